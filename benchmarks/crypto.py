@@ -0,0 +1,254 @@
+'''
+Benchmark decrypting submissions, encrypting replies and importing source keys with GpgHelper.
+
+Messages and documents of each size are encrypted to the test journalist key from tests/files, then
+decrypted with GpgHelper.decrypt_submission_or_reply, and replies of each size are encrypted with
+GpgHelper.encrypt_to_source to a source key generated for the benchmark, since the test source key
+has expired. To show where the time goes, the benchmark also times:
+
+* gpg_spawn: starting gpg, which every operation pays once
+* gpg_decrypt and gpg_encrypt: gpg alone decrypting and encrypting the same data, without the
+  temporary files and copies that GpgHelper adds
+* gunzip: decompressing a document, which decrypting it includes
+
+The results have the median time of each operation and its throughput in MB/s, and the overhead of
+GpgHelper over gpg alone at each size.
+
+    python -m benchmarks.crypto --sizes 1,1024 --output before.json
+    python -m benchmarks.crypto --sizes 1,1024 --output after.json --compare before.json
+'''
+import argparse
+import gzip
+import logging
+import os
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Any, Callable, Dict, List  # noqa: F401
+
+from benchmarks.utils import compare, create_home, get_environment, summarize, write_results
+from securedrop_client.crypto import GpgHelper
+from securedrop_client.db import make_session_maker, Source
+
+TEST_FILES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'files')
+JOURNALIST_KEY = os.path.join(TEST_FILES, 'securedrop.gpg.asc')
+JOURNALIST_FINGERPRINT = '65A1B5FF195B56353CC63DFFCC40EF1228271441'
+SOURCE_UUID = 'source-uuid'
+
+
+def time_runs(function: Callable[[], Any], repeat: int,
+              setup: Callable[[], Any] = lambda: None) -> List[float]:
+    '''
+    Call the function `repeat` times, each time after calling setup, and return the time each call
+    took.
+    '''
+    times = []
+    for i in range(repeat):
+        setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def make_text(size: int) -> str:
+    '''
+    Return `size` bytes of text, which compresses about as well as a typical document.
+    '''
+    rng = random.Random(size)
+    words = [''.join(rng.choice(string.ascii_lowercase) for i in range(rng.randint(2, 10)))
+             for i in range(1000)]
+    text = []
+    length = 0
+    while length < size:
+        word = rng.choice(words)
+        text.append(word)
+        length += len(word) + 1
+    return ' '.join(text)[:size]
+
+
+class CryptoBenchmark:
+    '''
+    A client home directory with the test journalist key and a source with a key of its own.
+    '''
+
+    def __init__(self) -> None:
+        self.home, self.data_dir = create_home()
+        self.gpg_home = os.path.join(self.home, 'gpg')
+        os.mkdir(self.gpg_home, 0o0700)
+        self.work_dir = tempfile.mkdtemp(dir=self.home)
+
+        # Import the journalist's secret key the way run.sh does, which also creates the trust
+        # database that GpgHelper expects.
+        subprocess.check_call(
+            ['gpg', '--homedir', self.gpg_home, '--batch', '--import', JOURNALIST_KEY],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        self.session_maker = make_session_maker(self.home)
+        session = self.session_maker()
+        session.add(Source(
+            uuid=SOURCE_UUID, journalist_designation='source', is_flagged=False,
+            public_key='', interaction_count=0, is_starred=False, document_count=0))
+        session.commit()
+
+        # Generate the source's key in a keyring of its own, like the server does.
+        source_gpg_home = os.path.join(self.home, 'source-gpg')
+        os.mkdir(source_gpg_home, 0o0700)
+        subprocess.check_call(
+            ['gpg', '--homedir', source_gpg_home, '--batch', '--passphrase', '',
+             '--quick-generate-key', 'source', 'rsa4096', 'cert', 'never'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.source_fingerprint = [
+            line.split(':')[9] for line in subprocess.check_output(
+                ['gpg', '--homedir', source_gpg_home, '--with-colons', '--fingerprint']
+            ).decode().splitlines() if line.startswith('fpr:')][0]
+        subprocess.check_call(
+            ['gpg', '--homedir', source_gpg_home, '--batch', '--passphrase', '',
+             '--quick-add-key', self.source_fingerprint, 'rsa4096', 'encr', 'never'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.source_key = subprocess.check_output(
+            ['gpg', '--homedir', source_gpg_home, '--armor', '--export']).decode()
+
+        self.helper = GpgHelper(self.home, self.session_maker, is_qubes=False)
+        self.helper.import_key(SOURCE_UUID, self.source_key, self.source_fingerprint)
+
+    def close(self) -> None:
+        self.session_maker.remove()
+        shutil.rmtree(self.home)
+
+    def gpg(self, *args: str) -> None:
+        subprocess.check_call(
+            ['gpg', '--homedir', self.gpg_home, '--trust-model', 'always', '--batch', '--yes']
+            + list(args),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def encrypt_file(self, path: str) -> str:
+        '''
+        Encrypt the file to the journalist, as the server does with submissions.
+        '''
+        self.gpg('--encrypt', '-r', JOURNALIST_FINGERPRINT, '-o', path + '.gpg', path)
+        return path + '.gpg'
+
+    def run(self, sizes: List[int], repeat: int) -> Dict[str, List[float]]:
+        samples = {}  # type: Dict[str, List[float]]
+        samples['gpg_spawn'] = time_runs(lambda: self.gpg('--version'), repeat)
+        samples['import_key'] = time_runs(
+            lambda: self.helper.import_key(SOURCE_UUID, self.source_key, self.source_fingerprint),
+            repeat)
+
+        for size in sizes:
+            text = make_text(size)
+            message = os.path.join(self.work_dir, '1-source-msg')
+            with open(message, 'w') as f:
+                f.write(text)
+            encrypted_message = self.encrypt_file(message)
+
+            document = os.path.join(self.work_dir, '2-source-doc.gz')
+            with open(document, 'wb') as f, \
+                    gzip.GzipFile(filename='document.txt', mode='wb', fileobj=f) as gzipped:
+                gzipped.write(text.encode())
+            encrypted_document = self.encrypt_file(document)
+
+            # GpgHelper deletes what it decrypts, so decrypt copies.
+            message_copy = os.path.join(self.data_dir, os.path.basename(encrypted_message))
+            document_copy = os.path.join(self.data_dir, os.path.basename(encrypted_document))
+            plaintext = os.path.join(self.data_dir, 'plaintext')
+
+            samples['gpg_decrypt[{}]'.format(size)] = time_runs(
+                lambda: self.gpg('--decrypt', '-o', '/dev/null', encrypted_message), repeat)
+            samples['decrypt_message[{}]'.format(size)] = time_runs(
+                lambda: self.helper.decrypt_submission_or_reply(message_copy, plaintext),
+                repeat, lambda: shutil.copy(encrypted_message, message_copy))
+            samples['decrypt_document[{}]'.format(size)] = time_runs(
+                lambda: self.helper.decrypt_submission_or_reply(document_copy, plaintext, True),
+                repeat, lambda: shutil.copy(encrypted_document, document_copy))
+            samples['gunzip[{}]'.format(size)] = time_runs(
+                lambda: self.gunzip(document, plaintext), repeat)
+            samples['gpg_encrypt[{}]'.format(size)] = time_runs(
+                lambda: self.gpg('--encrypt', '-r', self.source_fingerprint, '-r',
+                                 JOURNALIST_FINGERPRINT, '--armor', '-o', '/dev/null', message),
+                repeat)
+            samples['encrypt_to_source[{}]'.format(size)] = time_runs(
+                lambda: self.helper.encrypt_to_source(SOURCE_UUID, text), repeat)
+
+            print('{} bytes: {}'.format(size, ', '.join(
+                '{} {:.3f}s'.format(name.split('[')[0], min(times))
+                for name, times in samples.items() if name.endswith('[{}]'.format(size)))),
+                file=sys.stderr)
+
+        return samples
+
+    @staticmethod
+    def gunzip(path: str, plaintext: str) -> None:
+        with gzip.open(path, 'rb') as infile, open(plaintext, 'wb') as outfile:
+            shutil.copyfileobj(infile, outfile)
+
+
+def summarize_results(samples: Dict[str, List[float]], sizes: List[int]) -> Dict[str, Any]:
+    '''
+    Summarize the times of each operation with its throughput in MB/s if it depends on the size,
+    and return them with the overhead of GpgHelper over gpg alone at each size.
+    '''
+    scenarios = {}
+    for name, times in samples.items():
+        scenarios[name] = summarize(times)
+        if name.endswith(']'):
+            size = int(name.split('[')[1][:-1])
+            scenarios[name]['mb_per_s'] = size / scenarios[name]['median'] / 1000000
+
+    overheads = {}
+    for size in sizes:
+        def median(operation: str) -> float:
+            return scenarios['{}[{}]'.format(operation, size)]['median']
+
+        overheads[str(size)] = {
+            'decrypt_message': median('decrypt_message') - median('gpg_decrypt'),
+            'decrypt_document': median('decrypt_document') - median('gpg_decrypt'),
+            'encrypt_to_source': median('encrypt_to_source') - median('gpg_encrypt'),
+        }
+
+    return {'scenarios': scenarios, 'overheads': overheads}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--sizes', default='1,64,1024,8192',
+                        help='comma separated sizes of messages, documents and replies in KiB')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs of each operation')
+    parser.add_argument('--output', help='file to write the results to, instead of stdout')
+    parser.add_argument('--compare', help='results of an earlier run to compare with')
+    args = parser.parse_args()
+    sizes = [int(size) * 1024 for size in args.sizes.split(',')]
+
+    logging.basicConfig(level=logging.WARNING)
+
+    benchmark = CryptoBenchmark()
+    try:
+        samples = benchmark.run(sizes, args.repeat)
+    finally:
+        benchmark.close()
+
+    results = {
+        'benchmark': 'crypto',
+        'parameters': {
+            'repeat': args.repeat,
+            'sizes': sizes,
+        },
+        'environment': get_environment(),
+    }
+    results['environment']['gpg'] = subprocess.check_output(
+        ['gpg', '--version']).decode().splitlines()[0]
+    results.update(summarize_results(samples, sizes))
+
+    write_results(results, args.output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
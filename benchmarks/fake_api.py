@@ -0,0 +1,128 @@
+'''
+An in-process stand-in for the SecureDrop journalist API, serving generated sources, submissions
+and replies through the part of the sdclientapi.API interface that a sync uses.
+'''
+import random
+import uuid
+
+from typing import Dict, List, Tuple  # noqa: F401
+
+from sdclientapi import Reply, Source, Submission
+
+
+class FakeAPI:
+    '''
+    Serve `sources` sources, each with `submissions` submissions (alternately messages and files)
+    and `replies` replies written by one of `journalists` journalists.
+
+    The data is generated from `seed`, so that two runs with the same parameters sync the same
+    data. The churn method changes the data the way a busy instance would between two syncs.
+    '''
+
+    def __init__(self, sources: int, submissions: int, replies: int, journalists: int,
+                 seed: int = 0) -> None:
+        self.random = random.Random(seed)
+        self.submissions_per_source = submissions
+        self.replies_per_source = replies
+        self.journalists = [
+            (self._uuid(), 'journalist{}'.format(i)) for i in range(journalists)
+        ]  # type: List[Tuple[str, str]]
+
+        self.sources = []  # type: List[Source]
+        self.submissions = {}  # type: Dict[str, List[Submission]]
+        self.replies = {}  # type: Dict[str, List[Reply]]
+        for i in range(sources):
+            self.add_source()
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def add_source(self) -> None:
+        '''
+        Add a source with its submissions and replies.
+        '''
+        source_uuid = self._uuid()
+        designation = 'source {}'.format(len(self.sources))
+        source_url = '/api/v1/sources/{}'.format(source_uuid)
+        self.sources.append(Source(
+            add_star_url='{}/add_star'.format(source_url),
+            interaction_count=self.submissions_per_source + self.replies_per_source,
+            is_flagged=False,
+            is_starred=False,
+            journalist_designation=designation,
+            key={'type': 'PGP', 'public': 'public key', 'fingerprint': 'fingerprint'},
+            last_updated='2020-01-01T00:00:00.000000Z',
+            number_of_documents=(self.submissions_per_source + 1) // 2,
+            number_of_messages=self.submissions_per_source // 2,
+            remove_star_url='{}/remove_star'.format(source_url),
+            replies_url='{}/replies'.format(source_url),
+            submissions_url='{}/submissions'.format(source_url),
+            url=source_url,
+            uuid=source_uuid))
+
+        self.submissions[source_uuid] = []
+        for i in range(1, self.submissions_per_source + 1):
+            submission_uuid = self._uuid()
+            if i % 2:
+                filename = '{}-{}-doc.gz.gpg'.format(i, designation.replace(' ', '_'))
+            else:
+                filename = '{}-{}-msg.gpg'.format(i, designation.replace(' ', '_'))
+            submission_url = '{}/submissions/{}'.format(source_url, submission_uuid)
+            self.submissions[source_uuid].append(Submission(
+                download_url='{}/download'.format(submission_url),
+                filename=filename,
+                is_read=False,
+                size=self.random.randint(1000, 100000),
+                source_url=source_url,
+                submission_url=submission_url,
+                uuid=submission_uuid))
+
+        self.replies[source_uuid] = []
+        for i in range(1, self.replies_per_source + 1):
+            reply_uuid = self._uuid()
+            journalist_uuid, journalist_username = self.random.choice(self.journalists)
+            self.replies[source_uuid].append(Reply(
+                filename='{}-{}-reply.gpg'.format(
+                    self.submissions_per_source + i, designation.replace(' ', '_')),
+                journalist_uuid=journalist_uuid,
+                journalist_username=journalist_username,
+                is_deleted_by_source=False,
+                reply_url='{}/replies/{}'.format(source_url, reply_uuid),
+                size=self.random.randint(1000, 10000),
+                source_url=source_url,
+                uuid=reply_uuid))
+
+    def churn(self, fraction: float) -> Dict[str, int]:
+        '''
+        Add, delete and rename about `fraction` of the sources and submissions: add new sources,
+        delete existing sources along with their submissions and replies, and rename submissions.
+
+        Returns the number of sources added and deleted and the number of submissions renamed.
+        '''
+        count = max(1, int(len(self.sources) * fraction))
+
+        for source in self.random.sample(self.sources, min(count, len(self.sources))):
+            self.sources.remove(source)
+            del self.submissions[source.uuid]
+            del self.replies[source.uuid]
+
+        for i in range(count):
+            self.add_source()
+
+        submissions = [s for submissions in self.submissions.values() for s in submissions]
+        renamed = self.random.sample(
+            submissions, min(len(submissions), max(1, int(len(submissions) * fraction))))
+        for submission in renamed:
+            counter, rest = submission.filename.split('-', 1)
+            submission.filename = '{}-renamed-{}'.format(counter, rest)
+
+        return {'added': count, 'deleted': count, 'renamed': len(renamed)}
+
+    def get_sources(self) -> List[Source]:
+        return list(self.sources)
+
+    def get_submissions(self, source: Source) -> List[Submission]:
+        return list(self.submissions[source.uuid])
+
+    def get_all_replies(self) -> List[Reply]:
+        return [reply for source in self.sources for reply in self.replies[source.uuid]]
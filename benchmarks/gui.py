@@ -0,0 +1,244 @@
+'''
+Benchmark rendering the source list and conversations with many sources and conversation items.
+
+The client runs on Qt's offscreen platform, unless QT_QPA_PLATFORM says otherwise, against a new
+database at each scale point. At a scale point of N there are N sources, the first of which has a
+conversation of N items (messages, replies and files in turn). The benchmark times:
+
+* show_source_list_snapshot: reading the source list snapshot and showing the sources in it, as
+  the client does before loading the sources from the database when the user logs in
+* show_sources: showing the sources for the first time, then refreshing them
+* on_source_changed: selecting the large conversation for the first time, then again after another
+  source was selected
+* update_conversation: redrawing the large conversation
+
+Each time includes the events processed after the call, such as deferred widget deletions, since
+the window is frozen until they are done. Peak memory is reported as the peak of memory allocated
+by Python during the call, and the process's peak resident set size, which includes memory
+allocated by Qt, after the call.
+
+    python -m benchmarks.gui --scales 100,1000 --output before.json
+    python -m benchmarks.gui --scales 100,1000 --output after.json --compare before.json
+'''
+import argparse
+import logging
+import os
+import resource
+import shutil
+import sys
+import time
+import tracemalloc
+
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List  # noqa: F401
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+from benchmarks.utils import compare, create_home, get_environment, summarize, \
+    write_results  # noqa: E402
+from securedrop_client.app import configure_locale_and_language  # noqa: E402
+from securedrop_client.db import File, make_session_maker, Message, Reply, Source, \
+    User  # noqa: E402
+from securedrop_client.gui.main import Window  # noqa: E402
+from securedrop_client.logic import Controller  # noqa: E402
+from securedrop_client.resources import load_css, load_stylesheet_fonts  # noqa: E402
+from securedrop_client.storage import read_source_list_snapshot, \
+    write_source_list_snapshot  # noqa: E402
+
+SCENARIOS = [
+    'show_source_list_snapshot',
+    'show_sources',
+    'show_sources_refresh',
+    'on_source_changed',
+    'on_source_changed_cached',
+    'update_conversation',
+]
+
+
+def populate(session_maker: Any, scale: int) -> None:
+    '''
+    Add `scale` sources with a message each, the first of which has a conversation of `scale`
+    messages, replies and files in turn.
+    '''
+    session = session_maker()
+    journalist = User(uuid='journalist-uuid', username='journalist')
+    session.add(journalist)
+
+    now = datetime.now()
+    for i in range(scale):
+        source = Source(
+            uuid='source-uuid-{}'.format(i),
+            journalist_designation='source {}'.format(i),
+            is_flagged=False,
+            public_key='public key',
+            interaction_count=scale if i == 0 else 1,
+            is_starred=bool(i % 7 == 0),
+            last_updated=now - timedelta(minutes=i),
+            document_count=0)
+        session.add(source)
+        session.flush()
+
+        for j in range(1, (scale if i == 0 else 1) + 1):
+            uuid = '{}-{}'.format(source.uuid, j)
+            if j % 3 == 1:
+                session.add(Message(
+                    source_id=source.id, uuid=uuid, filename='{}-msg.gpg'.format(j), size=123,
+                    download_url='download', is_downloaded=True, is_decrypted=True,
+                    content='Message {} from {}'.format(j, source.journalist_designation)))
+            elif j % 3 == 2:
+                session.add(Reply(
+                    source_id=source.id, uuid=uuid, filename='{}-reply.gpg'.format(j), size=123,
+                    journalist_id=journalist.id, is_downloaded=True, is_decrypted=True,
+                    content='Reply {} to {}'.format(j, source.journalist_designation)))
+            else:
+                session.add(File(
+                    source_id=source.id, uuid=uuid, filename='{}-doc.gz.gpg'.format(j), size=123,
+                    original_filename='document-{}.txt'.format(j), download_url='download',
+                    is_downloaded=False, is_decrypted=None))
+
+    session.commit()
+    session.close()
+
+
+def measure(app: QApplication, function: Callable[[], Any]) -> Dict[str, float]:
+    '''
+    Call the function and process the events it posted, and return the time it took with the peak
+    of memory allocated by Python meanwhile and the peak resident set size of the process.
+    '''
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'time': elapsed,
+        'python_peak_bytes': peak,
+        # ru_maxrss is in kilobytes on Linux
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def run_scale(app: QApplication, scale: int, repeat: int) -> Dict[str, List[Dict[str, float]]]:
+    '''
+    Run the scenarios `repeat` times against a new database at the given scale point.
+    '''
+    home, data_dir = create_home()
+    session_maker = make_session_maker(home)
+    populate(session_maker, scale)
+
+    gui = Window()
+    controller = Controller('http://localhost', gui, session_maker, home, proxy=False, qubes=False)
+    # Set up the window as Window.setup does, without the login dialog, which blocks until it is
+    # closed.
+    gui.controller = controller
+    gui.top_pane.setup(controller)
+    gui.left_pane.setup(gui, controller)
+    gui.main_view.setup(controller)
+    gui.show_main_window()
+    app.processEvents()
+    write_source_list_snapshot(controller.session, controller.source_list_snapshot)
+
+    main_view = gui.main_view
+    source_list = main_view.source_list
+    samples = {scenario: [] for scenario in SCENARIOS}  # type: Dict[str, List[Dict[str, float]]]
+    try:
+        for i in range(repeat):
+            # Start each run without the widgets created by the previous one.
+            source_list.clear()
+            for wrapper in main_view.source_conversations.values():
+                wrapper.deleteLater()
+            main_view.source_conversations.clear()
+            app.processEvents()
+
+            samples['show_source_list_snapshot'].append(measure(app, lambda: main_view.show_sources(
+                read_source_list_snapshot(controller.source_list_snapshot))))
+            source_list.clear()
+            app.processEvents()
+
+            sources = controller.session.query(Source).order_by(Source.last_updated.desc()).all()
+            samples['show_sources'].append(
+                measure(app, lambda: main_view.show_sources(sources)))
+            samples['show_sources_refresh'].append(
+                measure(app, lambda: main_view.show_sources(sources)))
+
+            samples['on_source_changed'].append(
+                measure(app, lambda: source_list.setCurrentRow(0)))
+            source_list.setCurrentRow(1)
+            app.processEvents()
+            samples['on_source_changed_cached'].append(
+                measure(app, lambda: source_list.setCurrentRow(0)))
+
+            source = source_list.get_current_source()
+            conversation_view = main_view.source_conversations[source].conversation_view
+            samples['update_conversation'].append(
+                measure(app, lambda: conversation_view.update_conversation()))
+
+            print('Scale {}, run {}/{}: {}'.format(scale, i + 1, repeat, ', '.join(
+                '{} {:.3f}s'.format(scenario, samples[scenario][-1]['time'])
+                for scenario in SCENARIOS)), file=sys.stderr)
+    finally:
+        gui.close()
+        gui.deleteLater()
+        app.processEvents()
+        controller.session.close()
+        session_maker.remove()
+        shutil.rmtree(home)
+
+    return samples
+
+
+def summarize_scenario(samples: List[Dict[str, float]]) -> Dict[str, Any]:
+    summary = summarize([sample['time'] for sample in samples])
+    summary['python_peak_bytes'] = max(sample['python_peak_bytes'] for sample in samples)
+    summary['max_rss_bytes'] = max(sample['max_rss_bytes'] for sample in samples)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--scales', default='100,500,1000',
+                        help='comma separated numbers of sources and conversation items')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs at each scale')
+    parser.add_argument('--output', help='file to write the results to, instead of stdout')
+    parser.add_argument('--compare', help='results of an earlier run to compare with')
+    args = parser.parse_args()
+    scales = [int(scale) for scale in args.scales.split(',')]
+
+    logging.basicConfig(level=logging.WARNING)
+    configure_locale_and_language()
+
+    app = QApplication(sys.argv[:1])
+    stylesheet = load_css('sdclient.css')
+    load_stylesheet_fonts([stylesheet])
+    app.setStyleSheet(stylesheet)
+
+    scenarios = {}
+    for scale in scales:
+        samples = run_scale(app, scale, args.repeat)
+        for scenario in SCENARIOS:
+            name = '{}[{}]'.format(scenario, scale)
+            scenarios[name] = summarize_scenario(samples[scenario])
+
+    results = {
+        'benchmark': 'gui',
+        'parameters': {
+            'platform': app.platformName(),
+            'repeat': args.repeat,
+            'scales': scales,
+        },
+        'environment': get_environment(),
+        'scenarios': scenarios,
+    }
+
+    write_results(results, args.output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+'''
+Benchmark starting the client, up to the login dialog being painted and the client being ready for
+the user to log in.
+
+Each run starts the client in a new process with --profile-startup, on Qt's offscreen platform
+unless QT_QPA_PLATFORM says otherwise, against a new client home directory. Once the client has
+written its startup profile the process is stopped. The benchmark times:
+
+* first_paint: from starting the process to the login dialog being painted, which includes
+  starting Python and importing securedrop_client.app
+* ready: from starting the process to the client being ready for the user to log in, with the
+  phases of start_app as its stages
+
+The results also have the median import time of each package imported during start_app.
+
+    python -m benchmarks.startup --output before.json
+    python -m benchmarks.startup --output after.json --compare before.json
+'''
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from typing import Any, Dict, List  # noqa: F401
+
+from benchmarks.utils import compare, create_home, get_environment, summarize, write_results
+from securedrop_client.app import STARTUP_PROFILE
+
+TIMEOUT = 60
+
+
+def start_client(home: str) -> Dict[str, Any]:
+    '''
+    Start the client with --profile-startup, wait for it to write its startup profile, stop it and
+    return the profile with the time the process was started.
+    '''
+    profile_file = os.path.join(home, 'logs', STARTUP_PROFILE)
+    if os.path.exists(profile_file):
+        os.remove(profile_file)
+
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    launched = time.time()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'securedrop_client', '--sdc-home', home, '--no-proxy',
+         '--no-qubes', '--profile-startup'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # The profile is written in one go once the client is ready, so it is complete once it is
+        # not empty.
+        while not os.path.exists(profile_file) or not os.path.getsize(profile_file):
+            if process.poll() is not None:
+                raise RuntimeError('The client exited with {}'.format(process.returncode))
+            if time.time() - launched > TIMEOUT:
+                raise RuntimeError('The client was not ready after {}s'.format(TIMEOUT))
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait()
+
+    with open(profile_file) as f:
+        profile = json.load(f)
+    profile['launched'] = launched
+    return profile
+
+
+def summarize_profiles(profiles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    '''
+    Summarize the times to first paint and to being ready, with the median time of each phase as
+    the stages of being ready, and the median import time of each package.
+    '''
+    ready = summarize([profile['ready'] - profile['launched'] for profile in profiles])
+    ready['stages'] = {
+        phase: statistics.median(profile['phases'][phase] for profile in profiles)
+        for phase in profiles[0]['phases']
+    }
+
+    imports = {}  # type: Dict[str, List[float]]
+    for profile in profiles:
+        for package, duration in profile['imports'].items():
+            imports.setdefault(package, []).append(duration)
+
+    return {
+        'scenarios': {
+            'first_paint': summarize(
+                [profile['first_paint'] - profile['launched'] for profile in profiles]),
+            'ready': ready,
+        },
+        # Packages that were not imported in a run count as taking no time in it.
+        'imports': {
+            package: statistics.median(durations + [0.0] * (len(profiles) - len(durations)))
+            for package, durations in imports.items()
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--repeat', type=int, default=10, help='number of times to start')
+    parser.add_argument('--output', help='file to write the results to, instead of stdout')
+    parser.add_argument('--compare', help='results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    home, data_dir = create_home()
+    # The client checks that only the user can read its home directory.
+    os.chmod(data_dir, 0o0700)
+    profiles = []
+    try:
+        for i in range(args.repeat):
+            profile = start_client(home)
+            profiles.append(profile)
+            print('Run {}/{}: first paint {:.3f}s, ready {:.3f}s'.format(
+                i + 1, args.repeat, profile['first_paint'] - profile['launched'],
+                profile['ready'] - profile['launched']), file=sys.stderr)
+    finally:
+        shutil.rmtree(home)
+
+    results = {
+        'benchmark': 'startup',
+        'parameters': {
+            'platform': os.environ.get('QT_QPA_PLATFORM', 'offscreen'),
+            'repeat': args.repeat,
+        },
+        'environment': get_environment(),
+    }
+    results.update(summarize_profiles(profiles))
+
+    write_results(results, args.output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
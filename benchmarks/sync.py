@@ -0,0 +1,131 @@
+'''
+Benchmark syncing with the server against an in-process stand-in for the journalist API.
+
+Each run syncs a new database three times:
+
+* cold: the first sync, which adds every source, submission and reply
+* warm: a sync with nothing new, which should be cheap
+* churn: a sync after sources were added and deleted and submissions were renamed
+
+The results are written as JSON, with the median, minimum and maximum time of each scenario and the
+median time of each stage of the sync, so that two results can be compared with --compare:
+
+    python -m benchmarks.sync --sources 500 --output before.json
+    python -m benchmarks.sync --sources 500 --output after.json --compare before.json
+'''
+import argparse
+import logging
+import shutil
+import statistics
+import sys
+import time
+
+from typing import Any, Dict, List, Tuple  # noqa: F401
+
+from benchmarks.fake_api import FakeAPI
+from benchmarks.utils import compare, create_home, get_environment, summarize, write_results
+from securedrop_client.db import make_session_maker
+from securedrop_client.storage import get_remote_data, update_local_storage, SyncReport
+
+SCENARIOS = ['cold', 'warm', 'churn']
+
+
+def sync(session_maker: Any, api: FakeAPI, data_dir: str) -> Tuple[float, SyncReport]:
+    '''
+    Sync the database with the API the way MetadataSyncJob does, without importing source keys, and
+    return the time it took with the report of its stages.
+    '''
+    session = session_maker()
+    report = SyncReport()
+    try:
+        start = time.perf_counter()
+        remote_sources, remote_submissions, remote_replies = get_remote_data(api, report)
+        update_local_storage(
+            session, remote_sources, remote_submissions, remote_replies, data_dir, report)
+        elapsed = time.perf_counter() - start
+    finally:
+        session.close()
+    report.finish()
+    return elapsed, report
+
+
+def run(args: argparse.Namespace) -> Dict[str, List[Tuple[float, SyncReport]]]:
+    '''
+    Run the scenarios `args.repeat` times, each time with a new database.
+    '''
+    samples = {
+        scenario: [] for scenario in SCENARIOS
+    }  # type: Dict[str, List[Tuple[float, SyncReport]]]
+    for i in range(args.repeat):
+        home, data_dir = create_home()
+        session_maker = make_session_maker(home)
+        try:
+            api = FakeAPI(args.sources, args.submissions, args.replies, args.journalists, seed=i)
+            samples['cold'].append(sync(session_maker, api, data_dir))
+            samples['warm'].append(sync(session_maker, api, data_dir))
+            api.churn(args.churn)
+            samples['churn'].append(sync(session_maker, api, data_dir))
+        finally:
+            session_maker.remove()
+            shutil.rmtree(home)
+
+        print('Run {}/{}: {}'.format(i + 1, args.repeat, ', '.join(
+            '{} {:.3f}s'.format(scenario, samples[scenario][-1][0]) for scenario in SCENARIOS)),
+            file=sys.stderr)
+
+    return samples
+
+
+def summarize_scenario(samples: List[Tuple[float, SyncReport]]) -> Dict[str, Any]:
+    '''
+    Summarize the times of the runs of a scenario, with the median time of each stage of the sync.
+    '''
+    stages = {}  # type: Dict[str, List[float]]
+    for elapsed, report in samples:
+        for name, duration in report.durations.items():
+            stages.setdefault(name, []).append(duration)
+
+    summary = summarize([elapsed for elapsed, report in samples])
+    summary['stages'] = {name: statistics.median(durations) for name, durations in stages.items()}
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--sources', type=int, default=200, help='number of sources')
+    parser.add_argument('--submissions', type=int, default=4, help='submissions per source')
+    parser.add_argument('--replies', type=int, default=2, help='replies per source')
+    parser.add_argument('--journalists', type=int, default=10, help='number of journalists')
+    parser.add_argument('--churn', type=float, default=0.1,
+                        help='fraction of sources added, deleted and submissions renamed')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs of each scenario')
+    parser.add_argument('--output', help='file to write the results to, instead of stdout')
+    parser.add_argument('--compare', help='results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    samples = run(args)
+    results = {
+        'benchmark': 'sync',
+        'parameters': {
+            'sources': args.sources,
+            'submissions': args.submissions,
+            'replies': args.replies,
+            'journalists': args.journalists,
+            'churn': args.churn,
+            'repeat': args.repeat,
+        },
+        'environment': get_environment(),
+        'scenarios': {
+            scenario: summarize_scenario(samples[scenario]) for scenario in SCENARIOS
+        },
+    }
+
+    write_results(results, args.output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+'''
+Helpers shared by the benchmarks: creating a client home directory, describing the environment and
+writing and comparing results.
+'''
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from typing import Any, Dict, List, Tuple  # noqa: F401
+
+import sqlalchemy
+
+from securedrop_client.config import Config
+from securedrop_client.db import Base, make_session_maker, ReplySendStatus, ReplySendStatusCodes
+
+
+def create_home() -> Tuple[str, str]:
+    '''
+    Create a client home directory with a configuration and an empty database, as
+    create_dev_data.py does, and return it with its data directory.
+    '''
+    home = tempfile.mkdtemp(prefix='sdc-benchmark-')
+    os.chmod(home, 0o0700)
+    data_dir = os.path.join(home, 'data')
+    os.mkdir(data_dir)
+
+    with open(os.path.join(home, Config.CONFIG_NAME), 'w') as f:
+        f.write(json.dumps({
+            'journalist_key_fingerprint': '65A1B5FF195B56353CC63DFFCC40EF1228271441',
+        }))
+
+    session = make_session_maker(home)()
+    Base.metadata.create_all(bind=session.get_bind())
+    for reply_send_status in ReplySendStatusCodes:
+        session.add(ReplySendStatus(reply_send_status.value))
+    session.commit()
+    session.close()
+
+    return home, data_dir
+
+
+def get_environment() -> Dict[str, str]:
+    '''
+    Describe what the benchmark ran on, since results are only comparable on the same machine.
+    '''
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ''
+
+    return {
+        'commit': commit,
+        'machine': platform.machine(),
+        'node': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'sqlite': sqlite3.sqlite_version,
+    }
+
+
+def summarize(times: List[float]) -> Dict[str, Any]:
+    '''
+    Return the median, minimum and maximum of the times of the runs of a scenario, with the times.
+    '''
+    return {
+        'median': statistics.median(times),
+        'min': min(times),
+        'max': max(times),
+        'runs': times,
+    }
+
+
+def write_results(results: Dict[str, Any], output: str = None) -> None:
+    '''
+    Write the results as JSON to the output file, or to stdout if there is none.
+    '''
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if output:
+        with open(output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+
+
+def compare(results: Dict[str, Any], baseline_path: str) -> None:
+    '''
+    Print how the median time of each scenario, and of each of its stages if it has any, changed
+    from the results of an earlier run of the same benchmark.
+    '''
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    if results['parameters'] != baseline['parameters']:
+        print('Warning: the baseline was run with different parameters', file=sys.stderr)
+    if results['environment']['node'] != baseline['environment']['node']:
+        print('Warning: the baseline was run on a different machine', file=sys.stderr)
+
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if not previous:
+            continue
+        print('{}: {:.3f}s -> {:.3f}s ({:+.1%})'.format(
+            name, previous['median'], current['median'],
+            current['median'] / previous['median'] - 1))
+        for stage, duration in current.get('stages', {}).items():
+            previous_duration = previous.get('stages', {}).get(stage)
+            if previous_duration:
+                print('  {}: {:.3f}s -> {:.3f}s ({:+.1%})'.format(
+                    stage, previous_duration, duration, duration / previous_duration - 1))
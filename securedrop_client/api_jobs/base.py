@@ -1,9 +1,12 @@
 import logging
+import random
 
 from PyQt5.QtCore import QObject, pyqtSignal
 from sdclientapi import API, AuthError, RequestTimeoutError
 from sqlalchemy.orm.session import Session
-from typing import Any, Optional, TypeVar
+from typing import Any, Dict, Optional, TypeVar
+
+from securedrop_client.api_jobs.timeouts import TimeoutModel
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,43 @@ class ApiInaccessibleError(Exception):
         super().__init__(message)
 
 
+class RetryLaterError(Exception):
+    '''
+    Raised by a job that timed out and should be retried once `delay` seconds have passed.
+    '''
+
+    def __init__(self, delay: float) -> None:
+        super().__init__('Retrying in {:.1f} seconds'.format(delay))
+        self.delay = delay
+
+
+class RetryPolicy:
+    '''
+    Decide how long a job waits before it is retried after a request timed out.
+
+    The delay grows exponentially with the number of retries, from `base_delay` seconds up to
+    `max_delay` seconds. With jitter, the delay is drawn uniformly between zero and that value
+    ("full jitter"), so that jobs which timed out together do not all retry at the same moment. A
+    `base_delay` of zero retries immediately.
+    '''
+
+    def __init__(self, base_delay: float = 0, max_delay: float = 0, multiplier: float = 2,
+                 jitter: bool = True) -> None:
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def get_delay(self, retry_count: int) -> float:
+        '''
+        Return the delay in seconds before the retry that follows `retry_count` earlier retries.
+        '''
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** retry_count)
+        if self.jitter:
+            return random.uniform(0, delay)  # nosec: not used for security
+        return delay
+
+
 class QueueJob(QObject):
     def __init__(self) -> None:
         super().__init__()
@@ -57,10 +97,31 @@ class ApiJob(QueueJob):
     '''
     failure_signal = pyqtSignal(Exception)
 
+    '''
+    How long to wait before retrying after a request timed out. Job types override this, by default
+    a job is retried immediately.
+    '''
+    RETRY_POLICY = RetryPolicy()
+
     def __init__(self, remaining_attempts: int = DEFAULT_NUM_ATTEMPTS) -> None:
         super().__init__()
         self.remaining_attempts = remaining_attempts
 
+        # Number of times the job has been retried after a timeout, used to compute the backoff
+        self.retry_count = 0
+
+        # Estimates request timeouts. The queue replaces it with the model shared by all of its
+        # jobs when the job is added, so that what one job learns benefits the next.
+        self.timeout_model = TimeoutModel()
+
+        # Id of the job's record in the queue's JobStore, if it has one
+        self.store_id = None  # type: Optional[int]
+
+        # Number of times the API has been called and number of bytes transferred by the job, for
+        # the queue's JobStatistics
+        self.attempts = 0
+        self.bytes_transferred = 0
+
     def _do_call_api(self, api_client: API, session: Session) -> None:
         if not api_client:
             raise ApiInaccessibleError()
@@ -68,6 +129,7 @@ class ApiJob(QueueJob):
         while self.remaining_attempts >= 1:
             try:
                 self.remaining_attempts -= 1
+                self.attempts += 1
                 result = self.call_api(api_client, session)
             except (AuthError, ApiInaccessibleError) as e:
                 raise ApiInaccessibleError() from e
@@ -75,6 +137,13 @@ class ApiJob(QueueJob):
                 if self.remaining_attempts == 0:
                     self.failure_signal.emit(e)
                     raise
+
+                # Rather than waiting here, which would block the queue, let the queue put the job
+                # back once the delay has passed.
+                delay = self.RETRY_POLICY.get_delay(self.retry_count)
+                self.retry_count += 1
+                if delay > 0:
+                    raise RetryLaterError(delay) from e
             except Exception as e:
                 self.failure_signal.emit(e)
                 raise
@@ -82,6 +151,16 @@ class ApiJob(QueueJob):
                 self.success_signal.emit(result)
                 break
 
+    def get_persistent_args(self) -> Optional[Dict[str, Any]]:
+        '''
+        Return the arguments needed to re-create this job when the client restarts, or None if the
+        job should not outlive the client.
+
+        The arguments are stored as JSON, so they must only contain JSON serializable values. Job
+        types whose work would be lost if the client exited before they ran override this.
+        '''
+        return None
+
     def call_api(self, api_client: API, session: Session) -> Any:
         '''
         Method for making the actual API call and handling the result.
@@ -3,21 +3,31 @@ import hashlib
 import logging
 import math
 import os
+import re
+import requests
 import shutil
+import threading
+import time
 
 from tempfile import NamedTemporaryFile
-from typing import Any, Union, Tuple, Type
+from typing import Any, Callable, Dict, List, Mapping, Optional, Union, Tuple, Type  # noqa: F401
+from urllib.parse import urljoin
 
-from sdclientapi import API, BaseError
+from PyQt5.QtCore import Qt
+from sdclientapi import API, AuthError, BaseError, RequestTimeoutError, WrongUUIDError
 from sdclientapi import Reply as SdkReply
 from sdclientapi import Submission as SdkSubmission
 from sqlalchemy.orm.session import Session
+from urllib3.exceptions import ReadTimeoutError
 
-from securedrop_client.api_jobs.base import ApiJob
+from securedrop_client.api_jobs.base import ApiJob, ApiInaccessibleError, RetryLaterError, \
+    RetryPolicy
 from securedrop_client.crypto import GpgHelper, CryptoError
 from securedrop_client.db import File, Message, Reply
 from securedrop_client.storage import mark_as_decrypted, mark_as_downloaded, \
-    set_message_or_reply_content, get_remote_data, update_local_storage
+    set_message_or_reply_content, get_remote_data, update_local_storage, \
+    get_partial_download_path, PARTIAL_DOWNLOADS_DIR, SyncReport
+from securedrop_client.utils import safe_mkdir
 
 logger = logging.getLogger(__name__)
 
@@ -31,16 +41,92 @@ class DownloadChecksumMismatchException(Exception):
         self.uuid = uuid
 
 
+class DownloadInterruptedError(RequestTimeoutError):
+    '''
+    Raised when the connection drops before a download completes. It is retried like a timeout, but
+    is not one, so it does not raise the download timeout.
+    '''
+
+    def __init__(self, message: str) -> None:
+        super().__init__()
+        self.message = message
+
+    def __str__(self) -> str:
+        return self.message
+
+
 class MetadataSyncJob(ApiJob):
     '''
     Update source metadata such that new download jobs can be added to the queue.
+
+    Sync requests that arrive while this job is still waiting in the queue can be coalesced into it
+    with add_failure_callback instead of enqueuing another full sync.
     '''
 
+    # Background syncs are retried many times, so back off to give a struggling server room.
+    RETRY_POLICY = RetryPolicy(base_delay=2, max_delay=60)
+
     def __init__(self, data_dir: str, gpg: GpgHelper) -> None:
         super().__init__()
         self.data_dir = data_dir
         self.gpg = gpg
 
+        # Guards `started` and `failure_callback` since requesters attach from the GUI thread while
+        # the job is picked up by a queue thread.
+        self._lock = threading.Lock()
+        self.started = False
+        self.failure_callback = None  # type: Optional[Callable]
+
+        # Number of attempts asked for by the requester whose failure callback is connected
+        self.requested_attempts = self.remaining_attempts
+
+    def add_failure_callback(self, failure_callback: Callable, remaining_attempts: int) -> bool:
+        '''
+        Attach a requester to this job if it has not started running yet.
+
+        The job reports a failure to one requester only, since requesters handle failure in
+        conflicting ways (e.g. a background sync resumes the queues, a manual refresh does not). A
+        requester that asks for fewer attempts than the current one, like a manual refresh, is the
+        more urgent one, so its failure callback replaces the current one. Otherwise the current
+        failure callback is kept. The job's remaining attempts are lowered to the requested number
+        if that is smaller, so that a manual refresh fails as quickly as it would with a job of its
+        own.
+
+        Return False if the job has already started, in which case the requester needs to enqueue a
+        new job.
+        '''
+        with self._lock:
+            if self.started:
+                return False
+
+            if self.failure_callback is None or remaining_attempts < self.requested_attempts:
+                if self.failure_callback is not None:
+                    self.failure_signal.disconnect(self.failure_callback)
+                self.failure_signal.connect(failure_callback, type=Qt.QueuedConnection)
+                self.failure_callback = failure_callback
+                self.requested_attempts = remaining_attempts
+
+            self.remaining_attempts = min(self.remaining_attempts, remaining_attempts)
+            return True
+
+    def _do_call_api(self, api_client: API, session: Session) -> None:
+        '''
+        Override ApiJob.
+
+        Mark the job as started so that no more requesters can attach to it. If the job is going to
+        be put back into the queue because the server could not be reached or to be retried later,
+        it is waiting again, so allow requesters to attach to it once more.
+        '''
+        with self._lock:
+            self.started = True
+
+        try:
+            super()._do_call_api(api_client, session)
+        except (RequestTimeoutError, ApiInaccessibleError, RetryLaterError):
+            with self._lock:
+                self.started = False
+            raise
+
     def call_api(self, api_client: API, session: Session) -> Any:
         '''
         Override ApiJob.
@@ -48,20 +134,21 @@ class MetadataSyncJob(ApiJob):
         Download new metadata, update the local database, import new keys, and
         then the success signal will let the controller know to add any new download
         jobs.
+
+        Returns a SyncReport with the time each stage of the sync took, which is also logged.
         '''
+        report = SyncReport()
 
-        # TODO: Once https://github.com/freedomofpress/securedrop-client/issues/648, we will want to
-        # pass the default request timeout to api calls instead of setting it on the api object
-        # directly.
-        api_client.default_request_timeout = 20
+        timed_api_client = self.timeout_model.client(api_client, 'sync', default_timeout=20)
         remote_sources, remote_submissions, remote_replies = \
-            get_remote_data(api_client)
+            get_remote_data(timed_api_client, report)
 
         update_local_storage(session,
                              remote_sources,
                              remote_submissions,
                              remote_replies,
-                             self.data_dir)
+                             self.data_dir,
+                             report)
 
         for source in remote_sources:
             if source.key and source.key.get('type', None) == 'PGP':
@@ -73,10 +160,15 @@ class MetadataSyncJob(ApiJob):
                     # See: https://bugs.python.org/issue2506
                     continue  # pragma: no cover
                 try:
-                    self.gpg.import_key(source.uuid, pub_key, fingerprint)
+                    with report.stage('import_key'):
+                        self.gpg.import_key(source.uuid, pub_key, fingerprint)
                 except CryptoError:
                     logger.warning('Failed to import key for source {}'.format(source.uuid))
 
+        report.finish()
+        logger.info(report)
+        return report
+
 
 class DownloadJob(ApiJob):
     '''
@@ -85,6 +177,10 @@ class DownloadJob(ApiJob):
 
     CHUNK_SIZE = 4096
 
+    RETRY_POLICY = RetryPolicy(base_delay=1, max_delay=30)
+
+    PARTIAL_DOWNLOADS_DIR = PARTIAL_DOWNLOADS_DIR
+
     def __init__(self, data_dir: str) -> None:
         super().__init__()
         self.data_dir = data_dir
@@ -115,6 +211,9 @@ class DownloadJob(ApiJob):
           set it to 100000 bytes/second.
 
         * Minimum timeout allowed is 25 seconds
+
+        * This is the minimum timeout for the download. The job's TimeoutModel raises it when
+          downloads have been observed to be slower.
         '''
         TIMEOUT_BYTES_PER_SECOND = 100000.0
         TIMEOUT_ADJUSTMENT_FACTOR = 1.5
@@ -123,15 +222,184 @@ class DownloadJob(ApiJob):
         return timeout + TIMEOUT_BASE
 
     def call_download_api(self, api: API,
-                          db_object: Union[File, Message, Reply]) -> Tuple[str, str]:
+                          db_object: Union[File, Message, Reply]) -> Tuple[str, str, Optional[str]]:
         '''
         Method for making the actual API call to downlod the file and handling the result.
 
-        This MUST return the (etag, filepath) tuple response from the server and MUST raise an
-        exception if and only if the download fails.
+        This MUST return the (etag, filepath, checksum) tuple and MUST raise an exception if and
+        only if the download fails. The etag and filepath come from the server response, checksum
+        is the SHA-256 hex digest computed while the file was streamed to disk, or None if the file
+        was not hashed during the download.
         '''
         raise NotImplementedError
 
+    def _get_partial_download_path(self, uuid: str) -> str:
+        '''
+        Return the path where the partial download of the submission with the given UUID is staged.
+        '''
+        safe_mkdir(self.data_dir, self.PARTIAL_DOWNLOADS_DIR)
+        return get_partial_download_path(self.data_dir, uuid)
+
+    def _remove_partial_download(self, uuid: str) -> None:
+        '''
+        Remove the partial download of the submission with the given UUID, if there is one.
+        '''
+        partial_path = get_partial_download_path(self.data_dir, uuid)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    def _download_submission(self, api: API, submission: SdkSubmission,
+                             size: int) -> Tuple[str, str, Optional[str]]:
+        '''
+        Download a submission of `size` bytes, resuming a previous partial download of it if there
+        is one.
+
+        The submission is staged in the partial downloads directory, keyed by its UUID. If the
+        connection drops or times out, the bytes received so far are kept and the job is retried;
+        the retry then asks the server for the remaining bytes only with an HTTP Range request. The
+        ETag returned is the checksum of the entire submission, so the caller can validate the
+        assembled file with _check_file_integrity.
+
+        The SHA-256 digest of the submission is computed as the bytes are written so that the file
+        does not need to be read again for the integrity check. When resuming, only the bytes
+        already in the partial download are read back.
+
+        Through the Qubes RPC proxy, the submission is downloaded whole by the SDK, which has no
+        public way to request a range, and it is not hashed during the download. The proxy hands
+        over the response as a file in its QubesIncoming directory, whose path the SDK returns.
+
+        Returns the (etag, filepath, checksum) tuple.
+        '''
+        if api.proxy:
+            timeout = self.timeout_model.get_timeout(
+                'download', self._get_realistic_timeout(size), size)
+            with self.timeout_model.measure('download', timeout, size):
+                etag, filepath = api.download_submission(submission, timeout=timeout)
+            self.bytes_transferred += size
+            return etag, filepath, None
+
+        partial_path = self._get_partial_download_path(submission.uuid)
+        url = urljoin(api.server, self._get_download_path_query(submission))
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        remaining_size = max(size - offset, 0)
+        timeout = self.timeout_model.get_timeout(
+            'download', self._get_realistic_timeout(remaining_size), remaining_size)
+
+        hasher = hashlib.sha256()
+        expected_size = -1
+        received_size = 0
+        start = time.monotonic()
+        try:
+            response = self._request_remaining_bytes(url, api.req_headers, partial_path, timeout)
+            with response:
+                self._raise_for_status(response.status_code, submission.uuid)
+
+                if response.status_code == 206:
+                    mode = 'ab'
+                    self._check_range_start(response.headers, partial_path, submission.uuid)
+                    self._hash_file(hasher, partial_path)
+                else:
+                    # The server sent the whole submission, so start from the beginning.
+                    mode = 'wb'
+
+                expected_size = int(response.headers.get('Content-Length', -1))
+                with open(partial_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        received_size += len(chunk)
+                        self.bytes_transferred += len(chunk)
+        except requests.exceptions.RequestException as e:
+            if self._is_timeout(e):
+                logger.debug('Download of %s timed out: %s', submission.uuid, e)
+                self.timeout_model.observe_timeout('download')
+                raise RequestTimeoutError() from e
+
+            self._observe_interrupted_transfer(time.monotonic() - start, received_size)
+            raise DownloadInterruptedError(
+                'Download of {} interrupted: {}'.format(submission.uuid, e)) from e
+
+        if expected_size != -1 and received_size < expected_size:
+            self._observe_interrupted_transfer(time.monotonic() - start, received_size)
+            raise DownloadInterruptedError('Download of {} interrupted after {} of {} bytes'.format(
+                submission.uuid, received_size, expected_size))
+
+        self.timeout_model.observe('download', time.monotonic() - start, received_size)
+        etag = response.headers.get('ETag', '').strip('"')
+        return etag, partial_path, hasher.hexdigest()
+
+    def _request_remaining_bytes(self, url: str, headers: Dict[str, str], partial_path: str,
+                                 timeout: int) -> requests.Response:
+        '''
+        Request the bytes of the submission that are not yet in the partial download.
+
+        If the server cannot satisfy the range, e.g. because the submission changed, discard the
+        partial download and request the whole submission instead.
+        '''
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        if offset:
+            logger.debug('Resuming download of %s from byte %s', os.path.basename(partial_path),
+                         offset)
+            range_headers = dict(headers, Range='bytes={}-'.format(offset))
+            response = requests.get(url, headers=range_headers, stream=True, timeout=timeout)
+            if response.status_code != 416:
+                return response
+
+            response.close()
+            os.remove(partial_path)
+
+        return requests.get(url, headers=headers, stream=True, timeout=timeout)
+
+    @staticmethod
+    def _get_download_path_query(submission: SdkSubmission) -> str:
+        return 'api/v1/sources/{}/submissions/{}/download'.format(
+            submission.source_uuid, submission.uuid)
+
+    @staticmethod
+    def _raise_for_status(status_code: int, uuid: str) -> None:
+        '''
+        Raise the SDK's exception for a download response that has neither the whole submission
+        nor a range of it.
+        '''
+        if status_code == 404:
+            raise WrongUUIDError('Missing submission {}'.format(uuid))
+        elif status_code in (401, 403):
+            raise AuthError('Not authorized to download submission {}'.format(uuid))
+        elif status_code not in (200, 206):
+            raise BaseError('Failed to download submission {}: HTTP {}'.format(uuid, status_code))
+
+    def _check_range_start(self, headers: Mapping[str, str], partial_path: str,
+                           uuid: str) -> None:
+        '''
+        Check that a range response starts where the partial download ends. Otherwise the partial
+        download cannot be trusted, so remove it and raise DownloadInterruptedError to start again.
+        '''
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        match = re.match(r'bytes (\d+)-\d+/', headers.get('Content-Range', ''))
+        if match and int(match.group(1)) == offset:
+            return
+
+        self._remove_partial_download(uuid)
+        raise DownloadInterruptedError('Download of {} resumed at {} instead of byte {}'.format(
+            uuid, headers.get('Content-Range'), offset))
+
+    @staticmethod
+    def _is_timeout(e: requests.exceptions.RequestException) -> bool:
+        '''
+        Return True if the request timed out rather than its connection dropped. Requests raises a
+        ConnectionError for a timeout while the body is streamed.
+        '''
+        return isinstance(e, requests.exceptions.Timeout) or \
+            bool(e.args) and isinstance(e.args[0], ReadTimeoutError)
+
+    def _observe_interrupted_transfer(self, elapsed: float, received_size: int) -> None:
+        '''
+        Let the timeout model learn the throughput of a transfer that was interrupted, if enough
+        bytes were received to estimate it.
+        '''
+        if received_size >= self.timeout_model.MIN_THROUGHPUT_SAMPLE_SIZE:
+            self.timeout_model.observe('download', elapsed, received_size)
+
     def call_decrypt(self, filepath: str, session: Session = None) -> str:
         '''
         Method for decrypting the file and storing the plaintext result.
@@ -178,9 +446,11 @@ class DownloadJob(ApiJob):
         Note: On Qubes OS, files are downloaded to ~/QubesIncoming.
         '''
         try:
-            etag, download_path = self.call_download_api(api, db_object)
+            etag, download_path, checksum = self.call_download_api(api, db_object)
 
-            if not self._check_file_integrity(etag, download_path):
+            if not self._check_file_integrity(etag, download_path, checksum):
+                # Do not resume from a corrupted download, the retry has to start from scratch.
+                os.remove(download_path)
                 exception = DownloadChecksumMismatchException(
                     'Downloaded file had an invalid checksum.',
                     type(db_object),
@@ -190,9 +460,14 @@ class DownloadJob(ApiJob):
 
             shutil.move(download_path, os.path.join(self.data_dir, db_object.filename))
             mark_as_downloaded(type(db_object), db_object.uuid, session)
-            logger.info("File downloaded: {}".format(db_object.filename))
-        except BaseError as e:
-            logger.debug("Failed to download file: {}".format(db_object.filename))
+            logger.info("File downloaded: %s", db_object.filename)
+        except (RequestTimeoutError, AuthError) as e:
+            # The job will be retried, so keep the partial download to resume from.
+            logger.debug("Failed to download file: %s", db_object.filename)
+            raise e
+        except Exception as e:
+            logger.debug("Failed to download file: %s", db_object.filename)
+            self._remove_partial_download(db_object.uuid)
             raise e
 
     def _decrypt(self,
@@ -207,36 +482,49 @@ class DownloadJob(ApiJob):
             mark_as_decrypted(
                 type(db_object), db_object.uuid, session, original_filename=original_filename
             )
-            logger.info("File decrypted: {}".format(os.path.basename(filepath)))
+            logger.info("File decrypted: %s", os.path.basename(filepath))
         except CryptoError as e:
             mark_as_decrypted(type(db_object), db_object.uuid, session, is_decrypted=False)
-            logger.debug("Failed to decrypt file: {}".format(os.path.basename(filepath)))
+            logger.debug("Failed to decrypt file: %s", os.path.basename(filepath))
             raise e
 
     @classmethod
-    def _check_file_integrity(cls, etag: str, file_path: str) -> bool:
+    def _hash_file(cls, hasher: Any, file_path: str) -> None:
+        '''
+        Update the hasher with the contents of the file at the given path.
+        '''
+        with open(file_path, 'rb') as f:
+            while True:
+                read_bytes = f.read(cls.CHUNK_SIZE)
+                if not read_bytes:
+                    break
+                hasher.update(read_bytes)
+
+    @classmethod
+    def _check_file_integrity(cls, etag: str, file_path: str,
+                              sha256_checksum: Optional[str] = None) -> bool:
         '''
         Return True if file checksum is valid or unknown, otherwise return False.
+
+        If the SHA-256 digest was computed while the file was being downloaded, pass it as
+        sha256_checksum to avoid reading the file from disk again.
         '''
         if not etag:
-            logger.debug('No ETag. Skipping integrity check for file at {}'.format(file_path))
+            logger.debug('No ETag. Skipping integrity check for file at %s', file_path)
             return True
 
         alg, checksum = etag.split(':')
 
         if alg == 'sha256':
+            if sha256_checksum:
+                return sha256_checksum == checksum
             hasher = hashlib.sha256()
         else:
-            logger.debug('Unknown hash algorithm ({}). Skipping integrity check for file at {}'
-                         .format(alg, file_path))
+            logger.debug('Unknown hash algorithm (%s). Skipping integrity check for file at %s',
+                         alg, file_path)
             return True
 
-        with open(file_path, 'rb') as f:
-            while True:
-                read_bytes = f.read(cls.CHUNK_SIZE)
-                if not read_bytes:
-                    break
-                hasher.update(read_bytes)
+        cls._hash_file(hasher, file_path)
 
         calculated_checksum = binascii.hexlify(hasher.digest()).decode('utf-8')
         return calculated_checksum == checksum
@@ -258,18 +546,16 @@ class ReplyDownloadJob(DownloadJob):
         '''
         return session.query(Reply).filter_by(uuid=self.uuid).one()
 
-    def call_download_api(self, api: API, db_object: Reply) -> Tuple[str, str]:
+    def call_download_api(self, api: API, db_object: Reply) -> Tuple[str, str, Optional[str]]:
         '''
         Override DownloadJob.
         '''
         sdk_object = SdkReply(uuid=db_object.uuid, filename=db_object.filename)
         sdk_object.source_uuid = db_object.source.uuid
 
-        # TODO: Once https://github.com/freedomofpress/securedrop-sdk/issues/108 is implemented, we
-        # will want to pass the default request timeout to download_reply instead of setting it on
-        # the api object directly.
-        api.default_request_timeout = 20
-        return api.download_reply(sdk_object)
+        api = self.timeout_model.client(api, 'download_reply', default_timeout=20)
+        etag, filepath = api.download_reply(sdk_object)
+        return etag, filepath, None
 
     def call_decrypt(self, filepath: str, session: Session = None) -> str:
         '''
@@ -308,15 +594,14 @@ class MessageDownloadJob(DownloadJob):
         '''
         return session.query(Message).filter_by(uuid=self.uuid).one()
 
-    def call_download_api(self, api: API, db_object: Message) -> Tuple[str, str]:
+    def call_download_api(self, api: API, db_object: Message) -> Tuple[str, str, Optional[str]]:
         '''
         Override DownloadJob.
         '''
         sdk_object = SdkSubmission(uuid=db_object.uuid)
         sdk_object.source_uuid = db_object.source.uuid
         sdk_object.filename = db_object.filename
-        return api.download_submission(sdk_object,
-                                       timeout=self._get_realistic_timeout(db_object.size))
+        return self._download_submission(api, sdk_object, db_object.size)
 
     def call_decrypt(self, filepath: str, session: Session = None) -> str:
         '''
@@ -349,21 +634,26 @@ class FileDownloadJob(DownloadJob):
         self.uuid = uuid
         self.gpg = gpg
 
+    def get_persistent_args(self) -> Dict[str, Any]:
+        '''
+        Override ApiJob.
+        '''
+        return {'uuid': self.uuid}
+
     def get_db_object(self, session: Session) -> File:
         '''
         Override DownloadJob.
         '''
         return session.query(File).filter_by(uuid=self.uuid).one()
 
-    def call_download_api(self, api: API, db_object: File) -> Tuple[str, str]:
+    def call_download_api(self, api: API, db_object: File) -> Tuple[str, str, Optional[str]]:
         '''
         Override DownloadJob.
         '''
         sdk_object = SdkSubmission(uuid=db_object.uuid)
         sdk_object.source_uuid = db_object.source.uuid
         sdk_object.filename = db_object.filename
-        return api.download_submission(sdk_object,
-                                       timeout=self._get_realistic_timeout(db_object.size))
+        return self._download_submission(api, sdk_object, db_object.size)
 
     def call_decrypt(self, filepath: str, session: Session = None) -> str:
         '''
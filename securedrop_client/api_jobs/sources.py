@@ -3,17 +3,28 @@ import sdclientapi
 
 from sdclientapi import API
 from sqlalchemy.orm.session import Session
+from typing import Any, Dict
 
-from securedrop_client.api_jobs.base import ApiJob
+from securedrop_client.api_jobs.base import ApiJob, RetryPolicy
 
 logger = logging.getLogger(__name__)
 
 
 class DeleteSourceJob(ApiJob):
+
+    # The user is waiting for the outcome, so keep the backoff short.
+    RETRY_POLICY = RetryPolicy(base_delay=0.5, max_delay=4)
+
     def __init__(self, source_uuid: str) -> None:
         super().__init__()
         self.source_uuid = source_uuid
 
+    def get_persistent_args(self) -> Dict[str, Any]:
+        '''
+        Override ApiJob.
+        '''
+        return {'source_uuid': self.source_uuid}
+
     def call_api(self, api_client: API, session: Session) -> str:
         '''
         Override ApiJob.
@@ -23,12 +34,7 @@ class DeleteSourceJob(ApiJob):
         try:
             source_sdk_object = sdclientapi.Source(uuid=self.source_uuid)
 
-            # TODO: After
-            # https://github.com/freedomofpress/securedrop-client/issues/648
-            # is merged, we will want to pass the default request
-            # timeout instead of setting it on the api object
-            # directly.
-            api_client.default_request_timeout = 5
+            api_client = self.timeout_model.client(api_client, 'delete', default_timeout=5)
             api_client.delete_source(source_sdk_object)
 
             return self.source_uuid
@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, NamedTuple, Tuple  # noqa: F401
+
+from securedrop_client.api_jobs.base import ApiJob
+
+logger = logging.getLogger(__name__)
+
+JobRun = NamedTuple('JobRun', [
+    ('job_type', str),
+    ('wait_time', float),
+    ('run_time', float),
+    ('attempts', int),
+    ('outcome', str),
+    ('bytes_transferred', int),
+])
+
+
+class JobStatistics:
+    '''
+    Record how long jobs wait in the queues and how long they take to run, so that slowness can be
+    attributed to queueing delay or to the jobs themselves.
+
+    The queues report when a job is put in a queue, when a queue starts running it, and how the run
+    ended. Each run is recorded with the time the job waited in the queue, the time it ran, the
+    number of API call attempts it made, its outcome and the number of bytes it transferred. For
+    each job type, statistics are computed over the last WINDOW_SIZE runs. They are written to the
+    log, with the number of jobs still waiting, at most once every LOG_INTERVAL seconds when a run
+    ends, and whenever the owner of the queues asks, e.g. on a timer so that a stalled queue still
+    reports, or when a queue pauses.
+
+    The statistics are shared by the queue threads, so access to them is serialized with a lock.
+    '''
+
+    # Outcomes of a run
+    SUCCESS = 'success'
+    FAILURE = 'failure'
+    TIMEOUT = 'timeout'
+    RETRY_LATER = 'retry_later'
+    INACCESSIBLE = 'inaccessible'
+
+    # Number of most recent runs per job type that the statistics are computed over
+    WINDOW_SIZE = 100
+
+    # Minimum number of seconds between two summaries written to the log
+    LOG_INTERVAL = 300
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._enqueue_times = {}  # type: Dict[ApiJob, float]
+        self._running_jobs = {}  # type: Dict[ApiJob, Tuple[float, float, int, int]]
+        self._runs = {}  # type: Dict[str, Deque[JobRun]]
+        self._last_logged = time.monotonic()
+
+    def job_enqueued(self, job: ApiJob) -> None:
+        '''
+        Record that the job was put in a queue.
+        '''
+        with self._lock:
+            self._enqueue_times[job] = time.monotonic()
+
+    def job_started(self, job: ApiJob) -> None:
+        '''
+        Record that a queue started running the job.
+        '''
+        now = time.monotonic()
+        with self._lock:
+            enqueued_at = self._enqueue_times.pop(job, now)
+            self._running_jobs[job] = (enqueued_at, now, job.attempts, job.bytes_transferred)
+
+    def forget_waiting_jobs(self, waiting_jobs: Iterable[ApiJob]) -> None:
+        '''
+        Stop tracking jobs recorded as waiting that are not among the given jobs, i.e. jobs that
+        left their queue without being run.
+        '''
+        waiting_jobs = set(waiting_jobs)
+        with self._lock:
+            for job in list(self._enqueue_times):
+                if job not in waiting_jobs:
+                    del self._enqueue_times[job]
+
+    def job_finished(self, job: ApiJob, outcome: str) -> None:
+        '''
+        Record how the run of the job ended, and write the statistics to the log if they have not
+        been written for LOG_INTERVAL seconds.
+        '''
+        now = time.monotonic()
+        with self._lock:
+            if job not in self._running_jobs:
+                return
+
+            enqueued_at, started_at, attempts, bytes_transferred = self._running_jobs.pop(job)
+            job_type = type(job).__name__
+            if job_type not in self._runs:
+                self._runs[job_type] = deque(maxlen=self.WINDOW_SIZE)
+            self._runs[job_type].append(JobRun(
+                job_type,
+                started_at - enqueued_at,
+                now - started_at,
+                job.attempts - attempts,
+                outcome,
+                job.bytes_transferred - bytes_transferred))
+
+        self.log_statistics_if_due()
+
+    def get_runs(self, job_type: str) -> List[JobRun]:
+        '''
+        Return the most recent runs of jobs of the given type, oldest first.
+        '''
+        with self._lock:
+            return list(self._runs.get(job_type, []))
+
+    def get_statistics(self) -> Dict[str, Dict[str, Any]]:
+        '''
+        Return the statistics of the most recent runs of each job type, keyed by job type name.
+
+        For each job type, the number of runs and of each outcome, the mean, 95th percentile and
+        maximum wait and run times in seconds, the mean number of attempts, the number of bytes
+        transferred and the resulting throughput in bytes per second.
+        '''
+        with self._lock:
+            runs_by_type = {job_type: list(runs) for job_type, runs in self._runs.items()}
+
+        statistics = {}
+        for job_type, runs in runs_by_type.items():
+            outcomes = {}  # type: Dict[str, int]
+            for run in runs:
+                outcomes[run.outcome] = outcomes.get(run.outcome, 0) + 1
+
+            run_time = sum(run.run_time for run in runs)
+            bytes_transferred = sum(run.bytes_transferred for run in runs)
+            statistics[job_type] = {
+                'runs': len(runs),
+                'outcomes': outcomes,
+                'wait_time': self._summarize([run.wait_time for run in runs]),
+                'run_time': self._summarize([run.run_time for run in runs]),
+                'attempts': sum(run.attempts for run in runs) / len(runs),
+                'bytes_transferred': bytes_transferred,
+                'throughput': bytes_transferred / run_time if run_time else 0.0,
+            }
+
+        return statistics
+
+    def get_waiting_jobs(self) -> Tuple[int, float]:
+        '''
+        Return the number of jobs waiting in the queues and the number of seconds the longest
+        waiting of them has waited.
+        '''
+        now = time.monotonic()
+        with self._lock:
+            enqueue_times = list(self._enqueue_times.values())
+
+        return len(enqueue_times), now - min(enqueue_times, default=now)
+
+    def log_statistics_if_due(self) -> None:
+        '''
+        Write the statistics to the log if they have not been written for LOG_INTERVAL seconds.
+        '''
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_logged < self.LOG_INTERVAL:
+                return
+            self._last_logged = now
+
+        self._write_statistics()
+
+    def log_statistics(self) -> None:
+        '''
+        Write the statistics of each job type and the number of jobs waiting to the log.
+        '''
+        with self._lock:
+            self._last_logged = time.monotonic()
+
+        self._write_statistics()
+
+    def _write_statistics(self) -> None:
+        waiting, longest_wait = self.get_waiting_jobs()
+        logger.info('{} jobs waiting, longest {:.2f}s'.format(waiting, longest_wait))
+        for job_type, stats in sorted(self.get_statistics().items()):
+            logger.info(
+                '{}: {} runs {}, wait {:.2f}s mean {:.2f}s p95, run {:.2f}s mean {:.2f}s p95, '
+                '{:.1f} attempts, {:.0f} B/s'.format(
+                    job_type, stats['runs'], stats['outcomes'],
+                    stats['wait_time']['mean'], stats['wait_time']['p95'],
+                    stats['run_time']['mean'], stats['run_time']['p95'],
+                    stats['attempts'], stats['throughput']))
+
+    @staticmethod
+    def _summarize(values: List[float]) -> Dict[str, float]:
+        '''
+        Return the mean, 95th percentile (nearest rank) and maximum of the values.
+        '''
+        values = sorted(values)
+        return {
+            'mean': sum(values) / len(values),
+            'p95': values[max(0, -(-len(values) * 95 // 100) - 1)],
+            'max': values[-1],
+        }
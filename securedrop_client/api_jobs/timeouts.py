@@ -0,0 +1,176 @@
+import copy
+import logging
+import math
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple  # noqa: F401
+
+from sdclientapi import API, RequestTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class TimeoutModel:
+    '''
+    Learn how long requests to the server take and estimate timeouts for future requests.
+
+    For each class of request (e.g. 'sync' or 'star'), keep an exponentially weighted moving
+    average (EWMA) of the observed latency and of its mean deviation, the way TCP estimates its
+    retransmission timeout (RFC 6298). Transfers of at least MIN_THROUGHPUT_SAMPLE_SIZE bytes
+    update an EWMA of the observed throughput instead, so that download timeouts scale with file
+    size. Smaller transfers, such as messages, take about as long as any other request over Tor,
+    so they are observed as latency.
+
+    As in RFC 6298 (and Karn's algorithm), a request that times out is not used as a sample, since
+    how long it would have taken is unknown. Instead, the timeout of its class is doubled until a
+    request of that class succeeds, so that slow Tor circuits do not cause the same timeout over
+    and over.
+
+    Estimated timeouts never drop below the default timeout that the caller passes in and never
+    exceed MAX_TIMEOUT_FACTOR times that default.
+
+    The model is shared by the queue threads, so access to the averages is serialized with a lock.
+    '''
+
+    # Weights of the newest observation in the latency average and deviation, see RFC 6298
+    LATENCY_WEIGHT = 0.125
+    DEVIATION_WEIGHT = 0.25
+
+    # Weight of the newest observation in the throughput average
+    THROUGHPUT_WEIGHT = 0.25
+
+    # Number of mean deviations above the average latency that a timeout allows for
+    DEVIATION_FACTOR = 4
+
+    # Factor applied to the expected transfer time of a download
+    TRANSFER_ADJUSTMENT_FACTOR = 1.5
+
+    # Smallest transfer in bytes that is used to estimate throughput
+    MIN_THROUGHPUT_SAMPLE_SIZE = 256 * 1024
+
+    # Timeouts never exceed this multiple of the default timeout of their request
+    MAX_TIMEOUT_FACTOR = 4
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latencies = {}  # type: Dict[str, Tuple[float, float]]
+        self._throughput = None  # type: Optional[float]
+        self._backoffs = {}  # type: Dict[str, int]
+
+    def observe(self, request_class: str, elapsed: float, size_in_bytes: int = 0) -> None:
+        '''
+        Update the averages with a request of the given class that completed in `elapsed` seconds
+        and transferred `size_in_bytes` bytes, and reset the timeout backoff of the class.
+
+        The latency estimate of the class is subtracted from the duration of a transfer of at least
+        MIN_THROUGHPUT_SAMPLE_SIZE bytes, which then updates the throughput average only.
+        '''
+        with self._lock:
+            self._backoffs.pop(request_class, None)
+
+            if size_in_bytes >= self.MIN_THROUGHPUT_SAMPLE_SIZE:
+                if request_class in self._latencies:
+                    elapsed -= self._latencies[request_class][0]
+                if elapsed <= 0:
+                    return
+                throughput = size_in_bytes / elapsed
+                if self._throughput is None:
+                    self._throughput = throughput
+                else:
+                    self._throughput += self.THROUGHPUT_WEIGHT * (throughput - self._throughput)
+                return
+
+            if request_class not in self._latencies:
+                self._latencies[request_class] = (elapsed, elapsed / 2)
+                return
+
+            average, deviation = self._latencies[request_class]
+            deviation += self.DEVIATION_WEIGHT * (abs(average - elapsed) - deviation)
+            average += self.LATENCY_WEIGHT * (elapsed - average)
+            self._latencies[request_class] = (average, deviation)
+
+    def observe_timeout(self, request_class: str) -> None:
+        '''
+        Double the timeout of the given request class after one of its requests timed out, until
+        a request of the class succeeds.
+        '''
+        with self._lock:
+            backoff = self._backoffs.get(request_class, 1)
+            # The timeout is capped, so there is no point in doubling the backoff indefinitely
+            if backoff < self.MAX_TIMEOUT_FACTOR:
+                self._backoffs[request_class] = backoff * 2
+
+    def get_timeout(self, request_class: str, default_timeout: int, size_in_bytes: int = 0) -> int:
+        '''
+        Return the timeout in seconds for a request of the given class that transfers
+        `size_in_bytes` bytes.
+        '''
+        estimate = 0.0
+        with self._lock:
+            if request_class in self._latencies:
+                average, deviation = self._latencies[request_class]
+                estimate += average + self.DEVIATION_FACTOR * deviation
+
+            if size_in_bytes and self._throughput:
+                estimate += self.TRANSFER_ADJUSTMENT_FACTOR * size_in_bytes / self._throughput
+
+            backoff = self._backoffs.get(request_class, 1)
+
+        timeout = max(default_timeout, math.ceil(estimate)) * backoff
+        return min(timeout, default_timeout * self.MAX_TIMEOUT_FACTOR)
+
+    @contextmanager
+    def measure(self, request_class: str, timeout: int, size_in_bytes: int = 0) -> Iterator[None]:
+        '''
+        Observe the duration of the request made in the body of the with statement. If it raises
+        RequestTimeoutError, back off the timeout of its class instead.
+        '''
+        start = time.monotonic()
+        try:
+            yield
+        except RequestTimeoutError:
+            logger.debug('%s request timed out after %s seconds', request_class, timeout)
+            self.observe_timeout(request_class)
+            raise
+
+        self.observe(request_class, time.monotonic() - start, size_in_bytes)
+
+    def client(self, api_client: API, request_class: str, default_timeout: int) -> 'TimedAPI':
+        '''
+        Return a view of the API client that gives every request made through it a timeout from
+        this model.
+        '''
+        return TimedAPI(api_client, self, request_class, default_timeout)
+
+
+class TimedAPI:
+    '''
+    A view of an API client that sets the timeout of each request made through it from a
+    TimeoutModel, and lets the model observe how long the request took.
+
+    The SDK reads the timeout of a request from the client's `default_request_timeout`, so the view
+    holds a shallow copy of the client. Setting the timeout on the copy does not affect other jobs
+    sharing the client. All other attributes are read from the copy.
+    '''
+
+    def __init__(self, api_client: API, model: TimeoutModel, request_class: str,
+                 default_timeout: int) -> None:
+        self._api_client = copy.copy(api_client)
+        self._model = model
+        self._request_class = request_class
+        self._default_timeout = default_timeout
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._api_client, name)
+        if not callable(attribute):
+            return attribute
+
+        def timed_request(*args: Any, **kwargs: Any) -> Any:
+            timeout = self._model.get_timeout(self._request_class, self._default_timeout)
+            self._api_client.default_request_timeout = timeout
+            with self._model.measure(self._request_class, timeout):
+                return attribute(*args, **kwargs)
+
+        return timed_request
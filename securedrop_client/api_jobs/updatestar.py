@@ -3,18 +3,29 @@ import sdclientapi
 
 from sdclientapi import API
 from sqlalchemy.orm.session import Session
+from typing import Any, Dict
 
-from securedrop_client.api_jobs.base import ApiJob
+from securedrop_client.api_jobs.base import ApiJob, RetryPolicy
 
 logger = logging.getLogger(__name__)
 
 
 class UpdateStarJob(ApiJob):
+
+    # The user is waiting for the outcome, so keep the backoff short.
+    RETRY_POLICY = RetryPolicy(base_delay=0.5, max_delay=4)
+
     def __init__(self, source_uuid: str, star_status: bool) -> None:
         super().__init__()
         self.source_uuid = source_uuid
         self.star_status = star_status
 
+    def get_persistent_args(self) -> Dict[str, Any]:
+        '''
+        Override ApiJob.
+        '''
+        return {'source_uuid': self.source_uuid, 'star_status': self.star_status}
+
     def call_api(self, api_client: API, session: Session) -> str:
         '''
         Override ApiJob.
@@ -24,10 +35,7 @@ class UpdateStarJob(ApiJob):
         try:
             source_sdk_object = sdclientapi.Source(uuid=self.source_uuid)
 
-            # TODO: Once https://github.com/freedomofpress/securedrop-client/issues/648, we will
-            # want to pass the default request timeout to remove_star and add_star instead of
-            # setting it on the api object directly.
-            api_client.default_request_timeout = 5
+            api_client = self.timeout_model.client(api_client, 'star', default_timeout=5)
             if self.star_status:
                 api_client.remove_star(source_sdk_object)
             else:
@@ -3,8 +3,9 @@ import sdclientapi
 
 from sdclientapi import API, RequestTimeoutError
 from sqlalchemy.orm.session import Session
+from typing import Any, Dict
 
-from securedrop_client.api_jobs.base import ApiJob
+from securedrop_client.api_jobs.base import ApiJob, RetryPolicy
 from securedrop_client.crypto import GpgHelper
 from securedrop_client.db import DraftReply, Reply, ReplySendStatus, ReplySendStatusCodes, Source
 from securedrop_client.storage import update_draft_replies
@@ -13,6 +14,10 @@ logger = logging.getLogger(__name__)
 
 
 class SendReplyJob(ApiJob):
+
+    # The user is waiting for the outcome, so keep the backoff short.
+    RETRY_POLICY = RetryPolicy(base_delay=0.5, max_delay=4)
+
     def __init__(self, source_uuid: str, reply_uuid: str, message: str, gpg: GpgHelper) -> None:
         super().__init__()
         self.source_uuid = source_uuid
@@ -20,6 +25,18 @@ class SendReplyJob(ApiJob):
         self.message = message
         self.gpg = gpg
 
+    def get_persistent_args(self) -> Dict[str, Any]:
+        '''
+        Override ApiJob.
+
+        The message is not recorded, so that the plaintext of the reply is only stored in the
+        client database. It is read back from the draft reply when the job is restored.
+        '''
+        return {
+            'source_uuid': self.source_uuid,
+            'reply_uuid': self.reply_uuid,
+        }
+
     def call_api(self, api_client: API, session: Session) -> str:
         '''
         Override ApiJob.
@@ -93,10 +110,7 @@ class SendReplyJob(ApiJob):
     def _make_call(self, encrypted_reply: str, api_client: API) -> sdclientapi.Reply:
         sdk_source = sdclientapi.Source(uuid=self.source_uuid)
 
-        # TODO: Once https://github.com/freedomofpress/securedrop-client/issues/648, we will want to
-        # pass the default request timeout to reply_source instead of setting it on the api object
-        # directly.
-        api_client.default_request_timeout = 5
+        api_client = self.timeout_model.client(api_client, 'reply', default_timeout=5)
         return api_client.reply_source(sdk_source, encrypted_reply, self.reply_uuid)
 
 
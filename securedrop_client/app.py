@@ -16,6 +16,9 @@ GNU Affero General Public License for more details.
 You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import atexit
+import builtins
+import json
 import logging
 import os
 import gettext
@@ -24,20 +27,26 @@ import platform
 import signal
 import sys
 import socket
+import threading
+import time
 from argparse import ArgumentParser
-from PyQt5.QtWidgets import QApplication, QMessageBox
-from PyQt5.QtCore import Qt, QTimer
-from logging.handlers import TimedRotatingFileHandler, SysLogHandler
+from collections import OrderedDict
+from contextlib import contextmanager
+from queue import Queue
+from typing import Dict, Iterator, List, Optional, Tuple  # noqa: F401
+from PyQt5.QtWidgets import QApplication, QMessageBox, QWidget
+from PyQt5.QtCore import Qt, QEvent, QEventLoop, QObject, QTimer
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler, \
+    SysLogHandler
 from securedrop_client import __version__
-from securedrop_client.logic import Controller
-from securedrop_client.gui.main import Window
-from securedrop_client.resources import load_icon, load_css, load_font
-from securedrop_client.db import make_session_maker
+from securedrop_client.gui.login import LoginDialog
+from securedrop_client.resources import load_icon, load_css, load_stylesheet_fonts
 from securedrop_client.utils import safe_mkdir
 
 DEFAULT_SDC_HOME = '~/.securedrop_client'
 ENCODING = 'utf-8'
-LOGLEVEL = os.environ.get('LOGLEVEL', 'info').upper()
+LOGLEVEL = os.environ.get('LOGLEVEL', 'info')
+STARTUP_PROFILE = 'startup-profile.json'
 
 
 def init(sdc_home: str) -> None:
@@ -77,9 +86,38 @@ def configure_locale_and_language() -> str:
     return language_code
 
 
-def configure_logging(sdc_home: str) -> None:
+def parse_log_levels(log_levels: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Return the level of the root logger and the levels of other loggers, by logger name, from a
+    comma separated list of levels, in which the levels of other loggers are given as name=level,
+    e.g. "debug,securedrop_client.storage=info". Levels that are not known are left out.
+    """
+    root_level = 'INFO'
+    levels = {}  # type: Dict[str, str]
+    for entry in log_levels.split(','):
+        name, separator, level = entry.strip().rpartition('=')
+        level = level.strip().upper()
+        if not isinstance(logging.getLevelName(level), int):
+            continue
+        if name.strip():
+            levels[name.strip()] = level
+        else:
+            root_level = level
+    return root_level, levels
+
+
+def configure_logging(sdc_home: str, async_logging: bool = True) -> None:
     """
     All logging related settings are set up by this function.
+
+    The LOGLEVEL environment variable sets the log level, and the levels of particular loggers, as
+    parse_log_levels reads it, so that e.g. syncing can log at info level while the rest of the
+    client logs at debug level.
+
+    With async_logging, which is the default, the threads that log only put records in a queue,
+    and a thread of its own writes them to the log file and syslog, so that logging on the GUI
+    thread or a queue thread does not wait for I/O. The records left in the queue are written when
+    the client exits.
     """
     safe_mkdir(sdc_home, 'logs')
     log_file = os.path.join(sdc_home, 'logs', 'client.log')
@@ -106,13 +144,25 @@ def configure_logging(sdc_home: str) -> None:
     sysloghandler.setFormatter(formatter)
     handler.setLevel(logging.DEBUG)
 
+    root_level, levels = parse_log_levels(LOGLEVEL)
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
     # set up primary log
     log = logging.getLogger()
-    log.setLevel(LOGLEVEL)
-    log.addHandler(handler)
+    log.setLevel(root_level)
+
+    if async_logging:
+        log_queue = Queue()  # type: Queue
+        listener = QueueListener(log_queue, handler, sysloghandler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        log.addHandler(QueueHandler(log_queue))
+    else:
+        log.addHandler(handler)
 
-    # add the secondard logger
-    log.addHandler(sysloghandler)
+        # add the secondard logger
+        log.addHandler(sysloghandler)
 
     # override excepthook to capture a log of catastrophic failures.
     sys.excepthook = excepthook
@@ -149,6 +199,14 @@ def arg_parser() -> ArgumentParser:
     parser.add_argument(
         '--no-qubes', action='store_true',
         help='Disable opening submissions in DispVMs')
+    parser.add_argument(
+        '--profile-startup', action='store_true',
+        help=('Record how long each phase of starting up and importing each package takes, in '
+              'logs/{} in the SecureDrop Client home directory.'.format(STARTUP_PROFILE)))
+    parser.add_argument(
+        '--sync-logging', action='store_true',
+        help=('Write each log record before carrying on, rather than from a thread of its own, so '
+              'that nothing logged is lost if the client crashes.'))
     return parser
 
 
@@ -174,6 +232,138 @@ def prevent_second_instance(app: QApplication, unique_name: str) -> None:
             raise
 
 
+class StartupProfile:
+    """
+    Records how long each phase of starting the client takes, and how long importing each package
+    takes, until the client is ready for the user to log in.
+
+    The import time of a package is the time spent importing its modules, not counting the packages
+    they import in turn, like python -X importtime shows. It leaves out the packages imported by
+    securedrop_client.app itself, which are imported before the profile starts.
+    """
+
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self.started = time.time()
+        self.first_paint = None  # type: Optional[float]
+        self.phases = []  # type: List[Tuple[str, float]]
+        self.imports = {}  # type: Dict[str, float]
+
+        # The import function replaced while the profile records imports, and the time spent in
+        # the imports nested in each import in progress
+        self._import = builtins.__import__
+        self._nested = [0.0]
+        self._thread = threading.get_ident()
+        if self.enabled:
+            builtins.__import__ = self._timed_import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if threading.get_ident() != self._thread:
+            return self._import(name, globals, locals, fromlist, level)
+
+        modules = len(sys.modules)
+        self._nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            self._nested[-1] += elapsed
+            # Only count the imports that loaded modules, rather than found them already loaded
+            if len(sys.modules) > modules:
+                if level:
+                    name = (globals or {}).get('__package__') or name
+                package = name.split('.')[0]
+                self.imports[package] = self.imports.get(package, 0.0) + elapsed - nested
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Record how long the code run in the context takes as the named phase.
+        """
+        start = time.perf_counter()
+        yield
+        if self.enabled:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def painted(self) -> None:
+        """
+        Record that the login dialog has been painted.
+        """
+        self.first_paint = time.time()
+
+    def write(self, sdc_home: str) -> None:
+        """
+        Stop recording imports, and write the profile to the logs directory as JSON, with the times
+        the client started, painted the login dialog and was ready as seconds since the epoch.
+        """
+        if not self.enabled:
+            return
+
+        builtins.__import__ = self._import
+
+        ready = time.time()
+        profile = {
+            'started': self.started,
+            'first_paint': self.first_paint,
+            'ready': ready,
+            'phases': OrderedDict(self.phases),
+            'imports': OrderedDict(
+                sorted(self.imports.items(), key=lambda item: item[1], reverse=True)),
+        }
+        profile_file = os.path.join(sdc_home, 'logs', STARTUP_PROFILE)
+        with open(profile_file, 'w') as f:
+            json.dump(profile, f, indent=2)
+
+        logging.info('Ready for login {:.3f}s after starting, {}; startup profile written to {}'
+                     .format(ready - self.started,
+                             ', '.join('{} {:.3f}s'.format(*phase) for phase in self.phases),
+                             profile_file))
+
+
+class PaintWaiter(QObject):
+    """
+    Runs an event loop until a widget has been painted.
+    """
+
+    def __init__(self, widget: QWidget) -> None:
+        super().__init__()
+        self.loop = QEventLoop()
+        self.widget = widget
+        self.widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            # Quit once the paint event is handled and the window updated with what was painted
+            QTimer.singleShot(0, self.loop.quit)
+        return False
+
+    def wait(self, timeout):
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.timeout.connect(self.loop.quit)
+        timer.start(timeout)
+
+        # Input events wait for the next time events are processed, since nothing is ready to
+        # handle them yet.
+        self.loop.exec_(QEventLoop.ExcludeUserInputEvents)
+
+        timer.stop()
+        self.widget.removeEventFilter(self)
+
+
+def show_until_painted(widget: QWidget, timeout: int = 1000) -> None:
+    """
+    Show the widget and process events until it is painted, so that it appears before work that
+    blocks the event loop. Gives up after the timeout, in milliseconds, in case the window system
+    never shows the widget.
+    """
+    waiter = PaintWaiter(widget)
+    widget.show()
+    waiter.wait(timeout)
+
+
 def start_app(args, qt_args) -> None:
     """
     Create all the top-level assets for the application, set things up and
@@ -182,37 +372,60 @@ def start_app(args, qt_args) -> None:
     - set up locale and language.
     - set up logging.
     - create an application object.
+    - show the login dialog, before importing the modules only needed after
+      login.
     - create a window for the app.
     - create an API connection to the SecureDrop proxy.
     - create a SqlAlchemy session to local storage.
     - configure the client (logic) object.
     - ensure the application is setup in the default safe starting state.
     """
-    configure_locale_and_language()
-    init(args.sdc_home)
-    configure_logging(args.sdc_home)
-    logging.info('Starting SecureDrop Client {}'.format(__version__))
-
-    app = QApplication(qt_args)
-    app.setApplicationName('SecureDrop Client')
-    app.setDesktopFileName('org.freedomofthepress.securedrop.client')
-    app.setApplicationVersion(__version__)
-    app.setAttribute(Qt.AA_UseHighDpiPixmaps)
-
-    load_font('Montserrat')
-    load_font('Source_Sans_Pro')
-
-    prevent_second_instance(app, args.sdc_home)
-
-    session_maker = make_session_maker(args.sdc_home)
-
-    gui = Window()
-
-    app.setWindowIcon(load_icon(gui.icon))
-    app.setStyleSheet(load_css('sdclient.css'))
+    profile = StartupProfile(args.profile_startup)
+
+    with profile.phase('configure'):
+        configure_locale_and_language()
+        init(args.sdc_home)
+        configure_logging(args.sdc_home, not args.sync_logging)
+        logging.info('Starting SecureDrop Client {}'.format(__version__))
+
+    with profile.phase('create application'):
+        app = QApplication(qt_args)
+        app.setApplicationName('SecureDrop Client')
+        app.setDesktopFileName('org.freedomofthepress.securedrop.client')
+        app.setApplicationVersion(__version__)
+        app.setAttribute(Qt.AA_UseHighDpiPixmaps)
+
+        prevent_second_instance(app, args.sdc_home)
+
+    with profile.phase('show login dialog'):
+        # The widgets add the font files of their own stylesheets as they are created
+        stylesheet = load_css('sdclient.css')
+        load_stylesheet_fonts([stylesheet])
+        app.setStyleSheet(stylesheet)
+
+        login_dialog = LoginDialog(None)
+        login_dialog.reset()
+        show_until_painted(login_dialog)
+    profile.painted()
+
+    # The user reads the login dialog while the rest of the client loads: the database, API and
+    # widget modules are not needed to show it.
+    with profile.phase('import'):
+        from securedrop_client.db import make_session_maker
+        from securedrop_client.gui.main import Window
+        from securedrop_client.logic import Controller
+
+    with profile.phase('create window'):
+        session_maker = make_session_maker(args.sdc_home)
+        gui = Window(login_dialog)
+        app.setWindowIcon(load_icon(gui.icon))
+
+    with profile.phase('create controller'):
+        controller = Controller("http://localhost:8081/", gui, session_maker,
+                                args.sdc_home, not args.no_proxy, not args.no_qubes)
+
+    profile.write(args.sdc_home)
 
-    controller = Controller("http://localhost:8081/", gui, session_maker,
-                            args.sdc_home, not args.no_proxy, not args.no_qubes)
     controller.setup()
 
     configure_signal_handlers(app)
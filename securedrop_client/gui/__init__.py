@@ -17,12 +17,12 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from typing import Union
+from typing import Optional, Union
 
 from PyQt5.QtWidgets import QLabel, QHBoxLayout, QPushButton, QWidget
 from PyQt5.QtCore import QSize, Qt
 
-from securedrop_client.resources import load_svg, load_icon
+from securedrop_client.resources import load_icon, load_svg_pixmap
 
 
 class SvgToggleButton(QPushButton):
@@ -136,7 +136,7 @@ class SvgLabel(QLabel):
         The display size of the SVG, defaults to filling the entire size of the widget.
     """
 
-    def __init__(self, filename: str, svg_size: str = None) -> None:
+    def __init__(self, filename: str, svg_size: Optional[QSize] = None) -> None:
         super().__init__()
 
         # Remove margins and spacing
@@ -145,8 +145,9 @@ class SvgLabel(QLabel):
         layout.setSpacing(0)
         self.setLayout(layout)
 
-        # Add SVG and set its size
-        self.svg = load_svg(filename)
+        # Add SVG, rendered once for all the labels showing it at this size, and set its size
+        self.svg = QLabel()
+        self.svg.setPixmap(load_svg_pixmap(filename, svg_size))
         self.svg.setFixedSize(svg_size) if svg_size else self.svg.setFixedSize(QSize())
         layout.addWidget(self.svg)
 
@@ -0,0 +1,400 @@
+"""
+Contains the login dialog, which is shown before the rest of the client's widgets are loaded.
+
+Copyright (C) 2018  The Freedom of the Press Foundation.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import html
+import sys
+
+from gettext import gettext as _
+from PyQt5.QtCore import Qt, pyqtSignal, QSize
+from PyQt5.QtGui import QPalette, QBrush, QColor
+from PyQt5.QtWidgets import QLabel, QWidget, QHBoxLayout, QPushButton, QVBoxLayout, QLineEdit, \
+    QDialog, QSizePolicy, QGraphicsDropShadowEffect, QDesktopWidget
+
+from securedrop_client.gui import SvgLabel
+from securedrop_client.resources import load_icon, load_image, set_stylesheet
+
+
+class LoginOfflineLink(QLabel):
+    """
+    A button that logs the user in in offline mode.
+    """
+
+    clicked = pyqtSignal()
+
+    CSS = '''
+    #offline_mode {
+        border: none;
+        color: #fff;
+        text-decoration: underline;
+    }
+    '''
+
+    def __init__(self):
+        # Add svg images to button
+        super().__init__()
+
+        # Set css id
+        self.setObjectName('offline_mode')
+
+        # Set styles
+        set_stylesheet(self, self.CSS)
+        self.setFixedSize(QSize(120, 22))
+
+        self.setText(_('USE OFFLINE'))
+
+    def mouseReleaseEvent(self, event):
+        self.clicked.emit()
+
+
+class SignInButton(QPushButton):
+    """
+    A button that logs the user into application when clicked.
+    """
+
+    CSS = '''
+    #login {
+        border: none;
+        background-color: #05edfe;
+        font-family: 'Montserrat';
+        font-weight: 600;
+        font-size: 14px;
+        color: #2a319d;
+    }
+    #login:pressed {
+        background-color: #85f6fe;
+    }
+    '''
+
+    def __init__(self):
+        super().__init__(_('SIGN IN'))
+
+        # Set css id
+        self.setObjectName('login')
+
+        # Set styles
+        set_stylesheet(self, self.CSS)
+        self.setFixedHeight(40)
+        self.setFixedWidth(140)
+
+        # Set drop shadow effect
+        effect = QGraphicsDropShadowEffect(self)
+        effect.setOffset(0, 1)
+        effect.setBlurRadius(8)
+        effect.setColor(QColor('#aa000000'))
+        self.setGraphicsEffect(effect)
+        self.update()
+
+
+class LoginErrorBar(QWidget):
+    """
+    A bar widget for displaying messages about login errors to the user.
+    """
+
+    CSS = '''
+    QWidget {
+        background-color: #ce0083;
+    }
+    #error_icon {
+        color: #fff;
+    }
+    #error_status_bar {
+        font-family: 'Montserrat';
+        font-weight: 500;
+        font-size: 12px;
+        color: #fff;
+    }
+    '''
+
+    def __init__(self):
+        super().__init__()
+
+        self.setObjectName('error_bar')
+
+        # Set styles
+        set_stylesheet(self, self.CSS)
+
+        # Set layout
+        layout = QHBoxLayout(self)
+        self.setLayout(layout)
+
+        # Remove margins and spacing
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+
+        # Set size policy
+        retain_space = self.sizePolicy()
+        retain_space.setRetainSizeWhenHidden(True)
+        self.setSizePolicy(retain_space)
+
+        # Error icon
+        self.error_icon = SvgLabel('error_icon_white.svg', svg_size=QSize(18, 18))
+        self.error_icon.setObjectName('error_icon')
+        self.error_icon.setFixedWidth(42)
+
+        # Error status bar
+        self.error_status_bar = QLabel()
+        self.error_status_bar.setObjectName('error_status_bar')
+        self.setFixedHeight(42)
+
+        # Create space ths size of the error icon to keep the error message centered
+        spacer1 = QWidget()
+        spacer2 = QWidget()
+
+        # Add widgets to layout
+        layout.addWidget(spacer1)
+        layout.addWidget(self.error_icon)
+        layout.addWidget(self.error_status_bar)
+        layout.addWidget(spacer2)
+
+    def set_message(self, message):
+        self.show()
+        self.error_status_bar.setText(message)
+
+    def clear_message(self):
+        self.error_status_bar.setText('')
+        self.hide()
+
+
+class PasswordEdit(QLineEdit):
+    """
+    A LineEdit with icons to show/hide password entries
+    """
+    CSS = '''QLineEdit {
+        border-radius: 0px;
+        height: 30px;
+        margin: 0px 0px 0px 0px;
+    }
+    '''
+
+    def __init__(self, parent):
+        self.parent = parent
+        super().__init__(self.parent)
+
+        # Set styles
+        set_stylesheet(self, self.CSS)
+
+        self.visibleIcon = load_icon("eye_visible.svg")
+        self.hiddenIcon = load_icon("eye_hidden.svg")
+
+        self.setEchoMode(QLineEdit.Password)
+        self.togglepasswordAction = self.addAction(self.hiddenIcon, QLineEdit.TrailingPosition)
+        self.togglepasswordAction.triggered.connect(self.on_toggle_password_Action)
+        self.password_shown = False
+
+    def on_toggle_password_Action(self):
+        if not self.password_shown:
+            self.setEchoMode(QLineEdit.Normal)
+            self.password_shown = True
+            self.togglepasswordAction.setIcon(self.visibleIcon)
+        else:
+            self.setEchoMode(QLineEdit.Password)
+            self.password_shown = False
+            self.togglepasswordAction.setIcon(self.hiddenIcon)
+
+
+class LoginDialog(QDialog):
+    """
+    A dialog to display the login form.
+    """
+
+    CSS = '''
+    #login_form QLabel {
+        color: #fff;
+        font-family: 'Montserrat';
+        font-weight: 500;
+        font-size: 13px;
+    }
+    #login_form QLineEdit {
+        border-radius: 0px;
+        height: 30px;
+        margin: 0px 0px 0px 0px;
+    }
+    '''
+
+    MIN_PASSWORD_LEN = 14  # Journalist.MIN_PASSWORD_LEN on server
+    MAX_PASSWORD_LEN = 128  # Journalist.MAX_PASSWORD_LEN on server
+    MIN_JOURNALIST_USERNAME = 3  # Journalist.MIN_USERNAME_LEN on server
+
+    def __init__(self, parent):
+        self.parent = parent
+        super().__init__(self.parent)
+
+        # Set css id
+        self.setObjectName('login_dialog')
+
+        # Set styles
+        set_stylesheet(self, self.CSS)
+
+        # Set layout
+        layout = QVBoxLayout(self)
+        self.setLayout(layout)
+
+        # Set margins and spacing
+        layout.setContentsMargins(0, 274, 0, 20)
+        layout.setSpacing(0)
+
+        # Set background
+        self.setAutoFillBackground(True)
+        palette = QPalette()
+        palette.setBrush(QPalette.Background, QBrush(load_image('login_bg.svg')))
+        self.setPalette(palette)
+        self.setFixedSize(QSize(596, 671))  # Set to size provided in the login_bg.svg file
+        self.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+
+        # Create error bar
+        self.error_bar = LoginErrorBar()
+
+        # Create form widget
+        form = QWidget()
+
+        form.setObjectName('login_form')
+
+        form_layout = QVBoxLayout()
+        form.setLayout(form_layout)
+
+        form_layout.setContentsMargins(80, 0, 80, 0)
+        form_layout.setSpacing(8)
+
+        self.username_label = QLabel(_('Username'))
+        self.username_field = QLineEdit()
+
+        self.password_label = QLabel(_('Passphrase'))
+        self.password_field = PasswordEdit(self)
+
+        self.tfa_label = QLabel(_('Two-Factor Code'))
+        self.tfa_field = QLineEdit()
+
+        buttons = QWidget()
+        buttons_layout = QHBoxLayout()
+        buttons.setLayout(buttons_layout)
+        buttons_layout.setContentsMargins(0, 20, 0, 0)
+        self.submit = SignInButton()
+        self.submit.clicked.connect(self.validate)
+        self.offline_mode = LoginOfflineLink()
+        buttons_layout.addWidget(self.offline_mode)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.submit)
+
+        form_layout.addWidget(self.username_label)
+        form_layout.addWidget(self.username_field)
+        form_layout.addWidget(QWidget(self))
+        form_layout.addWidget(self.password_label)
+        form_layout.addWidget(self.password_field)
+        form_layout.addWidget(QWidget(self))
+        form_layout.addWidget(self.tfa_label)
+        form_layout.addWidget(self.tfa_field)
+        form_layout.addWidget(buttons)
+
+        # Create widget to display application name and version
+        application_version = QWidget()
+        application_version_layout = QHBoxLayout()
+        application_version.setLayout(application_version_layout)
+
+        # Add widgets
+        layout.addWidget(self.error_bar)
+        layout.addStretch()
+        layout.addWidget(form)
+        layout.addStretch()
+        layout.addWidget(application_version)
+
+        # Always display the login dialog centered in the screen.
+        screen_size = QDesktopWidget().screenGeometry()
+        self.move((screen_size.width() - self.width()) // 2,
+                  (screen_size.height() - self.height()) // 2)
+
+    def closeEvent(self, event):
+        """
+        Only exit the application when the main window is not visible, or when there is no main
+        window yet because the dialog was shown while the client started.
+        """
+        if not self.parent or not self.parent.isVisible():
+            sys.exit(0)
+
+    def keyPressEvent(self, event):
+        """
+        Cutomize keyboard behavior in the login dialog.
+
+        - [Esc] should not close the dialog
+        - [Enter] or [Return] should attempt to submit the form
+        """
+        if event.key() == Qt.Key_Escape:
+            event.ignore()
+
+        if event.key() == Qt.Key_Enter or event.key() == Qt.Key_Return:
+            self.validate()
+
+    def setup(self, controller):
+        self.controller = controller
+        self.offline_mode.clicked.connect(self.controller.login_offline_mode)
+
+    def reset(self):
+        """
+        Resets the login form to the default state.
+        """
+        self.username_field.setText('')
+        self.username_field.setFocus()
+        self.password_field.setText('')
+        self.tfa_field.setText('')
+        self.setDisabled(False)
+        self.error_bar.clear_message()
+
+    def error(self, message):
+        """
+        Ensures the passed in message is displayed as an error message.
+        """
+        self.setDisabled(False)
+        self.error_bar.set_message(html.escape(message))
+
+    def validate(self):
+        """
+        Validate the user input -- we expect values for:
+
+        * username (free text)
+        * password (free text)
+        * TFA token (numerals)
+        """
+        self.setDisabled(True)
+        username = self.username_field.text()
+        password = self.password_field.text()
+        tfa_token = self.tfa_field.text().replace(' ', '')
+        if username and password and tfa_token:
+            # Validate username
+            if len(username) < self.MIN_JOURNALIST_USERNAME:
+                self.setDisabled(False)
+                self.error(_('Your username should be at least 3 characters. '))
+                return
+
+            # Validate password
+            if len(password) < self.MIN_PASSWORD_LEN or len(password) > self.MAX_PASSWORD_LEN:
+                self.setDisabled(False)
+                self.error(_('Your password should be between 14 and 128 characters. '))
+                return
+
+            # Validate 2FA token
+            try:
+                int(tfa_token)
+            except ValueError:
+                self.setDisabled(False)
+                self.error(_('Please use only numerals for the two-factor code.'))
+                return
+
+            self.controller.login(username, password, tfa_token)
+        else:
+            self.setDisabled(False)
+            self.error(_('Please enter a username, password and '
+                         'two-factor code.'))
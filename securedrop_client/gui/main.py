@@ -22,18 +22,55 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import logging
 
 from gettext import gettext as _
-from typing import Dict, List, Optional  # noqa: F401
+from typing import Callable, Dict, List, Optional  # noqa: F401
+from PyQt5.QtCore import QEvent, QObject, QTimer
 from PyQt5.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QDesktopWidget
 
 from securedrop_client import __version__
 from securedrop_client.db import Source, User
 from securedrop_client.logic import Controller  # noqa: F401
-from securedrop_client.gui.widgets import TopPane, LeftPane, MainView, LoginDialog
+from securedrop_client.gui.login import LoginDialog
+from securedrop_client.gui.widgets import TopPane, LeftPane, MainView
 from securedrop_client.resources import load_icon
 
 logger = logging.getLogger(__name__)
 
 
+class PaintListener(QObject):
+    """
+    Calls a function once, after a widget has next been painted, or after the timeout, in
+    milliseconds, in case the widget is not painted, e.g. because the window is hidden.
+    """
+
+    def __init__(self, widget: QWidget, callback: Callable[[], None], timeout: int) -> None:
+        super().__init__(widget)
+        self.widget = widget
+        self.callback = callback  # type: Optional[Callable[[], None]]
+        self.widget.installEventFilter(self)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.call)
+        self.timer.start(timeout)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            # Call once the paint event is handled and the window updated with what was painted
+            QTimer.singleShot(0, self.call)
+        return False
+
+    def call(self) -> None:
+        if self.callback is None:
+            return
+
+        callback = self.callback
+        self.callback = None
+        self.timer.stop()
+        self.widget.removeEventFilter(self)
+        self.deleteLater()
+        callback()
+
+
 class Window(QMainWindow):
     """
     Represents the application's main window that will contain the UI widgets.
@@ -42,7 +79,7 @@ class Window(QMainWindow):
 
     icon = 'icon.png'
 
-    def __init__(self) -> None:
+    def __init__(self, login_dialog: Optional[LoginDialog] = None) -> None:
         """
         Create the default start state. The window contains a root widget into
         which is placed:
@@ -51,9 +88,14 @@ class Window(QMainWindow):
           information.
         * A main-view widget, itself containing a list view for sources and a
           place for details / message contents / forms.
+
+        The login dialog, if given, is the one shown while the client started,
+        which the window uses the first time it shows the login form.
         """
         super().__init__()
 
+        self.login_dialog = login_dialog
+
         self.setWindowTitle(_("SecureDrop Client {}").format(__version__))
         self.setWindowIcon(load_icon(self.icon))
 
@@ -112,19 +154,14 @@ class Window(QMainWindow):
 
     def show_login(self):
         """
-        Show the login form.
+        Show the login form, in the login dialog shown while the client started if it is still
+        open.
         """
-        self.login_dialog = LoginDialog(self)
-
-        # Always display the login dialog centered in the screen.
-        screen_size = QDesktopWidget().screenGeometry()
-        login_dialog_size = self.login_dialog.geometry()
-        x_center = (screen_size.width() - login_dialog_size.width()) / 2
-        y_center = (screen_size.height() - login_dialog_size.height()) / 2
-        self.login_dialog.move(x_center, y_center)
+        if not self.login_dialog:
+            self.login_dialog = LoginDialog(self)
+            self.login_dialog.reset()
 
         self.login_dialog.setup(self.controller)
-        self.login_dialog.reset()
         self.login_dialog.exec()
 
     def show_login_error(self, error):
@@ -148,6 +185,14 @@ class Window(QMainWindow):
         """
         self.main_view.show_sources(sources)
 
+    def call_after_sources_painted(self, callback, timeout=1000):
+        """
+        Call the function once the source list has next been painted, so that work which blocks
+        the event loop waits until what the source list shows appears, or after the timeout, in
+        milliseconds, if it is not painted by then.
+        """
+        PaintListener(self.main_view.source_list.viewport(), callback, timeout)
+
     def show_sync(self, updated_on):
         """
         Display a message indicating the data-sync state.
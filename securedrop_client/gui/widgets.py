@@ -19,24 +19,27 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import logging
 import arrow
 import html
-import sys
 
+from collections import OrderedDict
 from gettext import gettext as _
-from typing import Dict, List, Union  # noqa: F401
+from typing import Dict, List, Optional, Union  # noqa: F401
 from uuid import uuid4
-from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal, QEvent, QTimer, QSize, pyqtBoundSignal, \
-    QObject, QPoint
+from PyQt5 import sip
+from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal, QEvent, QTimer, QSize, \
+    QObject, QPoint, QModelIndex
 from PyQt5.QtGui import QIcon, QPalette, QBrush, QColor, QFont, QLinearGradient, QKeySequence
 from PyQt5.QtWidgets import QListWidget, QLabel, QWidget, QListWidgetItem, QHBoxLayout, \
     QPushButton, QVBoxLayout, QLineEdit, QScrollArea, QDialog, QAction, QMenu, QMessageBox, \
     QToolButton, QSizePolicy, QPlainTextEdit, QStatusBar, QGraphicsDropShadowEffect
 
 from securedrop_client.db import DraftReply, Source, Message, File, Reply, User
-from securedrop_client.storage import source_exists
+from securedrop_client.storage import get_conversation_file_counter_range, \
+    get_conversation_items, get_latest_conversation_item, refresh_files, source_exists, \
+    SourceSnapshot
 from securedrop_client.export import ExportStatus, ExportError
 from securedrop_client.gui import SecureQLabel, SvgLabel, SvgPushButton, SvgToggleButton
-from securedrop_client.logic import Controller
-from securedrop_client.resources import load_icon, load_image
+from securedrop_client.logic import Controller, SignalDispatcher
+from securedrop_client.resources import load_icon, load_image, set_stylesheet
 from securedrop_client.utils import humanize_filesize
 
 logger = logging.getLogger(__name__)
@@ -219,7 +222,7 @@ class RefreshButton(SvgPushButton):
         self.setObjectName('refresh_button')
 
         # Set styles
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
         self.setFixedSize(QSize(20, 20))
 
         # Click event handler
@@ -284,7 +287,7 @@ class ActivityStatusBar(QStatusBar):
         self.setObjectName('activity_status_bar')
 
         # Set styles
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
 
         # Remove grip image at bottom right-hand corner
         self.setSizeGripEnabled(False)
@@ -347,7 +350,7 @@ class ErrorStatusBar(QWidget):
         super().__init__()
 
         # Set styles
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
 
         # Set layout
         layout = QHBoxLayout(self)
@@ -470,7 +473,7 @@ class UserProfile(QLabel):
         self.setObjectName('user_profile')
 
         # Set styles
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
 
         # Set background
         palette = QPalette()
@@ -561,7 +564,7 @@ class UserButton(SvgPushButton):
         self.setObjectName('user_button')
 
         # Set styles
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
         self.setFixedHeight(30)
 
         self.setLayoutDirection(Qt.RightToLeft)
@@ -628,7 +631,7 @@ class LoginButton(QPushButton):
         self.setObjectName('login')
 
         # Set styles
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
         self.setFixedHeight(40)
 
         # Set drop shadow effect
@@ -679,12 +682,18 @@ class MainView(QWidget):
     }
     '''
 
+    # Maximum number of conversations kept after their source is unselected
+    CONVERSATION_CACHE_SIZE = 10
+
+    # Maximum number of messages, replies and files shown by the kept conversations in total
+    CONVERSATION_CACHE_ITEMS = 1000
+
     def __init__(self, parent: QObject):
         super().__init__(parent)
 
         # Set id and styles
         self.setObjectName('main_view')
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
 
         # Set layout
         self.layout = QHBoxLayout(self)
@@ -712,9 +721,14 @@ class MainView(QWidget):
         self.layout.addWidget(self.source_list)
         self.layout.addWidget(self.view_holder)
 
-        # Note: We should not delete SourceConversationWrapper when its source is unselected. This
-        # is a temporary solution to keep copies of our objects since we do delete them.
-        self.source_conversations = {}  # type: Dict[Source, SourceConversationWrapper]
+        # Conversations of the most recently selected sources, least recently selected first, so
+        # that switching back to a source does not rebuild its conversation. See
+        # evict_conversations for how many are kept.
+        self.source_conversations = \
+            OrderedDict()  # type: OrderedDict[Source, SourceConversationWrapper]
+
+        # Text typed in the reply box of a source whose conversation was evicted, by source UUID
+        self.reply_drafts = {}  # type: Dict[str, str]
 
     def setup(self, controller):
         """
@@ -737,6 +751,11 @@ class MainView(QWidget):
 
         self.source_list.update(sources)
 
+        # The selected source is still selected, so show its conversation, which may have new
+        # messages, replies or files.
+        if self.source_list.get_current_source():
+            self.on_source_changed()
+
     def on_source_changed(self):
         """
         Show conversation for the currently-selected source if it hasn't been deleted. If the
@@ -750,17 +769,53 @@ class MainView(QWidget):
             # else we create it.
             try:
                 conversation_wrapper = self.source_conversations[source]
+                self.source_conversations.move_to_end(source)
 
                 # Redraw the conversation view such that new messages, replies, files appear.
-                conversation_wrapper.conversation_view.update_conversation(source.collection)
+                conversation_wrapper.conversation_view.update_conversation()
             except KeyError:
                 conversation_wrapper = SourceConversationWrapper(source, self.controller)
                 self.source_conversations[source] = conversation_wrapper
 
+                draft = self.reply_drafts.pop(source.uuid, '')
+                if draft:
+                    conversation_wrapper.reply_box.text_edit.setText(draft)
+
             self.set_conversation(conversation_wrapper)
+            self.evict_conversations()
         else:
             self.clear_conversation()
 
+    def evict_conversations(self):
+        """
+        Delete the conversations of the least recently selected sources while more than
+        CONVERSATION_CACHE_SIZE conversations are kept, or while they show more than
+        CONVERSATION_CACHE_ITEMS messages, replies and files in total, which is what most of their
+        memory goes to. The conversation of the selected source is always kept.
+        """
+        while len(self.source_conversations) > 1 and (
+                len(self.source_conversations) > self.CONVERSATION_CACHE_SIZE or
+                self.count_conversation_items() > self.CONVERSATION_CACHE_ITEMS):
+            source, conversation_wrapper = self.source_conversations.popitem(last=False)
+            self.delete_conversation(source, conversation_wrapper)
+
+    def count_conversation_items(self) -> int:
+        return sum(len(conversation_wrapper.conversation_view.current_conversation)
+                   for conversation_wrapper in self.source_conversations.values())
+
+    def delete_conversation(self, source: Source, conversation_wrapper: QWidget) -> None:
+        """
+        Delete the conversation widget, keeping the text typed in its reply box so that it is
+        restored the next time the source is selected.
+        """
+        draft = conversation_wrapper.reply_box.text_edit.toPlainText()
+        if draft:
+            self.reply_drafts[source.uuid] = draft
+        else:
+            self.reply_drafts.pop(source.uuid, None)
+
+        conversation_wrapper.deleteLater()
+
     def set_conversation(self, widget):
         """
         Update the view holder to contain the referenced widget.
@@ -778,6 +833,11 @@ class MainView(QWidget):
         while self.view_layout.count():
             child = self.view_layout.takeAt(0)
             if child.widget():
+                # Do not keep a conversation that is deleted here, typically because its source
+                # was deleted.
+                for source, conversation_wrapper in list(self.source_conversations.items()):
+                    if conversation_wrapper is child.widget():
+                        del self.source_conversations[source]
                 child.widget().deleteLater()
 
 
@@ -798,7 +858,7 @@ class EmptyConversationView(QWidget):
 
         # Set id and styles
         self.setObjectName('view')
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
 
         # Set layout
         layout = QHBoxLayout(self)
@@ -857,7 +917,7 @@ class SourceList(QListWidget):
 
         # Set id and styles
         self.setObjectName('sourcelist')
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
         self.setFixedWidth(445)
         self.setUniformItemSizes(True)
 
@@ -865,35 +925,81 @@ class SourceList(QListWidget):
         layout = QVBoxLayout(self)
         self.setLayout(layout)
 
+        # The row of each source in the list, keyed by source UUID
+        self.source_items = {}  # type: Dict[str, QListWidgetItem]
+
     def setup(self, controller):
         self.controller = controller
 
     def update(self, sources: List[Source]):
         """
-        Reset and update the list with the passed in list of sources.
+        Update the list to show the passed in list of sources, in the same order.
+
+        Rows are keyed by source UUID: the rows of sources that are gone are removed, the rows of
+        sources that are still there are updated in place and moved if their position changed, and
+        rows are only created for new sources. The selected source stays selected if it is still
+        in the list.
+        """
+        source_uuids = {source.uuid for source in sources}
+        for source_uuid in list(self.source_items):
+            if source_uuid not in source_uuids:
+                removed_item = self.source_items.pop(source_uuid)
+                if removed_item is self.currentItem():
+                    # Deselect rather than let the current row move to a neighbouring source.
+                    self.setCurrentItem(None)
+                self.takeItem(self.row(removed_item))
+
+        for row, source in enumerate(sources):
+            list_item = self.source_items.get(source.uuid)
+            if list_item is None:
+                self.insert_source(row, source)
+            else:
+                self.update_source(list_item, row, source)
+
+    def clear(self):
+        """
+        Remove all the rows from the list.
         """
-        current_source = self.get_current_source()
-        current_source_id = current_source and current_source.id
+        super().clear()
+        self.source_items = {}
 
-        self.clear()
+    def insert_source(self, row: int, source: Source):
+        """
+        Insert a row for the source at the given row number.
+        """
+        new_source = SourceWidget(source)
+        new_source.setup(self.controller)
 
-        for source in sources:
-            new_source = SourceWidget(source)
-            new_source.setup(self.controller)
+        list_item = QListWidgetItem()
+        list_item.setSizeHint(new_source.sizeHint())
 
-            list_item = QListWidgetItem(self)
-            list_item.setSizeHint(new_source.sizeHint())
+        self.insertItem(row, list_item)
+        self.setItemWidget(list_item, new_source)
+        self.source_items[source.uuid] = list_item
 
-            self.addItem(list_item)
-            self.setItemWidget(list_item, new_source)
+    def update_source(self, list_item, row, source):
+        """
+        Move the row of the source to the given row number, if it is elsewhere, and update its
+        widget in place.
+        """
+        current_row = self.row(list_item)
+        if current_row != row:
+            # Moving the row keeps its widget, unlike taking and inserting the item again.
+            self.model().moveRow(QModelIndex(), current_row, QModelIndex(), row)
 
-            if source.id == current_source_id:
-                self.setCurrentItem(list_item)
+        source_widget = self.itemWidget(list_item)
+        source_widget.source = source
+        source_widget.update()
 
     def get_current_source(self):
+        """
+        Return the selected source, unless its row still shows the source from the source list
+        snapshot, which has no conversation to show until the row is updated from the database.
+        """
         source_item = self.currentItem()
         source_widget = self.itemWidget(source_item)
-        if source_widget and source_exists(self.controller.session, source_widget.source.uuid):
+        if source_widget and not isinstance(source_widget.source, SourceSnapshot) and \
+                source_exists(self.controller.session, source_widget.source.uuid):
             return source_widget.source
 
 
@@ -923,37 +1029,6 @@ class SourceWidget(QWidget):
     -----------------------------------------------------------------------------
     """
 
-    CSS = '''
-    QWidget#source_widget {
-        border-bottom: 1px solid #9b9b9b;
-    }
-    QWidget#gutter {
-        min-width: 40px;
-        max-width: 40px;
-    }
-    QWidget#metadata {
-        max-width: 60px;
-    }
-    QLabel#preview {
-        font-family: 'Source Sans Pro';
-        font-weight: 400;
-        font-size: 13px;
-        color: #383838;
-    }
-    QLabel#source_name {
-        font-family: 'Montserrat';
-        font-weight: 500;
-        font-size: 13px;
-        color: #383838;
-    }
-    QLabel#timestamp {
-        font-family: 'Montserrat';
-        font-weight: 500;
-        font-size: 13px;
-        color: #383838;
-    }
-    '''
-
     SIDE_MARGIN = 10
     SOURCE_WIDGET_VERTICAL_MARGIN = 10
     PREVIEW_WIDTH = 312
@@ -965,9 +1040,6 @@ class SourceWidget(QWidget):
         # Store source
         self.source = source
 
-        # Set styles
-        self.setStyleSheet(self.CSS)
-
         # Set layout
         layout = QHBoxLayout(self)
         self.setLayout(layout)
@@ -1030,6 +1102,15 @@ class SourceWidget(QWidget):
         # Add widgets to main layout
         layout.addWidget(self.source_widget)
 
+        # Values the timestamp and preview were last set from, and whether the newest item of the
+        # conversation can still change without the source changing
+        self.last_updated = None
+        self.latest_msg = None
+        self.preview_source_state = None  # type: Optional[tuple]
+        self.preview_is_final = False
+
+        self.controller = None  # type: Optional[Controller]
+
         self.update()
 
     def setup(self, controller):
@@ -1038,20 +1119,60 @@ class SourceWidget(QWidget):
         """
         self.controller = controller
         self.star.setup(self.controller)
+        self.update_preview()
 
     def update(self):
         """
-        Updates the displayed values with the current values from self.source.
+        Updates the displayed values with the current values from self.source, which is a Source or
+        a SourceSnapshot.
+
+        The formatted timestamp and the preview are cached along with the values they were made
+        from, so that updating a row whose source has not changed does not format them again.
         """
-        self.timestamp.setText(arrow.get(self.source.last_updated).format('DD MMM'))
+        if self.source.last_updated != self.last_updated:
+            self.last_updated = self.source.last_updated
+            self.timestamp.setText(arrow.get(self.last_updated).format('DD MMM'))
         self.name.setText(self.source.journalist_designation)
-        if self.source.collection:
-            msg = str(self.source.collection[-1])
+        self.update_preview()
+        self.paperclip.setHidden(self.source.document_count == 0)
+        self.star.update_state(self.source)
+
+    def update_preview(self):
+        """
+        Show the newest item of the conversation as the preview. Only that item is loaded from the
+        database, rather than the whole collection of the source.
+
+        A new item changes the source's last update and interaction count, so the newest item is
+        only looked up again when they changed, or while it is a message or reply that is not yet
+        decrypted or a file that is not yet downloaded.
+
+        A source from the source list snapshot has no conversation loaded, so its preview is left
+        as it is until the row is updated from the database.
+        """
+        if self.controller is None or isinstance(self.source, SourceSnapshot):
+            return
+
+        source_state = (self.source.last_updated, self.source.interaction_count)
+        if source_state == self.preview_source_state and self.preview_is_final:
+            return
+        self.preview_source_state = source_state
+
+        latest_item = get_latest_conversation_item(self.controller.session, self.source)
+        if latest_item is None:
+            self.preview_is_final = True
+            return
+
+        if isinstance(latest_item, File):
+            self.preview_is_final = bool(latest_item.is_downloaded)
+        else:
+            self.preview_is_final = latest_item.content is not None
+
+        msg = str(latest_item)
+        if msg != self.latest_msg:
+            self.latest_msg = msg
             if len(msg) > 120:
                 msg = msg[:120] + "..."
             self.preview.setText(msg)
-        if self.source.document_count == 0:
-            self.paperclip.hide()
 
     def delete_source(self, event):
         if self.controller.api is None:
@@ -1067,12 +1188,6 @@ class StarToggleButton(SvgToggleButton):
     A button that shows whether or not a source is starred
     """
 
-    css = '''
-    #star_button {
-        border: none;
-    }
-    '''
-
     def __init__(self, source: Source):
         super().__init__(
             on='star_on.svg',
@@ -1084,7 +1199,6 @@ class StarToggleButton(SvgToggleButton):
             self.setChecked(True)
 
         self.setObjectName('star_button')
-        self.setStyleSheet(self.css)
         self.setFixedSize(QSize(20, 20))
 
     def setup(self, controller):
@@ -1092,6 +1206,16 @@ class StarToggleButton(SvgToggleButton):
         self.controller.authentication_state.connect(self.on_authentication_changed)
         self.on_authentication_changed(self.controller.is_authenticated)
 
+    def update_state(self, source: Source):
+        """
+        Show whether or not the source is starred, without telling the controller to update it.
+        """
+        self.source = source
+        if self.isCheckable() and self.isChecked() != bool(source.is_starred):
+            self.blockSignals(True)
+            self.setChecked(bool(source.is_starred))
+            self.blockSignals(False)
+
     def on_authentication_changed(self, authenticated: bool):
         """
         Set up handlers based on whether or not the user is authenticated. Connect to 'pressed'
@@ -1168,413 +1292,21 @@ class DeleteSourceMessageBox:
         return message
 
 
-class LoginOfflineLink(QLabel):
-    """
-    A button that logs the user in in offline mode.
-    """
-
-    clicked = pyqtSignal()
-
-    CSS = '''
-    #offline_mode {
-        border: none;
-        color: #fff;
-        text-decoration: underline;
-    }
-    '''
-
-    def __init__(self):
-        # Add svg images to button
-        super().__init__()
-
-        # Set css id
-        self.setObjectName('offline_mode')
-
-        # Set styles
-        self.setStyleSheet(self.CSS)
-        self.setFixedSize(QSize(120, 22))
-
-        self.setText(_('USE OFFLINE'))
-
-    def mouseReleaseEvent(self, event):
-        self.clicked.emit()
-
-
-class SignInButton(QPushButton):
-    """
-    A button that logs the user into application when clicked.
-    """
-
-    CSS = '''
-    #login {
-        border: none;
-        background-color: #05edfe;
-        font-family: 'Montserrat';
-        font-weight: 600;
-        font-size: 14px;
-        color: #2a319d;
-    }
-    #login:pressed {
-        background-color: #85f6fe;
-    }
-    '''
-
-    def __init__(self):
-        super().__init__(_('SIGN IN'))
-
-        # Set css id
-        self.setObjectName('login')
-
-        # Set styles
-        self.setStyleSheet(self.CSS)
-        self.setFixedHeight(40)
-        self.setFixedWidth(140)
-
-        # Set drop shadow effect
-        effect = QGraphicsDropShadowEffect(self)
-        effect.setOffset(0, 1)
-        effect.setBlurRadius(8)
-        effect.setColor(QColor('#aa000000'))
-        self.setGraphicsEffect(effect)
-        self.update()
-
-
-class LoginErrorBar(QWidget):
-    """
-    A bar widget for displaying messages about login errors to the user.
-    """
-
-    CSS = '''
-    QWidget {
-        background-color: #ce0083;
-    }
-    #error_icon {
-        color: #fff;
-    }
-    #error_status_bar {
-        font-family: 'Montserrat';
-        font-weight: 500;
-        font-size: 12px;
-        color: #fff;
-    }
-    '''
-
-    def __init__(self):
-        super().__init__()
-
-        self.setObjectName('error_bar')
-
-        # Set styles
-        self.setStyleSheet(self.CSS)
-
-        # Set layout
-        layout = QHBoxLayout(self)
-        self.setLayout(layout)
-
-        # Remove margins and spacing
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.setSpacing(0)
-
-        # Set size policy
-        retain_space = self.sizePolicy()
-        retain_space.setRetainSizeWhenHidden(True)
-        self.setSizePolicy(retain_space)
-
-        # Error icon
-        self.error_icon = SvgLabel('error_icon_white.svg', svg_size=QSize(18, 18))
-        self.error_icon.setObjectName('error_icon')
-        self.error_icon.setFixedWidth(42)
-
-        # Error status bar
-        self.error_status_bar = QLabel()
-        self.error_status_bar.setObjectName('error_status_bar')
-        self.setFixedHeight(42)
-
-        # Create space ths size of the error icon to keep the error message centered
-        spacer1 = QWidget()
-        spacer2 = QWidget()
-
-        # Add widgets to layout
-        layout.addWidget(spacer1)
-        layout.addWidget(self.error_icon)
-        layout.addWidget(self.error_status_bar)
-        layout.addWidget(spacer2)
-
-    def set_message(self, message):
-        self.show()
-        self.error_status_bar.setText(message)
-
-    def clear_message(self):
-        self.error_status_bar.setText('')
-        self.hide()
-
-
-class PasswordEdit(QLineEdit):
-    """
-    A LineEdit with icons to show/hide password entries
-    """
-    CSS = '''QLineEdit {
-        border-radius: 0px;
-        height: 30px;
-        margin: 0px 0px 0px 0px;
-    }
-    '''
-
-    def __init__(self, parent):
-        self.parent = parent
-        super().__init__(self.parent)
-
-        # Set styles
-        self.setStyleSheet(self.CSS)
-
-        self.visibleIcon = load_icon("eye_visible.svg")
-        self.hiddenIcon = load_icon("eye_hidden.svg")
-
-        self.setEchoMode(QLineEdit.Password)
-        self.togglepasswordAction = self.addAction(self.hiddenIcon, QLineEdit.TrailingPosition)
-        self.togglepasswordAction.triggered.connect(self.on_toggle_password_Action)
-        self.password_shown = False
-
-    def on_toggle_password_Action(self):
-        if not self.password_shown:
-            self.setEchoMode(QLineEdit.Normal)
-            self.password_shown = True
-            self.togglepasswordAction.setIcon(self.visibleIcon)
-        else:
-            self.setEchoMode(QLineEdit.Password)
-            self.password_shown = False
-            self.togglepasswordAction.setIcon(self.hiddenIcon)
-
-
-class LoginDialog(QDialog):
-    """
-    A dialog to display the login form.
-    """
-
-    CSS = '''
-    #login_form QLabel {
-        color: #fff;
-        font-family: 'Montserrat';
-        font-weight: 500;
-        font-size: 13px;
-    }
-    #login_form QLineEdit {
-        border-radius: 0px;
-        height: 30px;
-        margin: 0px 0px 0px 0px;
-    }
-    '''
-
-    MIN_PASSWORD_LEN = 14  # Journalist.MIN_PASSWORD_LEN on server
-    MAX_PASSWORD_LEN = 128  # Journalist.MAX_PASSWORD_LEN on server
-    MIN_JOURNALIST_USERNAME = 3  # Journalist.MIN_USERNAME_LEN on server
-
-    def __init__(self, parent):
-        self.parent = parent
-        super().__init__(self.parent)
-
-        # Set css id
-        self.setObjectName('login_dialog')
-
-        # Set styles
-        self.setStyleSheet(self.CSS)
-
-        # Set layout
-        layout = QVBoxLayout(self)
-        self.setLayout(layout)
-
-        # Set margins and spacing
-        layout.setContentsMargins(0, 274, 0, 20)
-        layout.setSpacing(0)
-
-        # Set background
-        self.setAutoFillBackground(True)
-        palette = QPalette()
-        palette.setBrush(QPalette.Background, QBrush(load_image('login_bg.svg')))
-        self.setPalette(palette)
-        self.setFixedSize(QSize(596, 671))  # Set to size provided in the login_bg.svg file
-        self.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
-
-        # Create error bar
-        self.error_bar = LoginErrorBar()
-
-        # Create form widget
-        form = QWidget()
-
-        form.setObjectName('login_form')
-
-        form_layout = QVBoxLayout()
-        form.setLayout(form_layout)
-
-        form_layout.setContentsMargins(80, 0, 80, 0)
-        form_layout.setSpacing(8)
-
-        self.username_label = QLabel(_('Username'))
-        self.username_field = QLineEdit()
-
-        self.password_label = QLabel(_('Passphrase'))
-        self.password_field = PasswordEdit(self)
-
-        self.tfa_label = QLabel(_('Two-Factor Code'))
-        self.tfa_field = QLineEdit()
-
-        buttons = QWidget()
-        buttons_layout = QHBoxLayout()
-        buttons.setLayout(buttons_layout)
-        buttons_layout.setContentsMargins(0, 20, 0, 0)
-        self.submit = SignInButton()
-        self.submit.clicked.connect(self.validate)
-        self.offline_mode = LoginOfflineLink()
-        buttons_layout.addWidget(self.offline_mode)
-        buttons_layout.addStretch()
-        buttons_layout.addWidget(self.submit)
-
-        form_layout.addWidget(self.username_label)
-        form_layout.addWidget(self.username_field)
-        form_layout.addWidget(QWidget(self))
-        form_layout.addWidget(self.password_label)
-        form_layout.addWidget(self.password_field)
-        form_layout.addWidget(QWidget(self))
-        form_layout.addWidget(self.tfa_label)
-        form_layout.addWidget(self.tfa_field)
-        form_layout.addWidget(buttons)
-
-        # Create widget to display application name and version
-        application_version = QWidget()
-        application_version_layout = QHBoxLayout()
-        application_version.setLayout(application_version_layout)
-
-        # Add widgets
-        layout.addWidget(self.error_bar)
-        layout.addStretch()
-        layout.addWidget(form)
-        layout.addStretch()
-        layout.addWidget(application_version)
-
-    def closeEvent(self, event):
-        """
-        Only exit the application when the main window is not visible.
-        """
-        if not self.parent.isVisible():
-            sys.exit(0)
-
-    def keyPressEvent(self, event):
-        """
-        Cutomize keyboard behavior in the login dialog.
-
-        - [Esc] should not close the dialog
-        - [Enter] or [Return] should attempt to submit the form
-        """
-        if event.key() == Qt.Key_Escape:
-            event.ignore()
-
-        if event.key() == Qt.Key_Enter or event.key() == Qt.Key_Return:
-            self.validate()
-
-    def setup(self, controller):
-        self.controller = controller
-        self.offline_mode.clicked.connect(self.controller.login_offline_mode)
-
-    def reset(self):
-        """
-        Resets the login form to the default state.
-        """
-        self.username_field.setText('')
-        self.username_field.setFocus()
-        self.password_field.setText('')
-        self.tfa_field.setText('')
-        self.setDisabled(False)
-        self.error_bar.clear_message()
-
-    def error(self, message):
-        """
-        Ensures the passed in message is displayed as an error message.
-        """
-        self.setDisabled(False)
-        self.error_bar.set_message(html.escape(message))
-
-    def validate(self):
-        """
-        Validate the user input -- we expect values for:
-
-        * username (free text)
-        * password (free text)
-        * TFA token (numerals)
-        """
-        self.setDisabled(True)
-        username = self.username_field.text()
-        password = self.password_field.text()
-        tfa_token = self.tfa_field.text().replace(' ', '')
-        if username and password and tfa_token:
-            # Validate username
-            if len(username) < self.MIN_JOURNALIST_USERNAME:
-                self.setDisabled(False)
-                self.error(_('Your username should be at least 3 characters. '))
-                return
-
-            # Validate password
-            if len(password) < self.MIN_PASSWORD_LEN or len(password) > self.MAX_PASSWORD_LEN:
-                self.setDisabled(False)
-                self.error(_('Your password should be between 14 and 128 characters. '))
-                return
-
-            # Validate 2FA token
-            try:
-                int(tfa_token)
-            except ValueError:
-                self.setDisabled(False)
-                self.error(_('Please use only numerals for the two-factor code.'))
-                return
-
-            self.controller.login(username, password, tfa_token)
-        else:
-            self.setDisabled(False)
-            self.error(_('Please enter a username, password and '
-                         'two-factor code.'))
-
-
 class SpeechBubble(QWidget):
     """
     Represents a speech bubble that's part of a conversation between a source
     and journalist.
     """
 
-    CSS = '''
-    #speech_bubble {
-        min-width: 540px;
-        max-width: 540px;
-        background-color: #fff;
-        padding: 16px;
-    }
-    #message {
-        min-width: 540px;
-        max-width: 540px;
-        font-family: 'Source Sans Pro';
-        font-weight: 400;
-        font-size: 15px;
-        background-color: #fff;
-        padding: 16px;
-    }
-    #color_bar {
-        min-height: 5px;
-        max-height: 5px;
-        background-color: #102781;
-        border: 0px;
-        min-width: 590px;
-        max-width: 590px;
-    }
-    '''
-
     TOP_MARGIN = 28
     BOTTOM_MARGIN = 10
 
-    def __init__(self, message_id: str, text: str, update_signal) -> None:
+    def __init__(self, message_id: str, text: str, update_dispatcher: SignalDispatcher) -> None:
         super().__init__()
         self.message_id = message_id
 
         # Set styles
         self.setObjectName('speech_bubble')
-        self.setStyleSheet(self.CSS)
         self.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
 
         # Set layout
@@ -1614,7 +1346,7 @@ class SpeechBubble(QWidget):
         layout.addWidget(bubble_area)
 
         # Connect signals to slots
-        update_signal.connect(self._update_text)
+        update_dispatcher.register(message_id, self._update_text)
 
     @pyqtSlot(str, str)
     def _update_text(self, message_id: str, text: str) -> None:
@@ -1631,8 +1363,8 @@ class MessageWidget(SpeechBubble):
     Represents an incoming message from the source.
     """
 
-    def __init__(self, message_id: str, message: str, update_signal) -> None:
-        super().__init__(message_id, message, update_signal)
+    def __init__(self, message_id: str, message: str, update_dispatcher: SignalDispatcher) -> None:
+        super().__init__(message_id, message, update_dispatcher)
 
 
 class ReplyWidget(SpeechBubble):
@@ -1640,81 +1372,19 @@ class ReplyWidget(SpeechBubble):
     Represents a reply to a source.
     """
 
-    CSS_REPLY_FAILED = '''
-    #message {
-        min-width: 540px;
-        max-width: 540px;
-        font-family: 'Source Sans Pro';
-        font-weight: 400;
-        font-size: 15px;
-        background-color: #fff;
-        color: #3b3b3b;
-        padding: 16px;
-    }
-    #color_bar {
-        min-height: 5px;
-        max-height: 5px;
-        background-color: #ff3366;
-        border: 0px;
-    }
-    #error_message {
-        font-family: 'Source Sans Pro';
-        font-weight: 500;
-        font-size: 13px;
-        color: #ff3366;
-    }
-    '''
-
-    CSS_REPLY_SUCCEEDED = '''
-    #message {
-        min-width: 540px;
-        max-width: 540px;
-        font-family: 'Source Sans Pro';
-        font-weight: 400;
-        font-size: 15px;
-        background-color: #fff;
-        color: #3b3b3b;
-        padding: 16px;
-    }
-    #color_bar {
-        min-height: 5px;
-        max-height: 5px;
-        background-color: #0065db;
-        border: 0px;
-    }
-    '''
-
     # Custom pending CSS styling simulates the effect of opacity which is only
     # supported by tooltips for QSS.
-    CSS_REPLY_PENDING = '''
-    #message {
-        min-width: 540px;
-        max-width: 540px;
-        font-family: 'Source Sans Pro';
-        font-weight: 400;
-        font-size: 15px;
-        color: #A9AAAD;
-        background-color: #F7F8FC;
-        padding: 16px;
-    }
-    #color_bar {
-        min-height: 5px;
-        max-height: 5px;
-        background-color: #0065db;
-        border: 0px;
-    }
-    '''
 
     def __init__(
         self,
         message_id: str,
         message: str,
         reply_status: str,
-        update_signal,
-        message_succeeded_signal,
-        message_failed_signal,
+        update_dispatcher: SignalDispatcher,
+        message_succeeded_dispatcher: SignalDispatcher,
+        message_failed_dispatcher: SignalDispatcher,
     ) -> None:
-        super().__init__(message_id, message, update_signal)
+        super().__init__(message_id, message, update_dispatcher)
         self.message_id = message_id
 
         error_icon = SvgLabel('error_icon.svg', svg_size=QSize(12, 12))
@@ -1734,21 +1404,38 @@ class ReplyWidget(SpeechBubble):
         self.error.hide()
         self.bubble_area_layout.addWidget(self.error)
 
-        message_succeeded_signal.connect(self._on_reply_success)
-        message_failed_signal.connect(self._on_reply_failure)
+        message_succeeded_dispatcher.register(message_id, self._on_reply_success)
+        message_failed_dispatcher.register(message_id, self._on_reply_failure)
 
         # Set styles
         self._set_reply_state(reply_status)
 
+    def update_status(self, status: str) -> None:
+        """
+        Show the given send status, if it is not the one already shown.
+        """
+        if status != self.reply_status:
+            self._set_reply_state(status)
+
     def _set_reply_state(self, status: str) -> None:
+        self.reply_status = status
         if status == 'SUCCEEDED':
-            self.setStyleSheet(self.CSS_REPLY_SUCCEEDED)
             self.error.hide()
         elif status == 'FAILED':
-            self.setStyleSheet(self.CSS_REPLY_FAILED)
             self.error.show()
-        elif status == 'PENDING':
-            self.setStyleSheet(self.CSS_REPLY_PENDING)
+
+        # The application stylesheet styles replies by their reply_status property.
+        self.setProperty('reply_status', status)
+        self._repolish()
+
+    def _repolish(self):
+        """
+        Polish the message and color bar again, since a change to the reply_status property only
+        restyles the widgets polished after it.
+        """
+        for widget in (self.message, self.color_bar):
+            widget.style().unpolish(widget)
+            widget.style().polish(widget)
 
     @pyqtSlot(str)
     def _on_reply_success(self, message_id: str) -> None:
@@ -1757,7 +1444,7 @@ class ReplyWidget(SpeechBubble):
         signal matches the message_id of this widget.
         """
         if message_id == self.message_id:
-            logger.debug('Message {} succeeded'.format(message_id))
+            logger.debug('Message %s succeeded', message_id)
             self._set_reply_state('SUCCEEDED')
 
     @pyqtSlot(str)
@@ -1767,7 +1454,7 @@ class ReplyWidget(SpeechBubble):
         signal matches the message_id of this widget.
         """
         if message_id == self.message_id:
-            logger.debug('Message {} failed'.format(message_id))
+            logger.debug('Message %s failed', message_id)
             self._set_reply_state('FAILED')
 
 
@@ -1776,86 +1463,32 @@ class FileWidget(QWidget):
     Represents a file.
     """
 
-    CSS = '''
-    #file_widget {
-        min-width: 540px;
-        max-width: 540px;
-        padding: 16px;
-    }
-    #file_options {
-        min-width: 137px;
-    }
-    QPushButton#export_print {
-        border: none;
-        padding: 8px;
-        font-family: 'Source Sans Pro';
-        font-weight: 500;
-        font-size: 13px;
-        color: #2A319D;
-    }
-    QPushButton#export_print:hover {
-        color: #05a6fe;
-    }
-    QPushButton#download_button {
-        border: none;
-        font-family: 'Source Sans Pro';
-        font-weight: 600;
-        font-size: 13px;
-        color: #2a319d;
-    }
-    QLabel#file_name {
-        min-width: 129px;
-        padding-right: 8px;
-        font-family: 'Source Sans Pro';
-        font-weight: 700;
-        font-size: 14px;
-        color: #2a319d;
-    }
-    QLabel#no_file_name {
-        padding-right: 8px;
-        font-family: 'Source Sans Pro';
-        font-weight: 300;
-        font-size: 13px;
-        color: #a5b3e9;
-    }
-    QLabel#file_size {
-        min-width: 48px;
-        max-width: 48px;
-        font-family: 'Source Sans Pro';
-        font-weight: 400;
-        font-size: 14px;
-        color: #2a319d;
-    }
-    QWidget#horizontal_line {
-        min-height: 2px;
-        max-height: 2px;
-        background-color: rgba(211, 216, 234, 0.45);
-        padding-left: 8px;
-        padding-right: 8px;
-    }
-    '''
-
     VERTICAL_MARGIN = 10
     FILE_FONT_SPACING = 2
     FILE_OPTIONS_FONT_SPACING = 1.6
 
+    # Widgets whose files have been downloaded since they were last refreshed. They are refreshed
+    # together once control returns to the event loop, so that the files of a sync that finishes
+    # many downloads at once are loaded with one query rather than one per file.
+    downloaded_widgets = []  # type: List[FileWidget]
+
     def __init__(
         self,
-        file_uuid: str,
+        file: File,
         controller: Controller,
-        file_ready_signal: pyqtBoundSignal,
+        file_ready_dispatcher: SignalDispatcher,
     ) -> None:
         """
-        Given some text and a reference to the controller, make something to display a file.
+        Given a file loaded by the conversation and a reference to the controller, make something
+        to display the file.
         """
         super().__init__()
 
         self.controller = controller
-        self.file = self.controller.get_file(file_uuid)
+        self.file = file
 
         # Set styles
         self.setObjectName('file_widget')
-        self.setStyleSheet(self.CSS)
         file_description_font = QFont()
         file_description_font.setLetterSpacing(QFont.AbsoluteSpacing, self.FILE_FONT_SPACING)
         file_buttons_font = QFont()
@@ -1918,7 +1551,26 @@ class FileWidget(QWidget):
         self.file_size.setAlignment(Qt.AlignRight)
 
         # Decide what to show or hide based on whether or not the file's been downloaded
+        self.set_file(self.file)
+
+        # Add widgets
+        layout.addWidget(self.file_options)
+        layout.addWidget(self.file_name)
+        layout.addWidget(self.no_file_name)
+        layout.addWidget(horizontal_line)
+        layout.addWidget(self.file_size)
+
+        # Connect signals to slots
+        file_ready_dispatcher.register(file.uuid, self._on_file_downloaded)
+
+    def set_file(self, file: File) -> None:
+        """
+        Show the given state of the file: its name with the export and print buttons if it has
+        been downloaded, or else the download button.
+        """
+        self.file = file
         if self.file.is_downloaded:
+            self.file_name.setText(self.file.original_filename)
             self.download_button.hide()
             self.no_file_name.hide()
             self.export_button.show()
@@ -1933,16 +1585,6 @@ class FileWidget(QWidget):
             self.download_button.show()
             self.no_file_name.show()
 
-        # Add widgets
-        layout.addWidget(self.file_options)
-        layout.addWidget(self.file_name)
-        layout.addWidget(self.no_file_name)
-        layout.addWidget(horizontal_line)
-        layout.addWidget(self.file_size)
-
-        # Connect signals to slots
-        file_ready_signal.connect(self._on_file_downloaded, type=Qt.QueuedConnection)
-
     def eventFilter(self, obj, event):
         if event.type() == QEvent.MouseButtonPress:
             if event.button() == Qt.LeftButton:
@@ -1951,16 +1593,29 @@ class FileWidget(QWidget):
 
     @pyqtSlot(str)
     def _on_file_downloaded(self, file_uuid: str) -> None:
-        if file_uuid == self.file.uuid:
-            self.file = self.controller.get_file(self.file.uuid)
-            if self.file.is_downloaded:
-                self.file_name.setText(self.file.original_filename)
-                self.download_button.hide()
-                self.no_file_name.hide()
-                self.export_button.show()
-                self.middot.show()
-                self.print_button.show()
-                self.file_name.show()
+        if file_uuid != self.file.uuid or self in FileWidget.downloaded_widgets:
+            return
+
+        if not FileWidget.downloaded_widgets:
+            QTimer.singleShot(0, FileWidget.refresh_downloaded_widgets)
+        FileWidget.downloaded_widgets.append(self)
+
+    @staticmethod
+    def refresh_downloaded_widgets() -> None:
+        """
+        Show the current state of the files downloaded since the last refresh, skipping widgets
+        deleted in the meantime.
+        """
+        widgets = [
+            widget for widget in FileWidget.downloaded_widgets if not sip.isdeleted(widget)
+        ]
+        FileWidget.downloaded_widgets = []
+        if not widgets:
+            return
+
+        refresh_files(widgets[0].controller.session, [widget.file for widget in widgets])
+        for widget in widgets:
+            widget.set_file(widget.file)
 
     @pyqtSlot()
     def _on_export_clicked(self):
@@ -1997,7 +1652,7 @@ class FileWidget(QWidget):
         of the file distinguishes which function in the logic layer to call.
         """
         # update state
-        self.file = self.controller.get_file(self.file.uuid)
+        refresh_files(self.controller.session, [self.file])
 
         if self.file.is_downloaded:
             # Open the already downloaded file.
@@ -2033,7 +1688,7 @@ class PrintDialog(QDialog):
         self.file_uuid = file_uuid
 
         self.setObjectName('print_dialog')
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
         self.setWindowFlags(Qt.Popup)
         self.setWindowModality(Qt.WindowModal)
 
@@ -2180,7 +1835,7 @@ class ExportDialog(QDialog):
         self.file_name = file_name
 
         self.setObjectName('export_dialog')
-        self.setStyleSheet(self.CSS)
+        set_stylesheet(self, self.CSS)
         self.setWindowFlags(Qt.Popup)
         self.setWindowModality(Qt.WindowModal)
 
@@ -2359,27 +2014,38 @@ class ConversationView(QWidget):
     Renders a conversation.
     """
 
-    CSS = '''
-    #container {
-        background: #f3f5f9;
-    }
-    #scroll {
-        border: 0;
-        background: #f3f5f9;
-    }
-    '''
-
     MARGIN_LEFT = 38
     MARGIN_RIGHT = 20
 
+    # Number of file counters in a page of the conversation. Only the latest page is shown at first,
+    # and older pages are loaded from the database as the user scrolls up to them.
+    PAGE_SIZE = 100
+
     def __init__(self, source_db_object: Source, controller: Controller):
         super().__init__()
 
         self.source = source_db_object
         self.controller = controller
 
-        # Set styles
-        self.setStyleSheet(self.CSS)
+        # The file_counter of the oldest page loaded by scrolling up, or None if only the latest
+        # page is shown
+        self.first_file_counter = None  # type: Optional[int]
+
+        # The file_counter the items shown start from, and whether there are older items
+        self.window_start = 0
+        self.has_older_items = False
+
+        # Distance of the scroll position from the bottom of the conversation to keep while older
+        # items are added above it
+        self.position_from_bottom = None  # type: Optional[int]
+
+        # The widget of each item shown, keyed by the item's UUID, and the file_counter of the
+        # newest item shown, so that updates only add, change or remove the items that need it
+        self.current_conversation = {}  # type: Dict[str, QWidget]
+        self.last_file_counter = -1
+
+        # The lowest file_counter of the conversation, or None if it has no items
+        self.lowest_file_counter = None  # type: Optional[int]
 
         # Set layout
         main_layout = QVBoxLayout()
@@ -2406,73 +2072,256 @@ class ConversationView(QWidget):
         # Completely unintuitive way to ensure the view remains scrolled to the bottom.
         sb = self.scroll.verticalScrollBar()
         sb.rangeChanged.connect(self.update_conversation_position)
+        sb.valueChanged.connect(self.on_scrolled)
 
         main_layout.addWidget(self.scroll)
 
-        self.update_conversation(self.source.collection)
+        self.update_conversation()
 
     def clear_conversation(self):
         while self.conversation_layout.count():
             child = self.conversation_layout.takeAt(0)
             if child.widget():
                 child.widget().deleteLater()
-
-    def update_conversation(self, collection: list) -> None:
-        # clear all old items
-        self.clear_conversation()
-        self.controller.session.refresh(self.source)
-        # add new items
-        for conversation_item in collection:
-            if isinstance(conversation_item, Message):
-                self.add_message(conversation_item)
-            elif isinstance(conversation_item, (DraftReply, Reply)):
-                self.add_reply(conversation_item)
+        self.current_conversation = {}
+        self.last_file_counter = -1
+
+    def update_conversation(self) -> None:
+        """
+        Show the items in the latest page of the conversation, and in the pages loaded by scrolling
+        up, as they are in the database. Only the items of those pages are loaded, not the whole
+        conversation.
+
+        The widgets of items already shown are kept, and updated if the item changed. Only the
+        widgets of items that are gone are removed, and only new items get new widgets: appended
+        if they are newer than the newest item shown, or else inserted where they belong.
+        """
+        lowest, highest = get_conversation_file_counter_range(self.controller.session, self.source)
+        items = []  # type: list
+        self.window_start = 0
+        if highest is not None:
+            self.window_start = highest - self.PAGE_SIZE + 1
+        if self.first_file_counter is not None:
+            self.window_start = min(self.window_start, self.first_file_counter)
+        self.lowest_file_counter = lowest
+        self.has_older_items = lowest is not None and lowest < self.window_start
+        if highest is not None:
+            # The items are loaded with their current state in the database, so that messages that
+            # were decrypted and files that were downloaded since they were last shown are updated.
+            items = get_conversation_items(
+                self.controller.session, self.source, self.window_start, highest + 1)
+
+        # remove the items that are gone
+        item_uuids = {item.uuid for item in items}
+        for uuid in list(self.current_conversation):
+            if uuid not in item_uuids:
+                self.remove_conversation_item(uuid)
+
+        # update the items already shown and add the new ones
+        for index, conversation_item in enumerate(items):
+            widget = self.current_conversation.get(conversation_item.uuid)
+            if widget is not None:
+                self.move_conversation_item(widget, index)
+                self.update_item(widget, conversation_item)
+            elif conversation_item.file_counter > self.last_file_counter:
+                self.add_item(conversation_item)
             else:
-                self.add_file(conversation_item)
+                self.add_item(conversation_item, index)
+
+        if items:
+            self.last_file_counter = max(self.last_file_counter, items[-1].file_counter)
+
+        self.fill_viewport()
+
+    def load_older_items(self):
+        """
+        Load the page of the conversation before the oldest item shown from the database, skipping
+        pages without items, and show its items above the others.
+        """
+        if not self.has_older_items:
+            return
+
+        items = []  # type: list
+        end = self.window_start
+        while not items and end > self.lowest_file_counter:
+            start = max(0, end - self.PAGE_SIZE)
+            items = get_conversation_items(self.controller.session, self.source, start, end)
+            end = start
+        self.first_file_counter = self.window_start = end
+        self.has_older_items = end > self.lowest_file_counter
 
-    def add_file(self, file: File):
+        sb = self.scroll.verticalScrollBar()
+        self.position_from_bottom = sb.maximum() - sb.value()
+        for index, conversation_item in enumerate(items):
+            self.add_item(conversation_item, index)
+
+    def fill_viewport(self):
+        """
+        Load older pages of the conversation until the items shown are taller than the view, or
+        there are no older items, so that there is a scroll bar to scroll up to the rest of the
+        conversation with.
+
+        Nothing is loaded while the view is hidden, as it only gets its size once it is shown.
+        """
+        if not self.isVisible():
+            return
+
+        viewport = self.scroll.viewport()
+        while self.has_older_items and \
+                self.container.sizeHint().height() <= viewport.height():
+            self.load_older_items()
+
+    def showEvent(self, event):
+        """
+        Fill the view once it is shown and has its size.
+        """
+        super().showEvent(event)
+        self.fill_viewport()
+
+    def resizeEvent(self, event):
+        """
+        A view made taller may no longer be filled by the items shown.
+        """
+        super().resizeEvent(event)
+        self.fill_viewport()
+
+    def unload_older_items(self) -> None:
+        """
+        Go back to showing only the latest page of the conversation, removing the pages loaded by
+        scrolling up.
+        """
+        if self.first_file_counter is None:
+            return
+
+        self.first_file_counter = None
+        self.update_conversation()
+
+    def on_scrolled(self, value):
+        """
+        Load older items when the user scrolls to the top of the conversation, and remove them again
+        when the user scrolls back to the bottom.
+        """
+        sb = self.scroll.verticalScrollBar()
+        if sb.maximum() == sb.minimum():
+            return
+
+        if value == sb.minimum():
+            self.load_older_items()
+        elif value == sb.maximum():
+            self.unload_older_items()
+
+    def update_item(self, widget: QWidget, conversation_item) -> None:
+        """
+        Update the widget of a message, reply or file to show its current content, send status or
+        download state.
+        """
+        if isinstance(conversation_item, Message):
+            widget.message.setText(str(conversation_item))
+        elif isinstance(conversation_item, (DraftReply, Reply)):
+            widget.message.setText(str(conversation_item))
+            widget.update_status(self.get_send_status(conversation_item))
+        else:
+            widget.set_file(conversation_item)
+
+    def move_conversation_item(self, widget: QWidget, index: int) -> None:
+        """
+        Move the widget to the given index, if it is elsewhere, keeping its alignment.
+        """
+        current_index = self.conversation_layout.indexOf(widget)
+        if current_index != index:
+            layout_item = self.conversation_layout.takeAt(current_index)
+            self.conversation_layout.insertItem(index, layout_item)
+
+    def remove_conversation_item(self, uuid: str) -> None:
+        """
+        Remove the widget of the item with the given UUID from the conversation.
+        """
+        widget = self.current_conversation.pop(uuid)
+        self.conversation_layout.removeWidget(widget)
+        widget.deleteLater()
+
+    def add_item(self, conversation_item, index: Optional[int] = None) -> None:
+        """
+        Add a message, reply or file to the conversation, at the end or else at the given index.
+        """
+        if isinstance(conversation_item, Message):
+            self.add_message(conversation_item, index)
+        elif isinstance(conversation_item, (DraftReply, Reply)):
+            self.add_reply(conversation_item, index)
+        else:
+            self.add_file(conversation_item, index)
+
+    def add_conversation_item(self, uuid: str, conversation_item: QWidget, alignment: Qt.Alignment,
+                              index: Optional[int] = None) -> None:
+        """
+        Add the widget of the item with the given UUID to the conversation, at the end or else at
+        the given index.
+        """
+        self.current_conversation[uuid] = conversation_item
+        if index is None:
+            self.conversation_layout.addWidget(conversation_item, alignment=alignment)
+        else:
+            self.conversation_layout.insertWidget(index, conversation_item, alignment=alignment)
+
+    def add_file(self, file: File, index: Optional[int] = None):
         """
         Add a file from the source.
         """
-        conversation_item = FileWidget(file.uuid, self.controller, self.controller.file_ready)
-        self.conversation_layout.addWidget(conversation_item, alignment=Qt.AlignLeft)
+        conversation_item = FileWidget(file, self.controller, self.controller.file_ready_dispatcher)
+        self.add_conversation_item(file.uuid, conversation_item, Qt.AlignLeft, index)
 
     def update_conversation_position(self, min_val, max_val):
         """
         Handler called when a new item is added to the conversation. Ensures
         it's scrolled to the bottom and thus visible.
+
+        When older items were added above the others, the position is restored instead, so that the
+        user stays on the item they were reading.
         """
+        if self.position_from_bottom is not None:
+            self.scroll.verticalScrollBar().setValue(max_val - self.position_from_bottom)
+            self.position_from_bottom = None
+            return
+
         current_val = self.scroll.verticalScrollBar().value()
         viewport_height = self.scroll.viewport().height()
 
         if current_val + viewport_height > max_val:
             self.scroll.verticalScrollBar().setValue(max_val)
 
-    def add_message(self, message: Message) -> None:
+    def add_message(self, message: Message, index: Optional[int] = None) -> None:
         """
         Add a message from the source.
         """
-        conversation_item = MessageWidget(message.uuid, str(message), self.controller.message_ready)
-        self.conversation_layout.addWidget(conversation_item, alignment=Qt.AlignLeft)
+        conversation_item = MessageWidget(
+            message.uuid, str(message), self.controller.message_ready_dispatcher)
+        self.add_conversation_item(message.uuid, conversation_item, Qt.AlignLeft, index)
 
-    def add_reply(self, reply: Union[DraftReply, Reply]) -> None:
+    def add_reply(self, reply: Union[DraftReply, Reply], index: Optional[int] = None) -> None:
         """
         Add a reply from a journalist to the source.
         """
-        try:
-            send_status = reply.send_status.name
-        except AttributeError:
-            send_status = 'SUCCEEDED'
+        send_status = self.get_send_status(reply)
 
-        logger.debug('adding reply: with status {}'.format(send_status))
+        logger.debug('adding reply: with status %s', send_status)
         conversation_item = ReplyWidget(
             reply.uuid,
             str(reply),
             send_status,
-            self.controller.reply_ready,
-            self.controller.reply_succeeded,
-            self.controller.reply_failed)
-        self.conversation_layout.addWidget(conversation_item, alignment=Qt.AlignRight)
+            self.controller.reply_ready_dispatcher,
+            self.controller.reply_succeeded_dispatcher,
+            self.controller.reply_failed_dispatcher)
+        self.add_conversation_item(reply.uuid, conversation_item, Qt.AlignRight, index)
+
+    @staticmethod
+    def get_send_status(reply: Union[DraftReply, Reply]) -> str:
+        """
+        Return the send status of a draft reply, or SUCCEEDED for a reply, which has been sent.
+        """
+        try:
+            return reply.send_status.name
+        except AttributeError:
+            return 'SUCCEEDED'
 
     def add_reply_from_reply_box(self, uuid: str, content: str) -> None:
         """
@@ -2482,10 +2331,10 @@ class ConversationView(QWidget):
             uuid,
             content,
             'PENDING',
-            self.controller.reply_ready,
-            self.controller.reply_succeeded,
-            self.controller.reply_failed)
-        self.conversation_layout.addWidget(conversation_item, alignment=Qt.AlignRight)
+            self.controller.reply_ready_dispatcher,
+            self.controller.reply_succeeded_dispatcher,
+            self.controller.reply_failed_dispatcher)
+        self.add_conversation_item(uuid, conversation_item, Qt.AlignRight)
 
     def on_reply_sent(self, source_uuid: str, reply_uuid: str, reply_text: str) -> None:
         """
@@ -2535,28 +2384,6 @@ class ReplyBoxWidget(QWidget):
     A textbox where a journalist can enter a reply.
     """
 
-    CSS = '''
-    #replybox_holder {
-        min-height: 173px;
-        max-height: 173px;
-    }
-    #replybox {
-        background-color: #ffffff;
-    }
-    #replybox::disabled {
-        background-color: #efefef;
-    }
-    QPushButton {
-        border: none;
-    }
-    QWidget#horizontal_line {
-        min-height: 2px;
-        max-height: 2px;
-        background-color: rgba(42, 49, 157, 0.15);
-        border: none;
-    }
-    '''
-
     reply_sent = pyqtSignal(str, str, str)
 
     def __init__(self, source: Source, controller: Controller) -> None:
@@ -2568,9 +2395,6 @@ class ReplyBoxWidget(QWidget):
         # Set css id
         self.setObjectName('replybox_holder')
 
-        # Set styles
-        self.setStyleSheet(self.CSS)
-
         # Set layout
         main_layout = QVBoxLayout()
         self.setLayout(main_layout)
@@ -2587,7 +2411,7 @@ class ReplyBoxWidget(QWidget):
         self.replybox = QWidget()
         self.replybox.setObjectName('replybox')
         replybox_layout = QHBoxLayout(self.replybox)
-        replybox_layout.setContentsMargins(32.6, 19, 27.3, 18)
+        replybox_layout.setContentsMargins(32, 19, 27, 18)
         replybox_layout.setSpacing(0)
 
         # Create reply text box
@@ -2600,7 +2424,7 @@ class ReplyBoxWidget(QWidget):
         button_pixmap = load_image('send.svg')
         button_icon = QIcon(button_pixmap)
         self.send_button.setIcon(button_icon)
-        self.send_button.setIconSize(QSize(56.5, 47))
+        self.send_button.setIconSize(QSize(56, 47))
         self.send_button.setShortcut(QKeySequence("Ctrl+Return"))
         self.send_button.setDefault(True)
 
@@ -2659,32 +2483,12 @@ class ReplyTextEdit(QPlainTextEdit):
     a richtext lable on top to replace the placeholder functionality
     """
 
-    CSS = '''
-    #reply_textedit {
-        font-family: 'Montserrat';
-        font-weight: 400;
-        font-size: 18px;
-        border: none;
-        margin-right: 30.2px;
-    }
-    #reply_placeholder {
-        font-family: 'Montserrat';
-        font-weight: 400;
-        font-size: 18px;
-        color: #404040;
-    }
-    #reply_placeholder::disabled {
-        color: rgba(42, 49, 157, 0.6);
-    }
-    '''
-
     def __init__(self, source, controller):
         super().__init__()
         self.controller = controller
         self.source = source
 
         self.setObjectName('reply_textedit')
-        self.setStyleSheet(self.CSS)
 
         self.setTabChangesFocus(True)  # Needed so we can TAB to send button.
 
@@ -2775,24 +2579,12 @@ class SourceMenuButton(QToolButton):
     This button is responsible for launching the source menu on click.
     """
 
-    CSS = '''
-    #ellipsis_button {
-        border: none;
-        margin: 5px 0px 0px 0px;
-        padding-left: 8px;
-    }
-    QToolButton::menu-indicator {
-        image: none;
-    }
-    '''
-
     def __init__(self, source, controller):
         super().__init__()
         self.controller = controller
         self.source = source
 
         self.setObjectName('ellipsis_button')
-        self.setStyleSheet(self.CSS)
 
         self.setIcon(load_icon("ellipsis.svg"))
         self.setIconSize(QSize(22, 4))  # Set to the size of the svg viewBox
@@ -2806,47 +2598,22 @@ class SourceMenuButton(QToolButton):
 class TitleLabel(QLabel):
     """The title for a conversation."""
 
-    CSS = '''
-    #conversation-title-source-name {
-        font-family: 'Montserrat';
-        font-weight: 400;
-        font-size: 24px;
-        color: #2a319d;
-        padding-left: 4px;
-    }
-    '''
-
     def __init__(self, text):
         super().__init__(_(text))
 
         # Set css id
         self.setObjectName('conversation-title-source-name')
 
-        # Set styles
-        self.setStyleSheet(self.CSS)
-
 
 class LastUpdatedLabel(QLabel):
     """Time the conversation was last updated."""
 
-    CSS = '''
-    #conversation-title-date {
-        font-family: 'Montserrat';
-        font-weight: 200;
-        font-size: 24px;
-        color: #2a319d;
-    }
-    '''
-
     def __init__(self, last_updated):
         super().__init__(_(_('{}').format(arrow.get(last_updated).humanize())))
 
         # Set css id
         self.setObjectName('conversation-title-date')
 
-        # Set styles
-        self.setStyleSheet(self.CSS)
-
 
 class SourceProfileShortWidget(QWidget):
     """A widget for displaying short view for Source.
@@ -2856,16 +2623,6 @@ class SourceProfileShortWidget(QWidget):
     2. A menu to perform various operations on Source.
     """
 
-    CSS = '''
-    QWidget#horizontal_line {
-        min-height: 2px;
-        max-height: 2px;
-        background-color: rgba(42, 49, 157, 0.15);
-        padding-left: 12px;
-        padding-right: 12px;
-    }
-    '''
-
     MARGIN_LEFT = 25
     MARGIN_RIGHT = 17
     VERTICAL_MARGIN = 14
@@ -2876,9 +2633,6 @@ class SourceProfileShortWidget(QWidget):
         self.source = source
         self.controller = controller
 
-        # Set styles
-        self.setStyleSheet(self.CSS)
-
         # Set layout
         layout = QVBoxLayout()
         self.setLayout(layout)
@@ -18,20 +18,23 @@ along with this program.  If not, see <fhttp://www.gnu.org/licenses/>.
 """
 import arrow
 from datetime import datetime
+import functools
 import inspect
 import logging
 import os
 import sdclientapi
 import uuid
-from typing import Dict, Tuple, Union, Any, List, Type  # noqa: F401
+from typing import Callable, Dict, Tuple, Union, Any, List, Optional, Type  # noqa: F401
 
 from gettext import gettext as _
-from PyQt5.QtCore import QObject, QThread, pyqtSignal, QTimer, QProcess, Qt
+from PyQt5.QtCore import QObject, QRunnable, QThread, QThreadPool, pyqtSignal, QTimer, QProcess, \
+    Qt, pyqtBoundSignal
 from sdclientapi import RequestTimeoutError
 from sqlalchemy.orm.session import sessionmaker
 
 from securedrop_client import storage
 from securedrop_client import db
+from securedrop_client.api_jobs.base import ApiJob, DEFAULT_NUM_ATTEMPTS
 from securedrop_client.api_jobs.downloads import FileDownloadJob, MessageDownloadJob, \
     ReplyDownloadJob, DownloadChecksumMismatchException, MetadataSyncJob
 from securedrop_client.api_jobs.sources import DeleteSourceJob
@@ -40,7 +43,7 @@ from securedrop_client.api_jobs.uploads import SendReplyJob, SendReplyJobError,
 from securedrop_client.api_jobs.updatestar import UpdateStarJob, UpdateStarJobException
 from securedrop_client.crypto import GpgHelper
 from securedrop_client.export import Export
-from securedrop_client.queue import ApiJobQueue
+from securedrop_client.queue import ApiJobQueue, JobStore
 from securedrop_client.utils import check_dir_permissions
 
 logger = logging.getLogger(__name__)
@@ -91,6 +94,66 @@ class APICallRunner(QObject):
             self.call_succeeded.emit()
 
 
+class APICallRunnable(QRunnable):
+    """
+    Runs an APICallRunner on a thread of a QThreadPool.
+    """
+
+    def __init__(self, runner: APICallRunner) -> None:
+        super().__init__()
+        self.runner = runner
+
+    def run(self) -> None:
+        self.runner.call_api()
+
+
+class SignalDispatcher:
+    """
+    Delivers each emission of a signal whose first argument is a UUID only to the slots registered
+    for that UUID, so that emitting the signal does not call the slot of every widget that shows
+    an item, only to have all but one of them ignore it.
+
+    Slots are methods of QObjects, and are unregistered when their object is destroyed.
+    """
+
+    def __init__(self, signal: pyqtBoundSignal,
+                 connection_type: Qt.ConnectionType = Qt.AutoConnection) -> None:
+        self.slots = {}  # type: Dict[str, List[Callable]]
+        signal.connect(self.dispatch, type=connection_type)
+
+    def register(self, uuid: str, slot: Callable) -> None:
+        """
+        Call the slot with the arguments of each emission of the signal for the given UUID.
+        """
+        self.slots.setdefault(uuid, []).append(slot)
+        slot.__self__.destroyed.connect(lambda: self.unregister(uuid, slot))
+
+    def unregister(self, uuid: str, slot: Callable) -> None:
+        """
+        Stop calling the slot for the given UUID.
+        """
+        slots = self.slots.get(uuid, [])
+        if slot in slots:
+            slots.remove(slot)
+        if not slots:
+            self.slots.pop(uuid, None)
+
+    def dispatch(self, uuid: str, *args: Any) -> None:
+        for slot in list(self.slots.get(uuid, [])):
+            slot(uuid, *args)
+
+
+@functools.lru_cache(maxsize=None)
+def _accepts_current_object(callback_function: Any) -> bool:
+    """
+    Return True if the callback function has a `current_object` argument.
+
+    Inspecting a function is slow, so the result is cached. Pass the function of a bound method
+    rather than the method, since a new bound method is created each time it is looked up.
+    """
+    return 'current_object' in inspect.getfullargspec(callback_function).args
+
+
 class Controller(QObject):
     """
     Represents the logic for the secure drop client application. In an MVC
@@ -172,12 +235,28 @@ class Controller(QObject):
         self.session_maker = session_maker
         self.session = session_maker()
 
-        # Queue that handles running API job
-        self.api_job_queue = ApiJobQueue(self.api, self.session_maker)
+        # Queue that handles running API job, recording pending jobs next to the database so that
+        # they can be restored at the next login if the client exits before they finish
+        self.api_job_queue = ApiJobQueue(self.api, self.session_maker, JobStore(home))
         self.api_job_queue.paused.connect(self.on_queue_paused)
 
-        # Contains active threads calling the API.
-        self.api_threads = {}  # type: Dict[str, Dict]
+        # Threads that call the API. They are reused from one call to the next rather than started
+        # for each call.
+        self.api_thread_pool = QThreadPool()
+
+        # Contains active API calls.
+        self.api_calls = {}  # type: Dict[str, APICallRunner]
+
+        # Route the signals about a message, reply or file only to the widgets that show it.
+        self.message_ready_dispatcher = SignalDispatcher(self.message_ready)
+        self.reply_ready_dispatcher = SignalDispatcher(self.reply_ready)
+        self.reply_succeeded_dispatcher = SignalDispatcher(self.reply_succeeded)
+        self.reply_failed_dispatcher = SignalDispatcher(self.reply_failed)
+        self.file_ready_dispatcher = SignalDispatcher(self.file_ready, Qt.QueuedConnection)
+
+        # The most recently enqueued MetadataSyncJob. Sync requests are coalesced into it for as
+        # long as it is waiting in the queue.
+        self.sync_job = None  # type: Optional[MetadataSyncJob]
 
         self.gpg = GpgHelper(home, self.session_maker, proxy)
 
@@ -186,6 +265,10 @@ class Controller(QObject):
 
         self.sync_flag = os.path.join(home, 'sync_flag')
 
+        # What the source list showed after the last sync, to show until the sources are loaded.
+        self.source_list_snapshot = os.path.join(home, 'source_list.json')
+        self.sources_loaded = False
+
         # File data.
         self.data_dir = os.path.join(self.home, 'data')
 
@@ -242,37 +325,30 @@ class Controller(QObject):
                  current_object=None,
                  **kwargs):
         """
-        Calls the function in a non-blocking manner. Upon completion calls the
-        callback with the result. Calls timeout if the timer associated with
-        the call emits a timeout signal. Any further arguments are passed to
-        the function to be called.
+        Calls the function in a non-blocking manner, on a thread of the API
+        thread pool. Upon completion calls the callback with the result. Any
+        further arguments are passed to the function to be called.
         """
-        new_thread_id = str(uuid.uuid4())  # Uniquely id the new thread.
+        new_call_id = str(uuid.uuid4())  # Uniquely id the new call.
 
-        new_api_thread = QThread(self.gui)
         new_api_runner = APICallRunner(api_call_func, current_object, *args,
                                        **kwargs)
-        new_api_runner.moveToThread(new_api_thread)
 
         # handle completed call: copy response data, reset the
         # client, give the user-provided callback the response
-        # data
+        # data. The runner stays in this thread, so the callbacks run
+        # here rather than in the pool thread that emits the signals.
         new_api_runner.call_succeeded.connect(
-            lambda: self.completed_api_call(new_thread_id, success_callback))
+            lambda: self.completed_api_call(new_call_id, success_callback),
+            type=Qt.QueuedConnection)
         new_api_runner.call_failed.connect(
-            lambda: self.completed_api_call(new_thread_id, failure_callback))
-
-        # when the thread starts, we want to run `call_api` on `api_runner`
-        new_api_thread.started.connect(new_api_runner.call_api)
+            lambda: self.completed_api_call(new_call_id, failure_callback),
+            type=Qt.QueuedConnection)
 
-        # Add the thread related objects to the api_threads dictionary.
-        self.api_threads[new_thread_id] = {
-            'thread': new_api_thread,
-            'runner': new_api_runner,
-        }
+        # Keep the runner until the call completes.
+        self.api_calls[new_call_id] = new_api_runner
 
-        # Start the thread and related activity.
-        new_api_thread.start()
+        self.api_thread_pool.start(APICallRunnable(new_api_runner))
 
     def on_queue_paused(self) -> None:
         if self.api is None:
@@ -286,19 +362,17 @@ class Controller(QObject):
     def resume_queues(self) -> None:
         self.api_job_queue.resume_queues()
 
-    def completed_api_call(self, thread_id, user_callback):
+    def completed_api_call(self, call_id, user_callback):
         """
         Manage a completed API call. The actual result *may* be an exception or
         error result from the API. It's up to the handler (user_callback) to
         handle these potential states.
         """
         logger.info("Completed API call. Cleaning up and running callback.")
-        thread_info = self.api_threads.pop(thread_id)
-        runner = thread_info['runner']
+        runner = self.api_calls.pop(call_id)
         result_data = runner.result
 
-        arg_spec = inspect.getfullargspec(user_callback)
-        if 'current_object' in arg_spec.args:
+        if _accepts_current_object(getattr(user_callback, '__func__', user_callback)):
             user_callback(result_data, current_object=runner.current_object)
         else:
             user_callback(result_data)
@@ -323,7 +397,7 @@ class Controller(QObject):
         """
         Handles a successful authentication call against the API.
         """
-        logger.info('{} successfully logged in'.format(self.api.username))
+        logger.info('%s successfully logged in', self.api.username)
         self.gui.hide_login()
         user = storage.update_and_get_user(
             self.api.token_journalist_uuid,
@@ -332,8 +406,9 @@ class Controller(QObject):
             self.api.journalist_last_name,
             self.session)
         self.gui.show_main_window(user)
-        self.update_sources()
+        self.show_source_list_snapshot()
         self.api_job_queue.login(self.api)
+        self.api_job_queue.restore_jobs(self._restore_job)
         self.sync_api()
         self.is_authenticated = True
         self.resume_queues()
@@ -353,7 +428,7 @@ class Controller(QObject):
         self.gui.show_main_window()
         storage.mark_all_pending_drafts_as_failed(self.session)
         self.is_authenticated = False
-        self.update_sources()
+        self.show_source_list_snapshot()
 
     def on_action_requiring_login(self):
         """
@@ -372,16 +447,17 @@ class Controller(QObject):
     def sync_api(self, manual_refresh: bool = False):
         """
         Grab data from the remote SecureDrop API in a non-blocking manner.
+
+        If a sync job is already waiting in the queue, attach to it rather than enqueuing another
+        one, so that there is at most one queued and one running sync at any time. A manual refresh
+        that attaches to a sync waiting out a retry delay puts it back into the queue right away.
         """
-        logger.debug("In sync_api on thread {}".format(self.thread().currentThreadId()))
+        logger.debug("In sync_api on thread %s", self.thread().currentThreadId())
         self.sync_events.emit('syncing')
 
         if self.authenticated():
             logger.debug("You are authenticated, going to make your call")
 
-            job = MetadataSyncJob(self.data_dir, self.gpg)
-            job.success_signal.connect(self.on_sync_success, type=Qt.QueuedConnection)
-
             # If the sync did not originate from a manual refrsh, increase the number of
             # retry attempts (remaining_attempts) to 15, otherwise use the default so that a user
             # finds out quicker whether or not their refresh-attempt failed.
@@ -389,10 +465,26 @@ class Controller(QObject):
             # Set up failure-handling depending on whether or not the sync originated from a manual
             # refresh.
             if manual_refresh:
-                job.failure_signal.connect(self.on_refresh_failure, type=Qt.QueuedConnection)
+                failure_callback = self.on_refresh_failure
+                remaining_attempts = DEFAULT_NUM_ATTEMPTS
             else:
-                job.remaining_attempts = 15
-                job.failure_signal.connect(self.on_sync_failure, type=Qt.QueuedConnection)
+                failure_callback = self.on_sync_failure
+                remaining_attempts = 15
+
+            if self.sync_job and self.sync_job.add_failure_callback(failure_callback,
+                                                                    remaining_attempts):
+                logger.debug('A sync is already queued, coalescing sync request into it')
+                if manual_refresh:
+                    # The user is waiting, so do not let the sync wait out a retry delay.
+                    self.sync_job.retry_count = 0
+                    self.api_job_queue.re_add_delayed_job(self.sync_job)
+                return
+
+            job = MetadataSyncJob(self.data_dir, self.gpg)
+            job.remaining_attempts = remaining_attempts
+            job.success_signal.connect(self.on_sync_success, type=Qt.QueuedConnection)
+            job.add_failure_callback(failure_callback, remaining_attempts)
+            self.sync_job = job
 
             self.api_job_queue.enqueue(job)
 
@@ -415,6 +507,7 @@ class Controller(QObject):
 
             * Set last sync flag
             * Display the last sync time and updated list of sources in GUI
+            * Save a snapshot of the source list to show at the next login
             * Download new messages and replies
             * Update missing files so that they can be re-downloaded
         """
@@ -425,6 +518,7 @@ class Controller(QObject):
 
         storage.update_missing_files(self.data_dir, self.session)
         self.update_sources()
+        storage.write_source_list_snapshot(self.session, self.source_list_snapshot)
         self.download_new_messages()
         self.download_new_replies()
         self.sync_events.emit('synced')
@@ -434,7 +528,7 @@ class Controller(QObject):
         Called when syncronisation of data via the API fails after a background sync. Resume the
         queues so that we continue to retry syncing with the server in the background.
         """
-        logger.debug('The SecureDrop server cannot be reached due to Error: {}'.format(result))
+        logger.debug('The SecureDrop server cannot be reached due to Error: %s', result)
         self.gui.update_error_status(
             _('The SecureDrop server cannot be reached.'),
             duration=0,
@@ -445,7 +539,7 @@ class Controller(QObject):
         """
         Called when syncronisation of data via the API fails after a user manual clicks refresh.
         """
-        logger.debug('The SecureDrop server cannot be reached due to Error: {}'.format(result))
+        logger.debug('The SecureDrop server cannot be reached due to Error: %s', result)
         self.gui.update_error_status(
             _('The SecureDrop server cannot be reached.'),
             duration=0,
@@ -457,6 +551,26 @@ class Controller(QObject):
         """
         self.gui.show_sync(self.last_sync())
 
+    def show_source_list_snapshot(self):
+        """
+        Show the source list as it was after the last sync, from its snapshot, and update it with
+        the sources in local storage once it has been painted. The rows of the snapshot are updated
+        in place, so that only the rows of sources that are not in the snapshot are made then.
+
+        If the sources have already been loaded, e.g. when logging in again after logging out, the
+        source list already shows them, so it is updated right away, as it is if there is no
+        snapshot.
+        """
+        snapshot = []  # type: List[storage.SourceSnapshot]
+        if not self.sources_loaded:
+            snapshot = storage.read_source_list_snapshot(self.source_list_snapshot)
+        if not snapshot:
+            self.update_sources()
+            return
+
+        self.gui.show_sources(snapshot)
+        self.gui.call_after_sources_painted(self.update_sources)
+
     def update_sources(self):
         """
         Display the updated list of sources with those found in local storage.
@@ -465,6 +579,7 @@ class Controller(QObject):
         if sources:
             sources.sort(key=lambda x: x.last_updated, reverse=True)
         self.gui.show_sources(sources)
+        self.sources_loaded = True
         self.update_sync()
 
     def on_update_star_success(self, result) -> None:
@@ -491,11 +606,14 @@ class Controller(QObject):
             self.on_action_requiring_login()
             return
 
-        job = UpdateStarJob(source_db_object.uuid, source_db_object.is_starred)
+        job = self._create_update_star_job(source_db_object.uuid, source_db_object.is_starred)
+        self.api_job_queue.enqueue(job)
+
+    def _create_update_star_job(self, source_uuid: str, star_status: bool) -> UpdateStarJob:
+        job = UpdateStarJob(source_uuid, star_status)
         job.success_signal.connect(self.on_update_star_success, type=Qt.QueuedConnection)
         job.failure_signal.connect(self.on_update_star_failure, type=Qt.QueuedConnection)
-
-        self.api_job_queue.enqueue(job)
+        return job
 
     def logout(self):
         """
@@ -508,6 +626,7 @@ class Controller(QObject):
         self.api = None
         self.api_job_queue.logout()
         storage.mark_all_pending_drafts_as_failed(self.session)
+        storage.delete_source_list_snapshot(self.source_list_snapshot)
         self.gui.logout()
         self.is_authenticated = False
 
@@ -521,7 +640,14 @@ class Controller(QObject):
     def _submit_download_job(self,
                              object_type: Union[Type[db.Reply], Type[db.Message], Type[db.File]],
                              uuid: str) -> None:
+        job = self._create_download_job(object_type, uuid)
+        self.api_job_queue.enqueue(job)
 
+    def _create_download_job(
+        self,
+        object_type: Union[Type[db.Reply], Type[db.Message], Type[db.File]],
+        uuid: str
+    ) -> Union[ReplyDownloadJob, MessageDownloadJob, FileDownloadJob]:
         if object_type == db.Reply:
             job = ReplyDownloadJob(
                 uuid, self.data_dir, self.gpg
@@ -537,7 +663,7 @@ class Controller(QObject):
             job.success_signal.connect(self.on_file_download_success, type=Qt.QueuedConnection)
             job.failure_signal.connect(self.on_file_download_failure, type=Qt.QueuedConnection)
 
-        self.api_job_queue.enqueue(job)
+        return job
 
     def download_new_messages(self) -> None:
         messages = storage.find_new_messages(self.session)
@@ -561,11 +687,11 @@ class Controller(QObject):
         """
         Called when a message fails to download.
         """
-        logger.debug('Failed to download message: {}'.format(exception))
+        logger.debug('Failed to download message: %s', exception)
 
         # Keep resubmitting the job if the download is corrupted.
         if isinstance(exception, DownloadChecksumMismatchException):
-            logger.debug('Failure due to checksum mismatch, retrying {}'.format(exception.uuid))
+            logger.debug('Failure due to checksum mismatch, retrying %s', exception.uuid)
             self._submit_download_job(exception.object_type, exception.uuid)
 
     def download_new_replies(self) -> None:
@@ -585,11 +711,11 @@ class Controller(QObject):
         """
         Called when a reply fails to download.
         """
-        logger.debug('Failed to download reply: {}'.format(exception))
+        logger.debug('Failed to download reply: %s', exception)
 
         # Keep resubmitting the job if the download is corrupted.
         if isinstance(exception, DownloadChecksumMismatchException):
-            logger.debug('Failure due to checksum mismatch, retrying {}'.format(exception.uuid))
+            logger.debug('Failure due to checksum mismatch, retrying %s', exception.uuid)
             self._submit_download_job(exception.object_type, exception.uuid)
 
     def downloaded_file_exists(self, file_uuid: str) -> bool:
@@ -603,8 +729,8 @@ class Controller(QObject):
         if not os.path.exists(filepath):
             self.gui.update_error_status(_(
                 'File does not exist in the data directory. Please try re-downloading.'))
-            logger.debug('Cannot find {} in the data directory. File does not exist.'.format(
-                file.original_filename))
+            logger.debug('Cannot find %s in the data directory. File does not exist.',
+                         file.original_filename)
             return False
         return True
 
@@ -644,7 +770,7 @@ class Controller(QObject):
         is_downloaded is set to False.
         '''
         file = self.get_file(file_uuid)
-        logger.info('Opening file "{}".'.format(file.original_filename))
+        logger.info('Opening file "%s".', file.original_filename)
 
         if not self.downloaded_file_exists(file.uuid):
             self.sync_api()
@@ -679,7 +805,7 @@ class Controller(QObject):
         is_downloaded is set to False.
         '''
         file = self.get_file(file_uuid)
-        logger.info('Exporting file {}'.format(file.original_filename))
+        logger.info('Exporting file %s', file.original_filename)
 
         if not self.downloaded_file_exists(file.uuid):
             self.sync_api()
@@ -699,7 +825,7 @@ class Controller(QObject):
         so that is_downloaded is set to False.
         '''
         file = self.get_file(file_uuid)
-        logger.info('Printing file {}'.format(file.original_filename))
+        logger.info('Printing file %s', file.original_filename)
 
         if not self.downloaded_file_exists(file.uuid):
             self.sync_api()
@@ -739,20 +865,22 @@ class Controller(QObject):
         """
         Called when a file fails to download.
         """
-        logger.debug('Failed to download file: {}'.format(exception))
+        logger.debug('Failed to download file: %s', exception)
 
         # Keep resubmitting the job if the download is corrupted.
         if isinstance(exception, DownloadChecksumMismatchException):
-            logger.debug('Failure due to checksum mismatch, retrying {}'.format(exception.uuid))
+            logger.debug('Failure due to checksum mismatch, retrying %s', exception.uuid)
             self._submit_download_job(exception.object_type, exception.uuid)
         else:
             self.gui.update_error_status(_('The file download failed. Please try again.'))
 
     def on_delete_source_success(self, result) -> None:
         """
-        Handler for when a source deletion succeeds.
+        Handler for when a source deletion succeeds. The source is removed from the source list
+        snapshot right away, rather than at the end of the sync that removes it from local storage.
         """
         self.gui.clear_error_status()  # remove any permanent error status message
+        storage.remove_from_source_list_snapshot(self.source_list_snapshot, result)
         self.sync_api()
 
     def on_delete_source_failure(self, result: Exception) -> None:
@@ -773,11 +901,14 @@ class Controller(QObject):
             self.on_action_requiring_login()
             return
 
-        job = DeleteSourceJob(source.uuid)
+        job = self._create_delete_source_job(source.uuid)
+        self.api_job_queue.enqueue(job)
+
+    def _create_delete_source_job(self, source_uuid: str) -> DeleteSourceJob:
+        job = DeleteSourceJob(source_uuid)
         job.success_signal.connect(self.on_delete_source_success, type=Qt.QueuedConnection)
         job.failure_signal.connect(self.on_delete_source_failure, type=Qt.QueuedConnection)
-
-        self.api_job_queue.enqueue(job)
+        return job
 
     def send_reply(self, source_uuid: str, reply_uuid: str, message: str) -> None:
         """
@@ -800,6 +931,11 @@ class Controller(QObject):
         self.session.add(draft_reply)
         self.session.commit()
 
+        job = self._create_send_reply_job(source_uuid, reply_uuid, message)
+        self.api_job_queue.enqueue(job)
+
+    def _create_send_reply_job(self, source_uuid: str, reply_uuid: str,
+                               message: str) -> SendReplyJob:
         job = SendReplyJob(
             source_uuid,
             reply_uuid,
@@ -808,11 +944,41 @@ class Controller(QObject):
         )
         job.success_signal.connect(self.on_reply_success, type=Qt.QueuedConnection)
         job.failure_signal.connect(self.on_reply_failure, type=Qt.QueuedConnection)
-
-        self.api_job_queue.enqueue(job)
+        return job
+
+    def _restore_job(self, job_type: str, args: Dict[str, Any]) -> Optional[ApiJob]:
+        """
+        Re-create a job that was still pending when the client last exited from its type name and
+        persistent arguments, connected to the same handlers as a job submitted in this session.
+
+        Return None if the job is no longer needed: downloads of files that were deleted since, and
+        replies whose draft no longer exists. Drafts whose reply is restored are marked as pending
+        again, and the reply is sent with the content of the draft.
+        """
+        if job_type == 'FileDownloadJob':
+            if not self.session.query(db.File).filter_by(uuid=args['uuid']).one_or_none():
+                return None
+            return self._create_download_job(db.File, args['uuid'])
+        elif job_type == 'UpdateStarJob':
+            return self._create_update_star_job(args['source_uuid'], args['star_status'])
+        elif job_type == 'DeleteSourceJob':
+            return self._create_delete_source_job(args['source_uuid'])
+        elif job_type == 'SendReplyJob':
+            draft_reply = self.session.query(db.DraftReply).filter_by(
+                uuid=args['reply_uuid']).one_or_none()
+            if not draft_reply:
+                return None
+            draft_reply.send_status = self.session.query(db.ReplySendStatus).filter_by(
+                name=db.ReplySendStatusCodes.PENDING.value).one()
+            self.session.commit()
+            return self._create_send_reply_job(
+                args['source_uuid'], args['reply_uuid'], draft_reply.content)
+
+        logger.error('Cannot restore job of unknown type {}'.format(job_type))
+        return None
 
     def on_reply_success(self, reply_uuid: str) -> None:
-        logger.debug('{} sent successfully'.format(reply_uuid))
+        logger.debug('%s sent successfully', reply_uuid)
         self.gui.clear_error_status()  # remove any permanent error status message
         self.reply_succeeded.emit(reply_uuid)
         self.sync_api()
@@ -821,7 +987,7 @@ class Controller(QObject):
         self,
         exception: Union[SendReplyJobError, SendReplyJobTimeoutError]
     ) -> None:
-        logger.debug('{} failed to send'.format(exception.reply_uuid))
+        logger.debug('%s failed to send', exception.reply_uuid)
         self.reply_failed.emit(exception.reply_uuid)
 
     def get_file(self, file_uuid: str) -> db.File:
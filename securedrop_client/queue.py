@@ -1,17 +1,23 @@
 import itertools
+import json
 import logging
+import os
+import sqlite3
+import threading
 
-from PyQt5.QtCore import QObject, QThread, pyqtSlot, pyqtSignal
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSlot, pyqtSignal
 from queue import PriorityQueue
 from sdclientapi import API, RequestTimeoutError
 from sqlalchemy.orm import scoped_session
-from typing import Optional, Tuple  # noqa: F401
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple  # noqa: F401
 
 from securedrop_client.api_jobs.base import ApiJob, ApiInaccessibleError, DEFAULT_NUM_ATTEMPTS, \
-    PauseQueueJob
+    PauseQueueJob, RetryLaterError
 from securedrop_client.api_jobs.downloads import (FileDownloadJob, MessageDownloadJob,
                                                   ReplyDownloadJob, MetadataSyncJob)
 from securedrop_client.api_jobs.sources import DeleteSourceJob
+from securedrop_client.api_jobs.stats import JobStatistics
+from securedrop_client.api_jobs.timeouts import TimeoutModel
 from securedrop_client.api_jobs.uploads import SendReplyJob
 from securedrop_client.api_jobs.updatestar import UpdateStarJob
 
@@ -19,6 +25,155 @@ from securedrop_client.api_jobs.updatestar import UpdateStarJob
 logger = logging.getLogger(__name__)
 
 
+PendingJob = NamedTuple('PendingJob', [
+    ('id', int),
+    ('job_type', str),
+    ('args', Dict[str, Any]),
+    ('priority', int),
+    ('order_number', int),
+    ('remaining_attempts', int),
+])
+
+
+class JobStore:
+    '''
+    JobStore keeps a durable record of the jobs waiting in the queues in a SQLite database next to
+    the client database, so that work such as replies, stars and downloads that is still pending
+    when the client exits or crashes can be restored at the next login.
+
+    A job is recorded when it is added to a queue, its remaining attempts are updated when it is put
+    back in the queue, and it is forgotten once it has finished, whether it succeeded or failed.
+    Only jobs that return arguments from ApiJob.get_persistent_args are recorded. Every change is
+    committed straight away, and SQLite's journal makes each commit atomic, so the record survives
+    a crash at any point.
+
+    The database is opened when it is first used, since the client's home directory may not have
+    been created yet when the store is. The record is shared by the queue threads and the main
+    thread, so access to the connection is serialized with a lock. Errors are logged rather than
+    raised: failing to record a job must not stop the queues from processing it.
+    '''
+
+    FILENAME = 'queue.sqlite'
+
+    def __init__(self, home: str) -> None:
+        self.path = os.path.join(home, self.FILENAME)
+        self._lock = threading.Lock()
+        self._connection = None  # type: Optional[sqlite3.Connection]
+
+    def _connect(self) -> sqlite3.Connection:
+        '''
+        Return the connection to the database, opening it and creating the table of jobs first if
+        needed. Must be called with the lock held.
+        '''
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            with connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS jobs ('
+                    'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                    'job_type TEXT NOT NULL, '
+                    'args TEXT NOT NULL, '
+                    'priority INTEGER NOT NULL, '
+                    'order_number INTEGER NOT NULL, '
+                    'remaining_attempts INTEGER NOT NULL)')
+            self._connection = connection
+        return self._connection
+
+    def add(self, job: ApiJob, priority: int) -> None:
+        '''
+        Record the job if it can be restored and has not been recorded yet.
+        '''
+        if job.store_id is not None:
+            self.update(job)
+            return
+
+        args = job.get_persistent_args()
+        if args is None:
+            return
+
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    cursor = connection.execute(
+                        'INSERT INTO jobs '
+                        '(job_type, args, priority, order_number, remaining_attempts) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (type(job).__name__, json.dumps(args), priority, job.order_number,
+                         job.remaining_attempts))
+            job.store_id = cursor.lastrowid
+        except sqlite3.Error as e:
+            logger.error('Could not record job {}: {}'.format(job, e))
+
+    def update(self, job: ApiJob) -> None:
+        '''
+        Update the remaining attempts of a recorded job.
+        '''
+        if job.store_id is None:
+            return
+
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute('UPDATE jobs SET remaining_attempts = ? WHERE id = ?',
+                                       (job.remaining_attempts, job.store_id))
+        except sqlite3.Error as e:
+            logger.error('Could not update job {}: {}'.format(job, e))
+
+    def remove(self, job: ApiJob) -> None:
+        '''
+        Forget a recorded job.
+        '''
+        if job.store_id is None:
+            return
+
+        self.remove_pending_job(job.store_id)
+        job.store_id = None
+
+    def remove_pending_job(self, store_id: int) -> None:
+        '''
+        Forget the recorded job with the given id.
+        '''
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute('DELETE FROM jobs WHERE id = ?', (store_id,))
+        except sqlite3.Error as e:
+            logger.error('Could not forget job {}: {}'.format(store_id, e))
+
+    def get_pending_jobs(self) -> List[PendingJob]:
+        '''
+        Return the recorded jobs in the order in which they were first added to a queue.
+        '''
+        try:
+            with self._lock:
+                rows = self._connect().execute(
+                    'SELECT id, job_type, args, priority, order_number, remaining_attempts '
+                    'FROM jobs ORDER BY id').fetchall()
+        except sqlite3.Error as e:
+            logger.error('Could not read pending jobs: {}'.format(e))
+            return []
+
+        pending_jobs = []
+        for id, job_type, args, priority, order_number, remaining_attempts in rows:
+            try:
+                pending_jobs.append(PendingJob(
+                    id, job_type, json.loads(args), priority, order_number, remaining_attempts))
+            except ValueError as e:
+                logger.error('Could not read pending job {}: {}'.format(id, e))
+                self.remove_pending_job(id)
+
+        return pending_jobs
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
 class RunnableQueue(QObject):
     '''
     RunnableQueue maintains a priority queue and processes jobs in that queue. It continuously
@@ -32,10 +187,21 @@ class RunnableQueue(QObject):
     New jobs can still be added, but the processing function will need to be called again in order
     to resume. The processing loop is resumed when the resume signal is emitted.
 
+    If a job times out and its retry policy asks for a delay before the next attempt, the job is
+    kept out of the queue until the delay has passed, so that it does not hold up other jobs while
+    it waits. It is then put back in its original position. A delayed job can also be put back
+    before its delay has passed with re_add_delayed_job, e.g. when the user is waiting for it.
+
     Any other exception encountered while processing a job is unexpected, so the queue will drop the
     job and continue on to processing the next job. The job itself is responsible for emiting the
     success and failure signals, so when an unexpected error occurs, it should emit the failure
     signal so that the Controller can respond accordingly.
+
+    If the queue has a JobStore, jobs are recorded in it from the time they are added to the queue
+    until they finish, so that they can be restored if the client exits before then.
+
+    The time each job waits in the queue, the time it runs and how the run ends are recorded in the
+    queue's JobStatistics.
     '''
 
     # These are the priorities for processing jobs. Lower numbers corresponds to a higher priority.
@@ -61,11 +227,22 @@ class RunnableQueue(QObject):
     '''
     resume = pyqtSignal()
 
-    def __init__(self, api_client: API, session_maker: scoped_session) -> None:
+    def __init__(self, api_client: API, session_maker: scoped_session,
+                 timeout_model: Optional[TimeoutModel] = None,
+                 job_store: Optional[JobStore] = None,
+                 statistics: Optional[JobStatistics] = None) -> None:
         super().__init__()
         self.api_client = api_client
         self.session_maker = session_maker
+        self.timeout_model = timeout_model or TimeoutModel()
+        self.job_store = job_store
+        self.statistics = statistics or JobStatistics()
         self.queue = PriorityQueue()  # type: PriorityQueue[Tuple[int, ApiJob]]
+
+        # Jobs waiting out a delay before they are retried, with the timers that will put them back
+        # into the queue. The timers run on their own threads, hence the lock.
+        self.delayed_jobs = {}  # type: Dict[ApiJob, threading.Timer]
+        self.delayed_jobs_lock = threading.Lock()
         # `order_number` ensures jobs with equal priority are retrived in FIFO order. This is needed
         # because PriorityQueue is implemented using heapq which does not have sort stability. For
         # more info, see : https://bugs.python.org/issue17794
@@ -76,12 +253,17 @@ class RunnableQueue(QObject):
 
     def add_job(self, job: ApiJob) -> None:
         '''
-        Add the job with its priority to the queue after assigning it the next order_number.
+        Add the job with its priority to the queue after assigning it the next order_number and
+        the queue's timeout model, and record it in the job store.
         '''
         current_order_number = next(self.order_number)
         job.order_number = current_order_number
         priority = self.JOB_PRIORITIES[type(job)]
-        self.queue.put_nowait((priority, job))
+        if isinstance(job, ApiJob):
+            job.timeout_model = self.timeout_model
+            if self.job_store:
+                self.job_store.add(job, priority)
+        self._put(priority, job)
 
     def re_add_job(self, job: ApiJob) -> None:
         '''
@@ -89,7 +271,64 @@ class RunnableQueue(QObject):
         was submitted by the user (do not assign it the next order_number).
         '''
         job.remaining_attempts = DEFAULT_NUM_ATTEMPTS
+        job.retry_count = 0
+        if self.job_store:
+            self.job_store.update(job)
+        priority = self.JOB_PRIORITIES[type(job)]
+        self._put(priority, job)
+
+    def re_add_job_later(self, job: ApiJob, delay: float) -> None:
+        '''
+        Put the job back into the queue in the order in which it was submitted by the user once
+        `delay` seconds have passed, keeping its remaining attempts.
+        '''
+        if self.job_store:
+            self.job_store.update(job)
+        timer = threading.Timer(delay, self.re_add_delayed_job, args=[job])
+        timer.daemon = True
+        with self.delayed_jobs_lock:
+            self.delayed_jobs[job] = timer
+        timer.start()
+
+    def re_add_delayed_job(self, job: ApiJob) -> bool:
+        '''
+        Put a job that is waiting out its delay back into the queue now, in the order in which it
+        was submitted by the user. Return False if the job is not waiting.
+        '''
+        with self.delayed_jobs_lock:
+            timer = self.delayed_jobs.pop(job, None)
+
+        if timer is None:
+            return False
+
+        timer.cancel()
         priority = self.JOB_PRIORITIES[type(job)]
+        self._put(priority, job)
+        return True
+
+    def re_add_delayed_jobs(self) -> None:
+        '''
+        Put all jobs that are waiting out their delay back into the queue now.
+        '''
+        with self.delayed_jobs_lock:
+            jobs = list(self.delayed_jobs)
+
+        for job in jobs:
+            self.re_add_delayed_job(job)
+
+    def get_queued_jobs(self) -> List[ApiJob]:
+        '''
+        Return the API jobs waiting in the queue.
+        '''
+        with self.queue.mutex:
+            return [job for priority, job in self.queue.queue if isinstance(job, ApiJob)]
+
+    def _put(self, priority: int, job: ApiJob) -> None:
+        '''
+        Put the job into the queue, recording when it started waiting.
+        '''
+        if isinstance(job, ApiJob):
+            self.statistics.job_enqueued(job)
         self.queue.put_nowait((priority, job))
 
     @pyqtSlot()
@@ -104,6 +343,11 @@ class RunnableQueue(QObject):
         (1) Add a PauseQueuejob to the queue
         (2) Add the job back to the queue so that it can be reprocessed once the queue is resumed.
 
+        If the job raises RetryLaterError, add the job back to the queue once the delay has passed.
+
+        Once the job has finished, whether it succeeded or raised any other exception, remove it
+        from the job store.
+
         Note: Generic exceptions are handled in _do_call_api.
         '''
         while True:
@@ -114,19 +358,40 @@ class RunnableQueue(QObject):
                 self.paused.emit()
                 return
 
+            self.statistics.job_started(job)
             try:
                 session = self.session_maker()
                 job._do_call_api(self.api_client, session)
+            except RetryLaterError as e:
+                logger.debug('Job %s timed out: %s', job, e)
+                self.statistics.job_finished(job, JobStatistics.RETRY_LATER)
+                self.re_add_job_later(job, e.delay)
             except (RequestTimeoutError, ApiInaccessibleError) as e:
-                logger.debug('Job {} raised an exception: {}: {}'.format(self, type(e).__name__, e))
+                logger.debug('Job %s raised an exception: %s: %s', self, type(e).__name__, e)
+                if isinstance(e, RequestTimeoutError):
+                    self.statistics.job_finished(job, JobStatistics.TIMEOUT)
+                else:
+                    self.statistics.job_finished(job, JobStatistics.INACCESSIBLE)
                 self.add_job(PauseQueueJob())
                 self.re_add_job(job)
             except Exception as e:
                 logger.error('Job {} raised an exception: {}: {}'.format(self, type(e).__name__, e))
                 logger.error('Skipping job')
+                self.statistics.job_finished(job, JobStatistics.FAILURE)
+                self._forget_job(job)
+            else:
+                self.statistics.job_finished(job, JobStatistics.SUCCESS)
+                self._forget_job(job)
             finally:
                 session.close()
 
+    def _forget_job(self, job: ApiJob) -> None:
+        '''
+        Remove a finished job from the job store.
+        '''
+        if self.job_store:
+            self.job_store.remove(job)
+
 
 class ApiJobQueue(QObject):
     '''
@@ -134,14 +399,33 @@ class ApiJobQueue(QObject):
     '''
     paused = pyqtSignal()
 
-    def __init__(self, api_client: API, session_maker: scoped_session) -> None:
+    def __init__(self, api_client: API, session_maker: scoped_session,
+                 job_store: Optional[JobStore] = None) -> None:
         super().__init__(None)
 
         self.main_thread = QThread()
         self.download_file_thread = QThread()
 
-        self.main_queue = RunnableQueue(api_client, session_maker)
-        self.download_file_queue = RunnableQueue(api_client, session_maker)
+        # Both queues talk to the same server over the same network, so they learn request timeouts
+        # together.
+        self.timeout_model = TimeoutModel()
+
+        # Jobs from both queues are recorded in the same store, so that they can be restored in the
+        # order in which they were submitted.
+        self.job_store = job_store
+        self.restored_jobs = False
+
+        # Statistics of the jobs run by both queues, written to the log periodically while logged
+        # in even if no job finishes, so that a stalled queue still reports
+        self.statistics = JobStatistics()
+        self.statistics_timer = QTimer(self)
+        self.statistics_timer.setInterval(JobStatistics.LOG_INTERVAL * 1000)
+        self.statistics_timer.timeout.connect(self.statistics.log_statistics_if_due)
+
+        self.main_queue = RunnableQueue(
+            api_client, session_maker, self.timeout_model, job_store, self.statistics)
+        self.download_file_queue = RunnableQueue(
+            api_client, session_maker, self.timeout_model, job_store, self.statistics)
 
         self.main_queue.moveToThread(self.main_thread)
         self.download_file_queue.moveToThread(self.download_file_thread)
@@ -156,10 +440,22 @@ class ApiJobQueue(QObject):
         self.main_queue.api_client = None
         self.download_file_queue.api_client = None
 
+        # Jobs waiting to be retried go back into the queues with all other pending jobs rather
+        # than reappearing once their delay has passed.
+        self.main_queue.re_add_delayed_jobs()
+        self.download_file_queue.re_add_delayed_jobs()
+
+        # Stop tracking jobs that left the queues without being run, and report what is left
+        self.statistics.forget_waiting_jobs(
+            self.main_queue.get_queued_jobs() + self.download_file_queue.get_queued_jobs())
+        self.statistics_timer.stop()
+        self.statistics.log_statistics()
+
     def login(self, api_client: API) -> None:
         logger.debug('Passing API token to queues')
         self.main_queue.api_client = api_client
         self.download_file_queue.api_client = api_client
+        self.statistics_timer.start()
         self.start_queues()
 
     def start_queues(self) -> None:
@@ -172,6 +468,7 @@ class ApiJobQueue(QObject):
             self.download_file_thread.start()
 
     def on_queue_paused(self) -> None:
+        self.statistics.log_statistics()
         self.paused.emit()
 
     def resume_queues(self) -> None:
@@ -180,11 +477,28 @@ class ApiJobQueue(QObject):
         self.main_queue.resume.emit()
         self.download_file_queue.resume.emit()
 
-    def enqueue(self, job: ApiJob) -> None:
+    def re_add_delayed_job(self, job: ApiJob) -> bool:
+        '''
+        Retry a job that is waiting out its delay now. Return False if the job is not waiting.
+        '''
+        return self.main_queue.re_add_delayed_job(job) or \
+            self.download_file_queue.re_add_delayed_job(job)
+
+    def get_statistics(self) -> Dict[str, Dict[str, Any]]:
+        '''
+        Return the statistics of the most recent runs of each job type, see
+        JobStatistics.get_statistics.
+        '''
+        return self.statistics.get_statistics()
+
+    def enqueue(self, job: ApiJob) -> bool:
+        '''
+        Add the job to its queue. Return False if it was not added because we are not logged in.
+        '''
         # Prevent api jobs being added to the queue when not logged in.
         if not self.main_queue.api_client or not self.download_file_queue.api_client:
             logger.info('Not adding job, we are not logged in')
-            return
+            return False
 
         # First check the queues are started in case they died for some reason.
         self.start_queues()
@@ -195,3 +509,46 @@ class ApiJobQueue(QObject):
         else:
             logger.debug('Adding job to main queue')
             self.main_queue.add_job(job)
+
+        return True
+
+    def restore_jobs(self, restore_job: Callable[[str, Dict[str, Any]], Optional[ApiJob]]) -> None:
+        '''
+        Re-enqueue the jobs that were still pending when the client last exited, in the order in
+        which they were submitted, with the attempts they had left.
+
+        `restore_job` re-creates a job from its type name and persistent arguments, or returns None
+        if the job is no longer needed. Jobs cannot be enqueued before the first login, so the jobs
+        in the store at that point are all from an earlier run of the client. Jobs are only restored
+        once so that jobs submitted since then are not enqueued twice.
+
+        The record of a pending job is only removed once the restored job has been enqueued, and
+        recorded again, or if it is no longer needed, so that jobs that could not be enqueued are
+        restored at the next login.
+        '''
+        if not self.job_store or self.restored_jobs:
+            return
+
+        # Jobs are not enqueued when we are not logged in, so keep them for the next login
+        if not self.main_queue.api_client or not self.download_file_queue.api_client:
+            logger.info('Not restoring jobs, we are not logged in')
+            return
+
+        self.restored_jobs = True
+
+        for pending_job in self.job_store.get_pending_jobs():
+            try:
+                job = restore_job(pending_job.job_type, pending_job.args)
+            except Exception as e:
+                logger.error('Could not restore {} job: {}: {}'.format(
+                    pending_job.job_type, type(e).__name__, e))
+                job = None
+
+            if job:
+                logger.debug('Restoring %s job', pending_job.job_type)
+                job.remaining_attempts = max(pending_job.remaining_attempts, 1)
+                if not self.enqueue(job):
+                    continue
+
+            # The restored job is recorded again when it is enqueued
+            self.job_store.remove_pending_job(pending_job.id)
@@ -18,15 +18,56 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 import os
+import re
 
-from pkg_resources import resource_filename, resource_string
-from PyQt5.QtGui import QPixmap, QIcon, QFontDatabase
-from PyQt5.QtSvg import QSvgWidget
-from PyQt5.QtCore import QDir
+from typing import Dict, Iterable, Optional, Set, Tuple  # noqa: F401
+
+from PyQt5.QtGui import QFont, QFontDatabase, QGuiApplication, QIcon, QPainter, QPixmap, \
+    QPixmapCache
+from PyQt5.QtSvg import QSvgRenderer, QSvgWidget
+from PyQt5.QtCore import QDir, QSize, Qt
+from PyQt5.QtWidgets import QWidget
+
+# The directory of the resources, found once rather than on each lookup. importlib.resources.files
+# only exists from Python 3.9, and before that the resources are next to this module.
+try:
+    from importlib.resources import files as resource_files
+    RESOURCES_DIR = str(resource_files(__name__))
+except ImportError:
+    RESOURCES_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Add resource directories to the search path.
-QDir.addSearchPath('images', resource_filename(__name__, 'images'))
-QDir.addSearchPath('css', resource_filename(__name__, 'css'))
+QDir.addSearchPath('images', os.path.join(RESOURCES_DIR, 'images'))
+QDir.addSearchPath('css', os.path.join(RESOURCES_DIR, 'css'))
+
+# Icons already loaded, keyed by the SVG files of their modes and states. A QIcon renders its SVG
+# files once per size it is drawn at, so widgets sharing an icon also share what it rendered.
+_icons = {}  # type: Dict[Tuple[Optional[str], ...], QIcon]
+
+# The folder of the font files of each font family stylesheets can use
+FONT_FOLDERS = {
+    'Montserrat': 'Montserrat',
+    'Source Sans Pro': 'Source_Sans_Pro',
+}
+
+# The weight Qt gives the font files of each style, as named at the end of their file names
+FONT_WEIGHTS = {
+    'Thin': QFont.Thin,
+    'ExtraLight': QFont.ExtraLight,
+    'Light': QFont.Light,
+    'Regular': QFont.Normal,
+    'Medium': QFont.Medium,
+    'SemiBold': QFont.DemiBold,
+    'Bold': QFont.Bold,
+    'ExtraBold': QFont.ExtraBold,
+    'Black': QFont.Black,
+}
+
+# The font files already added to the font database, with the IDs the database gave them
+_fonts = {}  # type: Dict[str, int]
+
+# The stylesheets whose font files were added to the font database
+_stylesheets_with_fonts = set()  # type: Set[str]
 
 
 def path(name: str, resource_dir: str = "images/") -> str:
@@ -35,14 +76,96 @@ def path(name: str, resource_dir: str = "images/") -> str:
 
     Qt uses unix path conventions.
     """
-    return resource_filename(__name__, resource_dir + name)
+    return os.path.join(RESOURCES_DIR, resource_dir + name)
+
+
+def add_font_file(filename: str) -> None:
+    """
+    Add the font file to the font database, unless it was added already.
+    """
+    if filename not in _fonts:
+        _fonts[filename] = QFontDatabase.addApplicationFont(filename)
 
 
 def load_font(font_folder_name: str) -> None:
-    directory = resource_filename(__name__, 'fonts/') + font_folder_name
+    """
+    Add all the font files in the folder to the font database.
+    """
+    directory = os.path.join(RESOURCES_DIR, 'fonts', font_folder_name)
     for filename in os.listdir(directory):
         if filename.endswith(".ttf"):
-            QFontDatabase.addApplicationFont(directory + '/' + filename)
+            add_font_file(directory + '/' + filename)
+
+
+def load_font_weights(font_folder_name: str, weights: Iterable[int]) -> None:
+    """
+    Add the upright font files of the given QFont weights in the folder to the font database.
+
+    For a weight without a font file of its own, the font files of the nearest lighter and heavier
+    weights are added, since Qt chooses between those when it matches the weight.
+    """
+    directory = os.path.join(RESOURCES_DIR, 'fonts', font_folder_name)
+    files = {}  # type: Dict[int, str]
+    for filename in os.listdir(directory):
+        name, extension = os.path.splitext(filename)
+        style = name.rsplit('-', 1)[-1]
+        if extension == '.ttf' and style in FONT_WEIGHTS:
+            files[FONT_WEIGHTS[style]] = filename
+
+    for weight in weights:
+        lighter = [file_weight for file_weight in files if file_weight <= weight]
+        heavier = [file_weight for file_weight in files if file_weight >= weight]
+        for file_weight in {max(lighter, default=None), min(heavier, default=None)}:
+            if file_weight is not None:
+                add_font_file(directory + '/' + files[file_weight])
+
+
+def load_stylesheet_fonts(stylesheets: Iterable[str]) -> None:
+    """
+    Add the font files that the rules of the stylesheets use to the font database, leaving out the
+    weights and italics that no rule uses. A rule without a font-weight uses the normal weight.
+
+    Qt converts the numeric weights of stylesheets to QFont weights by dividing them by 8, so for
+    example font-weight: 600 selects the Bold font files rather than the SemiBold ones.
+
+    Stylesheets whose font files were already added are skipped without reading them again.
+    """
+    weights = {}  # type: Dict[str, Set[int]]
+    for stylesheet in stylesheets:
+        if stylesheet in _stylesheets_with_fonts:
+            continue
+        _stylesheets_with_fonts.add(stylesheet)
+        for rule in re.findall(r'\{([^}]*)\}', stylesheet):
+            family = re.search(r'font-family:\s*([^;]+)', rule)
+            if not family:
+                continue
+            family_name = family.group(1).strip().strip('\'"')
+            if family_name not in FONT_FOLDERS:
+                continue
+
+            weight = re.search(r'font-weight:\s*(\w+)', rule)
+            if not weight or weight.group(1) == 'normal':
+                weight_value = QFont.Normal
+            elif weight.group(1) == 'bold':
+                weight_value = QFont.Bold
+            else:
+                weight_value = min(int(weight.group(1)) // 8, 99)
+            weights.setdefault(FONT_FOLDERS[family_name], set()).add(weight_value)
+
+    for font_folder_name, font_weights in weights.items():
+        load_font_weights(font_folder_name, font_weights)
+
+
+def set_stylesheet(widget: QWidget, stylesheet: str) -> None:
+    """
+    Set the stylesheet of the widget, adding the font files it uses to the font database first.
+
+    Qt does not ask for a font file when a stylesheet uses a font that is missing from the font
+    database, so the font files of a widget's stylesheet are added when the first widget with that
+    stylesheet is created, rather than all at startup.
+    """
+    load_stylesheet_fonts([stylesheet])
+    widget.setStyleSheet(stylesheet)
 
 
 def load_icon(
@@ -85,6 +208,9 @@ def load_icon(
         The icon that displays the contents of the SVG files.
 
     """
+    key = (normal, disabled, active, selected, normal_off, disabled_off, active_off, selected_off)
+    if key in _icons:
+        return QIcon(_icons[key])
 
     icon = QIcon()
 
@@ -111,7 +237,8 @@ def load_icon(
     if selected_off:
         icon.addFile(path(selected_off), mode=QIcon.Selected, state=QIcon.Off)
 
-    return icon
+    _icons[key] = icon
+    return QIcon(icon)
 
 
 def load_svg(name: str) -> QSvgWidget:
@@ -121,15 +248,62 @@ def load_svg(name: str) -> QSvgWidget:
     return QSvgWidget(path(name))
 
 
+def device_pixel_ratio():
+    """
+    Return the ratio of device pixels to logical pixels of the application's screens.
+    """
+    return QGuiApplication.instance().devicePixelRatio()
+
+
+def load_svg_pixmap(name: str, size: Optional[QSize] = None) -> QPixmap:
+    """
+    Return a QPixmap of an SVG file in the resources rendered at the given size, or at the size
+    the SVG file specifies if no size is given.
+
+    The pixmap is rendered for the device pixel ratio of the application and kept in the
+    QPixmapCache, so that widgets showing the same SVG file at the same size share one rendering.
+    """
+    renderer = None
+    if not size or not size.isValid():
+        renderer = QSvgRenderer(path(name))
+        size = renderer.defaultSize()
+
+    ratio = device_pixel_ratio()
+    key = 'svg:{}:{}x{}@{}'.format(name, size.width(), size.height(), ratio)
+    pixmap = QPixmapCache.find(key)
+    if pixmap is None:
+        if renderer is None:
+            renderer = QSvgRenderer(path(name))
+        pixmap = QPixmap(size * ratio)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        renderer.render(painter)
+        painter.end()
+        pixmap.setDevicePixelRatio(ratio)
+        QPixmapCache.insert(key, pixmap)
+
+    return pixmap
+
+
 def load_image(name: str) -> QPixmap:
     """
     Return a QPixmap representation of a file in the resources.
+
+    The pixmap is kept in the QPixmapCache, so that the file is only read and rendered again once
+    the cache has dropped it.
     """
-    return QPixmap(path(name))
+    key = 'image:{}'.format(name)
+    pixmap = QPixmapCache.find(key)
+    if pixmap is None:
+        pixmap = QPixmap(path(name))
+        QPixmapCache.insert(key, pixmap)
+
+    return pixmap
 
 
 def load_css(name: str) -> str:
     """
     Return the contents of the referenced CSS file in the resources.
     """
-    return resource_string(__name__, "css/" + name).decode('utf-8')
+    with open(os.path.join(RESOURCES_DIR, 'css', name), encoding='utf-8') as f:
+        return f.read()
@@ -19,14 +19,17 @@ GNU Affero General Public License for more details.
 You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+from contextlib import contextmanager
 from datetime import datetime
 import logging
 import glob
+import json
 import os
+import time
 from dateutil.parser import parse
-from typing import List, Tuple, Type, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Type, Union  # noqa: F401
 
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, bindparam, desc, func, literal, null, or_, select, union_all
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.session import Session
 
@@ -39,6 +42,93 @@ from sdclientapi import Reply as SDKReply
 
 logger = logging.getLogger(__name__)
 
+# Name of the directory, relative to the data directory, where partially downloaded submissions are
+# staged until they are complete.
+PARTIAL_DOWNLOADS_DIR = 'partial'
+
+# Number of sources, from the top of the source list, kept in the source list snapshot. That is more
+# than the source list shows at once on a screen 1920 pixels tall.
+SOURCE_LIST_SNAPSHOT_SIZE = 20
+
+# The query for the newest item of the conversation with a source, see
+# get_latest_conversation_item. It is run for each row of the source list, and compiling it takes
+# longer than running it, so it is built once and its compiled form is cached. Only draft replies
+# have a timestamp, which orders them after the item they follow.
+_CONVERSATION_ITEM_MODELS = {
+    model.__name__: model for model in (Message, File, Reply, DraftReply)
+}  # type: Dict[str, Union[Type[Message], Type[File], Type[Reply], Type[DraftReply]]]
+_LATEST_CONVERSATION_ITEM = union_all(*[
+    select([literal(name).label('model'), model.id.label('id'),
+            model.file_counter.label('file_counter'),
+            (model.timestamp if model is DraftReply else null()).label('timestamp')])
+    .where(model.source_id == bindparam('source_id'))
+    for name, model in _CONVERSATION_ITEM_MODELS.items()
+]).order_by(desc('file_counter'), desc('timestamp')).limit(1)
+_compiled_statements = {}  # type: Dict
+
+
+class SyncReport:
+    """
+    Time the stages of a sync with the server, so that a slow sync can be traced to the stage that
+    slowed down.
+
+    Stages are timed with the stage context manager and reported in the order in which they first
+    ran. A stage that runs more than once, like fetching the submissions of each source, is reported
+    once with its total time and the number of times it ran. Stages can be nested, e.g. the commit
+    at the end of a reconcile step is timed on its own and as part of the step.
+    """
+
+    def __init__(self) -> None:
+        self.durations = {}  # type: Dict[str, float]
+        self.calls = {}  # type: Dict[str, int]
+        self.counts = {}  # type: Dict[str, int]
+        self.start = time.monotonic()
+        self.end = None  # type: Optional[float]
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time the stage run in the context.
+        """
+        self.durations.setdefault(name, 0.0)
+        self.calls.setdefault(name, 0)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.durations[name] += time.monotonic() - start
+            self.calls[name] += 1
+
+    def count(self, name: str, value: int) -> None:
+        """
+        Record the number of items of the given kind handled by the sync, e.g. remote sources.
+        """
+        self.counts[name] = value
+
+    def finish(self) -> None:
+        """
+        Mark the end of the sync.
+        """
+        self.end = time.monotonic()
+
+    @property
+    def duration(self) -> float:
+        """
+        Return the time the sync took, so far if it has not finished.
+        """
+        end = self.end if self.end is not None else time.monotonic()
+        return end - self.start
+
+    def __str__(self) -> str:
+        stages = []
+        for name, duration in self.durations.items():
+            if self.calls[name] > 1:
+                stages.append('{} {:.3f}s ({} calls)'.format(name, duration, self.calls[name]))
+            else:
+                stages.append('{} {:.3f}s'.format(name, duration))
+        counts = ', '.join('{} {}'.format(value, name) for name, value in self.counts.items())
+        return 'Sync took {:.3f}s ({}): {}'.format(self.duration, counts, ', '.join(stages))
+
 
 def get_local_sources(session: Session) -> List[Source]:
     """
@@ -68,24 +158,34 @@ def get_local_replies(session: Session) -> List[Reply]:
     return session.query(Reply).all()
 
 
-def get_remote_data(api: API) -> Tuple[List[SDKSource], List[SDKSubmission], List[SDKReply]]:
+def get_remote_data(api: API, report: Optional[SyncReport] = None
+                    ) -> Tuple[List[SDKSource], List[SDKSubmission], List[SDKReply]]:
     """
     Given an authenticated connection to the SecureDrop API, get sources,
     submissions and replies from the remote server and return a tuple
     containing lists of objects representing this data:
 
     (remote_sources, remote_submissions, remote_replies)
+
+    If a sync report is given, the requests are timed in it.
     """
+    report = report or SyncReport()
     remote_submissions = []  # type: List[SDKSubmission]
-    remote_sources = api.get_sources()
+    with report.stage('get_sources'):
+        remote_sources = api.get_sources()
     for source in remote_sources:
-        remote_submissions.extend(api.get_submissions(source))
-    remote_replies = api.get_all_replies()
+        with report.stage('get_submissions'):
+            remote_submissions.extend(api.get_submissions(source))
+    with report.stage('get_all_replies'):
+        remote_replies = api.get_all_replies()
 
-    logger.info('Fetched {} remote sources.'.format(len(remote_sources)))
-    logger.info('Fetched {} remote submissions.'.format(
-        len(remote_submissions)))
-    logger.info('Fetched {} remote replies.'.format(len(remote_replies)))
+    report.count('sources', len(remote_sources))
+    report.count('submissions', len(remote_submissions))
+    report.count('replies', len(remote_replies))
+
+    logger.info('Fetched %s remote sources.', len(remote_sources))
+    logger.info('Fetched %s remote submissions.', len(remote_submissions))
+    logger.info('Fetched %s remote replies.', len(remote_replies))
 
     return (remote_sources, remote_submissions, remote_replies)
 
@@ -94,12 +194,16 @@ def update_local_storage(session: Session,
                          remote_sources: List[SDKSource],
                          remote_submissions: List[SDKSubmission],
                          remote_replies: List[SDKReply],
-                         data_dir: str) -> None:
+                         data_dir: str,
+                         report: Optional[SyncReport] = None) -> None:
     """
     Given a database session and collections of remote sources, submissions and
     replies from the SecureDrop API, ensures the local database is updated
     with this data.
+
+    If a sync report is given, each step is timed in it.
     """
+    report = report or SyncReport()
 
     remote_messages = [x for x in remote_submissions if x.filename.endswith('msg.gpg')]
     remote_files = [x for x in remote_submissions if not x.filename.endswith('msg.gpg')]
@@ -107,14 +211,19 @@ def update_local_storage(session: Session,
     # The following update_* functions may change the database state.
     # Because of that, each get_local_* function needs to be called just before
     # its respective update_* function.
-    update_sources(remote_sources, get_local_sources(session), session, data_dir)
-    update_files(remote_files, get_local_files(session), session, data_dir)
-    update_messages(remote_messages, get_local_messages(session), session, data_dir)
-    update_replies(remote_replies, get_local_replies(session), session, data_dir)
+    with report.stage('update_sources'):
+        update_sources(remote_sources, get_local_sources(session), session, data_dir, report)
+    with report.stage('update_files'):
+        update_files(remote_files, get_local_files(session), session, data_dir, report)
+    with report.stage('update_messages'):
+        update_messages(remote_messages, get_local_messages(session), session, data_dir, report)
+    with report.stage('update_replies'):
+        update_replies(remote_replies, get_local_replies(session), session, data_dir, report)
 
 
 def update_sources(remote_sources: List[SDKSource],
-                   local_sources: List[Source], session: Session, data_dir: str) -> None:
+                   local_sources: List[Source], session: Session, data_dir: str,
+                   report: Optional[SyncReport] = None) -> None:
     """
     Given collections of remote sources, the current local sources and a
     session to the local database, ensure the state of the local database
@@ -142,7 +251,7 @@ def update_sources(remote_sources: List[SDKSource],
             # Removing the UUID from local_uuids ensures this record won't be
             # deleted at the end of this function.
             local_uuids.remove(source.uuid)
-            logger.debug('Updated source {}'.format(source.uuid))
+            logger.debug('Updated source %s', source.uuid)
         else:
             # A new source to be added to the database.
             ns = Source(uuid=source.uuid,
@@ -154,7 +263,7 @@ def update_sources(remote_sources: List[SDKSource],
                         last_updated=parse(source.last_updated),
                         document_count=source.number_of_documents)
             session.add(ns)
-            logger.debug('Added new source {}'.format(source.uuid))
+            logger.debug('Added new source %s', source.uuid)
 
     # The uuids remaining in local_uuids do not exist on the remote server, so
     # delete the related records.
@@ -164,25 +273,27 @@ def update_sources(remote_sources: List[SDKSource],
                 delete_single_submission_or_reply_on_disk(document, data_dir)
 
         session.delete(deleted_source)
-        logger.debug('Deleted source {}'.format(deleted_source.uuid))
+        logger.debug('Deleted source %s', deleted_source.uuid)
 
-    session.commit()
+    with (report or SyncReport()).stage('commit_sources'):
+        session.commit()
 
 
 def update_files(remote_submissions: List[SDKSubmission], local_submissions: List[File],
-                 session: Session, data_dir: str) -> None:
-    __update_submissions(File, remote_submissions, local_submissions, session, data_dir)
+                 session: Session, data_dir: str, report: Optional[SyncReport] = None) -> None:
+    __update_submissions(File, remote_submissions, local_submissions, session, data_dir, report)
 
 
 def update_messages(remote_submissions: List[SDKSubmission], local_submissions: List[Message],
-                    session: Session, data_dir: str) -> None:
-    __update_submissions(Message, remote_submissions, local_submissions, session, data_dir)
+                    session: Session, data_dir: str, report: Optional[SyncReport] = None) -> None:
+    __update_submissions(Message, remote_submissions, local_submissions, session, data_dir, report)
 
 
 def __update_submissions(model: Union[Type[File], Type[Message]],
                          remote_submissions: List[SDKSubmission],
                          local_submissions: Union[List[Message], List[File]],
-                         session: Session, data_dir: str) -> None:
+                         session: Session, data_dir: str,
+                         report: Optional[SyncReport] = None) -> None:
     """
     The logic for updating files and messages is effectively the same, so this function is somewhat
     overloaded to allow us to do both in a DRY way.
@@ -212,7 +323,7 @@ def __update_submissions(model: Union[Type[File], Type[Message]],
             # Removing the UUID from local_uuids ensures this record won't be
             # deleted at the end of this function.
             local_uuids.remove(submission.uuid)
-            logger.debug('Updated submission {}'.format(submission.uuid))
+            logger.debug('Updated submission %s', submission.uuid)
         else:
             # A new submission to be added to the database.
             _, source_uuid = submission.source_url.rsplit('/', 1)
@@ -220,7 +331,7 @@ def __update_submissions(model: Union[Type[File], Type[Message]],
             ns = model(source_id=source.id, uuid=submission.uuid, size=submission.size,
                        filename=submission.filename, download_url=submission.download_url)
             session.add(ns)
-            logger.debug('Added new submission {}'.format(submission.uuid))
+            logger.debug('Added new submission %s', submission.uuid)
 
     # The uuids remaining in local_uuids do not exist on the remote server, so
     # delete the related records.
@@ -228,13 +339,14 @@ def __update_submissions(model: Union[Type[File], Type[Message]],
                                if s.uuid in local_uuids]:
         delete_single_submission_or_reply_on_disk(deleted_submission, data_dir)
         session.delete(deleted_submission)
-        logger.debug('Deleted submission {}'.format(deleted_submission.uuid))
+        logger.debug('Deleted submission %s', deleted_submission.uuid)
 
-    session.commit()
+    with (report or SyncReport()).stage('commit_' + model.__tablename__):
+        session.commit()
 
 
 def update_replies(remote_replies: List[SDKReply], local_replies: List[Reply],
-                   session: Session, data_dir: str) -> None:
+                   session: Session, data_dir: str, report: Optional[SyncReport] = None) -> None:
     """
     * Existing replies are updated in the local database.
     * New replies have an entry created in the local database.
@@ -258,7 +370,7 @@ def update_replies(remote_replies: List[SDKReply], local_replies: List[Reply],
             local_reply.size = reply.size
 
             local_uuids.remove(reply.uuid)
-            logger.debug('Updated reply {}'.format(reply.uuid))
+            logger.debug('Updated reply %s', reply.uuid)
         else:
             # A new reply to be added to the database.
             source_uuid = reply.source_uuid
@@ -290,7 +402,7 @@ def update_replies(remote_replies: List[SDKReply], local_replies: List[Reply],
             except NoResultFound:
                 pass  # No draft locally stored corresponding to this reply.
 
-            logger.debug('Added new reply {}'.format(reply.uuid))
+            logger.debug('Added new reply %s', reply.uuid)
 
     # The uuids remaining in local_uuids do not exist on the remote server, so
     # delete the related records.
@@ -298,9 +410,10 @@ def update_replies(remote_replies: List[SDKReply], local_replies: List[Reply],
     for deleted_reply in replies_to_delete:
         delete_single_submission_or_reply_on_disk(deleted_reply, data_dir)
         session.delete(deleted_reply)
-        logger.debug('Deleted reply {}'.format(deleted_reply.uuid))
+        logger.debug('Deleted reply %s', deleted_reply.uuid)
 
-    session.commit()
+    with (report or SyncReport()).stage('commit_replies'):
+        session.commit()
 
 
 def find_or_create_user(uuid: str,
@@ -516,6 +629,10 @@ def delete_single_submission_or_reply_on_disk(obj_db: Union[File, Message, Reply
     )
     files_to_delete.extend(glob.glob(file_glob_pattern))
 
+    partial_download_path = get_partial_download_path(data_dir, obj_db.uuid)
+    if os.path.exists(partial_download_path):
+        files_to_delete.append(partial_download_path)
+
     for file_to_delete in files_to_delete:
         try:
             os.remove(file_to_delete)
@@ -523,6 +640,13 @@ def delete_single_submission_or_reply_on_disk(obj_db: Union[File, Message, Reply
             logging.info('File %s already deleted, skipping', file_to_delete)
 
 
+def get_partial_download_path(data_dir: str, uuid: str) -> str:
+    """
+    Return the path where the partial download of the submission with the given UUID is staged.
+    """
+    return os.path.join(data_dir, PARTIAL_DOWNLOADS_DIR, '{}.part'.format(uuid))
+
+
 def rename_file(data_dir: str, filename: str, new_filename: str) -> None:
     filename, _ = os.path.splitext(filename)
     new_filename, _ = os.path.splitext(new_filename)
@@ -530,7 +654,7 @@ def rename_file(data_dir: str, filename: str, new_filename: str) -> None:
         os.rename(os.path.join(data_dir, filename),
                   os.path.join(data_dir, new_filename))
     except OSError as e:
-        logger.debug('File could not be renamed: {}'.format(e))
+        logger.debug('File could not be renamed: %s', e)
 
 
 def source_exists(session: Session, source_uuid: str) -> bool:
@@ -553,6 +677,65 @@ def get_reply(session: Session, uuid: str) -> Reply:
     return session.query(Reply).filter_by(uuid=uuid).one()
 
 
+def get_conversation_items(session: Session, source: Source, start: int, end: int) -> List:
+    """
+    Return the messages, files, replies and draft replies of the source with a file_counter from
+    start up to but not including end, sorted in the same order as Source.collection. Items already
+    loaded in the session are updated with their current state in the database.
+    """
+    items = []  # type: List
+    for model in (Message, File, Reply, DraftReply):
+        items.extend(session.query(model).filter(
+            model.source_id == source.id,
+            model.file_counter >= start,
+            model.file_counter < end).populate_existing().all())
+    items.sort(key=lambda x: (x.file_counter, getattr(x, 'timestamp', datetime.min)))
+    return items
+
+
+def get_conversation_file_counter_range(session: Session,
+                                        source: Source) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Return the lowest and highest file_counter of the messages, files, replies and draft replies
+    of the source, or (None, None) if the source has none, without loading any of them.
+    """
+    lowest = None  # type: Optional[int]
+    highest = None  # type: Optional[int]
+    for model in (Message, File, Reply, DraftReply):
+        low, high = session.query(func.min(model.file_counter), func.max(model.file_counter)) \
+            .filter(model.source_id == source.id).one()
+        if low is not None:
+            lowest = low if lowest is None else min(lowest, low)
+            highest = high if highest is None else max(highest, high)
+    return lowest, highest
+
+
+def get_latest_conversation_item(
+        session: Session, source: Source) -> Optional[Union[Message, File, Reply, DraftReply]]:
+    """
+    Return the newest message, file, reply or draft reply of the source, which is the last item of
+    Source.collection, or None if the source has none. The newest item is found with a single query
+    over all of them, and only that item is loaded, with its current state in the database.
+    """
+    connection = session.connection().execution_options(compiled_cache=_compiled_statements)
+    latest = connection.execute(_LATEST_CONVERSATION_ITEM, source_id=source.id).first()
+    if latest is None:
+        return None
+
+    model = _CONVERSATION_ITEM_MODELS[latest.model]
+    return session.query(model).filter(model.id == latest.id).populate_existing().one()
+
+
+def refresh_files(session: Session, files: List[File]) -> None:
+    """
+    Update the files with their current state in the database, with one query for all of them
+    rather than one per file.
+    """
+    if files:
+        session.query(File).filter(
+            File.id.in_([file.id for file in files])).populate_existing().all()
+
+
 def mark_all_pending_drafts_as_failed(session: Session) -> None:
     """
     When we login (offline or online) or logout, we need to set all
@@ -570,3 +753,115 @@ def mark_all_pending_drafts_as_failed(session: Session) -> None:
         pending_draft.send_status = failed_status
 
     session.commit()
+
+
+class SourceSnapshot:
+    """
+    A source as the source list last showed it, read from the source list snapshot.
+
+    It has the attributes of Source that the source list shows, so that the rows of the source list
+    can be made from it before the sources are loaded from the database. The snapshot keeps no
+    content of the conversation, so the collection is empty and the preview is only shown once the
+    row is updated from the database.
+    """
+
+    def __init__(self, uuid: str, journalist_designation: str, last_updated: Optional[datetime],
+                 is_starred: bool, has_attachment: bool) -> None:
+        self.uuid = uuid
+        self.journalist_designation = journalist_designation
+        self.last_updated = last_updated
+        self.is_starred = is_starred
+        self.collection = []  # type: List[str]
+        self.document_count = 1 if has_attachment else 0
+
+    def __repr__(self) -> str:
+        return '<SourceSnapshot {}>'.format(self.journalist_designation)
+
+
+def _write_source_list_snapshot_rows(path: str,
+                                     sources: List[Union[Source, SourceSnapshot]]) -> None:
+    """
+    Write the sources to the snapshot at the given path. The snapshot is written to a temporary file
+    that only the user can read, which then replaces the previous snapshot, so that a snapshot is
+    never read half written.
+    """
+    rows = [
+        {
+            'uuid': source.uuid,
+            'designation': source.journalist_designation,
+            'last_updated': source.last_updated.isoformat() if source.last_updated else None,
+            'starred': bool(source.is_starred),
+            'attachment': bool(source.document_count),
+        }
+        for source in sources
+    ]
+
+    temporary_path = path + '.tmp'
+    try:
+        with open(os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o0600), 'w',
+                  encoding='utf-8') as f:
+            json.dump(rows, f)
+        os.replace(temporary_path, path)
+    except OSError as e:
+        logger.warning('Could not write the source list snapshot: {}'.format(e))
+
+
+def write_source_list_snapshot(session: Session, path: str) -> None:
+    """
+    Write a snapshot of the first SOURCE_LIST_SNAPSHOT_SIZE sources of the source list, the most
+    recently updated ones, in the order they are shown, to the file at the given path.
+
+    The snapshot keeps what the source list shows of each source apart from the content of its
+    conversation: its designation, when it was last updated, whether it is starred and whether it
+    has documents.
+    """
+    sources = session.query(Source).order_by(Source.last_updated.desc()) \
+        .limit(SOURCE_LIST_SNAPSHOT_SIZE).all()
+    _write_source_list_snapshot_rows(path, sources)
+
+
+def remove_from_source_list_snapshot(path: str, source_uuid: str) -> None:
+    """
+    Remove the source from the source list snapshot at the given path, if it is in it.
+    """
+    snapshot = read_source_list_snapshot(path)
+    remaining = [source for source in snapshot if source.uuid != source_uuid]
+    if len(remaining) != len(snapshot):
+        _write_source_list_snapshot_rows(path, remaining)
+
+
+def delete_source_list_snapshot(path: str) -> None:
+    """
+    Delete the source list snapshot at the given path, if there is one.
+    """
+    for snapshot_path in (path, path + '.tmp'):
+        try:
+            os.remove(snapshot_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning('Could not delete the source list snapshot: {}'.format(e))
+
+
+def read_source_list_snapshot(path: str) -> List[SourceSnapshot]:
+    """
+    Return the sources in the source list snapshot at the given path, in the order the source list
+    showed them, or an empty list if there is no snapshot or it cannot be read.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            rows = json.load(f)
+        return [
+            SourceSnapshot(
+                row['uuid'],
+                row['designation'],
+                parse(row['last_updated']) if row['last_updated'] else None,
+                row['starred'],
+                row['attachment'])
+            for row in rows
+        ]
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning('Could not read the source list snapshot: {}'.format(e))
+        return []
@@ -2,7 +2,8 @@ import pytest
 
 from sdclientapi import AuthError, RequestTimeoutError
 
-from securedrop_client.api_jobs.base import ApiInaccessibleError, ApiJob
+from securedrop_client.api_jobs.base import ApiInaccessibleError, ApiJob, RetryLaterError, \
+    RetryPolicy
 from tests.factory import dummy_job_factory
 
 
@@ -161,6 +162,62 @@ def test_ApiJob_retry_timeout(mocker):
     assert api_job.failure_signal.emit.called
 
 
+def test_ApiJob_retry_later_with_backoff(mocker):
+    """Retry logic: a job with a backoff policy asks the queue to retry it later"""
+    return_values = [RequestTimeoutError(), RequestTimeoutError(), 'now works']
+    api_job_cls = dummy_job_factory(mocker, return_values)
+    api_job_cls.RETRY_POLICY = RetryPolicy(base_delay=1, max_delay=10, jitter=False)
+    api_job = api_job_cls()
+
+    mock_api_client = mocker.MagicMock()
+    mock_session = mocker.MagicMock()
+
+    with pytest.raises(RetryLaterError) as excinfo:
+        api_job._do_call_api(mock_api_client, mock_session)
+    assert excinfo.value.delay == 1
+
+    with pytest.raises(RetryLaterError) as excinfo:
+        api_job._do_call_api(mock_api_client, mock_session)
+    assert excinfo.value.delay == 2
+
+    api_job._do_call_api(mock_api_client, mock_session)
+
+    assert api_job.remaining_attempts == 2
+    assert not api_job.failure_signal.emit.called
+    api_job.success_signal.emit.assert_called_once_with('now works')
+
+
+def test_ApiJob_retry_later_last_attempt_fails(mocker):
+    """Retry logic: the last attempt fails instead of being retried later"""
+    api_job_cls = dummy_job_factory(mocker, RequestTimeoutError())
+    api_job_cls.RETRY_POLICY = RetryPolicy(base_delay=1, max_delay=10)
+    api_job = api_job_cls()
+    api_job.remaining_attempts = 1
+
+    with pytest.raises(RequestTimeoutError):
+        api_job._do_call_api(mocker.MagicMock(), mocker.MagicMock())
+
+    assert api_job.failure_signal.emit.called
+
+
+def test_RetryPolicy_get_delay():
+    policy = RetryPolicy(base_delay=1, max_delay=10, jitter=False)
+
+    assert [policy.get_delay(i) for i in range(6)] == [1, 2, 4, 8, 10, 10]
+
+
+def test_RetryPolicy_get_delay_with_jitter(mocker):
+    mock_uniform = mocker.patch('securedrop_client.api_jobs.base.random.uniform', return_value=3)
+    policy = RetryPolicy(base_delay=1, max_delay=10)
+
+    assert policy.get_delay(2) == 3
+    mock_uniform.assert_called_once_with(0, 4)
+
+
+def test_RetryPolicy_default_retries_immediately():
+    assert RetryPolicy().get_delay(3) == 0
+
+
 def test_ApiJob_comparison(mocker):
     return_value = 'wat'
     api_job_cls = dummy_job_factory(mocker, return_value)
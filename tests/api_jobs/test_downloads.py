@@ -1,12 +1,18 @@
+import hashlib
+import http.server
 import os
 import pytest
+import sdclientapi
+import threading
 from typing import Tuple
 
-from sdclientapi import BaseError
+from PyQt5.QtCore import Qt
+from sdclientapi import BaseError, RequestTimeoutError
 from sdclientapi import Submission as SdkSubmission
 
 from securedrop_client.api_jobs.downloads import DownloadJob, FileDownloadJob, MessageDownloadJob, \
-    ReplyDownloadJob, DownloadChecksumMismatchException, MetadataSyncJob
+    ReplyDownloadJob, DownloadChecksumMismatchException, DownloadInterruptedError, MetadataSyncJob
+from securedrop_client.api_jobs.base import RetryLaterError
 from securedrop_client.crypto import GpgHelper, CryptoError
 from tests import factory
 
@@ -21,6 +27,16 @@ def patch_decrypt(mocker, homedir, gpghelper, filename):
     return mock_decrypt
 
 
+def test_download_jobs_persistent_args():
+    '''
+    Only file downloads are recorded to be restored at the next login: messages and replies that
+    are not downloaded yet are downloaded again after the first sync anyway.
+    '''
+    assert FileDownloadJob('mock', 'mock', 'mock').get_persistent_args() == {'uuid': 'mock'}
+    assert MessageDownloadJob('mock', 'mock', 'mock').get_persistent_args() is None
+    assert ReplyDownloadJob('mock', 'mock', 'mock').get_persistent_args() is None
+
+
 def test_MetadataSyncJob_success(mocker, homedir, session, session_maker):
     gpg = GpgHelper(homedir, session_maker, is_qubes=False)
     job = MetadataSyncJob(homedir, gpg)
@@ -46,12 +62,15 @@ def test_MetadataSyncJob_success(mocker, homedir, session, session_maker):
         'securedrop_client.api_jobs.downloads.update_local_storage',
         return_value=([mock_source], 'submissions', 'replies'))
 
-    job.call_api(api_client, session)
+    report = job.call_api(api_client, session)
 
     assert mock_key_import.call_args[0][0] == mock_source.uuid
     assert mock_key_import.call_args[0][1] == mock_source.key['public']
     assert mock_key_import.call_args[0][2] == mock_source.key['fingerprint']
     assert mock_get_remote_data.call_count == 1
+    assert mock_get_remote_data.call_args[0][1] is report
+    assert report.calls['import_key'] == 1
+    assert report.end is not None
 
 
 def test_MetadataSyncJob_success_with_key_import_fail(mocker, homedir, session, session_maker):
@@ -123,6 +142,79 @@ def test_MetadataSyncJob_success_with_missing_key(mocker, homedir, session, sess
     assert mock_get_remote_data.call_count == 1
 
 
+def test_MetadataSyncJob_add_failure_callback(mocker, homedir, session_maker):
+    """
+    Requesters can attach to a job that has not started. The failure callback of the requester that
+    asks for the fewest attempts replaces the others, and the lowest number of attempts wins.
+    """
+    gpg = GpgHelper(homedir, session_maker, is_qubes=False)
+    job = MetadataSyncJob(homedir, gpg)
+    job.failure_signal = mocker.MagicMock()
+    job.remaining_attempts = 15
+    background_callback = mocker.MagicMock()
+    refresh_callback = mocker.MagicMock()
+
+    assert job.add_failure_callback(background_callback, 15)
+    assert job.add_failure_callback(background_callback, 15)
+    job.remaining_attempts = 3  # the job was retried
+    assert job.add_failure_callback(refresh_callback, 5)
+    assert job.add_failure_callback(background_callback, 15)
+
+    assert job.failure_signal.connect.call_args_list == [
+        ((background_callback,), {'type': Qt.QueuedConnection}),
+        ((refresh_callback,), {'type': Qt.QueuedConnection}),
+    ]
+    job.failure_signal.disconnect.assert_called_once_with(background_callback)
+    assert job.failure_callback is refresh_callback
+    assert job.remaining_attempts == 3
+
+
+def test_MetadataSyncJob_add_failure_callback_after_start(mocker, homedir, session_maker):
+    """
+    A job that has started running does not accept more requesters.
+    """
+    gpg = GpgHelper(homedir, session_maker, is_qubes=False)
+    job = MetadataSyncJob(homedir, gpg)
+    mocker.patch.object(job, 'call_api', return_value=None)
+
+    job._do_call_api(mocker.MagicMock(), mocker.MagicMock())
+
+    assert job.started
+    assert not job.add_failure_callback(mocker.MagicMock(), 5)
+
+
+def test_MetadataSyncJob_waiting_again_after_timeout(mocker, homedir, session_maker):
+    """
+    A job that times out is put back into the queue, so requesters can attach to it again.
+    """
+    gpg = GpgHelper(homedir, session_maker, is_qubes=False)
+    job = MetadataSyncJob(homedir, gpg)
+    job.remaining_attempts = 1
+    job.failure_signal = mocker.MagicMock()
+    mocker.patch.object(job, 'call_api', side_effect=RequestTimeoutError())
+
+    with pytest.raises(RequestTimeoutError):
+        job._do_call_api(mocker.MagicMock(), mocker.MagicMock())
+
+    assert not job.started
+    assert job.add_failure_callback(mocker.MagicMock(), 5)
+
+
+def test_MetadataSyncJob_waiting_again_after_retry_later(mocker, homedir, session_maker):
+    """
+    A job waiting to be retried after a backoff delay accepts requesters again.
+    """
+    gpg = GpgHelper(homedir, session_maker, is_qubes=False)
+    job = MetadataSyncJob(homedir, gpg)
+    mocker.patch.object(job, 'call_api', side_effect=RequestTimeoutError())
+
+    with pytest.raises(RetryLaterError):
+        job._do_call_api(mocker.MagicMock(), mocker.MagicMock())
+
+    assert not job.started
+    assert job.retry_count == 1
+
+
 def test_MessageDownloadJob_raises_NotImplementedError(mocker):
     job = DownloadJob('mock')
 
@@ -677,3 +769,349 @@ def test_timeout_length_of_file_downloads(mocker, homedir, session, session_make
     assert five_MB_file_timeout == 100
     assert half_GB_file_timeout == 7525
     assert GB_file_timeout == 15025
+
+
+class FlakySubmissionServer:
+    '''
+    Local stand-in for the SecureDrop server's submission download endpoint. It supports HTTP Range
+    requests and drops the connection after sending `drop_after` bytes of the first response. A
+    misbehaving server is simulated with `range_shift`, which shifts the start of the ranges sent.
+    '''
+
+    def __init__(self, content: bytes, drop_after: int = None, range_shift: int = 0) -> None:
+        self.content = content
+        self.drop_after = drop_after
+        self.range_shift = range_shift
+        self.range_headers = []  # type: list
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self) -> None:
+                range_header = self.headers.get('Range')
+                server.range_headers.append(range_header)
+                start = int(range_header[len('bytes='):-1]) + server.range_shift \
+                    if range_header else 0
+                if start >= len(server.content):
+                    self.send_response(416)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                body = server.content[start:]
+                self.send_response(206 if range_header else 200)
+                self.send_header('Content-Length', str(len(body)))
+                if range_header:
+                    self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                        start, len(server.content) - 1, len(server.content)))
+                self.send_header('ETag', '"sha256:{}"'.format(
+                    hashlib.sha256(server.content).hexdigest()))
+                self.end_headers()
+
+                if server.drop_after is not None:
+                    self.wfile.write(body[:server.drop_after])
+                    self.wfile.flush()
+                    server.drop_after = None
+                    self.close_connection = True
+                    return
+
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.httpd = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{}/'.format(self.httpd.server_address[1])
+
+    def __enter__(self) -> 'FlakySubmissionServer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _direct_api_client(mocker, url):
+    api_client = mocker.MagicMock()
+    api_client.proxy = False
+    api_client.server = url
+    api_client.req_headers = {'Authorization': 'Token mock'}
+    return api_client
+
+
+def test_FileDownloadJob_resumes_interrupted_download(mocker, homedir, session, session_maker):
+    '''
+    When the connection drops mid-transfer, the bytes received so far are kept and the retry only
+    requests the remaining bytes. The assembled file is validated against the ETag checksum.
+    '''
+    source = factory.Source()
+    file_ = factory.File(source=source, is_downloaded=None, is_decrypted=None)
+    session.add(source)
+    session.add(file_)
+    session.commit()
+
+    data_dir = os.path.join(homedir, 'data')
+    gpg = GpgHelper(homedir, session_maker, is_qubes=False)
+    mock_decrypt = patch_decrypt(mocker, homedir, gpg, file_.filename)
+    content = os.urandom(100000)
+
+    with FlakySubmissionServer(content, drop_after=30000) as server:
+        api_client = _direct_api_client(mocker, server.url)
+        job = FileDownloadJob(file_.uuid, data_dir, gpg)
+        job.remaining_attempts = 2
+
+        # The queue puts the job back after the backoff delay
+        with pytest.raises(RetryLaterError):
+            job._do_call_api(api_client, session)
+        job._do_call_api(api_client, session)
+
+    # The retry resumes from wherever the first response was cut off
+    assert server.range_headers[0] is None
+    resumed_from = int(server.range_headers[1][len('bytes='):-1])
+    assert 0 < resumed_from <= 30000
+    with open(os.path.join(data_dir, file_.filename), 'rb') as f:
+        assert f.read() == content
+    assert not os.path.exists(job._get_partial_download_path(file_.uuid))
+    assert mock_decrypt.called
+
+
+def test_FileDownloadJob_interrupted_download_raises_timeout(mocker, homedir, session,
+                                                             session_maker):
+    '''
+    An interrupted download is reported as a timeout so that the queue retries it later, and the
+    partial download is kept for the retry.
+    '''
+    source = factory.Source()
+    file_ = factory.File(source=source, is_downloaded=None, is_decrypted=None)
+    session.add(source)
+    session.add(file_)
+    session.commit()
+
+    data_dir = os.path.join(homedir, 'data')
+    gpg = GpgHelper(homedir, session_maker, is_qubes=False)
+
+    with FlakySubmissionServer(b'x' * 50000, drop_after=10000) as server:
+        api_client = _direct_api_client(mocker, server.url)
+        job = FileDownloadJob(file_.uuid, data_dir, gpg)
+
+        with pytest.raises(RequestTimeoutError):
+            job.call_api(api_client, session)
+
+    assert 0 < os.path.getsize(job._get_partial_download_path(file_.uuid)) <= 10000
+
+
+def test_FileDownloadJob_restarts_when_range_not_satisfiable(mocker, homedir, session,
+                                                             session_maker):
+    '''
+    If the server cannot satisfy the range of a stale partial download, download the whole
+    submission again.
+    '''
+    source = factory.Source()
+    file_ = factory.File(source=source, is_downloaded=None, is_decrypted=None)
+    session.add(source)
+    session.add(file_)
+    session.commit()
+
+    data_dir = os.path.join(homedir, 'data')
+    gpg = GpgHelper(homedir, session_maker, is_qubes=False)
+    patch_decrypt(mocker, homedir, gpg, file_.filename)
+    job = FileDownloadJob(file_.uuid, data_dir, gpg)
+    with open(job._get_partial_download_path(file_.uuid), 'wb') as f:
+        f.write(b'stale' * 1000)
+
+    with FlakySubmissionServer(b'wat') as server:
+        api_client = _direct_api_client(mocker, server.url)
+        job.call_api(api_client, session)
+
+    assert server.range_headers == ['bytes=5000-', None]
+    with open(os.path.join(data_dir, file_.filename), 'rb') as f:
+        assert f.read() == b'wat'
+
+
+def test_FileDownloadJob_bad_checksum_discards_partial_download(mocker, homedir, session,
+                                                                session_maker):
+    '''
+    A download that does not match the ETag checksum is discarded so the retry starts from scratch.
+    '''
+    source = factory.Source()
+    file_ = factory.File(source=source, is_downloaded=None, is_decrypted=None)
+    session.add(source)
+    session.add(file_)
+    session.commit()
+
+    data_dir = os.path.join(homedir, 'data')
+    gpg = GpgHelper(homedir, session_maker, is_qubes=False)
+    job = FileDownloadJob(file_.uuid, data_dir, gpg)
+    with open(job._get_partial_download_path(file_.uuid), 'wb') as f:
+        f.write(b'garbage')
+
+    with FlakySubmissionServer(b'corrupted-wat') as server:
+        api_client = _direct_api_client(mocker, server.url)
+        with pytest.raises(DownloadChecksumMismatchException):
+            job.call_api(api_client, session)
+
+    assert not os.path.exists(job._get_partial_download_path(file_.uuid))
+
+
+def test_FileDownloadJob_missing_submission(mocker, homedir, session, session_maker):
+    source = factory.Source()
+    file_ = factory.File(source=source, is_downloaded=None, is_decrypted=None)
+    session.add(source)
+    session.add(file_)
+    session.commit()
+
+    gpg = GpgHelper(homedir, session_maker, is_qubes=False)
+    job = FileDownloadJob(file_.uuid, os.path.join(homedir, 'data'), gpg)
+    api_client = _direct_api_client(mocker, 'http://localhost/')
+    mocker.patch('securedrop_client.api_jobs.downloads.requests.get',
+                 return_value=mocker.MagicMock(status_code=404))
+
+    with pytest.raises(BaseError):
+        job.call_api(api_client, session)
+
+
+@pytest.mark.parametrize('status_code', [403, 500])
+def test_FileDownloadJob_download_http_error(mocker, homedir, session, session_maker,
+                                             status_code):
+    source = factory.Source()
+    file_ = factory.File(source=source, is_downloaded=None, is_decrypted=None)
+    session.add(source)
+    session.add(file_)
+    session.commit()
+
+    gpg = GpgHelper(homedir, session_maker, is_qubes=False)
+    job = FileDownloadJob(file_.uuid, os.path.join(homedir, 'data'), gpg)
+    api_client = _direct_api_client(mocker, 'http://localhost/')
+    response = mocker.MagicMock(status_code=status_code)
+    mocker.patch('securedrop_client.api_jobs.downloads.requests.get', return_value=response)
+    partial_path = job._get_partial_download_path(file_.uuid)
+    with open(partial_path, 'wb') as f:
+        f.write(b'partial')
+
+    with pytest.raises(BaseError):
+        job.call_api(api_client, session)
+
+    assert response.__exit__.called  # the streamed response is closed
+    if status_code == 403:
+        assert os.path.exists(partial_path)  # kept to resume after logging in again
+    else:
+        assert not os.path.exists(partial_path)
+
+
+def test_DownloadJob_check_file_integrity_uses_streamed_checksum(mocker):
+    '''
+    A checksum computed while downloading is used instead of reading the file from disk again.
+    '''
+    mock_open = mocker.patch('builtins.open')
+    etag = 'sha256:f00a787f7492a95e165b470702f4fe9373583fbdc025b2c8bdf0262cc48fcff4'
+
+    assert DownloadJob._check_file_integrity(etag, 'mock', sha256_checksum=etag.split(':')[1])
+    assert not DownloadJob._check_file_integrity(etag, 'mock', sha256_checksum='not-a-sha-sum')
+    assert not mock_open.called
+
+
+def test_DownloadJob_download_submission_computes_checksum(mocker, homedir):
+    '''
+    The checksum returned for a resumed download covers the bytes from the earlier attempt too.
+    '''
+    content = os.urandom(50000)
+    job = DownloadJob(os.path.join(homedir, 'data'))
+    submission = SdkSubmission(uuid='mock-uuid')
+    submission.source_uuid = 'mock-source-uuid'
+
+    with FlakySubmissionServer(content, drop_after=20000) as server:
+        api_client = _direct_api_client(mocker, server.url)
+        with pytest.raises(RequestTimeoutError):
+            job._download_submission(api_client, submission, len(content))
+        etag, path, checksum = job._download_submission(api_client, submission, len(content))
+
+    assert checksum == hashlib.sha256(content).hexdigest()
+    assert etag == 'sha256:{}'.format(checksum)
+
+
+def test_DownloadJob_dropped_connection_is_not_a_timeout(mocker, homedir):
+    '''
+    A dropped connection is retried like a timeout but does not raise the download timeout.
+    '''
+    content = os.urandom(50000)
+    job = DownloadJob(os.path.join(homedir, 'data'))
+    submission = SdkSubmission(uuid='mock-uuid')
+    submission.source_uuid = 'mock-source-uuid'
+    job.timeout_model.observe_timeout = mocker.MagicMock()
+
+    with FlakySubmissionServer(content, drop_after=20000) as server:
+        with pytest.raises(DownloadInterruptedError):
+            job._download_submission(_direct_api_client(mocker, server.url), submission,
+                                     len(content))
+
+    assert not job.timeout_model.observe_timeout.called
+    assert job.timeout_model.get_timeout('download', 25, len(content)) == 25
+
+
+def test_DownloadJob_download_submission_checks_range_start(mocker, homedir):
+    '''
+    If the server sends a range that does not start where the partial download ends, the partial
+    download is discarded so that the retry starts from the beginning.
+    '''
+    content = os.urandom(50000)
+    job = DownloadJob(os.path.join(homedir, 'data'))
+    submission = SdkSubmission(uuid='mock-uuid')
+    submission.source_uuid = 'mock-source-uuid'
+    partial_path = job._get_partial_download_path(submission.uuid)
+    with open(partial_path, 'wb') as f:
+        f.write(content[:10000])
+
+    with FlakySubmissionServer(content, range_shift=1) as server:
+        with pytest.raises(DownloadInterruptedError):
+            job._download_submission(_direct_api_client(mocker, server.url), submission,
+                                     len(content))
+
+    assert not os.path.exists(partial_path)
+
+
+def test_DownloadJob_download_submission_through_proxy(mocker, homedir):
+    '''
+    Through the proxy, submissions are downloaded whole with the SDK's public download method,
+    whatever their size.
+    '''
+    job = DownloadJob(os.path.join(homedir, 'data'))
+    submission = SdkSubmission(uuid='mock-uuid')
+    api_client = mocker.MagicMock()
+    api_client.proxy = True
+    api_client.download_submission.return_value = ('sha256:mock', '/home/user/QubesIncoming/mock')
+
+    assert job._download_submission(api_client, submission, 100 * 1024 * 1024) == \
+        ('sha256:mock', '/home/user/QubesIncoming/mock', None)
+    assert api_client.download_submission.call_count == 1
+    assert not api_client._send_json_request.called
+    assert job.bytes_transferred == 100 * 1024 * 1024
+
+
+def test_DownloadJob_download_submission_through_proxy_response(mocker, homedir):
+    '''
+    Pin the shape of the proxy's response to a download that the download relies on: the JSON body
+    names the file the proxy put in its QubesIncoming directory, and the ETag header is the
+    checksum of the submission.
+    '''
+    job = DownloadJob(os.path.join(homedir, 'data'))
+    submission = SdkSubmission(uuid='mock-uuid')
+    submission.source_uuid = 'mock-source-uuid'
+    api_client = sdclientapi.API('http://localhost', 'mock', 'mock', 'mock', proxy=True)
+    api_client.proxy_vm_name = 'sd-proxy'
+    send_rpc_json_request = mocker.patch.object(
+        api_client, '_send_rpc_json_request',
+        return_value=({'filename': 'mock-file'}, 200, {'Etag': '"sha256:mock"'}))
+
+    etag, filepath, checksum = job._download_submission(api_client, submission, 1000)
+
+    assert (etag, filepath, checksum) == \
+        ('sha256:mock', '/home/user/QubesIncoming/sd-proxy/mock-file', None)
+    method, path_query = send_rpc_json_request.call_args[0][:2]
+    assert (method, path_query) == \
+        ('GET', 'api/v1/sources/mock-source-uuid/submissions/mock-uuid/download')
@@ -0,0 +1,146 @@
+import logging
+
+from securedrop_client.api_jobs.stats import JobStatistics
+from tests import factory
+
+
+def test_JobStatistics_records_runs(mocker):
+    '''
+    Each run is recorded with the time the job waited, the time it ran, its attempts, outcome and
+    bytes transferred.
+    '''
+    monotonic = mocker.patch('securedrop_client.api_jobs.stats.time.monotonic', return_value=0)
+    statistics = JobStatistics()
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+    job = job_cls()
+
+    monotonic.return_value = 10
+    statistics.job_enqueued(job)
+    monotonic.return_value = 12
+    statistics.job_started(job)
+    job.attempts += 2
+    job.bytes_transferred += 1000
+    monotonic.return_value = 17
+    statistics.job_finished(job, JobStatistics.SUCCESS)
+
+    runs = statistics.get_runs(job_cls.__name__)
+    assert len(runs) == 1
+    assert runs[0].wait_time == 2
+    assert runs[0].run_time == 5
+    assert runs[0].attempts == 2
+    assert runs[0].outcome == JobStatistics.SUCCESS
+    assert runs[0].bytes_transferred == 1000
+
+
+def test_JobStatistics_get_statistics(mocker):
+    monotonic = mocker.patch('securedrop_client.api_jobs.stats.time.monotonic', return_value=0)
+    statistics = JobStatistics()
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+
+    for i in range(1, 21):
+        job = job_cls()
+        monotonic.return_value = 0
+        statistics.job_enqueued(job)
+        monotonic.return_value = i
+        statistics.job_started(job)
+        job.attempts += 1
+        job.bytes_transferred += 100
+        monotonic.return_value = 2 * i
+        statistics.job_finished(job, JobStatistics.SUCCESS if i % 2 else JobStatistics.TIMEOUT)
+
+    stats = statistics.get_statistics()[job_cls.__name__]
+    assert stats['runs'] == 20
+    assert stats['outcomes'] == {JobStatistics.SUCCESS: 10, JobStatistics.TIMEOUT: 10}
+    assert stats['wait_time'] == {'mean': 10.5, 'p95': 19, 'max': 20}
+    assert stats['run_time'] == {'mean': 10.5, 'p95': 19, 'max': 20}
+    assert stats['attempts'] == 1
+    assert stats['bytes_transferred'] == 2000
+    assert stats['throughput'] == 2000 / 210
+
+
+def test_JobStatistics_keeps_recent_runs(mocker):
+    statistics = JobStatistics()
+    statistics.WINDOW_SIZE = 3
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+    jobs = [job_cls() for i in range(5)]
+
+    for i, job in enumerate(jobs):
+        statistics.job_enqueued(job)
+        statistics.job_started(job)
+        job.bytes_transferred = i
+        statistics.job_finished(job, JobStatistics.SUCCESS)
+
+    assert [run.bytes_transferred for run in statistics.get_runs(job_cls.__name__)] == [2, 3, 4]
+
+
+def test_JobStatistics_ignores_jobs_that_did_not_start(mocker):
+    statistics = JobStatistics()
+    job = factory.dummy_job_factory(mocker, 'mock')()
+
+    statistics.job_finished(job, JobStatistics.SUCCESS)
+
+    assert statistics.get_statistics() == {}
+
+
+def test_JobStatistics_logs_periodically(mocker, caplog):
+    monotonic = mocker.patch('securedrop_client.api_jobs.stats.time.monotonic', return_value=0)
+    statistics = JobStatistics()
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+    caplog.set_level(logging.INFO, logger='securedrop_client.api_jobs.stats')
+
+    for now in [1, JobStatistics.LOG_INTERVAL, JobStatistics.LOG_INTERVAL + 1]:
+        monotonic.return_value = now
+        job = job_cls()
+        statistics.job_enqueued(job)
+        statistics.job_started(job)
+        statistics.job_finished(job, JobStatistics.SUCCESS)
+
+    assert len(caplog.records) == 2
+    assert caplog.records[0].getMessage() == '0 jobs waiting, longest 0.00s'
+    assert caplog.records[1].getMessage().startswith('{}: 2 runs'.format(job_cls.__name__))
+
+
+def test_JobStatistics_log_statistics_if_due(mocker, caplog):
+    '''
+    The statistics are written when asked if they have not been written for LOG_INTERVAL seconds,
+    even if no job has finished, so that a stalled queue still reports the jobs waiting in it.
+    '''
+    monotonic = mocker.patch('securedrop_client.api_jobs.stats.time.monotonic', return_value=0)
+    statistics = JobStatistics()
+    job = factory.dummy_job_factory(mocker, 'mock')()
+    statistics.job_enqueued(job)
+    caplog.set_level(logging.INFO, logger='securedrop_client.api_jobs.stats')
+
+    monotonic.return_value = JobStatistics.LOG_INTERVAL - 1
+    statistics.log_statistics_if_due()
+    assert caplog.records == []
+
+    monotonic.return_value = JobStatistics.LOG_INTERVAL
+    statistics.log_statistics_if_due()
+    statistics.log_statistics_if_due()
+    assert [record.getMessage() for record in caplog.records] == [
+        '1 jobs waiting, longest {:.2f}s'.format(JobStatistics.LOG_INTERVAL)]
+
+    statistics.log_statistics()
+    assert len(caplog.records) == 2
+
+
+def test_JobStatistics_forget_waiting_jobs(mocker):
+    '''
+    Jobs that left their queue without being run are no longer counted as waiting.
+    '''
+    monotonic = mocker.patch('securedrop_client.api_jobs.stats.time.monotonic', return_value=0)
+    statistics = JobStatistics()
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+    dropped_job = job_cls()
+    waiting_job = job_cls()
+    statistics.job_enqueued(dropped_job)
+    monotonic.return_value = 5
+    statistics.job_enqueued(waiting_job)
+    monotonic.return_value = 10
+
+    assert statistics.get_waiting_jobs() == (2, 10)
+
+    statistics.forget_waiting_jobs([waiting_job])
+
+    assert statistics.get_waiting_jobs() == (1, 5)
@@ -0,0 +1,161 @@
+import pytest
+
+from sdclientapi import RequestTimeoutError
+
+from securedrop_client.api_jobs.timeouts import TimeoutModel, TimedAPI
+
+
+def test_TimeoutModel_get_timeout_default():
+    '''
+    Without observations the default timeout is used.
+    '''
+    model = TimeoutModel()
+
+    assert model.get_timeout('sync', 20) == 20
+    assert model.get_timeout('download', 25, size_in_bytes=1000000) == 25
+
+
+def test_TimeoutModel_fast_requests_do_not_lower_timeout():
+    model = TimeoutModel()
+
+    for i in range(10):
+        model.observe('star', 0.5)
+
+    assert model.get_timeout('star', 5) == 5
+
+
+def test_TimeoutModel_slow_requests_raise_timeout():
+    model = TimeoutModel()
+
+    for i in range(10):
+        model.observe('sync', 30)
+
+    assert model.get_timeout('sync', 20) > 30
+    assert model.get_timeout('star', 5) == 5  # other request classes are unaffected
+
+
+def test_TimeoutModel_timeouts_raise_timeout():
+    '''
+    Repeated timeouts keep raising the timeout instead of timing out at the same value.
+    '''
+    model = TimeoutModel()
+    timeouts = [model.get_timeout('reply', 5)]
+
+    for i in range(3):
+        with pytest.raises(RequestTimeoutError):
+            with model.measure('reply', timeouts[-1]):
+                raise RequestTimeoutError()
+        timeouts.append(model.get_timeout('reply', 5))
+
+    assert timeouts == sorted(timeouts)
+    assert timeouts[-1] > timeouts[0]
+
+
+def test_TimeoutModel_timeout_backoff_is_reset_on_success():
+    '''
+    Timeouts are not used as latency samples: the backoff ends with the next successful request.
+    '''
+    model = TimeoutModel()
+    model.observe_timeout('sync')
+    model.observe_timeout('sync')
+
+    assert model.get_timeout('sync', 20) == 80
+    assert model.get_timeout('star', 5) == 5
+
+    model.observe('sync', 1)
+
+    assert model.get_timeout('sync', 20) == 20
+
+
+def test_TimeoutModel_timeout_is_capped_during_outage():
+    model = TimeoutModel()
+    timeouts = []
+
+    for i in range(15):
+        timeouts.append(model.get_timeout('sync', 20))
+        model.observe_timeout('sync')
+
+    assert timeouts[:3] == [20, 40, 80]
+    assert max(timeouts) == 20 * TimeoutModel.MAX_TIMEOUT_FACTOR
+
+
+def test_TimeoutModel_download_timeout_scales_with_throughput():
+    model = TimeoutModel()
+    model.observe('download', 20, size_in_bytes=1000000)  # 50 KB/s
+
+    assert model.get_timeout('download', 175, size_in_bytes=10 ** 7) == 300
+    assert model.get_timeout('download', 25, size_in_bytes=1000) == 25
+
+
+def test_TimeoutModel_small_downloads_are_latency_samples():
+    '''
+    Small transfers such as messages take about as long as any request over Tor, so they must not
+    be mistaken for a slow throughput.
+    '''
+    model = TimeoutModel()
+    model.observe('download', 3, size_in_bytes=2000)
+
+    assert model.get_timeout('download', 175, size_in_bytes=10 ** 7) == 175
+
+
+def test_TimeoutModel_throughput_excludes_latency():
+    model = TimeoutModel()
+    model.observe('download', 3, size_in_bytes=2000)
+    model.observe('download', 13, size_in_bytes=1000000)  # 100 KB/s after 3 seconds of latency
+
+    # 3 seconds of latency with a deviation of 1.5, plus 1.5 times 200 seconds of transfer
+    assert model.get_timeout('download', 100, size_in_bytes=2 * 10 ** 7) == 309
+
+
+def test_TimeoutModel_download_ignores_instant_transfer():
+    model = TimeoutModel()
+    model.observe('download', 0, size_in_bytes=1000000)
+
+    assert model.get_timeout('download', 25, size_in_bytes=1000000) == 25
+
+
+def test_TimeoutModel_timeout_is_capped():
+    model = TimeoutModel()
+    model.observe('download', 1000, size_in_bytes=TimeoutModel.MIN_THROUGHPUT_SAMPLE_SIZE)
+
+    assert model.get_timeout('download', 25, size_in_bytes=10 ** 9) == 100
+
+
+def test_TimeoutModel_measure(mocker):
+    model = TimeoutModel()
+    mocker.patch('securedrop_client.api_jobs.timeouts.time.monotonic', side_effect=[100, 160])
+
+    with model.measure('sync', 20):
+        pass
+
+    assert model.get_timeout('sync', 20) > 60
+
+
+def test_TimedAPI_sets_timeout_on_copy(mocker):
+    '''
+    Requests made through the view get a timeout from the model without changing the timeout of
+    the shared client, and are observed by the model.
+    '''
+    class FakeAPI:
+        default_request_timeout = 60
+        token_journalist_uuid = 'mock-uuid'
+
+        def add_star(self, source):
+            return self.default_request_timeout
+
+    api_client = FakeAPI()
+    model = TimeoutModel()
+    model.observe = mocker.MagicMock()
+
+    timed_api_client = TimedAPI(api_client, model, 'star', 5)
+
+    assert timed_api_client.add_star('mock') == 5
+    assert timed_api_client.token_journalist_uuid == 'mock-uuid'
+    assert api_client.default_request_timeout == 60
+    assert model.observe.call_args[0][0] == 'star'
+
+
+def test_TimeoutModel_client():
+    model = TimeoutModel()
+
+    assert isinstance(model.client(object(), 'sync', 20), TimedAPI)
@@ -14,6 +14,16 @@ def test_SendReplyJobTimeoutError():
     assert str(error) == 'mock_message'
 
 
+def test_SendReplyJob_get_persistent_args():
+    '''
+    The plaintext of the reply is not recorded with the job, only in the client database.
+    '''
+    job = SendReplyJob('mock_source_uuid', 'mock_reply_uuid', 'mock_message', 'mock_gpg')
+
+    assert job.get_persistent_args() == {
+        'source_uuid': 'mock_source_uuid', 'reply_uuid': 'mock_reply_uuid'}
+
+
 def test_send_reply_success(homedir, mocker, session, session_maker,
                             reply_status_codes):
     '''
@@ -3,6 +3,7 @@ Tests for the gui helper functions in __init__.py
 """
 
 from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QApplication
 
 from securedrop_client.gui import SecureQLabel, SvgPushButton, SvgLabel, SvgToggleButton
@@ -119,15 +120,15 @@ def test_SvgLabel_init(mocker):
     Ensure SvgLabel calls the expected methods correctly to set the icon and size.
     """
     svg_size = QSize(1, 1)
-    svg = mocker.MagicMock()
-    load_svg_fn = mocker.patch('securedrop_client.gui.load_svg', return_value=svg)
-    mocker.patch('securedrop_client.gui.QHBoxLayout.addWidget')
+    pixmap = QPixmap(1, 1)
+    load_svg_pixmap_fn = mocker.patch(
+        'securedrop_client.gui.load_svg_pixmap', return_value=pixmap)
 
     sl = SvgLabel(filename='mock', svg_size=svg_size)
 
-    load_svg_fn.assert_called_once_with('mock')
-    sl.svg.setFixedSize.assert_called_once_with(svg_size)
-    assert sl.svg == svg
+    load_svg_pixmap_fn.assert_called_once_with('mock', svg_size)
+    assert sl.svg.pixmap().cacheKey() == pixmap.cacheKey()
+    assert sl.svg.size() == svg_size
 
 
 def test_SecureQLabel_init():
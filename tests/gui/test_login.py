@@ -0,0 +1,318 @@
+"""
+Make sure the login dialog is configured correctly and works as expected.
+"""
+import pytest
+
+from PyQt5.QtCore import Qt, QPoint, QRect
+from PyQt5.QtWidgets import QApplication, QMainWindow, QLineEdit
+
+from securedrop_client.gui.login import LoginDialog, LoginErrorBar, LoginOfflineLink, PasswordEdit
+
+
+app = QApplication([])
+
+
+def test_LoginDialog_init_centers_dialog(mocker):
+    """
+    The login dialog is displayed centered in the screen.
+    """
+    mock_qdw = mocker.patch('securedrop_client.gui.login.QDesktopWidget')
+    mock_qdw().screenGeometry.return_value = QRect(0, 0, 1000, 1000)
+
+    ld = LoginDialog(None)
+
+    assert ld.pos() == QPoint((1000 - 596) // 2, (1000 - 671) // 2)
+
+
+def test_LoginDialog_setup(mocker, i18n):
+    """
+    The LoginView is correctly initialised.
+    """
+    mock_controller = mocker.MagicMock()
+    ld = LoginDialog(None)
+    ld.offline_mode = mocker.MagicMock()
+
+    ld.setup(mock_controller)
+
+    assert ld.controller == mock_controller
+    ld.offline_mode.clicked.connect.assert_called_once_with(ld.controller.login_offline_mode)
+
+
+def test_LoginDialog_reset(mocker):
+    """
+    Ensure the state of the login view is returned to the correct state.
+    """
+    mock_controller = mocker.MagicMock()
+
+    ld = LoginDialog(None)
+    ld.setup(mock_controller)
+    ld.username_field = mocker.MagicMock()
+    ld.password_field = mocker.MagicMock()
+    ld.tfa_field = mocker.MagicMock()
+    ld.setDisabled = mocker.MagicMock()
+    ld.error_bar = mocker.MagicMock()
+
+    ld.reset()
+
+    ld.username_field.setText.assert_called_once_with('')
+    ld.password_field.setText.assert_called_once_with('')
+    ld.tfa_field.setText.assert_called_once_with('')
+    ld.setDisabled.assert_called_once_with(False)
+    ld.error_bar.clear_message.assert_called_once_with()
+
+
+def test_LoginDialog_error(mocker, i18n):
+    """
+    Any error message passed in is assigned as the text for the error label.
+    """
+    mock_controller = mocker.MagicMock()
+    ld = LoginDialog(None)
+    ld.setup(mock_controller)
+    ld.error_bar = mocker.MagicMock()
+    ld.error('foo')
+    ld.error_bar.set_message.assert_called_once_with('foo')
+
+
+def test_LoginDialog_validate_no_input(mocker):
+    """
+    If the user doesn't provide input, tell them and give guidance.
+    """
+    mock_controller = mocker.MagicMock()
+
+    ld = LoginDialog(None)
+    ld.setup(mock_controller)
+    ld.username_field.text = mocker.MagicMock(return_value='')
+    ld.password_field.text = mocker.MagicMock(return_value='')
+    ld.tfa_field.text = mocker.MagicMock(return_value='')
+    ld.setDisabled = mocker.MagicMock()
+    ld.error = mocker.MagicMock()
+
+    ld.validate()
+
+    assert ld.setDisabled.call_count == 2
+    assert ld.error.call_count == 1
+
+
+def test_LoginDialog_validate_input_non_numeric_2fa(mocker):
+    """
+    If the user doesn't provide numeric 2fa input, tell them and give
+    guidance.
+    """
+    mock_controller = mocker.MagicMock()
+
+    ld = LoginDialog(None)
+    ld.setup(mock_controller)
+    ld.username_field.text = mocker.MagicMock(return_value='foo')
+    ld.password_field.text = mocker.MagicMock(return_value='nicelongpassword')
+    ld.tfa_field.text = mocker.MagicMock(return_value='baz')
+    ld.setDisabled = mocker.MagicMock()
+    ld.error = mocker.MagicMock()
+
+    ld.validate()
+
+    assert ld.setDisabled.call_count == 2
+    assert ld.error.call_count == 1
+    assert mock_controller.login.call_count == 0
+
+
+def test_LoginDialog_validate_too_short_username(mocker):
+    """
+    If the username is too small, we show an informative error message.
+    """
+    mock_controller = mocker.MagicMock()
+
+    ld = LoginDialog(None)
+    ld.setup(mock_controller)
+    ld.username_field.text = mocker.MagicMock(return_value='he')
+    ld.password_field.text = mocker.MagicMock(return_value='nicelongpassword')
+    ld.tfa_field.text = mocker.MagicMock(return_value='123456')
+    ld.setDisabled = mocker.MagicMock()
+    ld.error = mocker.MagicMock()
+
+    ld.validate()
+
+    assert ld.setDisabled.call_count == 2
+    assert ld.error.call_count == 1
+    assert mock_controller.login.call_count == 0
+
+
+def test_LoginDialog_validate_too_short_password(mocker):
+    """
+    If the password is too small, we show an informative error message.
+    """
+    mock_controller = mocker.MagicMock()
+
+    ld = LoginDialog(None)
+    ld.setup(mock_controller)
+    ld.username_field.text = mocker.MagicMock(return_value='foo')
+    ld.password_field.text = mocker.MagicMock(return_value='bar')
+    ld.tfa_field.text = mocker.MagicMock(return_value='123456')
+    ld.setDisabled = mocker.MagicMock()
+    ld.error = mocker.MagicMock()
+
+    ld.validate()
+
+    assert ld.setDisabled.call_count == 2
+    assert ld.error.call_count == 1
+    assert mock_controller.login.call_count == 0
+
+
+def test_LoginDialog_validate_too_long_password(mocker):
+    """
+    If the password is too long, we show an informative error message.
+    """
+    mock_controller = mocker.MagicMock()
+    ld = LoginDialog(None)
+    ld.setup(mock_controller)
+
+    max_password_len = 128
+    too_long_password = 'a' * (max_password_len + 1)
+
+    ld.username_field.text = mocker.MagicMock(return_value='foo')
+    ld.password_field.text = mocker.MagicMock(return_value=too_long_password)
+    ld.tfa_field.text = mocker.MagicMock(return_value='123456')
+    ld.setDisabled = mocker.MagicMock()
+    ld.error = mocker.MagicMock()
+
+    ld.validate()
+
+    assert ld.setDisabled.call_count == 2
+    assert ld.error.call_count == 1
+    assert mock_controller.login.call_count == 0
+
+
+def test_LoginDialog_validate_input_ok(mocker):
+    """
+    Valid input from the user causes a call to the controller's login method.
+    """
+    mock_controller = mocker.MagicMock()
+
+    ld = LoginDialog(None)
+    ld.setup(mock_controller)
+    ld.username_field.text = mocker.MagicMock(return_value='foo')
+    ld.password_field.text = mocker.MagicMock(return_value='nicelongpassword')
+    ld.tfa_field.text = mocker.MagicMock(return_value='123456')
+    ld.setDisabled = mocker.MagicMock()
+    ld.error = mocker.MagicMock()
+
+    ld.validate()
+
+    assert ld.setDisabled.call_count == 1
+    assert ld.error.call_count == 0
+    mock_controller.login.assert_called_once_with('foo', 'nicelongpassword', '123456')
+
+
+def test_LoginDialog_escapeKeyPressEvent(mocker):
+    """
+    Ensure we don't hide the login dialog when Esc key is pressed.
+    """
+    ld = LoginDialog(None)
+    event = mocker.MagicMock()
+    event.key = mocker.MagicMock(return_value=Qt.Key_Escape)
+
+    ld.keyPressEvent(event)
+
+    event.ignore.assert_called_once_with()
+
+
+@pytest.mark.parametrize("qt_key", [Qt.Key_Enter, Qt.Key_Return])
+def test_LoginDialog_submitKeyPressEvent(mocker, qt_key):
+    """
+    Ensure we submit the form when the user presses [Enter] or [Return]
+    """
+
+    ld = LoginDialog(None)
+    event = mocker.MagicMock()
+    event.key = mocker.MagicMock(return_value=qt_key)
+
+    ld.validate = mocker.MagicMock()
+
+    ld.keyPressEvent(event)
+
+    ld.validate.assert_called_once_with()
+
+
+def test_LoginDialog_closeEvent_exits(mocker):
+    """
+    If the main window is not visible, then exit the application when the LoginDialog receives a
+    close event.
+    """
+    mw = QMainWindow()
+    ld = LoginDialog(mw)
+    sys_exit_fn = mocker.patch('securedrop_client.gui.login.sys.exit')
+    mw.hide()
+
+    ld.closeEvent(event='mock')
+
+    sys_exit_fn.assert_called_once_with(0)
+
+
+def test_LoginErrorBar_set_message(mocker):
+    error_bar = LoginErrorBar()
+    error_bar.error_status_bar = mocker.MagicMock()
+    mocker.patch.object(error_bar, 'show')
+
+    error_bar.set_message('mock error')
+
+    error_bar.error_status_bar.setText.assert_called_with('mock error')
+    error_bar.show.assert_called_with()
+
+
+def test_LoginErrorBar_clear_message(mocker):
+    error_bar = LoginErrorBar()
+    error_bar.error_status_bar = mocker.MagicMock()
+    mocker.patch.object(error_bar, 'hide')
+
+    error_bar.clear_message()
+
+    error_bar.error_status_bar.setText.assert_called_with('')
+    error_bar.hide.assert_called_with()
+
+
+def test_LoginOfflineLink(mocker):
+    """
+    Assert that the clicked signal is emitted on mouse release event.
+    """
+    offline_link = LoginOfflineLink()
+    offline_link.clicked = mocker.MagicMock()
+
+    offline_link.mouseReleaseEvent(None)
+
+    offline_link.clicked.emit.assert_called_with()
+
+
+def test_LoginDialog_closeEvent_does_not_exit_when_main_window_is_visible(mocker):
+    """
+    If the main window is visible, then to not exit the application when the LoginDialog receives a
+    close event.
+    """
+    mw = QMainWindow()
+    ld = LoginDialog(mw)
+    sys_exit_fn = mocker.patch('securedrop_client.gui.login.sys.exit')
+    mw.show()
+
+    ld.closeEvent(event='mock')
+
+    assert sys_exit_fn.called is False
+
+
+def test_PasswordEdit(mocker):
+    passwordline = PasswordEdit(None)
+    passwordline.togglepasswordAction.trigger()
+
+    assert passwordline.echoMode() == QLineEdit.Normal
+    passwordline.togglepasswordAction.trigger()
+    assert passwordline.echoMode() == QLineEdit.Password
+
+
+def test_LoginDialog_closeEvent_exits_without_main_window(mocker):
+    """
+    If the login dialog was shown while the client started, before there was a main window, then
+    exit the application when the LoginDialog receives a close event.
+    """
+    ld = LoginDialog(None)
+    sys_exit_fn = mocker.patch('securedrop_client.gui.login.sys.exit')
+
+    ld.closeEvent(event='mock')
+
+    sys_exit_fn.assert_called_once_with(0)
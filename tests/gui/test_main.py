@@ -1,9 +1,10 @@
 """
 Check the core Window UI class works as expected.
 """
-from PyQt5.QtWidgets import QApplication, QHBoxLayout
+from PyQt5.QtCore import QEvent
+from PyQt5.QtWidgets import QApplication, QHBoxLayout, QWidget
 
-from securedrop_client.gui.main import Window
+from securedrop_client.gui.main import PaintListener, Window
 from securedrop_client.resources import load_icon
 
 
@@ -112,6 +113,25 @@ def test_show_login(mocker):
     w.login_dialog.exec.assert_called_once_with()
 
 
+def test_show_login_uses_login_dialog_shown_at_startup(mocker):
+    """
+    The login dialog shown while the client started is used the first time the login form is
+    shown, without clearing what the user typed meanwhile.
+    """
+    login_dialog = mocker.MagicMock()
+    w = Window(login_dialog)
+    w.controller = mocker.MagicMock()
+    mock_ld = mocker.patch('securedrop_client.gui.main.LoginDialog')
+
+    w.show_login()
+
+    mock_ld.assert_not_called()
+    assert w.login_dialog == login_dialog
+    login_dialog.setup.assert_called_once_with(w.controller)
+    login_dialog.reset.assert_not_called()
+    login_dialog.exec.assert_called_once_with()
+
+
 def test_show_login_error(mocker):
     """
     Ensures that an error message is displayed in the login dialog.
@@ -253,3 +273,50 @@ def test_logout(mocker):
 
     w.left_pane.set_logged_out.assert_called_once_with()
     w.top_pane.set_logged_out.assert_called_once_with()
+
+
+def test_call_after_sources_painted(mocker):
+    """
+    The callback waits for the source list to be painted.
+    """
+    mock_pl = mocker.patch('securedrop_client.gui.main.PaintListener')
+    w = Window()
+    callback = mocker.MagicMock()
+
+    w.call_after_sources_painted(callback)
+
+    mock_pl.assert_called_once_with(w.main_view.source_list.viewport(), callback, 1000)
+
+
+def test_PaintListener_calls_after_paint(mocker):
+    """
+    The callback is called once, after the widget is painted, and not again after the timeout.
+    """
+    widget = QWidget()
+    callback = mocker.MagicMock()
+    listener = PaintListener(widget, callback, 1000)
+    single_shot = mocker.patch('securedrop_client.gui.main.QTimer.singleShot')
+
+    listener.eventFilter(widget, QEvent(QEvent.Paint))
+    callback.assert_not_called()
+    single_shot.assert_called_once_with(0, listener.call)
+
+    listener.call()
+    listener.call()
+
+    callback.assert_called_once_with()
+    assert not listener.timer.isActive()
+
+
+def test_PaintListener_calls_after_timeout(mocker):
+    """
+    The callback is called after the timeout if the widget is not painted.
+    """
+    widget = QWidget()
+    callback = mocker.MagicMock()
+    listener = PaintListener(widget, callback, 1)
+
+    listener.eventFilter(widget, QEvent(QEvent.Resize))
+    listener.timer.timeout.emit()
+
+    callback.assert_called_once_with()
@@ -1,22 +1,23 @@
 """
 Make sure the UI widgets are configured correctly and work as expected.
 """
-import pytest
+import datetime
 
-from PyQt5.QtCore import Qt, QEvent
+from PyQt5 import sip
+from PyQt5.QtCore import Qt, QEvent, QSize
 from PyQt5.QtGui import QFocusEvent
-from PyQt5.QtWidgets import QWidget, QApplication, QVBoxLayout, QMessageBox, QMainWindow, \
-    QLineEdit
+from PyQt5.QtWidgets import QWidget, QApplication, QVBoxLayout, QMessageBox
 from sqlalchemy.orm import scoped_session, sessionmaker
 
-from securedrop_client import db, logic
+from securedrop_client import db, logic, storage
 from securedrop_client.export import ExportError, ExportStatus
-from securedrop_client.gui.widgets import MainView, SourceList, SourceWidget, LoginDialog, \
+from securedrop_client.gui.widgets import MainView, SourceList, SourceWidget, \
     SpeechBubble, MessageWidget, ReplyWidget, FileWidget, ConversationView, \
     DeleteSourceMessageBox, DeleteSourceAction, SourceMenu, TopPane, LeftPane, RefreshButton, \
     ErrorStatusBar, ActivityStatusBar, UserProfile, UserButton, UserMenu, LoginButton, \
-    ReplyBoxWidget, ReplyTextEdit, SourceConversationWrapper, StarToggleButton, LoginOfflineLink, \
-    LoginErrorBar, EmptyConversationView, ExportDialog, PrintDialog, PasswordEdit
+    ReplyBoxWidget, ReplyTextEdit, SourceConversationWrapper, StarToggleButton, \
+    EmptyConversationView, ExportDialog, PrintDialog
+from securedrop_client.storage import get_conversation_items, SourceSnapshot
 from tests import factory
 
 
@@ -441,6 +442,7 @@ def test_MainView_show_sources_with_none_selected(mocker):
     """
     mv = MainView(None)
     mv.source_list = mocker.MagicMock()
+    mv.source_list.get_current_source.return_value = None
     mv.empty_conversation_view = mocker.MagicMock()
 
     mv.show_sources([1, 2, 3])
@@ -450,12 +452,28 @@ def test_MainView_show_sources_with_none_selected(mocker):
     mv.empty_conversation_view.show.assert_called_once_with()
 
 
+def test_MainView_show_sources_with_source_selected(mocker):
+    """
+    If a source is still selected after the sources list is updated, its conversation is shown
+    again so that it includes new messages, replies and files.
+    """
+    mv = MainView(None)
+    mv.source_list = mocker.MagicMock()
+    mv.on_source_changed = mocker.MagicMock()
+
+    mv.show_sources([1, 2, 3])
+
+    mv.source_list.update.assert_called_once_with([1, 2, 3])
+    mv.on_source_changed.assert_called_once_with()
+
+
 def test_MainView_show_sources_with_no_sources_at_all(mocker):
     """
     Ensure the sources list is passed to the source list widget to be updated.
     """
     mv = MainView(None)
     mv.source_list = mocker.MagicMock()
+    mv.source_list.get_current_source.return_value = None
     mv.empty_conversation_view = mocker.MagicMock()
 
     mv.show_sources([])
@@ -505,7 +523,7 @@ def test_MainView_on_source_changed_updates_conversation_view(mocker, session):
     """
     mv = MainView(None)
     mv.source_list = mocker.MagicMock()
-    mv.controller = mocker.MagicMock(is_authenticated=True)
+    mv.controller = mocker.MagicMock(is_authenticated=True, session=session)
     s = factory.Source()
     session.add(s)
     f = factory.File(source=s, filename='0-mock-doc.gpg')
@@ -539,6 +557,7 @@ def test_MainView_on_source_changed_SourceConversationWrapper_is_preserved(mocke
     mv = MainView(None)
     mv.source_list = mocker.MagicMock()
     mv.set_conversation = mocker.MagicMock()
+    mv.evict_conversations = mocker.MagicMock()
     mv.controller = mocker.MagicMock(is_authenticated=True)
     source = factory.Source()
     source2 = factory.Source()
@@ -588,6 +607,104 @@ def test_MainView_on_source_changed_SourceConversationWrapper_is_preserved(mocke
     assert source_conversation_init.call_count == 0
 
 
+def select_sources(mocker, mv, sources):
+    """
+    Select each of the sources in turn in the main view.
+    """
+    for source in sources:
+        mv.source_list.get_current_source = mocker.MagicMock(return_value=source)
+        mv.on_source_changed()
+
+
+def test_MainView_on_source_changed_evicts_least_recently_selected(mocker, homedir, session):
+    """
+    Once more than CONVERSATION_CACHE_SIZE conversations are kept, the conversation of the least
+    recently selected source is deleted.
+    """
+    mv = MainView(None)
+    mv.CONVERSATION_CACHE_SIZE = 2
+    mv.source_list = mocker.MagicMock()
+    mv.controller = mocker.MagicMock(session=session, is_authenticated=True)
+    sources = [factory.Source(), factory.Source(), factory.Source()]
+    session.add_all(sources)
+    session.commit()
+
+    select_sources(mocker, mv, sources[:2])
+    conversation_wrappers = dict(mv.source_conversations)
+    delete_later = mocker.patch.object(conversation_wrappers[sources[0]], 'deleteLater')
+
+    # Selecting the first source again makes the second one the least recently selected.
+    select_sources(mocker, mv, [sources[0], sources[2]])
+
+    assert list(mv.source_conversations) == [sources[0], sources[2]]
+    assert delete_later.call_count == 0
+
+    select_sources(mocker, mv, [sources[1]])
+
+    assert list(mv.source_conversations) == [sources[2], sources[1]]
+    assert delete_later.call_count == 1
+
+
+def test_MainView_on_source_changed_evicts_when_too_many_items(mocker, homedir, session):
+    """
+    Conversations are deleted while the kept conversations show more than CONVERSATION_CACHE_ITEMS
+    items, except for the conversation of the selected source.
+    """
+    mv = MainView(None)
+    mv.CONVERSATION_CACHE_ITEMS = 2
+    mv.source_list = mocker.MagicMock()
+    mv.controller = mocker.MagicMock(session=session, is_authenticated=True)
+    sources = [factory.Source(), factory.Source(), factory.Source()]
+    session.add_all(sources)
+    for source in sources:
+        session.add(factory.Message(source=source))
+    session.add(factory.Message(source=sources[2]))
+    session.add(factory.Message(source=sources[2]))
+    session.commit()
+
+    select_sources(mocker, mv, sources[:2])
+
+    assert list(mv.source_conversations) == sources[:2]
+
+    # The third conversation alone shows more than CONVERSATION_CACHE_ITEMS items.
+    select_sources(mocker, mv, [sources[2]])
+
+    assert list(mv.source_conversations) == [sources[2]]
+
+
+def test_MainView_on_source_changed_keeps_reply_text(mocker, homedir, session):
+    """
+    The text typed in the reply box of an evicted conversation is restored when its source is
+    selected again.
+    """
+    mv = MainView(None)
+    mv.CONVERSATION_CACHE_SIZE = 1
+    mv.source_list = mocker.MagicMock()
+    mv.controller = mocker.MagicMock(session=session, is_authenticated=True)
+    sources = [factory.Source(), factory.Source()]
+    session.add_all(sources)
+    session.commit()
+
+    select_sources(mocker, mv, [sources[0]])
+    mv.source_conversations[sources[0]].reply_box.text_edit.setText('unsent reply')
+    select_sources(mocker, mv, [sources[1]])
+
+    assert list(mv.source_conversations) == [sources[1]]
+    assert mv.reply_drafts == {sources[0].uuid: 'unsent reply'}
+
+    select_sources(mocker, mv, [sources[0]])
+
+    text_edit = mv.source_conversations[sources[0]].reply_box.text_edit
+    assert text_edit.toPlainText() == 'unsent reply'
+    assert mv.reply_drafts == {}
+
+    # An empty reply box leaves nothing to restore.
+    text_edit.setText('')
+    select_sources(mocker, mv, [sources[1]])
+
+    assert mv.reply_drafts == {}
+
+
 def test_MainView_set_conversation(mocker):
     """
     Ensure the passed-in widget is added to the layout of the main view holder
@@ -618,6 +735,23 @@ def test_MainView_clear_conversation(mocker, homedir):
     assert mv.view_layout.count() == 0
 
 
+def test_MainView_clear_conversation_forgets_deleted_conversation(mocker, homedir):
+    """
+    A conversation deleted by clear_conversation is no longer kept for its source.
+    """
+    mv = MainView(None)
+    source = factory.Source()
+    conversation_wrapper = QWidget()
+    other_conversation_wrapper = QWidget()
+    mv.source_conversations[source] = conversation_wrapper
+    mv.source_conversations[factory.Source()] = other_conversation_wrapper
+    mv.view_layout.addWidget(conversation_wrapper)
+
+    mv.clear_conversation()
+
+    assert list(mv.source_conversations.values()) == [other_conversation_wrapper]
+
+
 def test_EmptyConversationView_show_no_sources_message(mocker):
     ecv = EmptyConversationView()
     ecv.content = mocker.MagicMock()
@@ -645,13 +779,12 @@ def test_EmptyConversationView_show_no_source_selected_message(mocker):
 
 def test_SourceList_update(mocker):
     """
-    Check the items in the source list are cleared and a new SourceWidget for
-    each passed-in source is created along with an associated QListWidgetItem.
+    Check a new SourceWidget for each passed-in source is created along with an associated
+    QListWidgetItem.
     """
     sl = SourceList()
 
-    sl.clear = mocker.MagicMock()
-    sl.addItem = mocker.MagicMock()
+    sl.insertItem = mocker.MagicMock()
     sl.setItemWidget = mocker.MagicMock()
     sl.controller = mocker.MagicMock()
 
@@ -663,17 +796,132 @@ def test_SourceList_update(mocker):
     sources = [mocker.MagicMock(), mocker.MagicMock(), mocker.MagicMock(), ]
     sl.update(sources)
 
-    sl.clear.assert_called_once_with()
     assert mock_sw.call_count == len(sources)
     assert mock_lwi.call_count == len(sources)
-    assert sl.addItem.call_count == len(sources)
+    assert sl.insertItem.call_count == len(sources)
     assert sl.setItemWidget.call_count == len(sources)
+    assert sl.source_items == {source.uuid: mock_lwi() for source in sources}
+
+
+def test_SourceList_update_keeps_existing_rows(mocker):
+    """
+    Updating the list with the same sources updates their widgets in place instead of creating
+    new ones.
+    """
+    mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item', return_value=None)
+    sl = SourceList()
+    sl.setup(mocker.MagicMock())
+    sources = [factory.Source(), factory.Source()]
+    sl.update(sources)
+    widgets = [sl.itemWidget(sl.item(row)) for row in range(sl.count())]
+    for widget in widgets:
+        widget.update = mocker.MagicMock()
+    mock_sw = mocker.patch('securedrop_client.gui.widgets.SourceWidget')
+
+    sources[1].journalist_designation = 'renamed'
+    sl.update(sources)
+
+    mock_sw.assert_not_called()
+    assert sl.count() == 2
+    assert [sl.itemWidget(sl.item(row)) for row in range(sl.count())] == widgets
+    for widget in widgets:
+        widget.update.assert_called_once_with()
+
+
+def test_SourceList_update_replaces_source_list_snapshot(mocker):
+    """
+    The rows made from the source list snapshot are kept for the sources they show, and show the
+    sources themselves once the list is updated with them.
+    """
+    sl = SourceList()
+    sl.setup(mocker.MagicMock())
+    source = factory.Source(journalist_designation='renamed')
+    message = factory.Message(source=source, content='hello')
+    mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item',
+                 return_value=message)
+    sl.update([SourceSnapshot(source.uuid, 'snapshot', source.last_updated, False, False)])
+    widget = sl.itemWidget(sl.item(0))
+
+    sl.update([source])
+
+    assert sl.itemWidget(sl.item(0)) is widget
+    assert widget.source is source
+    assert widget.name.text() == 'renamed'
+    assert widget.preview.text() == 'hello'
+
+
+def test_SourceList_get_current_source_from_source_list_snapshot(mocker):
+    """
+    A selected row still showing a source from the source list snapshot has no source to show the
+    conversation of yet.
+    """
+    sl = SourceList()
+    sl.setup(mocker.MagicMock())
+    mocker.patch('securedrop_client.gui.widgets.source_exists', return_value=True)
+    sl.update([SourceSnapshot('uuid', 'snapshot', datetime.datetime.now(), False, False)])
+    sl.setCurrentRow(0)
+
+    assert sl.get_current_source() is None
+
+
+def test_SourceList_update_adds_removes_and_moves_rows(mocker):
+    """
+    New sources get new rows, the rows of sources that are gone are removed, and the remaining
+    rows are moved to the position of their source without creating their widgets again.
+    """
+    mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item', return_value=None)
+    sl = SourceList()
+    sl.setup(mocker.MagicMock())
+    a, b, c, d = [factory.Source() for i in range(4)]
+    sl.update([a, b, c])
+    widget_a = sl.itemWidget(sl.source_items[a.uuid])
+    widget_c = sl.itemWidget(sl.source_items[c.uuid])
+
+    sl.update([c, d, a])
+
+    assert [sl.itemWidget(sl.item(row)).source for row in range(sl.count())] == [c, d, a]
+    assert sl.itemWidget(sl.item(0)) is widget_c
+    assert sl.itemWidget(sl.item(2)) is widget_a
+    assert set(sl.source_items) == {a.uuid, c.uuid, d.uuid}
+
+
+def test_SourceList_update_deselects_removed_source(mocker):
+    """
+    If the selected source is gone, no source is selected rather than one of its neighbours.
+    """
+    mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item', return_value=None)
+    sl = SourceList()
+    sl.setup(mocker.MagicMock())
+    sources = [factory.Source(), factory.Source(), factory.Source()]
+    sl.update(sources)
+    sl.setCurrentItem(sl.source_items[sources[1].uuid])
+
+    sl.update([sources[0], sources[2]])
+
+    assert sl.currentItem() is None
+    assert sl.count() == 2
+
+
+def test_SourceList_clear(mocker):
+    """
+    Clearing the list forgets the rows of the sources, so that they are created again.
+    """
+    mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item', return_value=None)
+    sl = SourceList()
+    sl.setup(mocker.MagicMock())
+    sl.update([factory.Source()])
+
+    sl.clear()
+
+    assert sl.count() == 0
+    assert sl.source_items == {}
 
 
 def test_SourceList_maintains_selection(mocker):
     """
     Maintains the selected item if present in new list
     """
+    mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item', return_value=None)
     sl = SourceList()
     sources = [factory.Source(), factory.Source()]
     sl.setup(mocker.MagicMock())
@@ -700,6 +948,7 @@ def test_SourceWidget_setup(mocker):
     """
     The setup method adds the controller as an attribute on the SourceWidget.
     """
+    mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item', return_value=None)
     mock_controller = mocker.MagicMock()
     mock_source = mocker.MagicMock(journalist_designation='mock')
     sw = SourceWidget(mock_source)
@@ -744,6 +993,45 @@ def test_SourceWidget_update_attachment_icon():
     sw.update()
     assert sw.paperclip.isHidden()
 
+    source.document_count = 2
+
+    sw.update()
+    assert not sw.paperclip.isHidden()
+
+
+def test_SourceWidget_update_caches_timestamp(mocker):
+    """
+    The timestamp is only formatted again when the source's last_updated changes.
+    """
+    source = factory.Source()
+    sw = SourceWidget(source)
+    mock_arrow = mocker.patch('securedrop_client.gui.widgets.arrow')
+    mock_arrow.get().format.return_value = '01 Feb'
+    mock_arrow.get.reset_mock()
+
+    sw.update()
+    mock_arrow.get.assert_not_called()
+
+    source.last_updated = datetime.datetime(2020, 2, 1)
+    sw.update()
+    mock_arrow.get.assert_called_once_with(source.last_updated)
+
+
+def test_SourceWidget_update_star(mocker):
+    """
+    The star shows whether the source is starred, without asking the controller to star it.
+    """
+    mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item', return_value=None)
+    source = factory.Source(is_starred=False)
+    sw = SourceWidget(source)
+    sw.setup(mocker.MagicMock(is_authenticated=True))
+
+    source.is_starred = True
+    sw.update()
+
+    assert sw.star.isChecked()
+    sw.controller.update_star.assert_not_called()
+
 
 def test_SourceWidget_update_truncate_latest_msg(mocker):
     """
@@ -752,13 +1040,58 @@ def test_SourceWidget_update_truncate_latest_msg(mocker):
     """
     source = mocker.MagicMock()
     source.journalist_designation = "Testy McTestface"
-    source.collection = [factory.Message(content="a" * 121), ]
+    mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item',
+                 return_value=factory.Message(content="a" * 121))
     sw = SourceWidget(source)
+    sw.setup(mocker.MagicMock())
 
     sw.update()
     assert sw.preview.text().endswith("...")
 
 
+def test_SourceWidget_update_preview_only_when_source_changed(mocker):
+    """
+    The newest item is only looked up again when the source changed, or while it is not decrypted.
+    """
+    source = factory.Source(interaction_count=1)
+    message = factory.Message(source=source, content=None)
+    get_latest = mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item',
+                              return_value=message)
+    sw = SourceWidget(source)
+    sw.setup(mocker.MagicMock())
+    assert sw.preview.text() == '<Message not yet available>'
+
+    message.content = 'hello'
+    sw.update()
+    assert sw.preview.text() == 'hello'
+    assert get_latest.call_count == 2
+
+    sw.update()
+    assert get_latest.call_count == 2
+
+    get_latest.return_value = factory.Message(source=source, content='newer')
+    source.interaction_count = 2
+    sw.update()
+    assert sw.preview.text() == 'newer'
+    assert get_latest.call_count == 3
+
+
+def test_SourceWidget_from_source_list_snapshot():
+    """
+    A source from the source list snapshot is shown like the source it was made from, without a
+    preview until the row is updated from the database.
+    """
+    snapshot = SourceSnapshot('uuid', 'Testy McTestface', datetime.datetime(2020, 1, 2), True, True)
+
+    sw = SourceWidget(snapshot)
+
+    assert sw.name.text() == 'Testy McTestface'
+    assert sw.timestamp.text() == '02 Jan'
+    assert sw.preview.text() == ''
+    assert not sw.paperclip.isHidden()
+    assert sw.star.isChecked()
+
+
 def test_SourceWidget_delete_source(mocker, session, source):
     mock_delete_source_message_box_object = mocker.MagicMock(DeleteSourceMessageBox)
     mock_controller = mocker.MagicMock()
@@ -929,278 +1262,6 @@ def test_StarToggleButton_on_toggle_offline_when_checked(mocker):
     set_icon_fn.assert_called_with(on='star_on.svg', off='star_on.svg')
 
 
-def test_LoginDialog_setup(mocker, i18n):
-    """
-    The LoginView is correctly initialised.
-    """
-    mock_controller = mocker.MagicMock()
-    ld = LoginDialog(None)
-    ld.offline_mode = mocker.MagicMock()
-
-    ld.setup(mock_controller)
-
-    assert ld.controller == mock_controller
-    ld.offline_mode.clicked.connect.assert_called_once_with(ld.controller.login_offline_mode)
-
-
-def test_LoginDialog_reset(mocker):
-    """
-    Ensure the state of the login view is returned to the correct state.
-    """
-    mock_controller = mocker.MagicMock()
-
-    ld = LoginDialog(None)
-    ld.setup(mock_controller)
-    ld.username_field = mocker.MagicMock()
-    ld.password_field = mocker.MagicMock()
-    ld.tfa_field = mocker.MagicMock()
-    ld.setDisabled = mocker.MagicMock()
-    ld.error_bar = mocker.MagicMock()
-
-    ld.reset()
-
-    ld.username_field.setText.assert_called_once_with('')
-    ld.password_field.setText.assert_called_once_with('')
-    ld.tfa_field.setText.assert_called_once_with('')
-    ld.setDisabled.assert_called_once_with(False)
-    ld.error_bar.clear_message.assert_called_once_with()
-
-
-def test_LoginDialog_error(mocker, i18n):
-    """
-    Any error message passed in is assigned as the text for the error label.
-    """
-    mock_controller = mocker.MagicMock()
-    ld = LoginDialog(None)
-    ld.setup(mock_controller)
-    ld.error_bar = mocker.MagicMock()
-    ld.error('foo')
-    ld.error_bar.set_message.assert_called_once_with('foo')
-
-
-def test_LoginDialog_validate_no_input(mocker):
-    """
-    If the user doesn't provide input, tell them and give guidance.
-    """
-    mock_controller = mocker.MagicMock()
-
-    ld = LoginDialog(None)
-    ld.setup(mock_controller)
-    ld.username_field.text = mocker.MagicMock(return_value='')
-    ld.password_field.text = mocker.MagicMock(return_value='')
-    ld.tfa_field.text = mocker.MagicMock(return_value='')
-    ld.setDisabled = mocker.MagicMock()
-    ld.error = mocker.MagicMock()
-
-    ld.validate()
-
-    assert ld.setDisabled.call_count == 2
-    assert ld.error.call_count == 1
-
-
-def test_LoginDialog_validate_input_non_numeric_2fa(mocker):
-    """
-    If the user doesn't provide numeric 2fa input, tell them and give
-    guidance.
-    """
-    mock_controller = mocker.MagicMock()
-
-    ld = LoginDialog(None)
-    ld.setup(mock_controller)
-    ld.username_field.text = mocker.MagicMock(return_value='foo')
-    ld.password_field.text = mocker.MagicMock(return_value='nicelongpassword')
-    ld.tfa_field.text = mocker.MagicMock(return_value='baz')
-    ld.setDisabled = mocker.MagicMock()
-    ld.error = mocker.MagicMock()
-
-    ld.validate()
-
-    assert ld.setDisabled.call_count == 2
-    assert ld.error.call_count == 1
-    assert mock_controller.login.call_count == 0
-
-
-def test_LoginDialog_validate_too_short_username(mocker):
-    """
-    If the username is too small, we show an informative error message.
-    """
-    mock_controller = mocker.MagicMock()
-
-    ld = LoginDialog(None)
-    ld.setup(mock_controller)
-    ld.username_field.text = mocker.MagicMock(return_value='he')
-    ld.password_field.text = mocker.MagicMock(return_value='nicelongpassword')
-    ld.tfa_field.text = mocker.MagicMock(return_value='123456')
-    ld.setDisabled = mocker.MagicMock()
-    ld.error = mocker.MagicMock()
-
-    ld.validate()
-
-    assert ld.setDisabled.call_count == 2
-    assert ld.error.call_count == 1
-    assert mock_controller.login.call_count == 0
-
-
-def test_LoginDialog_validate_too_short_password(mocker):
-    """
-    If the password is too small, we show an informative error message.
-    """
-    mock_controller = mocker.MagicMock()
-
-    ld = LoginDialog(None)
-    ld.setup(mock_controller)
-    ld.username_field.text = mocker.MagicMock(return_value='foo')
-    ld.password_field.text = mocker.MagicMock(return_value='bar')
-    ld.tfa_field.text = mocker.MagicMock(return_value='123456')
-    ld.setDisabled = mocker.MagicMock()
-    ld.error = mocker.MagicMock()
-
-    ld.validate()
-
-    assert ld.setDisabled.call_count == 2
-    assert ld.error.call_count == 1
-    assert mock_controller.login.call_count == 0
-
-
-def test_LoginDialog_validate_too_long_password(mocker):
-    """
-    If the password is too long, we show an informative error message.
-    """
-    mock_controller = mocker.MagicMock()
-    ld = LoginDialog(None)
-    ld.setup(mock_controller)
-
-    max_password_len = 128
-    too_long_password = 'a' * (max_password_len + 1)
-
-    ld.username_field.text = mocker.MagicMock(return_value='foo')
-    ld.password_field.text = mocker.MagicMock(return_value=too_long_password)
-    ld.tfa_field.text = mocker.MagicMock(return_value='123456')
-    ld.setDisabled = mocker.MagicMock()
-    ld.error = mocker.MagicMock()
-
-    ld.validate()
-
-    assert ld.setDisabled.call_count == 2
-    assert ld.error.call_count == 1
-    assert mock_controller.login.call_count == 0
-
-
-def test_LoginDialog_validate_input_ok(mocker):
-    """
-    Valid input from the user causes a call to the controller's login method.
-    """
-    mock_controller = mocker.MagicMock()
-
-    ld = LoginDialog(None)
-    ld.setup(mock_controller)
-    ld.username_field.text = mocker.MagicMock(return_value='foo')
-    ld.password_field.text = mocker.MagicMock(return_value='nicelongpassword')
-    ld.tfa_field.text = mocker.MagicMock(return_value='123456')
-    ld.setDisabled = mocker.MagicMock()
-    ld.error = mocker.MagicMock()
-
-    ld.validate()
-
-    assert ld.setDisabled.call_count == 1
-    assert ld.error.call_count == 0
-    mock_controller.login.assert_called_once_with('foo', 'nicelongpassword', '123456')
-
-
-def test_LoginDialog_escapeKeyPressEvent(mocker):
-    """
-    Ensure we don't hide the login dialog when Esc key is pressed.
-    """
-    ld = LoginDialog(None)
-    event = mocker.MagicMock()
-    event.key = mocker.MagicMock(return_value=Qt.Key_Escape)
-
-    ld.keyPressEvent(event)
-
-    event.ignore.assert_called_once_with()
-
-
-@pytest.mark.parametrize("qt_key", [Qt.Key_Enter, Qt.Key_Return])
-def test_LoginDialog_submitKeyPressEvent(mocker, qt_key):
-    """
-    Ensure we submit the form when the user presses [Enter] or [Return]
-    """
-
-    ld = LoginDialog(None)
-    event = mocker.MagicMock()
-    event.key = mocker.MagicMock(return_value=qt_key)
-
-    ld.validate = mocker.MagicMock()
-
-    ld.keyPressEvent(event)
-
-    ld.validate.assert_called_once_with()
-
-
-def test_LoginDialog_closeEvent_exits(mocker):
-    """
-    If the main window is not visible, then exit the application when the LoginDialog receives a
-    close event.
-    """
-    mw = QMainWindow()
-    ld = LoginDialog(mw)
-    sys_exit_fn = mocker.patch('securedrop_client.gui.widgets.sys.exit')
-    mw.hide()
-
-    ld.closeEvent(event='mock')
-
-    sys_exit_fn.assert_called_once_with(0)
-
-
-def test_LoginErrorBar_set_message(mocker):
-    error_bar = LoginErrorBar()
-    error_bar.error_status_bar = mocker.MagicMock()
-    mocker.patch.object(error_bar, 'show')
-
-    error_bar.set_message('mock error')
-
-    error_bar.error_status_bar.setText.assert_called_with('mock error')
-    error_bar.show.assert_called_with()
-
-
-def test_LoginErrorBar_clear_message(mocker):
-    error_bar = LoginErrorBar()
-    error_bar.error_status_bar = mocker.MagicMock()
-    mocker.patch.object(error_bar, 'hide')
-
-    error_bar.clear_message()
-
-    error_bar.error_status_bar.setText.assert_called_with('')
-    error_bar.hide.assert_called_with()
-
-
-def test_LoginOfflineLink(mocker):
-    """
-    Assert that the clicked signal is emitted on mouse release event.
-    """
-    offline_link = LoginOfflineLink()
-    offline_link.clicked = mocker.MagicMock()
-
-    offline_link.mouseReleaseEvent(None)
-
-    offline_link.clicked.emit.assert_called_with()
-
-
-def test_LoginDialog_closeEvent_does_not_exit_when_main_window_is_visible(mocker):
-    """
-    If the main window is visible, then to not exit the application when the LoginDialog receives a
-    close event.
-    """
-    mw = QMainWindow()
-    ld = LoginDialog(mw)
-    sys_exit_fn = mocker.patch('securedrop_client.gui.widgets.sys.exit')
-    mw.show()
-
-    ld.closeEvent(event='mock')
-
-    assert sys_exit_fn.called is False
-
-
 def test_SpeechBubble_init(mocker):
     """
     Check the speech bubble is configured correctly (there's a label containing
@@ -1208,14 +1269,13 @@ def test_SpeechBubble_init(mocker):
     """
     mock_signal = mocker.Mock()
     mock_connect = mocker.Mock()
-    mock_signal.connect = mock_connect
+    mock_signal.register = mock_connect
 
     sb = SpeechBubble('mock id', 'hello', mock_signal)
-    ss = sb.styleSheet()
 
     sb.message.text() == 'hello'
     assert mock_connect.called
-    assert 'background-color' in ss
+    assert sb.objectName() == 'speech_bubble'
 
 
 def test_SpeechBubble_update_text(mocker):
@@ -1262,7 +1322,7 @@ def test_MessageWidget_init(mocker):
     """
     mock_signal = mocker.Mock()
     mock_connected = mocker.Mock()
-    mock_signal.connect = mock_connected
+    mock_signal.register = mock_connected
 
     MessageWidget('mock id', 'hello', mock_signal)
 
@@ -1275,15 +1335,15 @@ def test_ReplyWidget_init(mocker):
     """
     mock_update_signal = mocker.Mock()
     mock_update_connected = mocker.Mock()
-    mock_update_signal.connect = mock_update_connected
+    mock_update_signal.register = mock_update_connected
 
     mock_success_signal = mocker.MagicMock()
     mock_success_connected = mocker.Mock()
-    mock_success_signal.connect = mock_success_connected
+    mock_success_signal.register = mock_success_connected
 
     mock_failure_signal = mocker.MagicMock()
     mock_failure_connected = mocker.Mock()
-    mock_failure_signal.connect = mock_failure_connected
+    mock_failure_signal.register = mock_failure_connected
 
     ReplyWidget(
         'mock id',
@@ -1310,7 +1370,7 @@ def test_FileWidget_init_file_not_downloaded(mocker, source, session):
     get_file = mocker.MagicMock(return_value=file)
     controller = mocker.MagicMock(get_file=get_file)
 
-    fw = FileWidget('mock', controller, mocker.MagicMock())
+    fw = FileWidget(file, controller, mocker.MagicMock())
 
     assert fw.controller == controller
     assert fw.file.is_downloaded is False
@@ -1333,7 +1393,7 @@ def test_FileWidget_init_file_downloaded(mocker, source, session):
     get_file = mocker.MagicMock(return_value=file)
     controller = mocker.MagicMock(get_file=get_file)
 
-    fw = FileWidget('mock', controller, mocker.MagicMock())
+    fw = FileWidget(file, controller, mocker.MagicMock())
 
     assert fw.controller == controller
     assert fw.file.is_downloaded is True
@@ -1362,7 +1422,7 @@ def test_FileWidget_event_handler(mocker, session, source):
     test_event = QEvent(QEvent.MouseButtonPress)
     test_event.button = mocker.MagicMock(return_value=Qt.LeftButton)
 
-    fw = FileWidget(file_.uuid, mock_controller, mock_signal)
+    fw = FileWidget(file_, mock_controller, mock_signal)
     fw._on_left_click = mocker.MagicMock()
 
     fw.eventFilter(fw, test_event)
@@ -1382,15 +1442,14 @@ def test_FileWidget_on_left_click_download(mocker, session, source):
     session.add(file_)
     session.commit()
 
-    mock_get_file = mocker.MagicMock(return_value=file_)
-    mock_controller = mocker.MagicMock(get_file=mock_get_file)
+    mock_controller = mocker.MagicMock(session=session)
+    refresh_files = mocker.patch('securedrop_client.gui.widgets.refresh_files')
 
-    fw = FileWidget(file_.uuid, mock_controller, mock_signal)
-    mock_get_file.assert_called_once_with(file_.uuid)
-    mock_get_file.reset_mock()
+    fw = FileWidget(file_, mock_controller, mock_signal)
+    refresh_files.assert_not_called()
 
     fw._on_left_click()
-    mock_get_file.assert_called_once_with(file_.uuid)
+    refresh_files.assert_called_once_with(session, [file_])
     mock_controller.on_submission_download.assert_called_once_with(
         db.File, file_.uuid)
 
@@ -1405,14 +1464,33 @@ def test_FileWidget_on_left_click_open(mocker, session, source):
     session.add(file_)
     session.commit()
 
-    mock_get_file = mocker.MagicMock(return_value=file_)
-    mock_controller = mocker.MagicMock(get_file=mock_get_file)
+    mock_controller = mocker.MagicMock(session=session)
 
-    fw = FileWidget(file_.uuid, mock_controller, mock_signal)
+    fw = FileWidget(file_, mock_controller, mock_signal)
     fw._on_left_click()
     fw.controller.on_file_open.assert_called_once_with(file_.uuid)
 
 
+def test_FileWidget_on_left_click_shows_current_state(mocker, session, source):
+    """
+    Left click should act on the current state of the file in the database, e.g. open rather than
+    download a file downloaded since the widget was last updated.
+    """
+    file_ = factory.File(source=source['source'], is_downloaded=False, is_decrypted=None)
+    session.add(file_)
+    session.commit()
+    mock_controller = mocker.MagicMock(session=session)
+    fw = FileWidget(file_, mock_controller, mocker.MagicMock())
+
+    other_session = scoped_session(sessionmaker(bind=session.get_bind()))
+    other_session.query(db.File).one().is_downloaded = True
+    other_session.commit()
+    fw._on_left_click()
+
+    mock_controller.on_file_open.assert_called_once_with(file_.uuid)
+    mock_controller.on_submission_download.assert_not_called()
+
+
 def test_FileWidget_update(mocker, session, source):
     """
     The update method should show/hide widgets if file is downloaded
@@ -1422,7 +1500,7 @@ def test_FileWidget_update(mocker, session, source):
     session.commit()
     get_file = mocker.MagicMock(return_value=file)
     controller = mocker.MagicMock(get_file=get_file)
-    fw = FileWidget(file.uuid, controller, mocker.MagicMock())
+    fw = FileWidget(file, controller, mocker.MagicMock())
 
     fw.update()
 
@@ -1431,6 +1509,29 @@ def test_FileWidget_update(mocker, session, source):
     assert not fw.file_name.isHidden()
 
 
+def test_FileWidget_set_file(mocker, source, session):
+    """
+    Setting the file shows its download state, including when it is no longer downloaded.
+    """
+    file = factory.File(source=source['source'], is_downloaded=False, is_decrypted=None)
+    session.add(file)
+    session.commit()
+    fw = FileWidget(file, mocker.MagicMock(), mocker.MagicMock())
+
+    file.is_downloaded = True
+    fw.set_file(file)
+
+    assert fw.download_button.isHidden()
+    assert not fw.file_name.isHidden()
+    assert fw.file_name.text() == file.original_filename
+
+    file.is_downloaded = False
+    fw.set_file(file)
+
+    assert not fw.download_button.isHidden()
+    assert fw.file_name.isHidden()
+
+
 def test_FileWidget_on_file_download_updates_items_when_uuid_matches(mocker, source, session):
     """
     The _on_file_download method should update the FileWidget
@@ -1439,13 +1540,13 @@ def test_FileWidget_on_file_download_updates_items_when_uuid_matches(mocker, sou
     session.add(file)
     session.commit()
 
-    get_file = mocker.MagicMock(return_value=file)
-    controller = mocker.MagicMock(get_file=get_file)
+    controller = mocker.MagicMock(session=session)
 
-    fw = FileWidget(file.uuid, controller, mocker.MagicMock())
+    fw = FileWidget(file, controller, mocker.MagicMock())
     fw.update = mocker.MagicMock()
 
     fw._on_file_downloaded(file.uuid)
+    FileWidget.refresh_downloaded_widgets()
 
     assert fw.download_button.isHidden()
     assert not fw.export_button.isHidden()
@@ -1455,6 +1556,63 @@ def test_FileWidget_on_file_download_updates_items_when_uuid_matches(mocker, sou
     assert not fw.file_name.isHidden()
 
 
+def test_FileWidget_on_file_downloaded_refreshes_files_together(mocker, source, session):
+    """
+    Files downloaded before control returns to the event loop are refreshed with one query, and
+    each widget then shows the downloaded state of its file.
+    """
+    files = [
+        factory.File(source=source['source'], is_downloaded=False, is_decrypted=None)
+        for i in range(3)
+    ]
+    session.add_all(files)
+    session.commit()
+    controller = mocker.MagicMock(session=session)
+    widgets = [FileWidget(file, controller, mocker.MagicMock()) for file in files]
+    single_shot = mocker.patch('securedrop_client.gui.widgets.QTimer.singleShot')
+    refresh_files = mocker.patch(
+        'securedrop_client.gui.widgets.refresh_files', wraps=storage.refresh_files)
+
+    other_session = scoped_session(sessionmaker(bind=session.get_bind()))
+    for file in other_session.query(db.File).all():
+        file.is_downloaded = True
+    other_session.commit()
+    for widget in widgets:
+        widget._on_file_downloaded(widget.file.uuid)
+    widgets[0]._on_file_downloaded(widgets[0].file.uuid)
+
+    single_shot.assert_called_once_with(0, FileWidget.refresh_downloaded_widgets)
+    assert FileWidget.downloaded_widgets == widgets
+
+    FileWidget.refresh_downloaded_widgets()
+
+    refresh_files.assert_called_once_with(session, files)
+    assert FileWidget.downloaded_widgets == []
+    for widget in widgets:
+        assert widget.download_button.isHidden()
+        assert not widget.file_name.isHidden()
+
+
+def test_FileWidget_refresh_downloaded_widgets_skips_deleted_widgets(mocker, source, session):
+    """
+    Widgets deleted before the refresh, e.g. when their conversation is no longer shown, are
+    skipped.
+    """
+    file = factory.File(source=source['source'], is_downloaded=False, is_decrypted=None)
+    session.add(file)
+    session.commit()
+    fw = FileWidget(file, mocker.MagicMock(session=session), mocker.MagicMock())
+    mocker.patch('securedrop_client.gui.widgets.QTimer.singleShot')
+    refresh_files = mocker.patch('securedrop_client.gui.widgets.refresh_files')
+
+    fw._on_file_downloaded(file.uuid)
+    sip.delete(fw)
+    FileWidget.refresh_downloaded_widgets()
+
+    refresh_files.assert_not_called()
+    assert FileWidget.downloaded_widgets == []
+
+
 def test_FileWidget_on_file_download_updates_items_when_uuid_does_not_match(
     mocker, homedir, session, source,
 ):
@@ -1468,7 +1626,7 @@ def test_FileWidget_on_file_download_updates_items_when_uuid_does_not_match(
     get_file = mocker.MagicMock(return_value=file)
     controller = mocker.MagicMock(get_file=get_file)
 
-    fw = FileWidget(file.uuid, controller, mocker.MagicMock())
+    fw = FileWidget(file, controller, mocker.MagicMock())
     fw.clear = mocker.MagicMock()
     fw.update = mocker.MagicMock()
 
@@ -1494,7 +1652,7 @@ def test_FileWidget__on_export_clicked(mocker, session, source):
     get_file = mocker.MagicMock(return_value=file)
     controller = mocker.MagicMock(get_file=get_file)
 
-    fw = FileWidget(file.uuid, controller, mocker.MagicMock())
+    fw = FileWidget(file, controller, mocker.MagicMock())
     fw.update = mocker.MagicMock()
     mocker.patch('securedrop_client.gui.widgets.QDialog.exec')
     controller.run_export_preflight_checks = mocker.MagicMock()
@@ -1521,7 +1679,7 @@ def test_FileWidget__on_export_clicked_missing_file(mocker, session, source):
     get_file = mocker.MagicMock(return_value=file)
     controller = mocker.MagicMock(get_file=get_file)
 
-    fw = FileWidget(file.uuid, controller, mocker.MagicMock())
+    fw = FileWidget(file, controller, mocker.MagicMock())
     fw.update = mocker.MagicMock()
     mocker.patch('securedrop_client.gui.widgets.QDialog.exec')
     controller.run_export_preflight_checks = mocker.MagicMock()
@@ -1545,7 +1703,7 @@ def test_FileWidget__on_print_clicked(mocker, session, source):
     get_file = mocker.MagicMock(return_value=file)
     controller = mocker.MagicMock(get_file=get_file)
 
-    fw = FileWidget(file.uuid, controller, mocker.MagicMock())
+    fw = FileWidget(file, controller, mocker.MagicMock())
     fw.update = mocker.MagicMock()
     mocker.patch('securedrop_client.gui.widgets.QDialog.exec')
     controller.print_file = mocker.MagicMock()
@@ -1572,7 +1730,7 @@ def test_FileWidget__on_print_clicked_missing_file(mocker, session, source):
     get_file = mocker.MagicMock(return_value=file)
     controller = mocker.MagicMock(get_file=get_file)
 
-    fw = FileWidget(file.uuid, controller, mocker.MagicMock())
+    fw = FileWidget(file, controller, mocker.MagicMock())
     fw.update = mocker.MagicMock()
     mocker.patch('securedrop_client.gui.widgets.QDialog.exec')
     controller.print_file = mocker.MagicMock()
@@ -1926,6 +2084,8 @@ def test_ConversationView_init(mocker, homedir):
     """
     Ensure the conversation view has a layout to add widgets to.
     """
+    mocker.patch('securedrop_client.gui.widgets.get_conversation_file_counter_range',
+                 return_value=(None, None))
     mocked_source = mocker.MagicMock()
     mocked_controller = mocker.MagicMock()
     cv = ConversationView(mocked_source, mocked_controller)
@@ -1938,6 +2098,8 @@ def test_ConversationView_update_conversation_position_follow(mocker, homedir):
     the maximum possible value, when the scrollbar is near the bottom, meaning
     it is following the conversation.
     """
+    mocker.patch('securedrop_client.gui.widgets.get_conversation_file_counter_range',
+                 return_value=(None, None))
     mocked_source = mocker.MagicMock()
     mocked_controller = mocker.MagicMock()
 
@@ -1957,6 +2119,8 @@ def test_ConversationView_update_conversation_position_stay_fixed(mocker, homedi
     Check the signal handler does not change the conversation position when
     journalist is reading older messages
     """
+    mocker.patch('securedrop_client.gui.widgets.get_conversation_file_counter_range',
+                 return_value=(None, None))
     mocked_source = mocker.MagicMock()
     mocked_controller = mocker.MagicMock()
 
@@ -1978,7 +2142,8 @@ def test_ConversationView_add_message(mocker, session, source):
     source = source['source']  # grab the source from the fixture dict for simplicity
 
     mock_message_ready_signal = mocker.MagicMock()
-    mocked_controller = mocker.MagicMock(session=session, message_ready=mock_message_ready_signal)
+    mocked_controller = mocker.MagicMock(
+        session=session, message_ready_dispatcher=mock_message_ready_signal)
 
     content = 'a sea, a bee'
     message = factory.Message(source=source, content=content)
@@ -2012,7 +2177,8 @@ def test_ConversationView_add_message_no_content(mocker, session, source):
     source = source['source']  # grab the source from the fixture dict for simplicity
 
     mock_message_ready_signal = mocker.MagicMock()
-    mocked_controller = mocker.MagicMock(session=session, message_ready=mock_message_ready_signal)
+    mocked_controller = mocker.MagicMock(
+        session=session, message_ready_dispatcher=mock_message_ready_signal)
 
     message = factory.Message(source=source, is_decrypted=False, content=None)
     session.add(message)
@@ -2041,6 +2207,8 @@ def test_ConversationView_on_reply_sent(mocker):
     """
     The handler for new replies should call add_reply
     """
+    mocker.patch('securedrop_client.gui.widgets.get_conversation_file_counter_range',
+                 return_value=(None, None))
     source = factory.Source()
     controller = mocker.MagicMock()
     cv = ConversationView(source, controller)
@@ -2056,6 +2224,8 @@ def test_ConversationView_on_reply_sent_does_not_add_message_intended_for_differ
     The handler for new replies should not call add_reply for a message that was intended for a
     different source. #sanity-check
     """
+    mocker.patch('securedrop_client.gui.widgets.get_conversation_file_counter_range',
+                 return_value=(None, None))
     source = factory.Source()
     controller = mocker.MagicMock()
     cv = ConversationView(source, controller)
@@ -2070,12 +2240,15 @@ def test_ConversationView_add_reply_from_reply_box(mocker):
     """
     Adding a reply from reply box results in a new ReplyWidget added to the layout.
     """
+    mocker.patch('securedrop_client.gui.widgets.get_conversation_file_counter_range',
+                 return_value=(None, None))
     source = factory.Source()
     reply_ready = mocker.MagicMock()
     reply_succeeded = mocker.MagicMock()
     reply_failed = mocker.MagicMock()
     controller = mocker.MagicMock(
-        reply_ready=reply_ready, reply_succeeded=reply_succeeded, reply_failed=reply_failed)
+        reply_ready_dispatcher=reply_ready, reply_succeeded_dispatcher=reply_succeeded,
+        reply_failed_dispatcher=reply_failed)
     cv = ConversationView(source, controller)
     cv.conversation_layout = mocker.MagicMock()
     reply_widget_res = mocker.MagicMock()
@@ -2100,9 +2273,9 @@ def test_ConversationView_add_reply(mocker, session, source):
     mock_reply_succeeded_signal = mocker.MagicMock()
     mock_reply_failed_signal = mocker.MagicMock()
     mocked_controller = mocker.MagicMock(session=session,
-                                         reply_ready=mock_reply_ready_signal,
-                                         reply_succeeded=mock_reply_succeeded_signal,
-                                         reply_failed=mock_reply_failed_signal)
+                                         reply_ready_dispatcher=mock_reply_ready_signal,
+                                         reply_succeeded_dispatcher=mock_reply_succeeded_signal,
+                                         reply_failed_dispatcher=mock_reply_failed_signal)
 
     content = 'a sea, a bee'
     reply = factory.Reply(source=source, content=content)
@@ -2145,9 +2318,9 @@ def test_ConversationView_add_reply_no_content(mocker, session, source):
     mock_reply_succeeded_signal = mocker.MagicMock()
     mock_reply_failed_signal = mocker.MagicMock()
     mocked_controller = mocker.MagicMock(session=session,
-                                         reply_ready=mock_reply_ready_signal,
-                                         reply_succeeded=mock_reply_succeeded_signal,
-                                         reply_failed=mock_reply_failed_signal)
+                                         reply_ready_dispatcher=mock_reply_ready_signal,
+                                         reply_succeeded_dispatcher=mock_reply_succeeded_signal,
+                                         reply_failed_dispatcher=mock_reply_failed_signal)
 
     reply = factory.Reply(source=source, is_decrypted=False, content=None)
     session.add(reply)
@@ -2188,7 +2361,7 @@ def test_ConversationView_add_downloaded_file(mocker, homedir, source, session):
     session.commit()
 
     mock_get_file = mocker.MagicMock(return_value=file)
-    mocked_controller = mocker.MagicMock(get_file=mock_get_file)
+    mocked_controller = mocker.MagicMock(session=session, get_file=mock_get_file)
 
     cv = ConversationView(source['source'], mocked_controller)
     cv.conversation_layout = mocker.MagicMock()
@@ -2216,7 +2389,7 @@ def test_ConversationView_add_not_downloaded_file(mocker, homedir, source, sessi
     session.commit()
 
     mock_get_file = mocker.MagicMock(return_value=file)
-    mocked_controller = mocker.MagicMock(get_file=mock_get_file)
+    mocked_controller = mocker.MagicMock(session=session, get_file=mock_get_file)
 
     cv = ConversationView(source['source'], mocked_controller)
     cv.conversation_layout = mocker.MagicMock()
@@ -2336,15 +2509,6 @@ def test_DeleteSourceAction_init(mocker):
     )
 
 
-def test_PasswordEdit(mocker):
-    passwordline = PasswordEdit(None)
-    passwordline.togglepasswordAction.trigger()
-
-    assert passwordline.echoMode() == QLineEdit.Normal
-    passwordline.togglepasswordAction.trigger()
-    assert passwordline.echoMode() == QLineEdit.Password
-
-
 def test_DeleteSourceAction_trigger(mocker):
     mock_controller = mocker.MagicMock()
     mock_source = mocker.MagicMock()
@@ -2387,9 +2551,11 @@ def test_DeleteSource_from_source_menu_when_user_is_loggedout(mocker):
 
 
 def test_DeleteSource_from_source_widget_when_user_is_loggedout(mocker):
+    mocker.patch('securedrop_client.gui.widgets.get_latest_conversation_item', return_value=None)
     mock_source = mocker.MagicMock(journalist_designation='mock')
     mock_controller = mocker.MagicMock(logic.Controller)
     mock_controller.api = None
+    mock_controller.session = mocker.MagicMock()
     mock_event = mocker.MagicMock()
     mock_delete_source_message_box_obj = mocker.MagicMock()
     mock_delete_source_message_box = mocker.MagicMock()
@@ -2447,6 +2613,8 @@ def test_ReplyBoxWidget_send_reply(mocker):
     Ensure sending a reply from the reply box emits signal, clears text box, and sends the reply
     details to the controller.
     """
+    mocker.patch('securedrop_client.gui.widgets.get_conversation_file_counter_range',
+                 return_value=(None, None))
     source = mocker.Mock()
     source.uuid = 'abc123'
     source.collection = []
@@ -2523,9 +2691,9 @@ def test_ReplyWidget_success_failure_slots(mocker):
                          mock_failure_signal)
 
     # ensure we have connected the slots
-    mock_success_signal.connect.assert_called_once_with(widget._on_reply_success)
-    mock_failure_signal.connect.assert_called_once_with(widget._on_reply_failure)
-    assert mock_update_signal.connect.called  # to ensure no stale mocks
+    mock_success_signal.register.assert_called_once_with(msg_id, widget._on_reply_success)
+    mock_failure_signal.register.assert_called_once_with(msg_id, widget._on_reply_failure)
+    assert mock_update_signal.register.called  # to ensure no stale mocks
 
     # check the success slog
     mock_logger = mocker.patch('securedrop_client.gui.widgets.logger')
@@ -2548,6 +2716,22 @@ def test_ReplyWidget_success_failure_slots(mocker):
     assert mock_logger.debug.called
 
 
+def test_ReplyWidget_set_reply_state_sets_style_property(mocker):
+    """
+    The reply status the stylesheet styles replies by is kept in the reply_status property, and the
+    message is polished again when it changes.
+    """
+    widget = ReplyWidget('abc123', 'lol', 'PENDING', mocker.Mock(), mocker.Mock(), mocker.Mock())
+
+    assert widget.property('reply_status') == 'PENDING'
+
+    polish = mocker.patch.object(widget.message.style(), 'polish')
+    widget.update_status('FAILED')
+
+    assert widget.property('reply_status') == 'FAILED'
+    polish.assert_any_call(widget.message)
+
+
 def test_ReplyBoxWidget__on_authentication_changed(mocker, homedir):
     """
     When the client is authenticated, enable reply box.
@@ -2742,12 +2926,12 @@ def test_update_conversation_maintains_old_items(mocker, session):
     session.commit()
 
     mock_get_file = mocker.MagicMock(return_value=file_)
-    mock_controller = mocker.MagicMock(get_file=mock_get_file)
+    mock_controller = mocker.MagicMock(session=session, get_file=mock_get_file)
 
     cv = ConversationView(source, mock_controller)
     assert cv.conversation_layout.count() == 3
 
-    cv.update_conversation(cv.source.collection)
+    cv.update_conversation()
 
     assert cv.conversation_layout.count() == 3
 
@@ -2769,7 +2953,7 @@ def test_update_conversation_adds_new_items(mocker, session):
     session.commit()
 
     mock_get_file = mocker.MagicMock(return_value=file_)
-    mock_controller = mocker.MagicMock(get_file=mock_get_file)
+    mock_controller = mocker.MagicMock(session=session, get_file=mock_get_file)
 
     cv = ConversationView(source, mock_controller)
     assert cv.conversation_layout.count() == 3  # precondition
@@ -2779,14 +2963,214 @@ def test_update_conversation_adds_new_items(mocker, session):
     session.add(new_message)
     session.commit()
 
-    cv.update_conversation(cv.source.collection)
+    cv.update_conversation()
     assert cv.conversation_layout.count() == 4
 
 
+def add_messages(session, source, file_counters):
+    messages = [
+        factory.Message(source=source, filename='{}-source-msg.gpg'.format(file_counter))
+        for file_counter in file_counters]
+    session.add_all(messages)
+    session.commit()
+    return messages
+
+
+def conversation_message_ids(cv):
+    return [
+        cv.conversation_layout.itemAt(i).widget().message_id
+        for i in range(cv.conversation_layout.count())]
+
+
+def test_ConversationView_shows_latest_page(mocker, session):
+    """
+    Only the items in the latest page of the conversation are shown at first.
+    """
+    mocker.patch.object(ConversationView, 'PAGE_SIZE', 2)
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    messages = add_messages(session, source, range(1, 6))
+
+    cv = ConversationView(source, mocker.MagicMock(session=session))
+
+    assert conversation_message_ids(cv) == [m.uuid for m in messages[3:]]
+    assert cv.has_older_items
+
+
+def test_ConversationView_load_older_items(mocker, session):
+    """
+    Older pages are loaded from the database and shown above the other items, until there are no
+    older items.
+    """
+    mocker.patch.object(ConversationView, 'PAGE_SIZE', 2)
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    messages = add_messages(session, source, range(1, 6))
+    cv = ConversationView(source, mocker.MagicMock(session=session))
+
+    cv.load_older_items()
+
+    assert conversation_message_ids(cv) == [m.uuid for m in messages[1:]]
+    assert cv.first_file_counter == 2
+    assert cv.has_older_items
+
+    cv.load_older_items()
+
+    assert conversation_message_ids(cv) == [m.uuid for m in messages]
+    assert cv.first_file_counter == 0
+    assert not cv.has_older_items
+
+
+def test_ConversationView_load_older_items_skips_empty_pages(mocker, session):
+    """
+    Pages without items, such as pages of deleted items, are skipped.
+    """
+    mocker.patch.object(ConversationView, 'PAGE_SIZE', 2)
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    messages = add_messages(session, source, [1, 10])
+    cv = ConversationView(source, mocker.MagicMock(session=session))
+    mock_get_items = mocker.patch('securedrop_client.gui.widgets.get_conversation_items',
+                                  wraps=get_conversation_items)
+
+    cv.load_older_items()
+
+    assert conversation_message_ids(cv) == [m.uuid for m in messages]
+    assert mock_get_items.call_count == 4
+
+    cv.load_older_items()
+
+    assert conversation_message_ids(cv) == [m.uuid for m in messages]
+    assert mock_get_items.call_count == 4
+    assert not cv.has_older_items
+
+
+def test_ConversationView_does_not_load_collection(mocker, session):
+    """
+    Only the latest page of the conversation is loaded from the database, not the whole collection
+    of the source.
+    """
+    mocker.patch.object(ConversationView, 'PAGE_SIZE', 2)
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    messages = add_messages(session, source, range(1, 6))
+    collection = mocker.patch.object(db.Source, 'collection', new_callable=mocker.PropertyMock)
+
+    cv = ConversationView(source, mocker.MagicMock(session=session))
+    cv.update_conversation()
+
+    collection.assert_not_called()
+    assert conversation_message_ids(cv) == [m.uuid for m in messages[3:]]
+
+
+def test_ConversationView_fill_viewport(mocker, session):
+    """
+    When the items shown do not fill the view, there is no scroll bar to scroll up with, so older
+    pages are loaded until they fill it or there are no older items.
+    """
+    mocker.patch.object(ConversationView, 'PAGE_SIZE', 2)
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    messages = add_messages(session, source, range(1, 6))
+    cv = ConversationView(source, mocker.MagicMock(session=session))
+    assert conversation_message_ids(cv) == [m.uuid for m in messages[3:]]
+
+    cv.resize(800, 2000)
+    cv.show()
+
+    assert conversation_message_ids(cv) == [m.uuid for m in messages]
+    assert not cv.has_older_items
+
+
+def test_ConversationView_fill_viewport_stops_when_full(mocker, session):
+    """
+    No more pages are loaded once the items shown are taller than the view.
+    """
+    mocker.patch.object(ConversationView, 'PAGE_SIZE', 2)
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    messages = add_messages(session, source, range(1, 6))
+    cv = ConversationView(source, mocker.MagicMock(session=session))
+    cv.resize(800, 2000)
+    cv.show()
+    mocker.patch.object(cv.container, 'sizeHint', return_value=QSize(800, 3000))
+    cv.unload_older_items()
+
+    assert conversation_message_ids(cv) == [m.uuid for m in messages[3:]]
+    assert cv.has_older_items
+
+
+def test_ConversationView_update_conversation_keeps_older_pages(mocker, session):
+    """
+    Updating the conversation keeps showing the pages loaded by scrolling up, until the user
+    scrolls back to the bottom.
+    """
+    mocker.patch.object(ConversationView, 'PAGE_SIZE', 2)
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    messages = add_messages(session, source, range(1, 6))
+    cv = ConversationView(source, mocker.MagicMock(session=session))
+    cv.load_older_items()
+
+    cv.update_conversation()
+    assert conversation_message_ids(cv) == [m.uuid for m in messages[1:]]
+
+    cv.unload_older_items()
+    assert conversation_message_ids(cv) == [m.uuid for m in messages[3:]]
+    assert cv.first_file_counter is None
+    assert cv.has_older_items
+
+
+def test_ConversationView_on_scrolled(mocker, homedir):
+    """
+    Older items are loaded when the user scrolls to the top, and removed when the user scrolls back
+    to the bottom.
+    """
+    mocker.patch('securedrop_client.gui.widgets.get_conversation_file_counter_range',
+                 return_value=(None, None))
+    cv = ConversationView(mocker.MagicMock(), mocker.MagicMock())
+    cv.load_older_items = mocker.MagicMock()
+    cv.unload_older_items = mocker.MagicMock()
+    cv.scroll.verticalScrollBar().setRange(0, 1000)
+
+    cv.on_scrolled(500)
+    cv.load_older_items.assert_not_called()
+    cv.unload_older_items.assert_not_called()
+
+    cv.on_scrolled(0)
+    cv.load_older_items.assert_called_once_with()
+
+    cv.on_scrolled(1000)
+    cv.unload_older_items.assert_called_once_with()
+
+
+def test_ConversationView_update_conversation_position_after_older_items(mocker, homedir):
+    """
+    When older items were added above the others, the distance from the bottom is kept.
+    """
+    mocker.patch('securedrop_client.gui.widgets.get_conversation_file_counter_range',
+                 return_value=(None, None))
+    cv = ConversationView(mocker.MagicMock(), mocker.MagicMock())
+    cv.scroll.verticalScrollBar().setValue = mocker.MagicMock()
+    cv.position_from_bottom = 400
+
+    cv.update_conversation_position(0, 6000)
+
+    cv.scroll.verticalScrollBar().setValue.assert_called_once_with(5600)
+    assert cv.position_from_bottom is None
+
+
 def test_update_conversation_content_updates(mocker, session):
     """
     Subsequent calls to update_conversation update the content of the conversation_item
-    if it has changed.
+    if it has changed, without creating it again.
     """
     mock_controller = mocker.MagicMock()
     # The controller's session must be a legitimate sqlalchemy session for this test
@@ -2800,21 +3184,14 @@ def test_update_conversation_content_updates(mocker, session):
     session.commit()
 
     cv = ConversationView(source, mock_controller)
-
-    cv.conversation_layout.addWidget = mocker.MagicMock()
-    # this is the MessageWidget that __init__() would return
-    mock_msg_widget_res = mocker.MagicMock()
-    # mock MessageWidget so we can inspect the __init__ call to see what content
-    # is in the widget.
-    mock_msg_widget = mocker.patch('securedrop_client.gui.widgets.MessageWidget',
-                                   return_value=mock_msg_widget_res)
-
-    # First call of update_conversation: with null content
-    cv.update_conversation(cv.source.collection)
+    message_widget = cv.current_conversation[message.uuid]
 
     # Since the content was None, we should have created the widget
-    # with the default message (which is the second call_arg).
-    assert mock_msg_widget.call_args[0][1] == '<Message not yet available>'
+    # with the default message.
+    assert message_widget.message.text() == '<Message not yet available>'
+
+    # mock MessageWidget so we can check that it is not created again.
+    mock_msg_widget = mocker.patch('securedrop_client.gui.widgets.MessageWidget')
 
     # Meanwhile, in another session, we add content to the database for that same message.
     engine = session.get_bind()
@@ -2825,17 +3202,122 @@ def test_update_conversation_content_updates(mocker, session):
     second_session.add(message)
     second_session.commit()
 
-    # Second call of update_conversation
-    cv.update_conversation(cv.source.collection)
+    cv.update_conversation()
 
     # Check that the widget was updated with the expected content.
-    assert mock_msg_widget.call_args[0][1] == expected_content
+    mock_msg_widget.assert_not_called()
+    assert cv.current_conversation[message.uuid] is message_widget
+    assert message_widget.message.text() == expected_content
+
+
+def test_update_conversation_keeps_widgets(mocker, session):
+    """
+    Updating the conversation keeps the widgets of the items already shown, appends new items and
+    removes the items that are gone.
+    """
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    messages = add_messages(session, source, [1, 2, 3])
+    cv = ConversationView(source, mocker.MagicMock(session=session))
+    widgets = dict(cv.current_conversation)
+
+    session.delete(messages[1])
+    new_messages = add_messages(session, source, [4])
+    session.refresh(source)
+    cv.update_conversation()
+
+    assert conversation_message_ids(cv) == [messages[0].uuid, messages[2].uuid,
+                                            new_messages[0].uuid]
+    assert cv.current_conversation[messages[0].uuid] is widgets[messages[0].uuid]
+    assert cv.current_conversation[messages[2].uuid] is widgets[messages[2].uuid]
+    assert messages[1].uuid not in cv.current_conversation
+    assert cv.last_file_counter == 4
+
+
+def test_update_conversation_inserts_older_items(mocker, session):
+    """
+    New items that are older than the newest item shown are inserted where they belong.
+    """
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    messages = add_messages(session, source, [1, 3])
+    cv = ConversationView(source, mocker.MagicMock(session=session))
+
+    new_messages = add_messages(session, source, [2])
+    session.refresh(source)
+    cv.update_conversation()
+
+    assert conversation_message_ids(cv) == [messages[0].uuid, new_messages[0].uuid,
+                                            messages[1].uuid]
+
+
+def test_update_conversation_refreshes_files(mocker, session):
+    """
+    File widgets are created without querying the database each, and show the current download
+    state of their file after the conversation is updated.
+    """
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    file_ = factory.File(source=source, filename='1-source-doc.gpg', is_downloaded=False,
+                         is_decrypted=None)
+    session.add(file_)
+    session.commit()
+    controller = mocker.MagicMock(session=session)
+    cv = ConversationView(source, controller)
+    file_widget = cv.current_conversation[file_.uuid]
+    assert not file_widget.download_button.isHidden()
+
+    other_session = scoped_session(sessionmaker(bind=session.get_bind()))
+    other_session.query(db.File).one().is_downloaded = True
+    other_session.commit()
+    cv.update_conversation()
+
+    controller.get_file.assert_not_called()
+    assert cv.current_conversation[file_.uuid] is file_widget
+    assert file_widget.download_button.isHidden()
+    assert not file_widget.file_name.isHidden()
+
+
+def test_update_conversation_moves_and_updates_replies(mocker, session, reply_status_codes):
+    """
+    A draft reply that was sent keeps its widget, which moves to the reply's position and shows
+    that it was sent.
+    """
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    messages = add_messages(session, source, [1, 2])
+    pending_status = session.query(db.ReplySendStatus).filter_by(
+        name=db.ReplySendStatusCodes.PENDING.value).one()
+    draft = factory.DraftReply(source=source, file_counter=1, send_status=pending_status)
+    session.add(draft)
+    session.commit()
+    cv = ConversationView(source, mocker.MagicMock(session=session))
+    reply_widget = cv.current_conversation[draft.uuid]
+    assert conversation_message_ids(cv) == [messages[0].uuid, draft.uuid, messages[1].uuid]
+    assert reply_widget.reply_status == 'PENDING'
+
+    reply = factory.Reply(source=source, uuid=draft.uuid, filename='3-source-reply.gpg')
+    session.delete(draft)
+    session.add(reply)
+    session.commit()
+    session.refresh(source)
+    cv.update_conversation()
+
+    assert conversation_message_ids(cv) == [messages[0].uuid, messages[1].uuid, reply.uuid]
+    assert cv.current_conversation[reply.uuid] is reply_widget
+    assert reply_widget.reply_status == 'SUCCEEDED'
 
 
 def test_clear_conversation_deletes_items(mocker, homedir):
     """
     Calling clear_conversation deletes items from layout
     """
+    mocker.patch('securedrop_client.gui.widgets.get_conversation_file_counter_range',
+                 return_value=(None, None))
     mock_controller = mocker.MagicMock()
     mock_source = mocker.MagicMock()
     message = db.Message(uuid='uuid', content='message', filename='1-foo')
@@ -2846,3 +3328,4 @@ def test_clear_conversation_deletes_items(mocker, homedir):
     cv.clear_conversation()
 
     assert cv.conversation_layout.count() == 0
+    assert cv.current_conversation == {}
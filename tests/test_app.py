@@ -1,14 +1,17 @@
 """
 Tests for the app module, which sets things up and runs the application.
 """
+import json
 import os
 import platform
 import pytest
+import subprocess
 import sys
-from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QApplication, QWidget
 from securedrop_client.app import ENCODING, excepthook, configure_logging, \
     start_app, arg_parser, DEFAULT_SDC_HOME, run, configure_signal_handlers, \
-    prevent_second_instance, configure_locale_and_language
+    prevent_second_instance, configure_locale_and_language, show_until_painted, \
+    StartupProfile, parse_log_levels
 
 app = QApplication([])
 
@@ -41,6 +44,9 @@ def test_configure_logging(homedir, mocker):
     mock_log_conf = mocker.patch('securedrop_client.app.TimedRotatingFileHandler')
     mock_log_conf_sys = mocker.patch('securedrop_client.app.SysLogHandler')
     mock_logging = mocker.patch('securedrop_client.app.logging')
+    mock_queue_handler = mocker.patch('securedrop_client.app.QueueHandler')
+    mock_queue_listener = mocker.patch('securedrop_client.app.QueueListener')
+    mock_atexit = mocker.patch('securedrop_client.app.atexit')
     mock_log_file = os.path.join(homedir, 'logs', 'client.log')
     configure_logging(homedir)
     mock_log_conf.assert_called_once_with(mock_log_file, when='midnight',
@@ -50,6 +56,76 @@ def test_configure_logging(homedir, mocker):
     mock_logging.getLogger.assert_called_once_with()
     assert sys.excepthook == excepthook
 
+    # The log file and syslog are written to by the queue listener's thread.
+    log_queue = mock_queue_handler.call_args[0][0]
+    mock_queue_listener.assert_called_once_with(
+        log_queue, mock_log_conf(), mock_log_conf_sys(), respect_handler_level=True)
+    mock_queue_listener().start.assert_called_once_with()
+    mock_atexit.register.assert_called_once_with(mock_queue_listener().stop)
+    mock_logging.getLogger().addHandler.assert_called_once_with(mock_queue_handler())
+
+
+def test_configure_logging_sync_logging(homedir, mocker):
+    """
+    Without async logging the log file and syslog handlers are added to the root logger.
+    """
+    mock_log_conf = mocker.patch('securedrop_client.app.TimedRotatingFileHandler')
+    mock_log_conf_sys = mocker.patch('securedrop_client.app.SysLogHandler')
+    mock_logging = mocker.patch('securedrop_client.app.logging')
+    mock_queue_listener = mocker.patch('securedrop_client.app.QueueListener')
+
+    configure_logging(homedir, async_logging=False)
+
+    mock_queue_listener.assert_not_called()
+    assert mock_logging.getLogger().addHandler.call_args_list == [
+        mocker.call(mock_log_conf()), mocker.call(mock_log_conf_sys())]
+
+
+def test_configure_logging_levels(homedir, mocker):
+    """
+    The levels of the root logger and of the loggers named in LOGLEVEL are set.
+    """
+    mocker.patch('securedrop_client.app.TimedRotatingFileHandler')
+    mocker.patch('securedrop_client.app.SysLogHandler')
+    loggers = {}
+    mocker.patch('securedrop_client.app.logging.getLogger',
+                 side_effect=lambda name='': loggers.setdefault(name, mocker.MagicMock()))
+    mocker.patch('securedrop_client.app.LOGLEVEL', 'debug,securedrop_client.storage=info')
+
+    configure_logging(homedir, async_logging=False)
+
+    loggers[''].setLevel.assert_called_once_with('DEBUG')
+    loggers['securedrop_client.storage'].setLevel.assert_called_once_with('INFO')
+
+
+@pytest.mark.parametrize('log_levels, expected', [
+    ('info', ('INFO', {})),
+    ('DEBUG', ('DEBUG', {})),
+    ('', ('INFO', {})),
+    ('debug,securedrop_client.storage=info, securedrop_client.queue = warning',
+     ('DEBUG', {'securedrop_client.storage': 'INFO', 'securedrop_client.queue': 'WARNING'})),
+    ('securedrop_client.storage=debug', ('INFO', {'securedrop_client.storage': 'DEBUG'})),
+    ('loud,securedrop_client.storage=louder', ('INFO', {})),
+])
+def test_parse_log_levels(log_levels, expected):
+    assert parse_log_levels(log_levels) == expected
+
+
+def test_async_logging_writes_log_file(homedir):
+    """
+    Records logged in async logging mode are written to the log file by the time the client exits.
+    """
+    subprocess.check_call([
+        sys.executable, '-c',
+        'import logging; '
+        'from securedrop_client.app import configure_logging; '
+        'configure_logging({!r}); '
+        'logging.getLogger("securedrop_client.storage").info("Updated source %s", "uuid")'.format(
+            str(homedir))], stderr=subprocess.DEVNULL)
+
+    with open(os.path.join(homedir, 'logs', 'client.log')) as f:
+        assert 'INFO: Updated source uuid' in f.read()
+
 
 @pytest.mark.skipif(platform.system() != 'Linux',
                     reason="concurrent app prevention skipped on non Linux")
@@ -117,23 +193,186 @@ def test_start_app(homedir, mocker):
     mock_qt_args = mocker.MagicMock()
     mock_args.sdc_home = str(homedir)
     mock_args.proxy = False
+    mock_args.profile_startup = False
+    mock_args.sync_logging = False
 
-    mocker.patch('securedrop_client.app.configure_logging')
+    mock_configure_logging = mocker.patch('securedrop_client.app.configure_logging')
     mock_app = mocker.patch('securedrop_client.app.QApplication')
-    mock_win = mocker.patch('securedrop_client.app.Window')
+    mock_login_dialog = mocker.patch('securedrop_client.app.LoginDialog')
+    mock_show = mocker.patch('securedrop_client.app.show_until_painted')
+    mock_win = mocker.patch('securedrop_client.gui.main.Window')
     mocker.patch('securedrop_client.resources.path',
                  return_value=mock_args.sdc_home + 'dummy.jpg')
-    mock_controller = mocker.patch('securedrop_client.app.Controller')
+    mock_controller = mocker.patch('securedrop_client.logic.Controller')
     mocker.patch('securedrop_client.app.prevent_second_instance')
     mocker.patch('securedrop_client.app.sys')
-    mocker.patch('securedrop_client.app.make_session_maker', return_value=mock_session_maker)
+    mocker.patch('securedrop_client.db.make_session_maker', return_value=mock_session_maker)
 
     start_app(mock_args, mock_qt_args)
+    mock_configure_logging.assert_called_once_with(mock_args.sdc_home, True)
     mock_app.assert_called_once_with(mock_qt_args)
-    mock_win.assert_called_once_with()
+    mock_login_dialog.assert_called_once_with(None)
+    mock_show.assert_called_once_with(mock_login_dialog())
+    mock_win.assert_called_once_with(mock_login_dialog())
     mock_controller.assert_called_once_with('http://localhost:8081/',
                                             mock_win(), mock_session_maker,
                                             homedir, False, False)
+    assert not os.path.exists(os.path.join(str(homedir), 'logs', 'startup-profile.json'))
+
+
+def test_start_app_shows_login_dialog_first(homedir, mocker):
+    """
+    Ensure the login dialog is shown before the window and controller are created.
+    """
+    mock_args = mocker.MagicMock()
+    mock_args.sdc_home = str(homedir)
+    mock_args.profile_startup = False
+
+    mocker.patch('securedrop_client.app.configure_logging')
+    mocker.patch('securedrop_client.app.QApplication')
+    mocker.patch('securedrop_client.app.LoginDialog')
+    mocker.patch('securedrop_client.app.prevent_second_instance')
+    mocker.patch('securedrop_client.app.sys')
+    mock_win = mocker.patch('securedrop_client.gui.main.Window')
+    mock_controller = mocker.patch('securedrop_client.logic.Controller')
+    mocker.patch('securedrop_client.db.make_session_maker')
+
+    def show_until_painted(widget):
+        assert not mock_win.called
+        assert not mock_controller.called
+
+    mock_show = mocker.patch('securedrop_client.app.show_until_painted',
+                             side_effect=show_until_painted)
+
+    start_app(mock_args, [])
+
+    mock_show.assert_called_once_with(mock_win.call_args[0][0])
+    mock_controller().setup.assert_called_once_with()
+
+
+def test_app_does_not_import_client_modules():
+    """
+    Ensure importing the app module, which shows the login dialog, does not import the modules only
+    needed after login.
+    """
+    modules = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, securedrop_client.app; print(" ".join(sys.modules))',
+    ]).decode().split()
+
+    assert 'securedrop_client.gui.login' in modules
+    assert 'securedrop_client.logic' not in modules
+    assert 'securedrop_client.gui.widgets' not in modules
+    assert 'securedrop_client.db' not in modules
+    assert 'sdclientapi' not in modules
+    assert 'sqlalchemy' not in modules
+
+
+def test_start_app_profile_startup(homedir, mocker):
+    """
+    Ensure --profile-startup writes the startup profile to the logs directory.
+    """
+    mock_args = mocker.MagicMock()
+    mock_args.sdc_home = str(homedir)
+    mock_args.profile_startup = True
+
+    mocker.patch('securedrop_client.app.configure_logging')
+    mocker.patch('securedrop_client.app.QApplication')
+    mocker.patch('securedrop_client.app.LoginDialog')
+    mocker.patch('securedrop_client.app.show_until_painted')
+    mocker.patch('securedrop_client.app.prevent_second_instance')
+    mocker.patch('securedrop_client.app.sys')
+    mocker.patch('securedrop_client.gui.main.Window')
+    mock_controller = mocker.patch('securedrop_client.logic.Controller')
+    mocker.patch('securedrop_client.db.make_session_maker')
+
+    start_app(mock_args, [])
+
+    with open(os.path.join(str(homedir), 'logs', 'startup-profile.json')) as f:
+        profile = json.load(f)
+    assert profile['started'] <= profile['first_paint'] <= profile['ready']
+    assert list(profile['phases']) == ['configure', 'create application', 'show login dialog',
+                                       'import', 'create window', 'create controller']
+    mock_controller().setup.assert_called_once_with()
+
+
+def test_StartupProfile_records_phases_and_imports(homedir, mocker):
+    """
+    Ensure the time of each phase is recorded, and the time of the imports that loaded modules by
+    package, until the profile is written.
+    """
+    import builtins
+    original_import = builtins.__import__
+    mocker.patch.dict('sys.modules')
+    sys.modules.pop('colorsys', None)
+    sys.modules.pop('sched', None)
+
+    profile = StartupProfile(True)
+    try:
+        with profile.phase('first'):
+            import colorsys  # noqa: F401
+        with profile.phase('second'):
+            import json  # noqa: F401
+    finally:
+        profile.write(str(homedir))
+
+    assert builtins.__import__ is original_import
+    assert [phase for phase, duration in profile.phases] == ['first', 'second']
+    assert list(profile.imports) == ['colorsys']
+
+    with profile.phase('after'):
+        import sched  # noqa: F401
+
+    assert len(profile.phases) == 3
+    assert list(profile.imports) == ['colorsys']
+
+
+def test_StartupProfile_disabled(homedir, mocker):
+    """
+    Ensure nothing is recorded or written when startup is not profiled.
+    """
+    import builtins
+    original_import = builtins.__import__
+
+    profile = StartupProfile(False)
+    with profile.phase('first'):
+        pass
+    profile.write(str(homedir))
+
+    assert builtins.__import__ is original_import
+    assert profile.phases == []
+    assert not os.path.exists(os.path.join(str(homedir), 'logs', 'startup-profile.json'))
+
+
+def test_show_until_painted(mocker):
+    """
+    Ensure the widget is shown and painted before show_until_painted returns.
+    """
+    class Widget(QWidget):
+        painted = False
+
+        def paintEvent(self, event):
+            self.painted = True
+
+    widget = Widget()
+
+    show_until_painted(widget)
+
+    assert widget.isVisible()
+    assert widget.painted
+    widget.close()
+
+
+def test_show_until_painted_gives_up_after_timeout(mocker):
+    """
+    Ensure show_until_painted returns if the widget is not painted before the timeout.
+    """
+    widget = QWidget()
+    mocker.patch.object(widget, 'show')
+
+    show_until_painted(widget, 10)
+
+    widget.show.assert_called_once_with()
 
 
 PERMISSIONS_CASES = [
@@ -175,6 +414,7 @@ def test_create_app_dir_permissions(tmpdir, mocker):
     for idx, case in enumerate(PERMISSIONS_CASES):
         mock_session_maker = mocker.MagicMock()
         mock_args = mocker.MagicMock()
+        mock_args.profile_startup = False
         sdc_home = os.path.join(str(tmpdir), 'case-{}'.format(idx))
         mock_args.sdc_home = sdc_home
         mock_qt_args = mocker.MagicMock()
@@ -191,13 +431,15 @@ def test_create_app_dir_permissions(tmpdir, mocker):
 
         mocker.patch('logging.getLogger')
         mocker.patch('securedrop_client.app.QApplication')
-        mocker.patch('securedrop_client.app.Window')
-        mocker.patch('securedrop_client.app.Controller')
+        mocker.patch('securedrop_client.app.LoginDialog')
+        mocker.patch('securedrop_client.app.show_until_painted')
+        mocker.patch('securedrop_client.gui.main.Window')
+        mocker.patch('securedrop_client.logic.Controller')
         mocker.patch('securedrop_client.app.sys')
         mocker.patch('securedrop_client.resources.path',
                      return_value=sdc_home + 'dummy.jpg')
         mocker.patch('securedrop_client.app.prevent_second_instance')
-        mocker.patch('securedrop_client.app.make_session_maker', return_value=mock_session_maker)
+        mocker.patch('securedrop_client.db.make_session_maker', return_value=mock_session_maker)
 
         def func():
             start_app(mock_args, mock_qt_args)
@@ -223,6 +465,9 @@ def test_argparse(mocker):
     mock_expand.assert_called_once_with(DEFAULT_SDC_HOME)
     # check that sdc_home is set after parsing args
     assert args.sdc_home == return_value
+    # logging is async unless asked otherwise
+    assert not args.sync_logging
+    assert parser.parse_args(['--sync-logging']).sync_logging
 
 
 def test_main(mocker):
@@ -255,9 +500,12 @@ def test_signal_interception(mocker, homedir):
     mocker.patch('securedrop_client.logic.Controller.setup')
     mocker.patch('securedrop_client.logic.GpgHelper')
     mocker.patch('securedrop_client.app.configure_logging')
+    mocker.patch('securedrop_client.app.LoginDialog')
+    mocker.patch('securedrop_client.app.show_until_painted')
     mock_signal_handlers = mocker.patch('securedrop_client.app.configure_signal_handlers')
     mock_args = mocker.Mock()
     mock_args.sdc_home = homedir
+    mock_args.profile_startup = False
 
     start_app(mock_args, [])
     assert mock_signal_handlers.called
@@ -3,15 +3,21 @@ Make sure the Controller object, containing the application logic, behaves as
 expected.
 """
 import arrow
+import inspect
 import os
 import pytest
+import threading
+import time
 
-from PyQt5.QtCore import Qt
+from PyQt5 import sip
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
 from sdclientapi import RequestTimeoutError
 from tests import factory
 
 from securedrop_client import db
-from securedrop_client.logic import APICallRunner, Controller
+from securedrop_client.logic import APICallRunner, APICallRunnable, Controller, \
+    SignalDispatcher, _accepts_current_object
+from securedrop_client.api_jobs.base import DEFAULT_NUM_ATTEMPTS
 from securedrop_client.api_jobs.downloads import DownloadChecksumMismatchException
 from securedrop_client.api_jobs.uploads import SendReplyJobError
 
@@ -74,7 +80,7 @@ def test_Controller_init(homedir, config, mocker, session_maker):
     assert co.hostname == 'http://localhost/'
     assert co.gui == mock_gui
     assert co.session_maker == session_maker
-    assert co.api_threads == {}
+    assert co.api_calls == {}
 
 
 def test_Controller_setup(homedir, config, mocker, session_maker):
@@ -94,33 +100,50 @@ def test_Controller_setup(homedir, config, mocker, session_maker):
 
 def test_Controller_call_api(homedir, config, mocker, session_maker):
     """
-    A new thread and APICallRunner is created / setup.
+    A new APICallRunner is created / setup and run on the API thread pool.
     Using the `config` fixture to ensure the config is written to disk.
     """
     mock_gui = mocker.MagicMock()
 
     co = Controller('http://localhost', mock_gui, session_maker, homedir)
 
-    co.finish_api_call = mocker.MagicMock()
-    mocker.patch('securedrop_client.logic.QThread')
+    co.api_thread_pool = mocker.MagicMock()
     mocker.patch('securedrop_client.logic.APICallRunner')
-    mocker.patch('securedrop_client.logic.QTimer')
+    mock_runnable = mocker.patch('securedrop_client.logic.APICallRunnable')
     mock_api_call = mocker.MagicMock()
     mock_success_callback = mocker.MagicMock()
     mock_failure_callback = mocker.MagicMock()
 
     co.call_api(mock_api_call, mock_success_callback, mock_failure_callback, 'foo', bar='baz')
 
-    assert len(co.api_threads) == 1
-    thread_info = co.api_threads[list(co.api_threads.keys())[0]]
-    thread = thread_info['thread']
-    runner = thread_info['runner']
-    thread.started.connect.assert_called_once_with(runner.call_api)
-    thread.start.assert_called_once_with()
-    runner.moveToThread.assert_called_once_with(thread)
-    runner.call_succeeded.connect.call_count == 1
-    runner.call_failed.connect.call_count == 1
-    runner.call_timed_out.connect.call_count == 1
+    assert len(co.api_calls) == 1
+    runner = co.api_calls[list(co.api_calls.keys())[0]]
+    mock_runnable.assert_called_once_with(runner)
+    co.api_thread_pool.start.assert_called_once_with(mock_runnable())
+    assert runner.call_succeeded.connect.call_count == 1
+    assert runner.call_failed.connect.call_count == 1
+
+
+def test_Controller_call_api_reuses_threads(homedir, config, mocker, session_maker):
+    """
+    API calls run on a thread of the pool, which is reused from one call to the next.
+    """
+    co = Controller('http://localhost', mocker.MagicMock(), session_maker, homedir)
+    co.api_thread_pool.setMaxThreadCount(1)
+    api_threads = []
+
+    def api_call():
+        api_threads.append(threading.get_ident())
+
+    for i in range(2):
+        co.call_api(api_call, mocker.MagicMock(), mocker.MagicMock())
+        # Unlike waitForDone, which also stops the pool's threads, wait for the call to finish.
+        while co.api_thread_pool.activeThreadCount():
+            time.sleep(0.01)
+
+    assert len(api_threads) == 2
+    assert api_threads[0] == api_threads[1]
+    assert threading.get_ident() not in api_threads
 
 
 def test_Controller_login(homedir, config, mocker, session_maker):
@@ -213,6 +236,7 @@ def test_Controller_on_authenticate_success(homedir, config, mocker, session_mak
     assert mock_api_job_queue.called
     co.update_sources.assert_called_once_with()
     login.assert_called_with(co.api)
+    co.api_job_queue.restore_jobs.assert_called_once_with(co._restore_job)
     co.resume_queues.assert_called_once_with()
 
 
@@ -233,19 +257,13 @@ def test_Controller_completed_api_call_without_current_object(
 
     result = 'result'
 
-    mock_thread = mocker.MagicMock()
     mock_runner = mocker.MagicMock()
     mock_runner.result = result
     mock_runner.current_object = None
-    co.api_threads = {
-        'thread_uuid': {
-            'thread': mock_thread,
-            'runner': mock_runner,
-        }
-    }
+    co.api_calls = {'call_uuid': mock_runner}
     mock_user_callback = mocker.MagicMock()
 
-    co.completed_api_call('thread_uuid', mock_user_callback)
+    co.completed_api_call('call_uuid', mock_user_callback)
 
     mock_user_callback.assert_called_once_with(result)
 
@@ -263,22 +281,16 @@ def test_Controller_completed_api_call_with_current_object(homedir, config, mock
     result = 'result'
     current_object = 'current_object'
 
-    mock_thread = mocker.MagicMock()
     mock_runner = mocker.MagicMock()
     mock_runner.result = result
     mock_runner.current_object = current_object
-    co.api_threads = {
-        'thread_uuid': {
-            'thread': mock_thread,
-            'runner': mock_runner,
-        }
-    }
+    co.api_calls = {'call_uuid': mock_runner}
     mock_user_callback = mocker.MagicMock()
 
     mock_arg_spec = mocker.MagicMock(args=['foo', 'current_object'])
     mocker.patch('securedrop_client.logic.inspect.getfullargspec', return_value=mock_arg_spec)
 
-    co.completed_api_call('thread_uuid', mock_user_callback)
+    co.completed_api_call('call_uuid', mock_user_callback)
     mock_user_callback.assert_called_once_with(result,
                                                current_object=current_object)
 
@@ -393,6 +405,54 @@ def test_Controller_sync_api_manual_refresh(homedir, config, mocker, session_mak
     co.api_job_queue.enqueue.call_count == 1
 
 
+def test_Controller_sync_api_coalesces_pending_sync(homedir, config, mocker, session_maker):
+    """
+    Sync requests made while a sync job is still waiting in the queue are attached to that job
+    instead of enqueuing another one.
+    """
+    mock_gui = mocker.MagicMock()
+
+    co = Controller('http://localhost', mock_gui, session_maker, homedir)
+
+    co.authenticated = mocker.MagicMock(return_value=True)
+    co.api_job_queue = mocker.MagicMock()
+    co.api_job_queue.enqueue = mocker.MagicMock()
+
+    co.sync_api()
+    co.sync_api()
+    co.sync_api(manual_refresh=True)
+
+    assert co.api_job_queue.enqueue.call_count == 1
+    job = co.api_job_queue.enqueue.call_args[0][0]
+    assert job is co.sync_job
+    assert job.failure_callback == co.on_refresh_failure
+    assert job.remaining_attempts == DEFAULT_NUM_ATTEMPTS
+    # Only the manual refresh cuts short a retry delay
+    co.api_job_queue.re_add_delayed_job.assert_called_once_with(job)
+
+
+def test_Controller_sync_api_new_job_once_sync_started(homedir, config, mocker, session_maker):
+    """
+    Once the pending sync job starts running, the next sync request enqueues a new job.
+    """
+    mock_gui = mocker.MagicMock()
+
+    co = Controller('http://localhost', mock_gui, session_maker, homedir)
+
+    co.authenticated = mocker.MagicMock(return_value=True)
+    co.api_job_queue = mocker.MagicMock()
+    co.api_job_queue.enqueue = mocker.MagicMock()
+
+    co.sync_api()
+    first_job = co.sync_job
+    first_job.started = True
+    co.sync_api()
+
+    assert co.api_job_queue.enqueue.call_count == 2
+    assert co.sync_job is not first_job
+    assert co.sync_job.remaining_attempts == 15
+
+
 def test_Controller_last_sync_with_file(homedir, config, mocker, session_maker):
     """
     The flag indicating the time of the last sync with the API is stored in a
@@ -482,6 +542,8 @@ def test_Controller_on_sync_success(homedir, config, mocker):
 
     mock_storage.update_missing_files.assert_called_once_with(co.data_dir, co.session)
     co.update_sources.assert_called_once_with()
+    mock_storage.write_source_list_snapshot.assert_called_once_with(
+        co.session, co.source_list_snapshot)
     co.download_new_messages.assert_called_once_with()
     co.download_new_replies.assert_called_once_with()
 
@@ -498,6 +560,56 @@ def test_Controller_update_sync(homedir, config, mocker, session_maker):
     co.gui.show_sync.assert_called_once_with(co.last_sync())
 
 
+def test_Controller_show_source_list_snapshot(homedir, config, mocker):
+    """
+    The sources in the snapshot are shown right away, and the sources in local storage once they
+    have been painted.
+    """
+    co = Controller('http://localhost', mocker.MagicMock(), mocker.MagicMock(), homedir)
+    co.update_sources = mocker.MagicMock()
+    snapshot = [mocker.MagicMock()]
+    read = mocker.patch('securedrop_client.logic.storage.read_source_list_snapshot',
+                        return_value=snapshot)
+
+    co.show_source_list_snapshot()
+
+    read.assert_called_once_with(os.path.join(homedir, 'source_list.json'))
+    co.gui.show_sources.assert_called_once_with(snapshot)
+    co.gui.call_after_sources_painted.assert_called_once_with(co.update_sources)
+    co.update_sources.assert_not_called()
+
+
+def test_Controller_show_source_list_snapshot_without_snapshot(homedir, config, mocker):
+    """
+    Without a snapshot, the sources in local storage are shown right away.
+    """
+    co = Controller('http://localhost', mocker.MagicMock(), mocker.MagicMock(), homedir)
+    co.update_sources = mocker.MagicMock()
+
+    co.show_source_list_snapshot()
+
+    co.update_sources.assert_called_once_with()
+    co.gui.show_sources.assert_not_called()
+    co.gui.call_after_sources_painted.assert_not_called()
+
+
+def test_Controller_show_source_list_snapshot_after_sources_loaded(homedir, config, mocker):
+    """
+    Once the sources have been loaded, e.g. when logging in again after logging out, the source
+    list is updated right away instead of showing the snapshot again.
+    """
+    co = Controller('http://localhost', mocker.MagicMock(), mocker.MagicMock(), homedir)
+    co.update_sources = mocker.MagicMock()
+    co.sources_loaded = True
+    read = mocker.patch('securedrop_client.logic.storage.read_source_list_snapshot')
+
+    co.show_source_list_snapshot()
+
+    read.assert_not_called()
+    co.update_sources.assert_called_once_with()
+    co.gui.show_sources.assert_not_called()
+
+
 def test_Controller_update_sources(homedir, config, mocker):
     """
     Ensure the UI displays a list of the available sources from local data
@@ -518,6 +630,7 @@ def test_Controller_update_sources(homedir, config, mocker):
 
     mock_storage.get_local_sources.assert_called_once_with(mock_session)
     mock_gui.show_sources.assert_called_once_with(source_list)
+    assert co.sources_loaded
 
 
 def test_Controller_update_star_not_logged_in(homedir, config, mocker, session_maker):
@@ -582,8 +695,10 @@ def test_Controller_logout_success(homedir, config, mocker, session_maker):
     info_logger = mocker.patch('securedrop_client.logic.logging.info')
     fail_draft_replies = mocker.patch(
         'securedrop_client.storage.mark_all_pending_drafts_as_failed')
+    delete_snapshot = mocker.patch('securedrop_client.logic.storage.delete_source_list_snapshot')
     logout_method = co.api.logout
     co.logout()
+    delete_snapshot.assert_called_once_with(co.source_list_snapshot)
     co.call_api.assert_called_with(
         logout_method,
         co.on_logout_success,
@@ -1023,10 +1138,9 @@ def test_Controller_on_file_open_file_missing(mocker, homedir, session_maker, se
     co.on_file_open(file.uuid)
 
     user_error = 'File does not exist in the data directory. Please try re-downloading.'
-    log_msg = 'Cannot find {} in the data directory. File does not exist.'.format(
-        file.original_filename)
     co.gui.update_error_status.assert_called_once_with(user_error)
-    debug_logger.assert_called_once_with(log_msg)
+    debug_logger.assert_called_once_with(
+        'Cannot find %s in the data directory. File does not exist.', file.original_filename)
     co.sync_api.assert_called_once_with()
 
 
@@ -1050,10 +1164,9 @@ def test_Controller_on_file_open_file_missing_not_qubes(
     co.on_file_open(file.uuid)
 
     user_error = 'File does not exist in the data directory. Please try re-downloading.'
-    log_msg = 'Cannot find {} in the data directory. File does not exist.'.format(
-        file.original_filename)
     co.gui.update_error_status.assert_called_once_with(user_error)
-    debug_logger.assert_called_once_with(log_msg)
+    debug_logger.assert_called_once_with(
+        'Cannot find %s in the data directory. File does not exist.', file.original_filename)
     co.sync_api.assert_called_once_with()
 
 
@@ -1129,7 +1242,7 @@ def test_Controller_on_reply_downloaded_failure(mocker, homedir, session_maker):
 
     co.on_reply_download_failure('mock_exception')
 
-    debug_logger.assert_called_once_with('Failed to download reply: mock_exception')
+    debug_logger.assert_called_once_with('Failed to download reply: %s', 'mock_exception')
     reply_ready.emit.assert_not_called()
 
     # Job should not get automatically resubmitted if the failure was generic
@@ -1235,7 +1348,7 @@ def test_Controller_on_message_downloaded_failure(mocker, homedir, session_maker
 
     co.on_message_download_failure('mock_exception')
 
-    debug_logger.assert_called_once_with('Failed to download message: mock_exception')
+    debug_logger.assert_called_once_with('Failed to download message: %s', 'mock_exception')
     message_ready.emit.assert_not_called()
 
     # Job should not get automatically resubmitted if the failure was generic
@@ -1272,7 +1385,9 @@ def test_Controller_on_delete_source_success(homedir, config, mocker, session_ma
     mock_gui = mocker.MagicMock()
     co = Controller('http://localhost', mock_gui, session_maker, homedir)
     co.sync_api = mocker.MagicMock()
-    co.on_delete_source_success(True)
+    remove = mocker.patch('securedrop_client.logic.storage.remove_from_source_list_snapshot')
+    co.on_delete_source_success('source-uuid')
+    remove.assert_called_once_with(co.source_list_snapshot, 'source-uuid')
     co.sync_api.assert_called_with()
 
 
@@ -1389,7 +1504,7 @@ def test_Controller_on_reply_success(homedir, mocker, session_maker, session):
 
     co.on_reply_success(reply.uuid)
 
-    assert debug_logger.call_args_list[0][0][0] == '{} sent successfully'.format(reply.uuid)
+    assert debug_logger.call_args_list[0][0] == ('%s sent successfully', reply.uuid)
     reply_succeeded.emit.assert_called_once_with(reply.uuid)
     reply_failed.emit.assert_not_called()
     co.sync_api.assert_called_once_with()
@@ -1407,7 +1522,7 @@ def test_Controller_on_reply_failure(homedir, mocker, session_maker):
     exception = SendReplyJobError('mock_error_message', 'mock_reply_uuid')
     co.on_reply_failure(exception)
 
-    debug_logger.assert_called_once_with('{} failed to send'.format('mock_reply_uuid'))
+    debug_logger.assert_called_once_with('%s failed to send', 'mock_reply_uuid')
     reply_failed.emit.assert_called_once_with('mock_reply_uuid')
     reply_succeeded.emit.assert_not_called()
 
@@ -1455,6 +1570,91 @@ def test_Controller_resume_queues(homedir, mocker, session_maker):
     co.api_job_queue.resume_queues.assert_called_once_with()
 
 
+def test_APICallRunnable_run(mocker):
+    runner = mocker.MagicMock()
+
+    APICallRunnable(runner).run()
+
+    runner.call_api.assert_called_once_with()
+
+
+def test_accepts_current_object_is_cached(mocker):
+    def callback(result, current_object=None):
+        pass
+
+    getfullargspec = mocker.patch('securedrop_client.logic.inspect.getfullargspec',
+                                  wraps=inspect.getfullargspec)
+
+    assert _accepts_current_object(callback)
+    assert _accepts_current_object(callback)
+    assert not _accepts_current_object(lambda result: None)
+    assert getfullargspec.call_count == 2
+
+
+class Receiver(QObject):
+    ready = pyqtSignal(str, str)
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def on_ready(self, uuid, text):
+        self.calls.append((uuid, text))
+
+
+def test_SignalDispatcher_routes_by_uuid():
+    """
+    Each emission of the signal is only delivered to the slots registered for its UUID.
+    """
+    sender = Receiver()
+    dispatcher = SignalDispatcher(sender.ready)
+    receiver_a = Receiver()
+    receiver_b = Receiver()
+    dispatcher.register('uuid-a', receiver_a.on_ready)
+    dispatcher.register('uuid-b', receiver_b.on_ready)
+
+    sender.ready.emit('uuid-a', 'text')
+    sender.ready.emit('uuid-c', 'text')
+
+    assert receiver_a.calls == [('uuid-a', 'text')]
+    assert receiver_b.calls == []
+
+
+def test_SignalDispatcher_unregisters_destroyed_receivers():
+    """
+    The slots of a destroyed object are unregistered.
+    """
+    sender = Receiver()
+    dispatcher = SignalDispatcher(sender.ready)
+    receiver = Receiver()
+    other_receiver = Receiver()
+    dispatcher.register('uuid', receiver.on_ready)
+    dispatcher.register('uuid', other_receiver.on_ready)
+
+    sip.delete(receiver)
+    assert dispatcher.slots == {'uuid': [other_receiver.on_ready]}
+
+    sip.delete(other_receiver)
+    assert dispatcher.slots == {}
+    sender.ready.emit('uuid', 'text')
+
+
+def test_Controller_dispatchers(homedir, config, mocker, session_maker):
+    """
+    The signals about messages and replies are delivered through the dispatchers.
+    """
+    co = Controller('http://localhost', mocker.MagicMock(), session_maker, homedir)
+    receiver = Receiver()
+    co.message_ready_dispatcher.register('message-uuid', receiver.on_ready)
+    co.reply_ready_dispatcher.register('reply-uuid', receiver.on_ready)
+
+    co.message_ready.emit('message-uuid', 'message')
+    co.reply_ready.emit('reply-uuid', 'reply')
+    co.reply_ready.emit('other-uuid', 'reply')
+
+    assert receiver.calls == [('message-uuid', 'message'), ('reply-uuid', 'reply')]
+
+
 def test_APICallRunner_api_call_timeout(mocker):
     """
     Ensure that if a RequestTimeoutError is raised, both the failure and timeout signals are
@@ -1596,10 +1796,9 @@ def test_Controller_print_file_file_missing(homedir, mocker, session, session_ma
     co.print_file(file.uuid)
 
     user_error = 'File does not exist in the data directory. Please try re-downloading.'
-    log_msg = 'Cannot find {} in the data directory. File does not exist.'.format(
-        file.original_filename)
     co.gui.update_error_status.assert_called_once_with(user_error)
-    debug_logger.assert_called_once_with(log_msg)
+    debug_logger.assert_called_once_with(
+        'Cannot find %s in the data directory. File does not exist.', file.original_filename)
     co.sync_api.assert_called_once_with()
 
 
@@ -1623,10 +1822,9 @@ def test_Controller_print_file_file_missing_not_qubes(
     co.print_file(file.uuid)
 
     user_error = 'File does not exist in the data directory. Please try re-downloading.'
-    log_msg = 'Cannot find {} in the data directory. File does not exist.'.format(
-        file.original_filename)
     co.gui.update_error_status.assert_called_once_with(user_error)
-    debug_logger.assert_called_once_with(log_msg)
+    debug_logger.assert_called_once_with(
+        'Cannot find %s in the data directory. File does not exist.', file.original_filename)
     co.sync_api.assert_called_once_with()
 
 
@@ -1790,10 +1988,9 @@ def test_Controller_export_file_to_usb_drive_file_missing(homedir, mocker, sessi
     co.export_file_to_usb_drive(file.uuid, 'mock passphrase')
 
     user_error = 'File does not exist in the data directory. Please try re-downloading.'
-    log_msg = 'Cannot find {} in the data directory. File does not exist.'.format(
-        file.original_filename)
     co.gui.update_error_status.assert_called_once_with(user_error)
-    debug_logger.assert_called_once_with(log_msg)
+    debug_logger.assert_called_once_with(
+        'Cannot find %s in the data directory. File does not exist.', file.original_filename)
     co.sync_api.assert_called_once_with()
 
 
@@ -1817,10 +2014,9 @@ def test_Controller_export_file_to_usb_drive_file_missing_not_qubes(
     co.export_file_to_usb_drive(file.uuid, 'mock passphrase')
 
     user_error = 'File does not exist in the data directory. Please try re-downloading.'
-    log_msg = 'Cannot find {} in the data directory. File does not exist.'.format(
-        file.original_filename)
     co.gui.update_error_status.assert_called_once_with(user_error)
-    debug_logger.assert_called_once_with(log_msg)
+    debug_logger.assert_called_once_with(
+        'Cannot find %s in the data directory. File does not exist.', file.original_filename)
     co.sync_api.assert_called_once_with()
 
 
@@ -1895,3 +2091,56 @@ def test_get_file(mocker, session, homedir):
 
     storage.get_file.assert_called_once_with(co.session, file.uuid)
     assert obj == file
+
+
+def test_Controller_restore_job_downloads(homedir, mocker, session_maker, session):
+    '''
+    File downloads are restored only if the file still exists.
+    '''
+    co = Controller('http://localhost', mocker.MagicMock(), session_maker, homedir)
+    source = factory.Source()
+    file_ = factory.File(source=source)
+    session.add(source)
+    session.add(file_)
+    session.commit()
+
+    job = co._restore_job('FileDownloadJob', {'uuid': file_.uuid})
+
+    assert job.uuid == file_.uuid
+    assert co._restore_job('FileDownloadJob', {'uuid': 'deleted-file-uuid'}) is None
+
+
+def test_Controller_restore_job_send_reply(homedir, mocker, session_maker, session,
+                                           reply_status_codes):
+    '''
+    Replies are restored only if their draft still exists, with the content of the draft, and the
+    draft is pending again.
+    '''
+    co = Controller('http://localhost', mocker.MagicMock(), session_maker, homedir)
+    source = factory.Source()
+    failed_status = session.query(db.ReplySendStatus).filter_by(
+        name=db.ReplySendStatusCodes.FAILED.value).one()
+    draft_reply = factory.DraftReply(source=source, send_status=failed_status, content='mock')
+    session.add(source)
+    session.add(draft_reply)
+    session.commit()
+    args = {'source_uuid': source.uuid, 'reply_uuid': draft_reply.uuid}
+
+    job = co._restore_job('SendReplyJob', args)
+
+    assert (job.source_uuid, job.reply_uuid, job.message) == (source.uuid, draft_reply.uuid, 'mock')
+    session.refresh(draft_reply)
+    assert draft_reply.send_status.name == db.ReplySendStatusCodes.PENDING.value
+    args['reply_uuid'] = 'deleted-draft-uuid'
+    assert co._restore_job('SendReplyJob', args) is None
+
+
+def test_Controller_restore_job_star_and_delete(homedir, mocker, session_maker):
+    co = Controller('http://localhost', mocker.MagicMock(), session_maker, homedir)
+
+    star_job = co._restore_job('UpdateStarJob', {'source_uuid': 'mock', 'star_status': True})
+    delete_job = co._restore_job('DeleteSourceJob', {'source_uuid': 'mock'})
+
+    assert (star_job.source_uuid, star_job.star_status) == ('mock', True)
+    assert delete_job.source_uuid == 'mock'
+    assert co._restore_job('UnknownJob', {}) is None
@@ -5,8 +5,11 @@ from queue import Queue
 from sdclientapi import RequestTimeoutError
 
 from securedrop_client.api_jobs.downloads import FileDownloadJob
-from securedrop_client.api_jobs.base import ApiInaccessibleError, PauseQueueJob
-from securedrop_client.queue import RunnableQueue, ApiJobQueue
+from securedrop_client.api_jobs.base import ApiInaccessibleError, PauseQueueJob, RetryPolicy
+from securedrop_client.api_jobs.stats import JobStatistics
+from securedrop_client.api_jobs.timeouts import TimeoutModel
+from securedrop_client.api_jobs.updatestar import UpdateStarJob
+from securedrop_client.queue import RunnableQueue, ApiJobQueue, JobStore
 from tests import factory
 
 
@@ -21,9 +24,26 @@ def test_RunnableQueue_init(mocker):
     assert queue.session_maker == mock_session_maker
     assert isinstance(queue.queue, Queue)
     assert queue.queue.empty()
+    assert isinstance(queue.timeout_model, TimeoutModel)
     queue.resume.connect.assert_called_once_with(queue.process)
 
 
+def test_RunnableQueue_add_job_shares_timeout_model(mocker):
+    '''
+    Jobs added to the queue use the queue's timeout model.
+    '''
+    timeout_model = TimeoutModel()
+    queue = RunnableQueue(mocker.MagicMock(), mocker.MagicMock(), timeout_model)
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+    queue.JOB_PRIORITIES = {job_cls: 1, PauseQueueJob: 2}
+    job = job_cls()
+
+    queue.add_job(job)
+    queue.add_job(PauseQueueJob())
+
+    assert job.timeout_model is timeout_model
+
+
 def test_RunnableQueue_happy_path(mocker):
     '''
     Add one job to the queue, run it.
@@ -76,6 +96,67 @@ def test_RunnableQueue_job_timeout(mocker):
     assert queue.queue.get(block=True) == (1, job2)
 
 
+def test_RunnableQueue_job_retry_later(mocker):
+    '''
+    A job that has to wait before being retried is kept out of the queue until its delay has passed,
+    so that it does not block the other jobs.
+    '''
+    queue = RunnableQueue(mocker.MagicMock(), mocker.MagicMock())
+    mock_timer = mocker.patch('securedrop_client.queue.threading.Timer')
+    job_cls = factory.dummy_job_factory(mocker, RequestTimeoutError())
+    job_cls.RETRY_POLICY = RetryPolicy(base_delay=5, max_delay=5, jitter=False)
+    other_job_cls = factory.dummy_job_factory(mocker, 'mock')
+    queue.JOB_PRIORITIES = {job_cls: 1, other_job_cls: 2, PauseQueueJob: 3}
+
+    job = job_cls()
+    other_job = other_job_cls()
+    queue.add_job(job)
+    queue.add_job(other_job)
+    queue.add_job(PauseQueueJob())
+
+    queue.process()
+
+    assert queue.queue.empty()
+    assert not job.failure_signal.emit.called
+    other_job.success_signal.emit.assert_called_once_with('mock')
+    mock_timer.assert_called_once_with(5, queue.re_add_delayed_job, args=[job])
+    mock_timer.return_value.start.assert_called_once_with()
+    assert queue.delayed_jobs == {job: mock_timer.return_value}
+
+
+def test_RunnableQueue_re_add_job_later(mocker):
+    queue = RunnableQueue(mocker.MagicMock(), mocker.MagicMock())
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+    queue.JOB_PRIORITIES = {job_cls: 1}
+    job = job_cls()
+    job.order_number = 1
+
+    queue.re_add_job_later(job, 0.01)
+
+    assert queue.queue.get(timeout=5) == (1, job)
+    assert queue.delayed_jobs == {}
+
+
+def test_RunnableQueue_re_add_delayed_job(mocker):
+    '''
+    A delayed job can be put back into the queue before its delay has passed, and only once.
+    '''
+    queue = RunnableQueue(mocker.MagicMock(), mocker.MagicMock())
+    mock_timer = mocker.patch('securedrop_client.queue.threading.Timer')
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+    queue.JOB_PRIORITIES = {job_cls: 1}
+    job = job_cls()
+    job.order_number = 1
+
+    queue.re_add_job_later(job, 60)
+
+    assert queue.re_add_delayed_job(job)
+    assert not queue.re_add_delayed_job(job)
+    mock_timer.return_value.cancel.assert_called_once_with()
+    assert queue.queue.get_nowait() == (1, job)
+    assert queue.queue.empty()
+
+
 def test_RunnableQueue_process_PauseQueueJob(mocker):
     api_client = mocker.MagicMock()
     session_maker = mocker.MagicMock(return_value=mocker.MagicMock())
@@ -247,7 +328,7 @@ def test_ApiJobQueue_enqueue(mocker):
     mock_start_queues = mocker.patch.object(job_queue, 'start_queues')
 
     dl_job = FileDownloadJob('mock', 'mock', 'mock')
-    job_queue.enqueue(dl_job)
+    assert job_queue.enqueue(dl_job)
 
     mock_download_file_add_job.assert_called_once_with(dl_job)
     assert not mock_main_queue_add_job.called
@@ -258,7 +339,7 @@ def test_ApiJobQueue_enqueue(mocker):
     mock_main_queue.reset_mock()
     mock_main_queue_add_job.reset_mock()
 
-    job_queue.enqueue(dummy_job)
+    assert job_queue.enqueue(dummy_job)
 
     mock_main_queue_add_job.assert_called_once_with(dummy_job)
     assert not mock_download_file_add_job.called
@@ -304,7 +385,7 @@ def test_ApiJobQueue_enqueue_no_auth(mocker):
 
     dummy_job = factory.dummy_job_factory(mocker, 'mock')()
     job_queue.JOB_PRIORITIES = {type(dummy_job): 1}
-    job_queue.enqueue(dummy_job)
+    assert not job_queue.enqueue(dummy_job)
 
     assert not mock_download_file_add_job.called
     assert not mock_main_queue_add_job.called
@@ -369,3 +450,315 @@ def test_ApiJobQueue_logout_removes_api_client(mocker):
 
     assert job_queue.main_queue.api_client is None
     assert job_queue.download_file_queue.api_client is None
+
+
+def test_JobStore_records_jobs_across_restarts(tmpdir):
+    '''
+    Recorded jobs can be read back by a new store, in the order in which they were added.
+    '''
+    job_store = JobStore(str(tmpdir))
+    star_job = UpdateStarJob('mock-source-uuid', True)
+    star_job.order_number = 7
+    download_job = FileDownloadJob('mock-file-uuid', 'mock', 'mock')
+    download_job.order_number = 0
+    download_job.remaining_attempts = 3
+
+    job_store.add(star_job, 16)
+    job_store.add(download_job, 13)
+    job_store.close()
+
+    pending_jobs = JobStore(str(tmpdir)).get_pending_jobs()
+
+    assert [(job.job_type, job.args) for job in pending_jobs] == [
+        ('UpdateStarJob', {'source_uuid': 'mock-source-uuid', 'star_status': True}),
+        ('FileDownloadJob', {'uuid': 'mock-file-uuid'}),
+    ]
+    assert (pending_jobs[0].priority, pending_jobs[0].order_number) == (16, 7)
+    assert pending_jobs[1].remaining_attempts == 3
+
+
+def test_JobStore_update_and_remove(tmpdir):
+    job_store = JobStore(str(tmpdir))
+    job = UpdateStarJob('mock', False)
+    job.order_number = 0
+    job_store.add(job, 16)
+
+    job.remaining_attempts = 1
+    job_store.update(job)
+    assert job_store.get_pending_jobs()[0].remaining_attempts == 1
+
+    job_store.remove(job)
+    assert job_store.get_pending_jobs() == []
+    assert job.store_id is None
+
+
+def test_JobStore_ignores_jobs_that_cannot_be_restored(mocker, tmpdir):
+    job_store = JobStore(str(tmpdir))
+    job = factory.dummy_job_factory(mocker, 'mock')()
+    job.order_number = 0
+
+    job_store.add(job, 1)
+
+    assert job.store_id is None
+    assert job_store.get_pending_jobs() == []
+
+
+def test_JobStore_errors_are_logged(mocker, tmpdir):
+    '''
+    The queues keep working if the store cannot be written to.
+    '''
+    job_store = JobStore(str(tmpdir.join('does-not-exist')))
+    mock_logger = mocker.patch('securedrop_client.queue.logger')
+    job = UpdateStarJob('mock', False)
+    job.order_number = 0
+
+    job_store.add(job, 16)
+
+    assert job.store_id is None
+    assert job_store.get_pending_jobs() == []
+    assert mock_logger.error.called
+
+
+def test_RunnableQueue_forgets_finished_jobs(mocker):
+    '''
+    Jobs are recorded while they are in the queue and forgotten once they finish, whether they
+    succeed or fail. Jobs that time out stay recorded.
+    '''
+    job_store = mocker.MagicMock()
+    queue = RunnableQueue(mocker.MagicMock(), mocker.MagicMock(), job_store=job_store)
+    queue.pause = mocker.MagicMock()
+    success_job_cls = factory.dummy_job_factory(mocker, 'mock')
+    failure_job_cls = factory.dummy_job_factory(mocker, Exception())
+    timeout_job_cls = factory.dummy_job_factory(mocker, RequestTimeoutError())
+    queue.JOB_PRIORITIES = {
+        PauseQueueJob: 0, success_job_cls: 1, failure_job_cls: 1, timeout_job_cls: 1}
+    success_job = success_job_cls()
+    failure_job = failure_job_cls()
+    timeout_job = timeout_job_cls()
+    timeout_job.remaining_attempts = 1
+
+    queue.add_job(success_job)
+    queue.add_job(failure_job)
+    queue.add_job(timeout_job)
+    queue.process()
+
+    assert job_store.add.call_count == 3
+    job_store.add.assert_any_call(success_job, 1)
+    assert job_store.remove.call_args_list == [((success_job,),), ((failure_job,),)]
+    job_store.update.assert_called_once_with(timeout_job)
+
+
+def test_ApiJobQueue_restore_jobs(mocker, tmpdir):
+    '''
+    Jobs from an earlier run are restored once, in their original order, with the attempts they had
+    left. Jobs that are no longer needed are dropped.
+    '''
+    old_store = JobStore(str(tmpdir))
+    for i, uuid in enumerate(['file-1', 'file-2', 'deleted-file']):
+        job = FileDownloadJob(uuid, 'mock', 'mock')
+        job.order_number = i
+        job.remaining_attempts = 2
+        old_store.add(job, 13)
+    old_store.close()
+
+    job_store = JobStore(str(tmpdir))
+    job_queue = ApiJobQueue(mocker.MagicMock(), mocker.MagicMock(), job_store)
+    mocker.patch.object(job_queue, 'start_queues')
+
+    def restore_job(job_type, args):
+        if args['uuid'] != 'deleted-file':
+            return FileDownloadJob(args['uuid'], 'mock', 'mock')
+
+    job_queue.restore_jobs(restore_job)
+    job_queue.restore_jobs(restore_job)
+
+    restored_jobs = [job_queue.download_file_queue.queue.get_nowait()[1] for i in range(2)]
+    assert job_queue.download_file_queue.queue.empty()
+    assert [job.uuid for job in restored_jobs] == ['file-1', 'file-2']
+    assert [job.remaining_attempts for job in restored_jobs] == [2, 2]
+    assert [job.args['uuid'] for job in job_store.get_pending_jobs()] == ['file-1', 'file-2']
+
+
+def test_ApiJobQueue_restore_jobs_not_logged_in(mocker, tmpdir):
+    '''
+    Jobs cannot be enqueued when we are not logged in, so they are kept to be restored at the next
+    login.
+    '''
+    old_store = JobStore(str(tmpdir))
+    job = UpdateStarJob('mock', True)
+    job.order_number = 0
+    old_store.add(job, 16)
+    old_store.close()
+
+    job_store = JobStore(str(tmpdir))
+    job_queue = ApiJobQueue(None, mocker.MagicMock(), job_store)
+    mocker.patch.object(job_queue, 'start_queues')
+
+    def restore_job(job_type, args):
+        return UpdateStarJob(args['source_uuid'], args['star_status'])
+
+    job_queue.restore_jobs(restore_job)
+
+    assert job_queue.main_queue.queue.empty()
+    assert len(job_store.get_pending_jobs()) == 1
+
+    job_queue.login(mocker.MagicMock())
+    job_queue.restore_jobs(restore_job)
+
+    assert job_queue.main_queue.queue.get_nowait()[1].source_uuid == 'mock'
+    assert len(job_store.get_pending_jobs()) == 1
+
+
+def test_ApiJobQueue_restore_jobs_keeps_jobs_not_enqueued(mocker, tmpdir):
+    '''
+    The record of a job is kept if the restored job could not be enqueued.
+    '''
+    old_store = JobStore(str(tmpdir))
+    job = UpdateStarJob('mock', True)
+    job.order_number = 0
+    old_store.add(job, 16)
+    old_store.close()
+
+    job_store = JobStore(str(tmpdir))
+    job_queue = ApiJobQueue(mocker.MagicMock(), mocker.MagicMock(), job_store)
+    mocker.patch.object(job_queue, 'enqueue', return_value=False)
+
+    job_queue.restore_jobs(lambda job_type, args: UpdateStarJob('mock', True))
+
+    assert job_queue.enqueue.call_count == 1
+    assert len(job_store.get_pending_jobs()) == 1
+
+
+def test_ApiJobQueue_restore_jobs_without_store(mocker):
+    job_queue = ApiJobQueue(mocker.MagicMock(), mocker.MagicMock())
+    restore_job = mocker.MagicMock()
+
+    job_queue.restore_jobs(restore_job)
+
+    assert not restore_job.called
+
+
+def test_ApiJobQueue_logout_re_adds_delayed_jobs(mocker):
+    '''
+    Jobs waiting to be retried are put back into the queues on logout instead of reappearing once
+    their delay has passed.
+    '''
+    job_queue = ApiJobQueue(mocker.MagicMock(), mocker.MagicMock())
+    mock_timer = mocker.patch('securedrop_client.queue.threading.Timer')
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+    job_queue.main_queue.JOB_PRIORITIES = {job_cls: 1}
+    job = job_cls()
+    job.order_number = 1
+    job_queue.main_queue.re_add_job_later(job, 60)
+
+    job_queue.logout()
+
+    mock_timer.return_value.cancel.assert_called_once_with()
+    assert job_queue.main_queue.queue.get_nowait() == (1, job)
+    assert not job_queue.re_add_delayed_job(job)
+
+
+def test_RunnableQueue_records_statistics(mocker):
+    '''
+    The outcome of each run of a job is recorded in the queue's statistics.
+    '''
+    statistics = mocker.MagicMock()
+    queue = RunnableQueue(mocker.MagicMock(), mocker.MagicMock(), statistics=statistics)
+    success_job_cls = factory.dummy_job_factory(mocker, 'mock')
+    failure_job_cls = factory.dummy_job_factory(mocker, Exception())
+    timeout_job_cls = factory.dummy_job_factory(mocker, RequestTimeoutError())
+    queue.JOB_PRIORITIES = {
+        PauseQueueJob: 0, success_job_cls: 1, failure_job_cls: 1, timeout_job_cls: 1}
+    success_job = success_job_cls()
+    failure_job = failure_job_cls()
+    timeout_job = timeout_job_cls()
+    timeout_job.remaining_attempts = 1
+
+    queue.add_job(success_job)
+    queue.add_job(failure_job)
+    queue.add_job(timeout_job)
+    queue.process()
+
+    assert statistics.job_started.call_args_list == [
+        ((success_job,),), ((failure_job,),), ((timeout_job,),)]
+    assert statistics.job_finished.call_args_list == [
+        ((success_job, 'success'),), ((failure_job, 'failure'),), ((timeout_job, 'timeout'),)]
+    # The timed out job is put back into the queue
+    assert statistics.job_enqueued.call_args_list == [
+        ((success_job,),), ((failure_job,),), ((timeout_job,),), ((timeout_job,),)]
+    assert success_job.attempts == 1
+
+
+def test_RunnableQueue_get_queued_jobs(mocker):
+    '''
+    The API jobs waiting in the queue are returned, but not the jobs that pause it.
+    '''
+    queue = RunnableQueue(mocker.MagicMock(), mocker.MagicMock())
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+    queue.JOB_PRIORITIES = {job_cls: 1, PauseQueueJob: 2}
+    job = job_cls()
+    queue.add_job(job)
+    queue.add_job(PauseQueueJob())
+
+    assert queue.get_queued_jobs() == [job]
+
+
+def test_ApiJobQueue_logout_forgets_jobs_no_longer_queued(mocker):
+    '''
+    On logout, the statistics stop tracking jobs that left the queues without being run, are
+    written to the log, and are no longer written periodically.
+    '''
+    job_queue = ApiJobQueue(mocker.MagicMock(), mocker.MagicMock())
+    job_cls = factory.dummy_job_factory(mocker, 'mock')
+    job_queue.main_queue.JOB_PRIORITIES = {job_cls: 1}
+    queued_job = job_cls()
+    job_queue.main_queue.add_job(queued_job)
+    job_queue.statistics.job_enqueued(job_cls())
+    job_queue.statistics_timer = mocker.MagicMock()
+    log_statistics = mocker.patch.object(job_queue.statistics, 'log_statistics')
+
+    job_queue.logout()
+
+    assert job_queue.statistics.get_waiting_jobs()[0] == 1
+    job_queue.statistics_timer.stop.assert_called_once_with()
+    log_statistics.assert_called_once_with()
+
+
+def test_ApiJobQueue_login_starts_statistics_timer(mocker):
+    '''
+    While logged in, the statistics are written to the log if they are due every LOG_INTERVAL
+    seconds, whether or not jobs finish.
+    '''
+    job_queue = ApiJobQueue(mocker.MagicMock(), mocker.MagicMock())
+    mocker.patch.object(job_queue, 'start_queues')
+
+    assert job_queue.statistics_timer.interval() == JobStatistics.LOG_INTERVAL * 1000
+    assert not job_queue.statistics_timer.isActive()
+
+    job_queue.login(mocker.MagicMock())
+
+    assert job_queue.statistics_timer.isActive()
+    job_queue.statistics_timer.stop()
+
+
+def test_ApiJobQueue_on_queue_paused_logs_statistics(mocker):
+    '''
+    The statistics are written to the log when a queue pauses.
+    '''
+    job_queue = ApiJobQueue(mocker.MagicMock(), mocker.MagicMock())
+    log_statistics = mocker.patch.object(job_queue.statistics, 'log_statistics')
+    paused_emissions = []
+    job_queue.paused.connect(lambda: paused_emissions.append(True))
+
+    job_queue.on_queue_paused()
+
+    log_statistics.assert_called_once_with()
+    assert paused_emissions == [True]
+
+
+def test_ApiJobQueue_get_statistics(mocker):
+    job_queue = ApiJobQueue(mocker.MagicMock(), mocker.MagicMock())
+
+    assert job_queue.main_queue.statistics is job_queue.statistics
+    assert job_queue.download_file_queue.statistics is job_queue.statistics
+    assert job_queue.get_statistics() == {}
@@ -1,9 +1,12 @@
 """
 Tests for the resources sub-module.
 """
+import os
+
 import securedrop_client.resources
-from PyQt5.QtGui import QIcon, QPixmap
-from PyQt5.QtSvg import QSvgWidget
+from PyQt5.QtCore import QSize
+from PyQt5.QtGui import QFont, QIcon, QPixmap, QPixmapCache
+from PyQt5.QtSvg import QSvgRenderer, QSvgWidget
 from PyQt5.QtWidgets import QApplication
 
 app = QApplication([])
@@ -11,14 +14,120 @@ app = QApplication([])
 
 def test_path(mocker):
     """
-    Ensure the resource_filename function is called with the expected args and
-    the path function under test returns its result.
+    Ensure the path function returns the filename of the resource in the
+    resource directory.
+    """
+    mocker.patch('securedrop_client.resources.RESOURCES_DIR', '/resources')
+    assert securedrop_client.resources.path('foo') == '/resources/images/foo'
+    assert securedrop_client.resources.path('foo', 'css/') == '/resources/css/foo'
+
+
+def test_resources_dir():
+    """
+    Ensure the resource directory is the directory of the resources package.
+    """
+    assert os.path.samefile(securedrop_client.resources.RESOURCES_DIR,
+                            os.path.dirname(securedrop_client.resources.__file__))
+    assert os.path.isfile(securedrop_client.resources.path('icon.png'))
+
+
+def test_load_font(mocker):
+    """
+    Ensure every font file in the folder is added to the font database once.
+    """
+    add_font = mocker.patch('securedrop_client.resources.QFontDatabase.addApplicationFont',
+                            return_value=1)
+    mocker.patch.dict('securedrop_client.resources._fonts', clear=True)
+
+    securedrop_client.resources.load_font('Source_Sans_Pro')
+    securedrop_client.resources.load_font('Source_Sans_Pro')
+
+    assert add_font.call_count == 12
+
+
+def test_load_font_weights(mocker):
+    """
+    Ensure only the upright font files of the given weights are added, and the files of the
+    nearest weights for a weight without a file of its own.
+    """
+    add_font = mocker.patch('securedrop_client.resources.QFontDatabase.addApplicationFont',
+                            return_value=1)
+    mocker.patch.dict('securedrop_client.resources._fonts', clear=True)
+
+    # Source Sans Pro has no Medium font files, so 62 is between Regular and SemiBold.
+    securedrop_client.resources.load_font_weights('Source_Sans_Pro', [QFont.Light, 62])
+
+    added = sorted(call[0][0].rsplit('/', 1)[-1] for call in add_font.call_args_list)
+    assert added == ['SourceSansPro-Light.ttf', 'SourceSansPro-Regular.ttf',
+                     'SourceSansPro-SemiBold.ttf']
+
+
+def test_load_stylesheet_fonts(mocker):
+    """
+    Ensure the fonts used by the rules of the stylesheets are loaded with the weights Qt gives them,
+    and fonts that are not bundled are left out.
+    """
+    load_font_weights = mocker.patch('securedrop_client.resources.load_font_weights')
+    mocker.patch('securedrop_client.resources._stylesheets_with_fonts', set())
+
+    securedrop_client.resources.load_stylesheet_fonts(['''
+    #a {
+        font-family: 'Source Sans Pro';
+        font-weight: 600;
+    }
+    #b {
+        font-family: Montserrat;
+    }
+    #c {
+        font-family: "Montserrat";
+        font-weight: bold;
+    }
+    #d {
+        font-family: 'Open Sans';
+        font-weight: 300;
+    }
+    #e {
+        font-weight: 200;
+    }
+    ''', '''
+    #f {
+        font-family: 'Source Sans Pro';
+        font-weight: 400;
+    }
+    '''])
+
+    assert sorted(load_font_weights.call_args_list) == [
+        mocker.call('Montserrat', {QFont.Normal, QFont.Bold}),
+        mocker.call('Source_Sans_Pro', {QFont.Normal, QFont.Bold}),
+    ]
+
+
+def test_load_stylesheet_fonts_once(mocker):
+    """
+    Ensure a stylesheet is only read the first time its fonts are loaded.
+    """
+    load_font_weights = mocker.patch('securedrop_client.resources.load_font_weights')
+    mocker.patch('securedrop_client.resources._stylesheets_with_fonts', set())
+    stylesheet = '#a { font-family: Montserrat; }'
+
+    securedrop_client.resources.load_stylesheet_fonts([stylesheet])
+    securedrop_client.resources.load_stylesheet_fonts([stylesheet])
+
+    load_font_weights.assert_called_once_with('Montserrat', {QFont.Normal})
+
+
+def test_set_stylesheet(mocker):
+    """
+    Ensure the fonts of a widget's stylesheet are loaded before the stylesheet is set.
     """
-    r = mocker.patch('securedrop_client.resources.resource_filename',
-                     return_value='bar')
-    assert securedrop_client.resources.path('foo') == 'bar'
-    r.assert_called_once_with(securedrop_client.resources.__name__,
-                              'images/foo')
+    load_stylesheet_fonts = mocker.patch('securedrop_client.resources.load_stylesheet_fonts')
+    widget = mocker.MagicMock()
+    widget.setStyleSheet.side_effect = \
+        lambda stylesheet: load_stylesheet_fonts.assert_called_once_with([stylesheet])
+
+    securedrop_client.resources.set_stylesheet(widget, '#a { font-family: Montserrat; }')
+
+    widget.setStyleSheet.assert_called_once_with('#a { font-family: Montserrat; }')
 
 
 def test_load_icon():
@@ -37,6 +146,18 @@ def test_load_icon():
     assert isinstance(result, QIcon)
 
 
+def test_load_icon_is_cached():
+    """
+    Loading the same icon again returns an icon sharing the data of the first one.
+    """
+    icon = securedrop_client.resources.load_icon('star_on.svg', normal_off='star_off.svg')
+    same_icon = securedrop_client.resources.load_icon('star_on.svg', normal_off='star_off.svg')
+    other_icon = securedrop_client.resources.load_icon('star_on.svg')
+
+    assert same_icon.cacheKey() == icon.cacheKey()
+    assert other_icon.cacheKey() != icon.cacheKey()
+
+
 def test_load_svg():
     """
     Check the load_svg function returns the expected QSvgWidget object.
@@ -53,13 +174,53 @@ def test_load_image():
     assert isinstance(result, QPixmap)
 
 
-def test_load_css(mocker):
+def test_load_image_is_cached(mocker):
+    """
+    The file of an image is only read again once the pixmap cache has dropped it.
+    """
+    QPixmapCache.clear()
+    pixmap = mocker.spy(securedrop_client.resources, 'QPixmap')
+
+    image = securedrop_client.resources.load_image('paperclip.svg')
+    same_image = securedrop_client.resources.load_image('paperclip.svg')
+
+    assert pixmap.call_count == 1
+    assert same_image.cacheKey() == image.cacheKey()
+
+    QPixmapCache.clear()
+    securedrop_client.resources.load_image('paperclip.svg')
+
+    assert pixmap.call_count == 2
+
+
+def test_load_svg_pixmap():
+    """
+    Check the load_svg_pixmap function renders the SVG file at the given size once.
+    """
+    pixmap = securedrop_client.resources.load_svg_pixmap('paperclip.svg', QSize(9, 9))
+    same_pixmap = securedrop_client.resources.load_svg_pixmap('paperclip.svg', QSize(9, 9))
+    larger_pixmap = securedrop_client.resources.load_svg_pixmap('paperclip.svg', QSize(18, 18))
+
+    assert pixmap.size() == QSize(9, 9)
+    assert same_pixmap.cacheKey() == pixmap.cacheKey()
+    assert larger_pixmap.size() == QSize(18, 18)
+
+
+def test_load_svg_pixmap_default_size():
+    """
+    Without a size, the SVG file is rendered at the size it specifies.
+    """
+    pixmap = securedrop_client.resources.load_svg_pixmap('paperclip.svg')
+
+    assert pixmap.size() == QSvgRenderer(securedrop_client.resources.path('paperclip.svg')) \
+        .defaultSize()
+
+
+def test_load_css(mocker, tmpdir):
     """
-    Ensure the resource_string function is called with the expected args and
-    the load_css function returns its result.
+    Ensure the load_css function returns the decoded contents of the CSS file
+    in the resource directory.
     """
-    rs = mocker.patch('securedrop_client.resources.resource_string',
-                      return_value=b'foo')
-    assert 'foo' == securedrop_client.resources.load_css('foo')
-    rs.assert_called_once_with(securedrop_client.resources.__name__,
-                               'css/foo')
+    tmpdir.mkdir('css').join('foo').write_text('foo \u2014', encoding='utf-8')
+    mocker.patch('securedrop_client.resources.RESOURCES_DIR', str(tmpdir))
+    assert 'foo \u2014' == securedrop_client.resources.load_css('foo')
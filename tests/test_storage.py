@@ -8,6 +8,7 @@ import uuid
 from dateutil.parser import parse
 
 from sdclientapi import Source, Submission, Reply
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.exc import NoResultFound
 
 import securedrop_client.db
@@ -17,7 +18,10 @@ from securedrop_client.storage import get_local_sources, get_local_messages, get
     delete_single_submission_or_reply_on_disk, rename_file, get_local_files, find_new_files, \
     source_exists, set_message_or_reply_content, mark_as_downloaded, mark_as_decrypted, get_file, \
     get_message, get_reply, update_and_get_user, update_missing_files, mark_as_not_downloaded, \
-    mark_all_pending_drafts_as_failed
+    mark_all_pending_drafts_as_failed, get_conversation_items, refresh_files, SyncReport, \
+    read_source_list_snapshot, write_source_list_snapshot, SOURCE_LIST_SNAPSHOT_SIZE, \
+    remove_from_source_list_snapshot, delete_source_list_snapshot, \
+    get_conversation_file_counter_range, get_latest_conversation_item
 
 from securedrop_client import db
 from tests import factory
@@ -130,6 +134,51 @@ def test_get_remote_data(mocker):
     assert replies == [reply, ]
 
 
+def test_get_remote_data_report(mocker):
+    """
+    The requests are timed in the sync report, with one stage for the submissions of all sources.
+    """
+    mock_api = mocker.MagicMock()
+    mock_api.get_sources.return_value = [make_remote_source(), make_remote_source()]
+    mock_api.get_submissions.return_value = [mocker.MagicMock()]
+    mock_api.get_all_replies.return_value = []
+    report = SyncReport()
+
+    get_remote_data(mock_api, report)
+
+    assert list(report.durations) == ['get_sources', 'get_submissions', 'get_all_replies']
+    assert report.calls == {'get_sources': 1, 'get_submissions': 2, 'get_all_replies': 1}
+    assert report.counts == {'sources': 2, 'submissions': 2, 'replies': 0}
+
+
+def test_SyncReport_str(mocker):
+    monotonic = mocker.patch('securedrop_client.storage.time.monotonic', return_value=0)
+    report = SyncReport()
+
+    for now in [0, 1, 1, 1.5, 1.5, 2]:
+        monotonic.side_effect = [now, now + 0.25]
+        with report.stage('get_submissions' if now < 2 else 'import_key'):
+            pass
+    monotonic.side_effect = None
+    monotonic.return_value = 3
+    report.count('sources', 3)
+    report.finish()
+
+    assert report.duration == 3
+    assert str(report) == \
+        'Sync took 3.000s (3 sources): get_submissions 1.250s (5 calls), import_key 0.250s'
+
+
+def test_SyncReport_stage_records_failure(mocker):
+    report = SyncReport()
+
+    with pytest.raises(ValueError):
+        with report.stage('get_sources'):
+            raise ValueError()
+
+    assert report.calls == {'get_sources': 1}
+
+
 def test_update_local_storage(homedir, mocker):
     """
     Assuming no errors getting data, check the expected functions to update
@@ -154,11 +203,17 @@ def test_update_local_storage(homedir, mocker):
     file_fn = mocker.patch('securedrop_client.storage.update_files')
     msg_fn = mocker.patch('securedrop_client.storage.update_messages')
 
-    update_local_storage(mock_session, [remote_source], remote_submissions, [remote_reply], homedir)
-    src_fn.assert_called_once_with([remote_source], [local_source], mock_session, homedir)
-    rpl_fn.assert_called_once_with([remote_reply], [local_reply], mock_session, homedir)
-    file_fn.assert_called_once_with([remote_file], [local_file], mock_session, homedir)
-    msg_fn.assert_called_once_with([remote_message], [local_message], mock_session, homedir)
+    report = SyncReport()
+
+    update_local_storage(
+        mock_session, [remote_source], remote_submissions, [remote_reply], homedir, report)
+    src_fn.assert_called_once_with([remote_source], [local_source], mock_session, homedir, report)
+    rpl_fn.assert_called_once_with([remote_reply], [local_reply], mock_session, homedir, report)
+    file_fn.assert_called_once_with([remote_file], [local_file], mock_session, homedir, report)
+    msg_fn.assert_called_once_with(
+        [remote_message], [local_message], mock_session, homedir, report)
+    assert list(report.durations) == [
+        'update_sources', 'update_files', 'update_messages', 'update_replies']
 
 
 def test_update_sources(homedir, mocker):
@@ -999,6 +1054,20 @@ def test_delete_single_submission_or_reply_race_guard(homedir, mocker):
     mock_remove.call_count == 1
 
 
+def test_delete_single_submission_or_reply_deletes_partial_download(homedir, mocker):
+    test_obj = mocker.MagicMock()
+    test_obj.uuid = 'mock-uuid'
+    test_obj.filename = '1-dissolved-steak-msg.gpg'
+    partial_download_path = os.path.join(homedir, 'data', 'partial', 'mock-uuid.part')
+    os.makedirs(os.path.dirname(partial_download_path))
+    with open(partial_download_path, 'w') as f:
+        f.write('partial')
+
+    delete_single_submission_or_reply_on_disk(test_obj, os.path.join(homedir, 'data'))
+
+    assert not os.path.exists(partial_download_path)
+
+
 def test_rename_file_does_not_throw(homedir):
     """
     If file cannot be found then OSError is caught and logged.
@@ -1088,6 +1157,119 @@ def test_get_reply(mocker, session):
     assert result == reply
 
 
+def test_get_conversation_items(mocker, session):
+    """
+    Only the items of the source with a file_counter in the range are returned, in conversation
+    order.
+    """
+    source = factory.Source()
+    other_source = factory.Source()
+    session.add(source)
+    session.add(other_source)
+    session.flush()
+    file_ = factory.File(source=source, filename='1-source-doc.gpg')
+    message = factory.Message(source=source, filename='2-source-msg.gpg')
+    reply = factory.Reply(source=source, filename='3-source-reply.gpg')
+    draft = factory.DraftReply(source=source, file_counter=3)
+    newer_message = factory.Message(source=source, filename='4-source-msg.gpg')
+    other_message = factory.Message(source=other_source, filename='2-source-msg.gpg')
+    session.add_all([file_, message, reply, draft, newer_message, other_message])
+    session.commit()
+
+    assert get_conversation_items(session, source, 2, 4) == [message, reply, draft]
+    assert get_conversation_items(session, source, 0, 2) == [file_]
+    assert get_conversation_items(session, source, 5, 10) == []
+
+
+def test_get_conversation_file_counter_range(mocker, session):
+    """
+    The lowest and highest file_counter of the items of the source are returned, or None for both
+    if the source has no items.
+    """
+    source = factory.Source()
+    other_source = factory.Source()
+    session.add(source)
+    session.add(other_source)
+    session.flush()
+    assert get_conversation_file_counter_range(session, source) == (None, None)
+
+    file_ = factory.File(source=source, filename='3-source-doc.gpg')
+    reply = factory.Reply(source=source, filename='7-source-reply.gpg')
+    draft = factory.DraftReply(source=source, file_counter=8)
+    other_message = factory.Message(source=other_source, filename='1-source-msg.gpg')
+    session.add_all([file_, reply, draft, other_message])
+    session.commit()
+
+    assert get_conversation_file_counter_range(session, source) == (3, 8)
+
+
+def test_get_latest_conversation_item(mocker, session):
+    """
+    The newest item of the source is the last item of its collection, loaded with its current state
+    in the database.
+    """
+    source = factory.Source()
+    other_source = factory.Source()
+    session.add(source)
+    session.add(other_source)
+    session.flush()
+    assert get_latest_conversation_item(session, source) is None
+
+    message = factory.Message(source=source, filename='2-source-msg.gpg', content='old')
+    file_ = factory.File(source=source, filename='1-source-doc.gpg')
+    other_message = factory.Message(source=other_source, filename='3-source-msg.gpg')
+    session.add_all([message, file_, other_message])
+    session.commit()
+    assert get_latest_conversation_item(session, source) is message
+
+    other_session = scoped_session(sessionmaker(bind=session.get_bind()))
+    other_session.query(db.Message).filter_by(uuid=message.uuid).one().content = 'new'
+    other_session.commit()
+    assert get_latest_conversation_item(session, source).content == 'new'
+
+    draft = factory.DraftReply(source=source, file_counter=2,
+                               timestamp=datetime.datetime(2020, 1, 1))
+    newer_draft = factory.DraftReply(source=source, file_counter=2,
+                                     timestamp=datetime.datetime(2020, 1, 2),
+                                     uuid='newer-draft-uuid')
+    session.add_all([draft, newer_draft])
+    session.commit()
+    assert get_latest_conversation_item(session, source) is newer_draft
+    assert get_latest_conversation_item(session, source) is source.collection[-1]
+
+
+def test_refresh_files(mocker, session):
+    """
+    Files loaded in the session are updated with their state in the database.
+    """
+    source = factory.Source()
+    session.add(source)
+    session.flush()
+    file_ = factory.File(source=source, is_downloaded=False, is_decrypted=None)
+    session.add(file_)
+    session.commit()
+    assert not file_.is_downloaded
+
+    other_session = scoped_session(sessionmaker(bind=session.get_bind()))
+    other_session.query(db.File).one().is_downloaded = True
+    other_session.commit()
+
+    refresh_files(session, [file_])
+
+    assert file_.is_downloaded
+
+
+def test_refresh_files_without_files(mocker):
+    """
+    No query is made when there are no files to refresh.
+    """
+    session = mocker.MagicMock()
+
+    refresh_files(session, [])
+
+    session.query.assert_not_called()
+
+
 def test_pending_replies_are_marked_as_failed_on_logout_login(mocker, session,
                                                               reply_status_codes):
     source = factory.Source()
@@ -1104,3 +1286,137 @@ def test_pending_replies_are_marked_as_failed_on_logout_login(mocker, session,
 
     for draft in session.query(db.DraftReply).all():
         assert draft.send_status == failed_status
+
+
+def test_write_and_read_source_list_snapshot(homedir, session):
+    """
+    The snapshot keeps what the source list shows of the most recently updated sources, in the
+    order the source list shows them, in a file only the user can read.
+    """
+    now = datetime.datetime(2020, 1, 2, 3, 4, 5)
+    older = factory.Source(last_updated=now - datetime.timedelta(days=1), is_starred=True)
+    newer = factory.Source(last_updated=now, document_count=2)
+    session.add_all([older, newer])
+    session.flush()
+    session.add(factory.Message(source=older, content='secret message'))
+    session.commit()
+    path = os.path.join(homedir, 'source_list.json')
+
+    write_source_list_snapshot(session, path)
+    snapshot = read_source_list_snapshot(path)
+
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    # No content of the conversations is written outside the database
+    with open(path) as f:
+        assert 'secret message' not in f.read()
+    assert [s.uuid for s in snapshot] == [newer.uuid, older.uuid]
+    assert snapshot[0].journalist_designation == newer.journalist_designation
+    assert snapshot[0].last_updated == now
+    assert snapshot[0].collection == []
+    assert snapshot[0].document_count == 1
+    assert not snapshot[0].is_starred
+    assert snapshot[1].collection == []
+    assert snapshot[1].document_count == 0
+    assert snapshot[1].is_starred
+
+
+def test_write_source_list_snapshot_keeps_top_of_source_list(homedir, session):
+    """
+    Only the sources at the top of the source list are kept in the snapshot.
+    """
+    now = datetime.datetime.now()
+    sources = [factory.Source(last_updated=now - datetime.timedelta(minutes=i))
+               for i in range(SOURCE_LIST_SNAPSHOT_SIZE + 5)]
+    session.add_all(sources)
+    session.commit()
+    path = os.path.join(homedir, 'source_list.json')
+
+    write_source_list_snapshot(session, path)
+
+    assert [s.uuid for s in read_source_list_snapshot(path)] == \
+        [s.uuid for s in sources[:SOURCE_LIST_SNAPSHOT_SIZE]]
+
+
+def test_write_source_list_snapshot_error(homedir, session, mocker):
+    """
+    Failing to write the snapshot is logged, and leaves the previous snapshot alone.
+    """
+    path = os.path.join(homedir, 'source_list.json')
+    with open(path, 'w') as f:
+        f.write('[]')
+    mocker.patch('securedrop_client.storage.os.replace', side_effect=OSError('full'))
+    warning = mocker.patch('securedrop_client.storage.logger.warning')
+
+    write_source_list_snapshot(session, path)
+
+    warning.assert_called_once_with('Could not write the source list snapshot: full')
+    with open(path) as f:
+        assert f.read() == '[]'
+
+
+def test_remove_from_source_list_snapshot(homedir, session):
+    """
+    A deleted source is removed from the snapshot, and the rest are kept in order.
+    """
+    now = datetime.datetime.now()
+    sources = [factory.Source(last_updated=now - datetime.timedelta(minutes=i)) for i in range(3)]
+    session.add_all(sources)
+    session.commit()
+    path = os.path.join(homedir, 'source_list.json')
+    write_source_list_snapshot(session, path)
+
+    remove_from_source_list_snapshot(path, sources[1].uuid)
+
+    assert [s.uuid for s in read_source_list_snapshot(path)] == \
+        [sources[0].uuid, sources[2].uuid]
+
+
+def test_remove_from_source_list_snapshot_without_snapshot(homedir):
+    """
+    Without a snapshot there is nothing to remove, and no snapshot is written.
+    """
+    path = os.path.join(homedir, 'source_list.json')
+
+    remove_from_source_list_snapshot(path, 'uuid')
+
+    assert not os.path.exists(path)
+
+
+def test_delete_source_list_snapshot(homedir, session):
+    """
+    The snapshot is deleted, and deleting a missing snapshot does nothing.
+    """
+    session.add(factory.Source())
+    session.commit()
+    path = os.path.join(homedir, 'source_list.json')
+    write_source_list_snapshot(session, path)
+
+    delete_source_list_snapshot(path)
+    delete_source_list_snapshot(path)
+
+    assert not os.path.exists(path)
+    assert read_source_list_snapshot(path) == []
+
+
+def test_read_source_list_snapshot_missing(homedir, mocker):
+    """
+    There is no snapshot before the first sync.
+    """
+    warning = mocker.patch('securedrop_client.storage.logger.warning')
+
+    assert read_source_list_snapshot(os.path.join(homedir, 'source_list.json')) == []
+    warning.assert_not_called()
+
+
+@pytest.mark.parametrize('content', ['not json', '{"uuid": "x"}', '[{"uuid": "x"}]'])
+def test_read_source_list_snapshot_invalid(homedir, mocker, content):
+    """
+    A snapshot that cannot be read is logged and ignored.
+    """
+    path = os.path.join(homedir, 'source_list.json')
+    with open(path, 'w') as f:
+        f.write(content)
+    warning = mocker.patch('securedrop_client.storage.logger.warning')
+
+    assert read_source_list_snapshot(path) == []
+    assert warning.call_count == 1